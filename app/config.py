@@ -1,4 +1,6 @@
 import warnings
+from typing import Dict
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -12,6 +14,102 @@ class Settings(BaseSettings):
     database_url: str  # Required: Supabase PostgreSQL connection string
     secret_key: str = "your-secret-key-change-in-production"  # JWT secret key (set via SECRET_KEY env var)
 
+    # Shared HTTP client for the Telegram Bot API (keep-alive connection pool)
+    telegram_api_base_url: str = "https://api.telegram.org"  # Point at a local Bot API server or a benchmark stand-in
+    telegram_http_max_connections: int = 100  # Max concurrent connections to api.telegram.org
+    telegram_http_max_keepalive: int = 20  # Idle connections kept open for reuse
+    telegram_http_keepalive_expiry: float = 30.0  # Seconds an idle connection stays in the pool
+    telegram_http_timeout: float = 10.0  # Read/write/pool timeout in seconds
+    telegram_http_connect_timeout: float = 5.0  # TCP+TLS connect timeout in seconds
+
+    # Cached bot credentials are re-checked against credentials_version this often (seconds, 0 = off)
+    bot_registry_refresh_interval: float = 30.0
+    bot_registry_miss_ttl: float = 10.0  # Seconds an unknown integration id is answered without a database query
+
+    # Outbound reply queue (webhook acknowledges immediately, workers send)
+    telegram_outbox_workers: int = 8  # Worker tasks; each chat is pinned to one worker
+    telegram_outbox_max_queue: int = 10000  # Total queued replies before falling back to direct sends
+    telegram_bot_rate_limit: float = 30.0  # Messages per second per bot (Telegram global limit)
+    telegram_bot_rate_burst: int = 30
+    telegram_chat_rate_limit: float = 1.0  # Messages per second per chat
+    telegram_chat_rate_burst: int = 3
+
+    # Per-bot delivery health (circuit breaker, 429 parking, blocked chats)
+    telegram_breaker_failure_threshold: int = 5  # Consecutive 401/5xx/network failures that open a bot's breaker
+    telegram_breaker_open_seconds: float = 30.0  # Sends fail fast this long before a probe is allowed
+    telegram_send_max_retries: int = 2  # Times a send answered with 429 is rescheduled for after the retry_after
+    telegram_max_retry_after: float = 60.0  # Longer retry_after values park the bot but fail the send
+    telegram_blocked_chat_ttl: float = 86400.0  # Seconds a chat that returned 403 is skipped
+    telegram_blocked_chat_max: int = 100000  # Max blocked (bot, chat) pairs remembered
+
+    # Reply inside the webhook response ({"method": "sendMessage", ...}) instead of
+    # calling sendMessage; only used when the webhook identifies its bot
+    telegram_inline_replies: bool = False
+
+    # Merge rapid-fire messages from one chat into a single reply (0 = off)
+    telegram_coalesce_window: float = 0.0  # Seconds of quiet that end a burst
+    telegram_coalesce_max_wait: float = 3.0  # Max seconds a burst is held before it is answered (webhooks are acknowledged at once)
+    telegram_coalesce_max_messages: int = 10  # A burst this large is processed immediately
+
+    # Write-behind buffer for conversation rows (batched multi-row INSERTs)
+    conversation_batch_size: int = 200  # Flush when this many rows are pending
+    conversation_flush_interval: float = 1.0  # ...or at least this often (seconds)
+    conversation_buffer_max: int = 10000  # Writers wait for a flush beyond this many rows
+    conversation_flush_max_retries: int = 5  # Failed batches are retried this many times before being dropped
+    conversation_flush_retry_backoff: float = 1.0  # Seconds before the first retry (doubles per failure, max 30s)
+
+    # Update ingestion: "webhook" (needs a public HTTPS PUBLIC_URL) or "polling" (getUpdates)
+    telegram_update_mode: str = "webhook"
+    telegram_poll_timeout: int = 25  # Long-poll timeout passed to getUpdates (seconds)
+    telegram_poll_limit: int = 100  # Max updates fetched per getUpdates call
+    telegram_poll_concurrency: int = 16  # Chats processed concurrently per polled batch
+
+    # Weighted fair scheduling of update processing across businesses
+    tenant_max_concurrency: int = 64  # Updates processed at once per worker (0 = no scheduling)
+    tenant_default_concurrency: int = 32  # Max of those slots one business may hold
+    tenant_default_share: float = 1.0  # Relative weight when businesses compete for slots
+    tenant_overrides: Dict[str, Dict[str, float]] = {}  # JSON: {"<business_id>": {"share": 4, "max_concurrency": 48}}
+
+    # Load shedding for update intake (pressure 1.0 = at capacity)
+    load_shedding_enabled: bool = True
+    webhook_max_inflight: int = 256  # In-flight webhook requests at full pressure
+    webhook_max_queue: int = 5000  # Queued replies/rows/slot waits at full pressure
+    load_shed_persist_at: float = 0.7  # Stop saving conversations from this pressure
+    load_shed_knowledge_at: float = 0.85  # Reply from the knowledge base only from this pressure
+    load_shed_reject_at: float = 1.0  # Answer webhooks with 429 (Telegram retries) from this pressure
+    load_shed_retry_after: int = 5  # Retry-After seconds on rejected webhooks
+
+    # Bulk broadcasts (share each bot's rate budget with live replies)
+    broadcast_rate_limit: float = 20.0  # Broadcast messages per second per bot (leaves headroom for replies)
+    broadcast_concurrency: int = 10  # Concurrent sendMessage calls per broadcast
+    broadcast_chunk_size: int = 200  # Recipients per checkpoint (max re-sent after a crash)
+    broadcast_lease_seconds: float = 120.0  # A broadcast whose worker stops renewing this long is resumable
+
+    # Knowledge base retrieval (BM25)
+    knowledge_min_confidence: float = 0.35  # Best hit below this (0-1) is not used as an answer
+    knowledge_cache_max_tenants: int = 1000  # Per-business indexes kept in memory (least recently used evicted)
+    knowledge_version_check_interval: float = 30.0  # Seconds between knowledge_version checks per cached business
+    semantic_search_enabled: bool = True  # Character n-gram similarity fallback when BM25 finds nothing (needs numpy)
+    semantic_min_similarity: float = 0.18  # Cosine similarity (0-1) a fallback hit needs, besides a shared word stem (short messages score low)
+    reply_cache_max_entries: int = 10000  # Memoized replies for repeated messages (0 = disabled)
+    reply_cache_ttl_seconds: float = 300.0  # Max age of a memoized reply
+    pipeline_timing_enabled: bool = True  # Per-stage latency histograms for ai_brain (/api/diagnostics/pipeline)
+    user_state_max_entries: int = 100000  # Users kept in conversation memory / spam / unknown-intent state (LRU)
+    user_state_idle_ttl_seconds: float = 86400.0  # Per-user state unused this long is forgotten
+    state_backend: str = "memory"  # Per-user session state: memory (per worker), postgres or redis (shared by all workers)
+    redis_url: str = "redis://localhost:6379/0"  # Redis-protocol server used by STATE_BACKEND=redis (rediss:// for TLS)
+    state_backend_timeout: float = 0.5  # Seconds a shared session load may take before the worker uses its local copy
+    state_flush_interval: float = 0.25  # Seconds between write-behind flushes of shared sessions (keep well under the 2s spam threshold)
+    memory_persistence_enabled: bool = True  # Write conversation memory to conversation_memory and reload it after restarts
+    memory_flush_interval: float = 2.0  # Seconds between batched conversation_memory upserts
+    memory_flush_batch_size: int = 1000  # Max rows per conversation_memory upsert statement
+    memory_load_timeout: float = 0.5  # Seconds a cold-miss memory load may take before the user starts fresh
+
+    # Webhook retry deduplication on (bot, update_id)
+    telegram_dedup_max_entries: int = 100000  # Recent updates remembered per process
+    telegram_dedup_ttl_seconds: float = 3600.0  # How long an update_id is remembered
+    telegram_dedup_shared: bool = False  # Also dedup across workers via the processed_updates table
+
     model_config = SettingsConfigDict(
         env_file=".env", 
         env_file_encoding="utf-8",
@@ -37,13 +37,17 @@ if not settings.database_url.startswith("postgresql://"):
 # Convert postgresql:// to postgresql+psycopg:// for psycopg3 support
 database_url = settings.database_url.replace("postgresql://", "postgresql+psycopg://", 1)
 
+# Connection pool bounds (also used by load shedding to measure pool pressure)
+DB_POOL_SIZE = 5  # Limit pool size to reduce connection issues
+DB_MAX_OVERFLOW = 10  # Allow up to 10 overflow connections
+
 engine = create_engine(
     database_url,
     echo=False,  # Set to True for SQL query logging (useful for debugging)
     pool_pre_ping=True,  # Verify connections before using them
     pool_recycle=300,  # Recycle connections after 5 minutes
-    pool_size=5,  # Limit pool size to reduce connection issues
-    max_overflow=10,  # Allow up to 10 overflow connections
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
     connect_args={
         "prepare_threshold": 0,  # Disable prepared statements to avoid psycopg3 DuplicatePreparedStatement errors
         "connect_timeout": 10,  # Connection timeout in seconds
@@ -64,6 +68,20 @@ SessionLocal = sessionmaker(
     bind=engine,  # Bind to the engine we created
 )
 
+
+def pool_usage() -> float:
+    """
+    Fraction of the connection pool currently checked out.
+
+    Returns:
+        0.0 (idle) to 1.0 (every pooled and overflow connection in use)
+    """
+    try:
+        return engine.pool.checkedout() / (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    except Exception:
+        return 0.0
+
+
 # Create base class for models
 # All database models will inherit from this Base class
 # Example: class User(Base): ...
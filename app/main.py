@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, Response
@@ -8,7 +10,17 @@ from app.config import settings
 from app.logging_config import init_logging
 from app.routes import api_router
 from app.services.knowledge_service import load_knowledge
-from app.database import init_db
+from app.database import init_db, get_db_context
+from app.services import bot_registry
+from app.services.bot_registry import load_bots
+from app.services.telegram import start_http_client, close_http_client
+from app.services.telegram_outbox import outbox
+from app.services.telegram_poller import polling_enabled, telegram_poller
+from app.services.burst_coalescer import burst_coalescer
+from app.services.broadcast_service import broadcast_engine
+from app.services.conversation_service import conversation_buffer
+from app.services.state_backend import shared_sessions
+from app.services.memory import memory_writer
 from app.models import (
     Conversation,
     User,
@@ -24,7 +36,17 @@ from app.models import (
 
 init_logging(settings.log_level)
 
-app = FastAPI(title="Wycly - Business Management System", version="0.1.0")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run startup tasks, then release shared resources on shutdown."""
+    await startup_event()
+    yield
+    await shutdown_event()
+
+
+app = FastAPI(title="Wycly - Business Management System", version="0.1.0", lifespan=lifespan)
 
 # Add CORS middleware
 # Support both local development and production (Render)
@@ -240,9 +262,24 @@ async def options_handler(full_path: str, request: Request):
 app.include_router(api_router)
 
 
-@app.on_event("startup")
 async def startup_event():
     """Initialize services on application startup."""
+    # Shared keep-alive HTTP client for all Telegram Bot API calls
+    start_http_client()
+    
+    # Outbound reply queue - webhooks enqueue replies and return immediately
+    outbox.start()
+    print(f"[OK] Telegram outbox started ({outbox.worker_count} workers)")
+    
+    # Write-behind buffer - conversations are inserted in batches
+    conversation_buffer.start()
+    
+    # Per-user session state shared between workers (STATE_BACKEND=postgres/redis)
+    shared_sessions.start()
+    
+    # Conversation memory persisted to conversation_memory in batched upserts
+    memory_writer.start()
+    
     # Initialize database (create tables)
     try:
         init_db()
@@ -263,5 +300,47 @@ async def startup_event():
         print("[OK] Knowledge base loaded successfully")
     else:
         print("[WARN] Knowledge base not loaded (faq.json not found or invalid)")
+    
+    # Build the in-process Telegram bot index used for per-integration webhooks
+    try:
+        with get_db_context() as db:
+            bot_count = load_bots(db)
+        print(f"[OK] Telegram bot index loaded ({bot_count} active bots)")
+    except Exception as e:
+        print(f"[WARN] Telegram bot index not loaded: {e}")
+    # Pick up credentials changed by other workers (credentials_version)
+    bot_registry.start_refresh(settings.bot_registry_refresh_interval)
+    
+    # Long-polling ingestion for deployments without a public webhook URL
+    if polling_enabled():
+        polled = telegram_poller.start()
+        print(f"[OK] Telegram long polling started ({polled} bots)")
+    
+    # Resume broadcasts interrupted by a restart (or abandoned by a dead worker)
+    try:
+        resumed = await broadcast_engine.resume_pending()
+        if resumed:
+            print(f"[OK] Resumed {resumed} broadcasts")
+    except Exception as e:
+        print(f"[WARN] Broadcasts not resumed: {e}")
 
 
+async def shutdown_event():
+    """Release shared resources on application shutdown."""
+    # Stop ingesting before draining what has already been accepted
+    await telegram_poller.stop()
+    await bot_registry.stop_refresh()
+    # Checkpointed broadcasts resume on the next start
+    await broadcast_engine.stop()
+    # Answer open message bursts now; their replies go through the outbox
+    await burst_coalescer.stop()
+    # Drain queued replies before closing the HTTP client they use
+    await outbox.stop()
+    print("[OK] Telegram outbox drained")
+    # Flush buffered conversations (including ones saved by the outbox drain)
+    await conversation_buffer.stop()
+    print("[OK] Conversation buffer flushed")
+    await memory_writer.stop()
+    await shared_sessions.stop()
+    await close_http_client()
+    print("[OK] Telegram HTTP client closed")
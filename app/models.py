@@ -9,7 +9,7 @@ All models are designed for Supabase PostgreSQL.
 from datetime import datetime
 from enum import Enum as PyEnum
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Float
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Boolean, ForeignKey, Float, Index, LargeBinary, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 from app.database import Base
@@ -30,6 +30,10 @@ class Conversation(Base):
     """
 
     __tablename__ = "conversations"
+    __table_args__ = (
+        # Broadcast audience scans: DISTINCT user_id per business/channel in user_id order
+        Index("ix_conversations_business_channel_user", "business_id", "channel", "user_id"),
+    )
 
     # Primary key - auto-incrementing integer
     id = Column(Integer, primary_key=True, index=True)
@@ -93,6 +97,7 @@ class Business(Base):
     name = Column(String, nullable=False, index=True)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     settings = Column(Text, nullable=True)  # JSON string for flexible settings
+    knowledge_version = Column(Integer, default=1, server_default="1", nullable=False)  # Bumped on every KnowledgeEntry write (invalidates cached knowledge indexes)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
@@ -108,6 +113,7 @@ class ChannelIntegration(Base):
     channel = Column(String, nullable=False, index=True)  # telegram, whatsapp, instagram, etc.
     channel_name = Column(String, nullable=True)  # Custom name for the integration
     credentials = Column(Text, nullable=True)  # Encrypted JSON credentials
+    credentials_version = Column(Integer, default=1, server_default="1", nullable=False)  # Bumped on every credentials/status change (invalidates cached credentials)
     is_active = Column(Boolean, default=True, nullable=False)
     webhook_url = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
@@ -173,6 +179,10 @@ class ConversationMemory(Base):
     Conversation memory model for tracking user context.
     """
     __tablename__ = "conversation_memory"
+    __table_args__ = (
+        # Upsert target of the batched memory flush (memory.MemoryWriteBuffer)
+        UniqueConstraint("business_id", "user_id", "channel", name="uq_conversation_memory_business_user_channel"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     business_id = Column(Integer, ForeignKey("businesses.id"), nullable=False, index=True)  # Multi-tenant support
@@ -217,6 +227,66 @@ class AdAsset(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
 
+class Broadcast(Base):
+    """
+    Bulk message delivery to a business's audience (e.g. ad copy from the ads studio).
+
+    The audience is every distinct Conversation.user_id for the business and
+    channel, processed in user_id order. cursor_user_id is the checkpoint:
+    all recipients up to and including it have been attempted, so a restart
+    resumes after it. The lease columns ensure only one worker runs a broadcast.
+    """
+    __tablename__ = "broadcasts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    business_id = Column(Integer, ForeignKey("businesses.id"), nullable=False, index=True)
+    integration_id = Column(Integer, ForeignKey("channel_integrations.id"), nullable=False)
+    channel = Column(String, default="telegram", nullable=False)
+    ad_asset_id = Column(Integer, ForeignKey("ad_assets.id"), nullable=True)
+    text = Column(Text, nullable=False)
+    status = Column(String, default="pending", nullable=False, index=True)  # pending, running, completed, cancelled, failed
+    sent_count = Column(Integer, default=0, nullable=False)
+    failed_count = Column(Integer, default=0, nullable=False)
+    cursor_user_id = Column(String, nullable=True)  # Checkpoint: last audience user_id attempted
+    lease_owner = Column(String, nullable=True)  # Worker currently sending
+    lease_expires_at = Column(DateTime, nullable=True)
+    error = Column(Text, nullable=True)
+    created_by_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class ProcessedUpdate(Base):
+    """
+    Telegram updates already accepted by a worker (shared webhook deduplication).
+
+    Rows older than the dedup TTL are deleted periodically.
+    """
+    __tablename__ = "processed_updates"
+    __table_args__ = (UniqueConstraint("bot_key", "update_id", name="uq_processed_updates_bot_update"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    bot_key = Column(String, nullable=False)  # Integration id (or "legacy" for the shared webhook)
+    update_id = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class UserSessionState(Base):
+    """
+    Per-user session state shared by all workers (STATE_BACKEND=postgres).
+
+    data is a serialized UserSession; rows not updated within the idle TTL
+    are ignored and deleted periodically.
+    """
+    __tablename__ = "user_sessions"
+
+    user_id = Column(String, primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
 # ========== USERS & ROLES MODELS ==========
 
 class Role(Base):
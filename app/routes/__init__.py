@@ -1,7 +1,7 @@
 """Routes package - exports all API routers."""
 from fastapi import APIRouter
 
-from app.routes import auth, dashboard, health, telegram, integrations, diagnostics, users, handoff, notifications, security, sales, onboarding, finance, crm, inventory, purchasing, projects, messaging, email, automation, hr
+from app.routes import auth, dashboard, health, telegram, integrations, diagnostics, users, handoff, notifications, security, sales, onboarding, finance, crm, inventory, purchasing, projects, messaging, email, automation, hr, broadcasts
 
 # Create main router and include all sub-routers
 api_router = APIRouter()
@@ -26,5 +26,6 @@ api_router.include_router(messaging.router)
 api_router.include_router(email.router)
 api_router.include_router(automation.router)
 api_router.include_router(hr.router)
+api_router.include_router(broadcasts.router)
 
 
@@ -0,0 +1,206 @@
+"""Broadcast (bulk campaign messaging) API routes."""
+import logging
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from app.database import get_db
+from app.models import AdAsset, Broadcast, ChannelIntegration, User as UserModel
+from app.routes.auth import get_current_user, get_user_business_id
+from app.services.broadcast_service import ACTIVE_STATUSES, broadcast_engine
+
+log = logging.getLogger(__name__)
+router = APIRouter(prefix="/api/dashboard/ads/broadcasts", tags=["broadcasts"])
+
+# Telegram's hard limit for a single message
+MAX_BROADCAST_TEXT_LENGTH = 4096
+
+
+# ========== PYDANTIC MODELS ==========
+
+class BroadcastCreate(BaseModel):
+    text: Optional[str] = None
+    ad_asset_id: Optional[int] = None  # Send an ad asset's copy instead of free text
+    channel: str = "telegram"
+
+
+class BroadcastResponse(BaseModel):
+    id: int
+    business_id: int
+    integration_id: int
+    channel: str
+    ad_asset_id: Optional[int]
+    text: str
+    status: str
+    sent_count: int
+    failed_count: int
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    completed_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+
+# ========== HELPERS ==========
+
+def _require_business(current_user: UserModel, db: Session) -> int:
+    """Broadcasts are per business; only admins and business owners may send them."""
+    if current_user.role not in ("admin", "business_owner"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only business owners can manage broadcasts"
+        )
+    business_id = get_user_business_id(current_user, db)
+    if business_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Broadcasts require a business account"
+        )
+    return business_id
+
+
+def _get_broadcast(broadcast_id: int, business_id: int, db: Session) -> Broadcast:
+    broadcast = db.query(Broadcast).filter(
+        Broadcast.id == broadcast_id,
+        Broadcast.business_id == business_id,
+    ).first()
+    if not broadcast:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Broadcast not found")
+    return broadcast
+
+
+# ========== BROADCAST ENDPOINTS ==========
+
+@router.post("/", response_model=BroadcastResponse, status_code=status.HTTP_201_CREATED)
+async def create_broadcast(
+    request: BroadcastCreate,
+    current_user: UserModel = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Send a message to every customer who has talked to the business on a channel.
+
+    Delivery runs in the background, rate limited per bot; poll the broadcast
+    for progress.
+    """
+    business_id = _require_business(current_user, db)
+
+    if request.channel != "telegram":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Broadcasts are currently supported on Telegram only"
+        )
+
+    text = (request.text or "").strip()
+    if request.ad_asset_id is not None:
+        asset = db.query(AdAsset).filter(
+            AdAsset.id == request.ad_asset_id,
+            AdAsset.business_id == business_id,
+        ).first()
+        if not asset:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ad asset not found")
+        text = text or (asset.content or "").strip()
+    if not text:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Broadcast text is required (or an ad asset with copy)"
+        )
+    if len(text) > MAX_BROADCAST_TEXT_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Broadcast text must be at most {MAX_BROADCAST_TEXT_LENGTH} characters"
+        )
+
+    integration = db.query(ChannelIntegration).filter(
+        ChannelIntegration.business_id == business_id,
+        ChannelIntegration.channel == "telegram",
+        ChannelIntegration.is_active == True,
+    ).first()
+    if not integration:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Connect a Telegram bot before sending broadcasts"
+        )
+
+    broadcast = Broadcast(
+        business_id=business_id,
+        integration_id=integration.id,
+        channel=request.channel,
+        ad_asset_id=request.ad_asset_id,
+        text=text,
+        status="pending",
+        created_by_user_id=current_user.id,
+    )
+    db.add(broadcast)
+    db.commit()
+    db.refresh(broadcast)
+
+    broadcast_engine.start(broadcast.id)
+    log.info(f"broadcast_created broadcast_id={broadcast.id} business_id={business_id} integration_id={integration.id}")
+    return broadcast
+
+
+@router.get("/")
+async def list_broadcasts(
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_user: UserModel = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """List the business's broadcasts, newest first."""
+    business_id = _require_business(current_user, db)
+    query = db.query(Broadcast).filter(Broadcast.business_id == business_id)
+    total = query.count()
+    broadcasts = query.order_by(Broadcast.created_at.desc()).offset(offset).limit(limit).all()
+    return {
+        "broadcasts": [BroadcastResponse.model_validate(broadcast) for broadcast in broadcasts],
+        "total": total,
+    }
+
+
+@router.get("/{broadcast_id}", response_model=BroadcastResponse)
+async def get_broadcast(
+    broadcast_id: int,
+    current_user: UserModel = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Get a broadcast and its delivery progress."""
+    business_id = _require_business(current_user, db)
+    return _get_broadcast(broadcast_id, business_id, db)
+
+
+@router.post("/{broadcast_id}/cancel", response_model=BroadcastResponse)
+async def cancel_broadcast(
+    broadcast_id: int,
+    current_user: UserModel = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Cancel a pending or running broadcast.
+
+    Recipients already sent to keep their message; the worker stops at its
+    next checkpoint (or immediately if it runs in this process).
+    """
+    business_id = _require_business(current_user, db)
+    broadcast = _get_broadcast(broadcast_id, business_id, db)
+    if broadcast.status not in ACTIVE_STATUSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Broadcast is already {broadcast.status}"
+        )
+
+    now = datetime.utcnow()
+    broadcast.status = "cancelled"
+    broadcast.completed_at = now
+    broadcast.updated_at = now
+    db.commit()
+    db.refresh(broadcast)
+
+    broadcast_engine.stop_broadcast(broadcast.id)
+    log.info(f"broadcast_cancelled broadcast_id={broadcast.id} sent={broadcast.sent_count}")
+    return broadcast
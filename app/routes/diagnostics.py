@@ -7,6 +7,11 @@ from sqlalchemy import func
 from app.database import get_db
 from app.models import Conversation, User as UserModel, Business, ChannelIntegration
 from app.routes.auth import get_current_user, get_user_business_id
+from app.services import bot_registry, metrics
+from app.services.bot_health import bot_health
+from app.services.pipeline_timing import pipeline_timing
+from app.services.tenant_knowledge import tenant_knowledge
+from app.services.tenant_scheduler import tenant_scheduler
 
 log = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/diagnostics", tags=["diagnostics"])
@@ -126,4 +131,106 @@ async def check_conversations(
     }
 
 
+@router.get("/metrics")
+async def get_runtime_metrics(
+    current_user: UserModel = Depends(get_current_user),
+):
+    """
+    In-process runtime metrics (queue depths, latencies, counters).
+
+    Metrics are per worker process. Admin only.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=403,
+            detail="Only Admin users can view runtime metrics"
+        )
+    return metrics.snapshot()
+
 
+@router.get("/pipeline")
+async def get_pipeline_timing(
+    current_user: UserModel = Depends(get_current_user),
+):
+    """
+    Per-stage latency of the message pipeline (spam check ... memory update),
+    totals per decision path, and which stages dominate the p99 tail.
+
+    Durations are milliseconds, per worker process. Admin only.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=403,
+            detail="Only Admin users can view pipeline timing"
+        )
+    return pipeline_timing.snapshot()
+
+
+@router.get("/bots")
+async def get_bot_health(
+    current_user: UserModel = Depends(get_current_user),
+):
+    """
+    Delivery health of every indexed Telegram bot (circuit breaker, 429 park, blocked chats).
+
+    State is per worker process. Admin only.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=403,
+            detail="Only Admin users can view bot health"
+        )
+    return {
+        "bots": [
+            {
+                "integration_id": bot.integration_id,
+                "business_id": bot.business_id,
+                "bot_username": bot.bot_username,
+                **bot_health.state_for(bot.bot_token),
+            }
+            for bot in bot_registry.all_bots()
+        ],
+    }
+
+
+@router.get("/tenants")
+async def get_tenant_scheduling(
+    current_user: UserModel = Depends(get_current_user),
+):
+    """
+    Per-business processing slots (share, cap, running, waiting).
+
+    Queue wait times are in /metrics as tenant_queue_wait_ms{business_id=...}.
+    State is per worker process. Admin only.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=403,
+            detail="Only Admin users can view tenant scheduling"
+        )
+    return {
+        "enabled": tenant_scheduler.enabled,
+        "max_concurrency": tenant_scheduler.max_concurrency,
+        "tenants": tenant_scheduler.snapshot(),
+    }
+
+
+@router.get("/knowledge")
+async def get_knowledge_cache(
+    current_user: UserModel = Depends(get_current_user),
+):
+    """
+    Per-business knowledge indexes cached in this worker (least recently used first).
+
+    Admin only.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=403,
+            detail="Only Admin users can view the knowledge cache"
+        )
+    return {
+        "max_tenants": tenant_knowledge.max_tenants,
+        "recheck_seconds": tenant_knowledge.recheck_seconds,
+        "tenants": tenant_knowledge.snapshot(),
+    }
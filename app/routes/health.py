@@ -12,7 +12,7 @@ async def root():
         "version": "0.1.0",
         "endpoints": {
             "health": "GET /health",
-            "webhook": "POST /telegram/webhook",
+            "webhook": "POST /telegram/webhook/{integration_id}",
             "docs": "GET /docs",
         },
     }
@@ -10,6 +10,10 @@ from datetime import datetime
 from app.database import get_db
 from app.models import ChannelIntegration, Business, User as UserModel
 from app.routes.auth import get_current_user, get_user_business_id
+from app.services import bot_registry
+from app.services.bot_health import bot_health
+from app.services.telegram import TelegramService
+from app.services.telegram_poller import delete_webhook, polling_enabled, telegram_poller
 import httpx
 
 log = logging.getLogger(__name__)
@@ -43,6 +47,7 @@ class TelegramStatusResponse(BaseModel):
     bot_username: Optional[str] = None
     integration_id: Optional[int] = None
     message: Optional[str] = None
+    delivery: Optional[dict] = None  # Send health: circuit breaker, 429 park, blocked chats
 
 
 @router.get("/", response_model=List[IntegrationResponse])
@@ -97,7 +102,8 @@ async def connect_telegram(
     Connect Telegram bot by providing bot token.
     This will:
     1. Validate the bot token
-    2. Set up the webhook automatically
+    2. Set up the webhook automatically (or, with TELEGRAM_UPDATE_MODE=polling,
+       remove any webhook and start a getUpdates poller - no PUBLIC_URL needed)
     3. Save the integration to database (encrypted)
     """
     # Check user role
@@ -165,20 +171,20 @@ async def connect_telegram(
     # Validate bot token by calling Telegram API
     bot_username = None
     try:
-        bot_info_url = f"https://api.telegram.org/bot{request.bot_token}/getMe"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(bot_info_url, timeout=10.0)
-            response.raise_for_status()
-            bot_info = response.json()
-            
-            if not bot_info.get("ok"):
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Invalid bot token. Please check your token and try again."
-                )
-            
-            bot_username = bot_info.get("result", {}).get("username", "Unknown")
-            log.info(f"Telegram bot validated: @{bot_username} by user {current_user.id}")
+        response = await TelegramService(request.bot_token).request("getMe")
+        response.raise_for_status()
+        bot_info = response.json()
+        
+        if not bot_info.get("ok"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid bot token. Please check your token and try again."
+            )
+        
+        bot_username = bot_info.get("result", {}).get("username", "Unknown")
+        log.info(f"Telegram bot validated: @{bot_username} by user {current_user.id}")
+        # The token works again; stop failing its sends fast
+        bot_health.reset(request.bot_token)
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 401:
             raise HTTPException(
@@ -196,84 +202,49 @@ async def connect_telegram(
             detail="Failed to validate bot token. Please try again."
         )
     
-    # Set webhook automatically
+    # Set webhook automatically (not needed when updates are long-polled)
     from app.config import settings
     
-    # Normalize PUBLIC_URL - handle common issues
-    # Render's fromService with property:host returns just the hostname (e.g., "wycly-backend-xxxx.onrender.com")
-    # We need to ensure it has https:// protocol
-    public_url = (settings.public_url or "").strip()
-    
-    # Remove any trailing slashes
-    public_url = public_url.rstrip('/')
-    
-    # If PUBLIC_URL doesn't start with http:// or https://, add https://
-    if public_url and not public_url.startswith(("http://", "https://")):
-        # If it contains a dot, it's likely a hostname (e.g., "wycly-backend-xxxx.onrender.com")
-        if "." in public_url:
-            public_url = f"https://{public_url}"
-            log.info(f"Auto-added https:// to PUBLIC_URL. Original: {settings.public_url}, Fixed: {public_url}")
-        # If it's just a service name (no dots), construct Render URL
-        elif public_url and "onrender.com" not in public_url:
-            # This shouldn't happen with Render's fromService, but handle it anyway
-            public_url = f"https://{public_url}.onrender.com"
-            log.info(f"Auto-constructed Render URL from service name. Original: {settings.public_url}, Fixed: {public_url}")
-    
-    # Validate PUBLIC_URL is set
-    if not public_url or public_url == "http://localhost:8000":
-        log.error("PUBLIC_URL is not set or is localhost. Cannot set webhook for production.")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Backend URL (PUBLIC_URL) is not configured. Please set PUBLIC_URL environment variable in Render dashboard to your full backend URL (e.g., https://wycly-backend-xxxx.onrender.com)."
-        )
-    
-    # Ensure webhook URL is HTTPS (Telegram requires HTTPS)
-    webhook_url = f"{public_url.rstrip('/')}/telegram/webhook"
-    if not webhook_url.startswith("https://"):
-        log.error(f"Webhook URL must be HTTPS, got: {webhook_url}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Webhook URL must use HTTPS. Current PUBLIC_URL: {settings.public_url}, constructed URL: {webhook_url}. Please set PUBLIC_URL in Render dashboard to your full backend URL with https:// (e.g., https://wycly-backend-xxxx.onrender.com)."
-        )
-    
-    try:
-        set_webhook_url = f"https://api.telegram.org/bot{request.bot_token}/setWebhook?url={webhook_url}"
-        log.info(f"Setting webhook for bot @{bot_username} to: {webhook_url}")
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(set_webhook_url, timeout=10.0)
-            response.raise_for_status()
-            webhook_result = response.json()
-            
-            if not webhook_result.get("ok"):
-                error_description = webhook_result.get('description', 'Unknown error')
-                log.error(f"Telegram API error setting webhook: {error_description}")
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Failed to set webhook: {error_description}"
-                )
-            log.info(f"Webhook set successfully for bot @{bot_username} to {webhook_url}")
-    except httpx.HTTPStatusError as e:
-        log.error(f"HTTP error setting webhook: {e.response.status_code} - {e.response.text}", exc_info=True)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to set webhook: HTTP {e.response.status_code}. Check that PUBLIC_URL is correct and accessible."
-        )
-    except httpx.RequestError as e:
-        log.error(f"Network error setting webhook: {e}", exc_info=True)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Network error while setting webhook: {str(e)}. Please check your internet connection and try again."
-        )
-    except HTTPException:
-        # Re-raise HTTPExceptions (like the one above for webhook_result.get("ok"))
-        raise
-    except Exception as e:
-        log.error(f"Unexpected error setting webhook: {e}", exc_info=True)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Unexpected error setting webhook: {str(e)}. Please check Render logs for details."
-        )
+    polling = polling_enabled()
+    webhook_base_url = None
+    if not polling:
+        # Normalize PUBLIC_URL - handle common issues
+        # Render's fromService with property:host returns just the hostname (e.g., "wycly-backend-xxxx.onrender.com")
+        # We need to ensure it has https:// protocol
+        public_url = (settings.public_url or "").strip()
+
+        # Remove any trailing slashes
+        public_url = public_url.rstrip('/')
+
+        # If PUBLIC_URL doesn't start with http:// or https://, add https://
+        if public_url and not public_url.startswith(("http://", "https://")):
+            # If it contains a dot, it's likely a hostname (e.g., "wycly-backend-xxxx.onrender.com")
+            if "." in public_url:
+                public_url = f"https://{public_url}"
+                log.info(f"Auto-added https:// to PUBLIC_URL. Original: {settings.public_url}, Fixed: {public_url}")
+            # If it's just a service name (no dots), construct Render URL
+            elif public_url and "onrender.com" not in public_url:
+                # This shouldn't happen with Render's fromService, but handle it anyway
+                public_url = f"https://{public_url}.onrender.com"
+                log.info(f"Auto-constructed Render URL from service name. Original: {settings.public_url}, Fixed: {public_url}")
+
+        # Validate PUBLIC_URL is set
+        if not public_url or public_url == "http://localhost:8000":
+            log.error("PUBLIC_URL is not set or is localhost. Cannot set webhook for production.")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Backend URL (PUBLIC_URL) is not configured. Please set PUBLIC_URL environment variable in Render dashboard to your full backend URL (e.g., https://wycly-backend-xxxx.onrender.com)."
+            )
+
+        # Ensure webhook URL is HTTPS (Telegram requires HTTPS)
+        # Each integration gets its own URL: {webhook_base_url}/{integration_id}
+        webhook_base_url = f"{public_url.rstrip('/')}/telegram/webhook"
+        if not webhook_base_url.startswith("https://"):
+            log.error(f"Webhook URL must be HTTPS, got: {webhook_base_url}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Webhook URL must use HTTPS. Current PUBLIC_URL: {settings.public_url}, constructed URL: {webhook_base_url}. Please set PUBLIC_URL in Render dashboard to your full backend URL with https:// (e.g., https://wycly-backend-xxxx.onrender.com)."
+            )
     
     # Check if integration already exists for this business and channel (with retry)
     # This prevents duplicate integrations for the same business+channel combination
@@ -298,26 +269,17 @@ async def connect_telegram(
     
     # Additional check: Warn if there are other active integrations with the same bot token
     # This helps identify duplicate integrations across different businesses
+    # (answered from the cached, already decoded credentials - no query or JSON decoding)
     try:
-        all_telegram_integrations = db.query(ChannelIntegration).filter(
-            ChannelIntegration.channel == "telegram",
-            ChannelIntegration.is_active == True
-        ).all()
-        
-        duplicate_bot_tokens = []
-        for other_integration in all_telegram_integrations:
-            if other_integration.id != (existing.id if existing else None):
-                try:
-                    other_credentials = json.loads(other_integration.credentials) if other_integration.credentials else {}
-                    other_bot_token = other_credentials.get("bot_token")
-                    if other_bot_token == request.bot_token:
-                        duplicate_bot_tokens.append({
-                            "integration_id": other_integration.id,
-                            "business_id": other_integration.business_id,
-                            "channel_name": other_integration.channel_name
-                        })
-                except Exception:
-                    pass
+        duplicate_bot_tokens = [
+            {
+                "integration_id": other.integration_id,
+                "business_id": other.business_id,
+                "channel_name": other.channel_name
+            }
+            for other in bot_registry.find_by_token(request.bot_token)
+            if other.integration_id != (existing.id if existing else None)
+        ]
         
         if duplicate_bot_tokens:
             log.warning(
@@ -336,16 +298,22 @@ async def connect_telegram(
     })
     
     if existing:
+        # Previous values, restored if Telegram rejects the new webhook
+        previous = {
+            "credentials": existing.credentials,
+            "is_active": existing.is_active,
+            "channel_name": existing.channel_name,
+            "webhook_url": existing.webhook_url,
+        }
         # Update existing integration (with retry)
         for attempt in range(max_retries):
             try:
                 existing.credentials = credentials
                 existing.is_active = True
-                existing.webhook_url = webhook_url
                 existing.channel_name = request.channel_name or f"Telegram (@{bot_username})"
+                existing.credentials_version = (existing.credentials_version or 0) + 1
                 existing.updated_at = datetime.utcnow()
-                db.commit()
-                db.refresh(existing)
+                db.flush()
                 break
             except Exception as e:
                 if "DuplicatePreparedStatement" in str(e) and attempt < max_retries - 1:
@@ -357,43 +325,117 @@ async def connect_telegram(
                         pass
                     continue
                 raise
-        
-        log.info(f"Telegram integration updated: {existing.id} by user {current_user.id}")
-        
-        return IntegrationResponse(
-            id=existing.id,
-            channel=existing.channel,
-            channel_name=existing.channel_name,
-            is_active=existing.is_active,
-            webhook_url=existing.webhook_url,
-            created_at=existing.created_at.isoformat(),
-            updated_at=existing.updated_at.isoformat(),
-        )
+        integration = existing
     else:
-        # Create new integration
+        # Create new integration (flushed to get its id for the webhook URL)
         integration = ChannelIntegration(
             business_id=business.id,
             channel="telegram",
             channel_name=request.channel_name or f"Telegram (@{bot_username})",
             credentials=credentials,
             is_active=True,
-            webhook_url=webhook_url
         )
         db.add(integration)
-        db.commit()
-        db.refresh(integration)
-        
-        log.info(f"Telegram integration created: {integration.id} by user {current_user.id}")
-        
-        return IntegrationResponse(
-            id=integration.id,
-            channel=integration.channel,
-            channel_name=integration.channel_name,
-            is_active=integration.is_active,
-            webhook_url=integration.webhook_url,
-            created_at=integration.created_at.isoformat(),
-            updated_at=integration.updated_at.isoformat(),
-        )
+        db.flush()
+    
+    # Commit before calling the Bot API so no row lock or pool connection is
+    # held during the network call; the row is reverted if the call fails.
+    # (Read the id first: touching the expired row after commit would begin
+    # a new transaction.)
+    integration_id = integration.id
+    db.commit()
+    
+    def revert_connect() -> None:
+        try:
+            db.rollback()
+            if existing:
+                for field, value in previous.items():
+                    setattr(existing, field, value)
+                # Bumped again so other workers drop the credentials they may have loaded
+                existing.credentials_version = (existing.credentials_version or 0) + 1
+                existing.updated_at = datetime.utcnow()
+            else:
+                db.delete(integration)
+            db.commit()
+        except Exception as revert_error:
+            db.rollback()
+            log.error(f"telegram_connect_revert_failed integration_id={integration_id} error={type(revert_error).__name__}")
+    
+    if polling:
+        # getUpdates is rejected while a webhook is set, so remove any old one
+        if not await delete_webhook(request.bot_token):
+            log.warning(f"Could not delete webhook for bot @{bot_username}; polling may see 409 conflicts")
+        webhook_url = None
+    else:
+        # Set webhook automatically, pointing at this integration's own URL
+        webhook_url = f"{webhook_base_url}/{integration_id}"
+        secret_token = bot_registry.webhook_secret_for(request.bot_token)
+
+        try:
+            log.info(f"Setting webhook for bot @{bot_username} to: {webhook_url}")
+
+            response = await TelegramService(request.bot_token).request(
+                "setWebhook",
+                {"url": webhook_url, "secret_token": secret_token},
+            )
+            response.raise_for_status()
+            webhook_result = response.json()
+
+            if not webhook_result.get("ok"):
+                error_description = webhook_result.get('description', 'Unknown error')
+                log.error(f"Telegram API error setting webhook: {error_description}")
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Failed to set webhook: {error_description}"
+                )
+            log.info(f"Webhook set successfully for bot @{bot_username} to {webhook_url}")
+        except httpx.HTTPStatusError as e:
+            revert_connect()
+            log.error(f"HTTP error setting webhook: {e.response.status_code} - {e.response.text}", exc_info=True)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to set webhook: HTTP {e.response.status_code}. Check that PUBLIC_URL is correct and accessible."
+            )
+        except httpx.RequestError as e:
+            revert_connect()
+            log.error(f"Network error setting webhook: {e}", exc_info=True)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Network error while setting webhook: {str(e)}. Please check your internet connection and try again."
+            )
+        except HTTPException:
+            # Re-raise HTTPExceptions (like the one above for webhook_result.get("ok"))
+            revert_connect()
+            raise
+        except Exception as e:
+            revert_connect()
+            log.error(f"Unexpected error setting webhook: {e}", exc_info=True)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Unexpected error setting webhook: {str(e)}. Please check Render logs for details."
+            )
+
+    
+    integration.webhook_url = webhook_url
+    db.commit()
+    db.refresh(integration)
+    
+    # Refresh the in-process bot index so webhooks resolve without DB queries
+    bot_entry = bot_registry.register_integration(integration)
+    if polling and bot_entry:
+        telegram_poller.start_bot(bot_entry)
+    
+    log.info(f"Telegram integration {'updated' if existing else 'created'}: {integration.id} by user {current_user.id}")
+    
+    return IntegrationResponse(
+        id=integration.id,
+        channel=integration.channel,
+        channel_name=integration.channel_name,
+        is_active=integration.is_active,
+        webhook_url=integration.webhook_url,
+        created_at=integration.created_at.isoformat(),
+        updated_at=integration.updated_at.isoformat(),
+    )
 
 
 @router.get("/telegram/status", response_model=TelegramStatusResponse)
@@ -425,43 +467,42 @@ async def get_telegram_status(
             message="Telegram bot not connected"
         )
     
-    # Get bot token from credentials
-    try:
-        credentials = json.loads(integration.credentials)
-        bot_token = credentials.get("bot_token")
-        bot_username = credentials.get("bot_username")
-    except:
+    # Get bot token from the credentials cache (decoded once per credentials_version)
+    bot = bot_registry.credentials_for(integration)
+    if bot is None:
         return TelegramStatusResponse(
             connected=False,
             message="Invalid integration credentials"
         )
+    bot_token = bot.bot_token
+    bot_username = bot.bot_username
     
     # Check webhook status
     try:
-        webhook_info_url = f"https://api.telegram.org/bot{bot_token}/getWebhookInfo"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(webhook_info_url, timeout=10.0)
-            response.raise_for_status()
-            webhook_info = response.json()
-            
-            if webhook_info.get("ok"):
-                result = webhook_info.get("result", {})
-                return TelegramStatusResponse(
-                    connected=True,
-                    webhook_url=result.get("url"),
-                    pending_updates=result.get("pending_update_count", 0),
-                    last_error_date=result.get("last_error_date"),
-                    last_error_message=result.get("last_error_message"),
-                    bot_username=bot_username,
-                    integration_id=integration.id
-                )
+        response = await TelegramService(bot_token).request("getWebhookInfo")
+        response.raise_for_status()
+        webhook_info = response.json()
+        
+        if webhook_info.get("ok"):
+            result = webhook_info.get("result", {})
+            return TelegramStatusResponse(
+                connected=True,
+                webhook_url=result.get("url"),
+                pending_updates=result.get("pending_update_count", 0),
+                last_error_date=result.get("last_error_date"),
+                last_error_message=result.get("last_error_message"),
+                bot_username=bot_username,
+                integration_id=integration.id,
+                delivery=bot_health.state_for(bot_token)
+            )
     except Exception as e:
         log.error(f"Error checking webhook status: {e}", exc_info=True)
         return TelegramStatusResponse(
             connected=True,
             message="Failed to check webhook status",
             bot_username=bot_username,
-            integration_id=integration.id
+            integration_id=integration.id,
+            delivery=bot_health.state_for(bot_token)
         )
 
 
@@ -502,42 +543,38 @@ async def test_telegram_connection(
             detail="Telegram bot not connected"
         )
     
-    try:
-        credentials = json.loads(integration.credentials)
-        bot_token = credentials.get("bot_token")
-    except:
+    bot = bot_registry.credentials_for(integration)
+    if bot is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid integration credentials"
         )
+    bot_token = bot.bot_token
     
     # Send test message
     test_message = "✅ Test message from Wycly! Your Telegram bot is working correctly."
     try:
-        send_url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                send_url,
-                json={
-                    "chat_id": chat_id,
-                    "text": test_message
-                },
-                timeout=10.0
-            )
-            response.raise_for_status()
-            result = response.json()
-            
-            if result.get("ok"):
-                log.info(f"Test message sent successfully to chat_id {chat_id} by user {current_user.id}")
-                return {
-                    "success": True,
-                    "message": "Test message sent successfully"
-                }
-            else:
-                return {
-                    "success": False,
-                    "error": result.get("description", "Unknown error")
-                }
+        response = await TelegramService(bot_token).request(
+            "sendMessage",
+            {
+                "chat_id": chat_id,
+                "text": test_message
+            },
+        )
+        response.raise_for_status()
+        result = response.json()
+        
+        if result.get("ok"):
+            log.info(f"Test message sent successfully to chat_id {chat_id} by user {current_user.id}")
+            return {
+                "success": True,
+                "message": "Test message sent successfully"
+            }
+        else:
+            return {
+                "success": False,
+                "error": result.get("description", "Unknown error")
+            }
     except httpx.HTTPStatusError as e:
         if e.response.status_code == 403:
             raise HTTPException(
@@ -593,19 +630,20 @@ async def disconnect_telegram(
     
     # Remove webhook
     try:
-        credentials = json.loads(integration.credentials)
-        bot_token = credentials.get("bot_token")
-        delete_webhook_url = f"https://api.telegram.org/bot{bot_token}/deleteWebhook"
-        async with httpx.AsyncClient() as client:
-            await client.get(delete_webhook_url, timeout=10.0)
+        bot = bot_registry.credentials_for(integration)
+        bot_token = bot.bot_token if bot else json.loads(integration.credentials).get("bot_token")
+        await TelegramService(bot_token).request("deleteWebhook")
         log.info(f"Webhook deleted for Telegram integration {integration.id}")
     except Exception as e:
         log.warning(f"Failed to delete webhook: {e}")
     
-    # Deactivate integration
+    # Deactivate integration (the version bump drops it from other workers' caches)
     integration.is_active = False
+    integration.credentials_version = (integration.credentials_version or 0) + 1
     integration.updated_at = datetime.utcnow()
     db.commit()
+    bot_registry.unregister_integration(integration.id)
+    telegram_poller.stop_bot(integration.id)
     
     log.info(f"Telegram integration disconnected: {integration.id} by user {current_user.id}")
     
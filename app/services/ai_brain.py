@@ -10,12 +10,16 @@ The brain is designed to be a drop-in replacement for AI services,
 maintaining the same interface while using rule-based logic.
 """
 import logging
+import time
+from collections import OrderedDict
 from enum import Enum
-from typing import Optional
+from typing import Optional, Tuple
 
+from app.config import settings
 from app.schemas import NormalizedMessage
-from app.services.memory import get_memory, update_memory
-from app.services.knowledge_service import find_answer, load_knowledge
+from app.services import metrics
+from app.services.memory import get_memory, load_memory, update_memory
+from app.services.knowledge_service import find_answer, knowledge_version, load_knowledge
 from app.services.edge_case_handler import (
     is_spam,
     validate_message_length,
@@ -24,6 +28,11 @@ from app.services.edge_case_handler import (
     get_unknown_intent_count,
     is_unsupported_action,
 )
+from app.services.keyword_matcher import keyword_rules
+from app.services.pipeline_timing import pipeline_timing
+from app.services.state_backend import shared_sessions
+from app.services.tenant_knowledge import tenant_knowledge
+from app.services.user_session import peek_session, session_key
 
 log = logging.getLogger(__name__)
 
@@ -38,12 +47,64 @@ class Intent(str, Enum):
     UNKNOWN = "unknown"
 
 
+# Intent keywords in priority order (more specific intents first); matched
+# on word boundaries, "*" = prefix
+INTENT_KEYWORDS = {
+    Intent.HUMAN.value: [
+        "agent",
+        "human",
+        "talk to someone",
+        "speak to someone",
+        "real person",
+        "representative",
+        "support agent",
+        "customer service",
+    ],
+    Intent.HELP.value: [
+        "help",
+        "support",
+        "what can you do",
+        "what do you do",
+        "how can you help",
+        "assist*",
+        "guide",
+        "instructions",
+    ],
+    Intent.PRICING.value: [
+        "price",
+        "prices",
+        "cost",
+        "pricing",
+        "how much",
+        "fee",
+        "fees",
+        "charge",
+        "subscription",
+        "plan",
+        "pricing plans",
+        "plans",
+        "costs",
+    ],
+    Intent.GREETING.value: [
+        "hi",
+        "hello",
+        "hey",
+        "greetings",
+        "good morning",
+        "good afternoon",
+        "good evening",
+        "hi there",
+        "hello there",
+    ],
+}
+keyword_rules.add_group("intent", INTENT_KEYWORDS)
+
 def detect_intent(message: NormalizedMessage) -> Intent:
     """
     Detect user intent from message text using keyword matching.
 
     Intent detection logic:
-    - Checks message text for keywords associated with each intent
+    - Scans message text once for the keywords of every intent (whole words)
     - Returns the first matching intent (priority order matters)
     - Falls back to UNKNOWN if no intent matches
 
@@ -86,78 +147,10 @@ def detect_intent(message: NormalizedMessage) -> Intent:
         if not message_lower:
             return default_intent
 
-        # Priority order matters - check more specific intents first
-
-        # Check for human/agent requests
-        try:
-            human_keywords = [
-                "agent",
-                "human",
-                "talk to someone",
-                "speak to someone",
-                "real person",
-                "representative",
-                "support agent",
-                "customer service",
-            ]
-            if any(keyword in message_lower for keyword in human_keywords):
-                return Intent.HUMAN
-        except Exception as e:
-            log.warning(f"Error checking human keywords: {e}")
-
-        # Check for help/support requests
-        try:
-            help_keywords = [
-                "help",
-                "support",
-                "what can you do",
-                "what do you do",
-                "how can you help",
-                "assist",
-                "guide",
-                "instructions",
-            ]
-            if any(keyword in message_lower for keyword in help_keywords):
-                return Intent.HELP
-        except Exception as e:
-            log.warning(f"Error checking help keywords: {e}")
-
-        # Check for pricing inquiries
-        try:
-            pricing_keywords = [
-                "price",
-                "cost",
-                "pricing",
-                "how much",
-                "fee",
-                "charge",
-                "subscription",
-                "plan",
-                "pricing plans",
-                "costs",
-            ]
-            if any(keyword in message_lower for keyword in pricing_keywords):
-                return Intent.PRICING
-        except Exception as e:
-            log.warning(f"Error checking pricing keywords: {e}")
-
-        # Check for greetings
-        try:
-            greeting_keywords = [
-                "hi",
-                "hello",
-                "hey",
-                "greetings",
-                "good morning",
-                "good afternoon",
-                "good evening",
-                "hi there",
-                "hello there",
-            ]
-            if any(keyword in message_lower for keyword in greeting_keywords):
-                return Intent.GREETING
-        except Exception as e:
-            log.warning(f"Error checking greeting keywords: {e}")
+        # One pass over the text; rule order in INTENT_KEYWORDS is priority order
+        label = keyword_rules.first(message_text, "intent")
+        if label:
+            return Intent(label)
 
         # Default to unknown if no intent matches
         return default_intent
@@ -247,12 +240,125 @@ def generate_response_for_intent(
     return response
 
 
-async def process_message(message: NormalizedMessage) -> str:
+# Reply paths stored in the reply cache
+_PATH_KNOWLEDGE = "knowledge_base"
+_PATH_INTENT = "rule_based"
+
+
+class ReplyCache:
+    """
+    Bounded LRU/TTL memo of replies to repeated messages.
+
+    Most traffic is the same few texts ("hi", "price?"), and for a given
+    business their reply only depends on the text, the knowledge and keyword
+    rules in effect, and a little conversation state. Keys are
+    (business_id, normalized text, state):
+    - Knowledge answers do not depend on memory; they are stored with
+      state None and shared by every user
+    - Intent replies are stored per state (last_intent, returning user,
+      unknown streak), the only memory generate_response_for_intent reads
+
+    Each entry records the knowledge and rules version it was computed
+    under; a hit whose version is no longer current is dropped and counted
+    as stale. Entries also expire after REPLY_CACHE_TTL_SECONDS, and the
+    least recently used entry is evicted beyond REPLY_CACHE_MAX_ENTRIES.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max(0, max_entries)
+        self.ttl_seconds = ttl_seconds
+        # key -> (reply, intent value, path, version, stored_at)
+        self._entries: "OrderedDict[tuple, Tuple[str, str, str, tuple, float]]" = OrderedDict()
+
+        self._hits = metrics.counter("reply_cache_lookups", result="hit")
+        self._misses = metrics.counter("reply_cache_lookups", result="miss")
+        self._stale = metrics.counter("reply_cache_lookups", result="stale")
+        metrics.register_gauge("reply_cache_entries", lambda: len(self._entries))
+        metrics.register_gauge("reply_cache_hit_rate", self.hit_rate)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: tuple, version: tuple) -> Optional[Tuple[str, str, str]]:
+        """
+        Look up a memoized reply.
+
+        Args:
+            key: (business_id, normalized text, state)
+            version: Current knowledge and rules version
+
+        Returns:
+            (reply, intent value, path), or None on a miss
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        reply, intent_value, path, entry_version, stored_at = entry
+        if entry_version != version or time.monotonic() - stored_at > self.ttl_seconds:
+            self._entries.pop(key, None)
+            self._stale.inc()
+            return None
+        self._entries.move_to_end(key)
+        return reply, intent_value, path
+
+    def put(self, key: tuple, version: tuple, reply: str, intent_value: str, path: str) -> None:
+        """Memoize a reply computed under version."""
+        if not self.enabled:
+            return
+        self._entries[key] = (reply, intent_value, path, version, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def record(self, hit: bool) -> None:
+        (self._hits if hit else self._misses).inc()
+
+    def hit_rate(self) -> float:
+        hits = self._hits.value
+        lookups = hits + self._misses.value
+        return round(hits / lookups, 4) if lookups else 0.0
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+# Process-wide reply memo
+reply_cache = ReplyCache(
+    max_entries=settings.reply_cache_max_entries,
+    ttl_seconds=settings.reply_cache_ttl_seconds,
+)
+
+
+def _normalize_for_cache(text: str) -> str:
+    """Case- and whitespace-insensitive form of a message (what the pipeline sees)."""
+    return " ".join(text.lower().split())
+
+
+def _reply_state(user_id: str, business_id: Optional[int] = None, channel: Optional[str] = None) -> tuple:
+    """
+    The conversation state an intent reply depends on (the user's session for
+    this business and channel).
+
+    Returns:
+        (last_intent, returning user, unknown streak): whether the user has
+        sent more than one message, and whether one more unknown message
+        reaches the repeated-unknown reply
+    """
+    session = peek_session(session_key(user_id, business_id, channel))
+    if session is None:
+        return (None, False, False)
+    return (session.last_intent, session.message_count > 1, session.unknown_streak + 1 >= 3)
+
+
+async def process_message(message: NormalizedMessage, business_id: Optional[int] = None) -> str:
     """
     Process a normalized message and return a rule-based response with memory and knowledge.
 
     This function maintains the same signature as the AI layer,
     making it a drop-in replacement. It:
+    0. Returns the memoized reply if this text was answered in the same
+       state before (see ReplyCache)
     1. Checks knowledge base for matching answer (RAG-lite)
     2. Reads conversation memory for the user
     3. Detects intent from message text
@@ -265,6 +371,8 @@ async def process_message(message: NormalizedMessage) -> str:
 
     Args:
         message: Normalized message from any platform (Telegram, WhatsApp, Instagram)
+        business_id: Business the message belongs to; its own knowledge entries
+            are consulted first (None = global knowledge only)
 
     Returns:
         Friendly text response based on detected intent, memory, and knowledge (never None or empty string)
@@ -275,28 +383,56 @@ async def process_message(message: NormalizedMessage) -> str:
         - Intent detection failures → Use UNKNOWN intent
         - Response generation failures → Use safe default
         - Memory update failures → Log but continue
+
+    Each stage's duration and the decision path are recorded in
+    pipeline_timing (see /api/diagnostics/pipeline).
     """
+    trace = pipeline_timing.start()
+    try:
+        return await _run_pipeline(message, business_id, trace)
+    finally:
+        # Shared STATE_BACKEND: write this user's session with the next exchange
+        user_id = getattr(message, "user_id", None)
+        if user_id and isinstance(user_id, str):
+            shared_sessions.touch(session_key(user_id, business_id, getattr(message, "channel", None)))
+        trace.finish()
+
+
+async def _run_pipeline(message: NormalizedMessage, business_id: Optional[int], trace) -> str:
+    """The process_message pipeline; trace collects stage timings."""
     # Safe default response
     SAFE_DEFAULT = "I'm here to help! How can I assist you today?"
 
     # Validate input
     if not message or not hasattr(message, "message_text"):
         log.warning("ai_brain.process_message received invalid message")
+        trace.decide("invalid")
         return SAFE_DEFAULT
 
     if not message.message_text or not message.message_text.strip():
         log.warning("ai_brain.process_message received empty message text")
+        trace.decide("invalid")
         return SAFE_DEFAULT
 
     if not message.user_id:
         log.warning("ai_brain.process_message received message with no user_id")
+        trace.decide("invalid")
         return SAFE_DEFAULT
 
+    # Load the user's session from a shared STATE_BACKEND (one round trip;
+    # no-op when state is per worker)
+    await shared_sessions.refresh(session_key(message.user_id, business_id, message.channel))
+    # Cold miss (restart, eviction): restore persisted conversation memory
+    await load_memory(message.user_id, business_id, message.channel)
+    trace.mark("state_load")
+
     # Edge Case 1: Check for spam (rapid repeated messages)
     try:
-        is_spam_detected, spam_reason = is_spam(message.user_id)
+        is_spam_detected, spam_reason = is_spam(message.user_id, business_id, message.channel)
+        trace.mark("spam_check")
         if is_spam_detected:
             log.warning(f"spam_detected user_id={message.user_id} reason={spam_reason}")
+            trace.decide("spam")
             return (
                 "I notice you're sending messages very quickly. "
                 "Please slow down a bit so I can help you better! "
@@ -309,8 +445,10 @@ async def process_message(message: NormalizedMessage) -> str:
     # Edge Case 2: Validate message length
     try:
         is_valid_length, length_reason = validate_message_length(message.message_text)
+        trace.mark("length_check")
         if not is_valid_length:
             log.warning(f"message_too_long user_id={message.user_id} reason={length_reason}")
+            trace.decide("too_long")
             return (
                 "Your message is quite long! Could you break it down into smaller questions? "
                 "I'm here to help with specific topics like pricing, features, or getting started. "
@@ -322,8 +460,11 @@ async def process_message(message: NormalizedMessage) -> str:
 
     # Edge Case 3: Check for emoji/symbol-only messages
     try:
-        if is_emoji_or_symbol_only(message.message_text):
+        emoji_only = is_emoji_or_symbol_only(message.message_text)
+        trace.mark("emoji_check")
+        if emoji_only:
             log.info(f"emoji_only_message user_id={message.user_id}")
+            trace.decide("emoji_only")
             return (
                 "I see you sent emojis! 😊 While I love emojis, I work best with text. "
                 "Could you tell me in words how I can help you today?"
@@ -335,8 +476,10 @@ async def process_message(message: NormalizedMessage) -> str:
     # Edge Case 4: Check for unsupported actions
     try:
         is_unsupported, action_type = is_unsupported_action(message.message_text)
+        trace.mark("unsupported_action_check")
         if is_unsupported:
             log.info(f"unsupported_action user_id={message.user_id} action={action_type}")
+            trace.decide("unsupported_action")
             if action_type == "file_upload":
                 return (
                     "I can't receive files right now, but I can help answer questions! "
@@ -369,26 +512,77 @@ async def process_message(message: NormalizedMessage) -> str:
         # Continue processing - action check failure shouldn't block
 
     try:
+        try:
+            await tenant_knowledge.prepare(business_id)
+        except Exception as e:
+            log.warning(f"tenant_knowledge_prepare_error business_id={business_id} error={type(e).__name__}")
+        trace.mark("knowledge_prepare")
+
+        # Step 0: Reuse the reply to an identical message in the same state
+        # Spam/length/emoji/action checks above and the memory and unknown
+        # tracking below still run for every message
+        cache_text = None
+        cache_version = None
+        reply_state = None
+        if reply_cache.enabled:
+            try:
+                cache_text = _normalize_for_cache(message.message_text)
+                cache_version = (knowledge_version(business_id), keyword_rules.version)
+                reply_state = _reply_state(message.user_id, business_id, message.channel)
+                cached = reply_cache.get((business_id, cache_text, None), cache_version) or reply_cache.get(
+                    (business_id, cache_text, reply_state), cache_version
+                )
+                reply_cache.record(cached is not None)
+                trace.mark("reply_cache")
+                if cached is not None:
+                    reply, intent_value, path = cached
+                    if path == _PATH_INTENT:
+                        track_unknown_intent(message.user_id, intent_value, business_id, message.channel)
+                    update_memory(message.user_id, intent_value, business_id, message.channel)
+                    trace.mark("memory_update")
+                    log.info(
+                        f"reply_cache_hit user_id={message.user_id} business_id={business_id} "
+                        f"intent={intent_value} decision_path={path}"
+                    )
+                    trace.decide("reply_cache")
+                    return reply
+            except Exception as e:
+                log.warning(f"reply_cache_error user_id={message.user_id} error={type(e).__name__} action=full_pipeline")
+                cache_text = None
+
         # Step 1: Check knowledge base first (RAG-lite)
         # If knowledge lookup fails, continue to intent-based response
+        # The fuzzy n-gram fallback only runs for messages no intent rule
+        # recognizes, so greetings and requests for a human keep their replies
         knowledge_answer = None
         try:
-            knowledge_answer = find_answer(message.message_text)
+            knowledge_answer = find_answer(message.message_text, business_id, semantic=False)
+            if not knowledge_answer and detect_intent(message) == Intent.UNKNOWN:
+                knowledge_answer = find_answer(message.message_text, business_id)
+            trace.mark("knowledge_lookup")
             if knowledge_answer and isinstance(knowledge_answer, str) and knowledge_answer.strip():
                 # Found valid answer in knowledge base - use it
                 log.info(
-                    f"knowledge_match user_id={message.user_id} "
+                    f"knowledge_match user_id={message.user_id} business_id={business_id} "
                     f"decision_path=knowledge_base"
                 )
                 # Still update memory for context tracking (non-blocking)
+                intent_value = "unknown"
                 try:
                     intent = detect_intent(message)
                     intent_value = intent.value if hasattr(intent, "value") else "unknown"
-                    update_memory(message.user_id, intent_value)
+                    update_memory(message.user_id, intent_value, business_id, message.channel)
                 except Exception as e:
                     log.warning(f"memory_update_failed user_id={message.user_id} error={type(e).__name__}")
                     # Continue - memory update failure doesn't block response
-                
+                trace.mark("memory_update")
+
+                if cache_text is not None:
+                    reply_cache.put(
+                        (business_id, cache_text, None), cache_version,
+                        knowledge_answer.strip(), intent_value, _PATH_KNOWLEDGE,
+                    )
+                trace.decide(_PATH_KNOWLEDGE)
                 return knowledge_answer.strip()
             else:
                 log.debug(f"knowledge_no_match user_id={message.user_id}")
@@ -402,7 +596,7 @@ async def process_message(message: NormalizedMessage) -> str:
         message_count = 0
         unknown_intent_count = 0
         try:
-            memory = get_memory(message.user_id)
+            memory = get_memory(message.user_id, business_id, message.channel)
             if isinstance(memory, dict):
                 last_intent = memory.get("last_intent")
                 message_count = memory.get("message_count", 0)
@@ -423,6 +617,7 @@ async def process_message(message: NormalizedMessage) -> str:
         except Exception as e:
             log.warning(f"memory_read_failed user_id={message.user_id} error={type(e).__name__} action=using_defaults")
             memory = {}
+        trace.mark("memory_read")
 
         # Step 3: Detect intent from message text
         # If intent detection fails, use UNKNOWN intent
@@ -442,14 +637,16 @@ async def process_message(message: NormalizedMessage) -> str:
             log.warning(f"intent_detection_failed user_id={message.user_id} error={type(e).__name__} action=using_unknown")
             intent = Intent.UNKNOWN
             intent_value = "unknown"
+        trace.mark("intent_detection")
 
         # Edge Case 4: Track unknown intents for special handling
         try:
-            unknown_intent_count = track_unknown_intent(message.user_id, intent_value)
+            unknown_intent_count = track_unknown_intent(message.user_id, intent_value, business_id, message.channel)
             log.debug(f"unknown_intent_tracked user_id={message.user_id} intent={intent_value} count={unknown_intent_count}")
         except Exception as e:
             log.warning(f"unknown_intent_tracking_failed user_id={message.user_id} error={type(e).__name__}")
-            unknown_intent_count = get_unknown_intent_count(message.user_id)
+            unknown_intent_count = get_unknown_intent_count(message.user_id, business_id, message.channel)
+        trace.mark("unknown_tracking")
 
         # Step 4: Generate context-aware response based on intent and memory
         # If response generation fails, use safe default
@@ -464,18 +661,25 @@ async def process_message(message: NormalizedMessage) -> str:
                     f"response_generated user_id={message.user_id} "
                     f"intent={intent_value} response_length={len(response)}"
                 )
+                if cache_text is not None:
+                    reply_cache.put(
+                        (business_id, cache_text, reply_state), cache_version,
+                        response.strip(), intent_value, _PATH_INTENT,
+                    )
         except Exception as e:
             log.warning(f"response_generation_failed user_id={message.user_id} error={type(e).__name__} action=using_default")
             response = SAFE_DEFAULT
+        trace.mark("response_generation")
 
         # Step 5: Update memory with new intent and increment message count
         # Memory update failures are non-blocking
         try:
-            update_memory(message.user_id, intent_value)
+            update_memory(message.user_id, intent_value, business_id, message.channel)
             log.debug(f"memory_updated user_id={message.user_id} intent={intent_value} unknown_count={unknown_intent_count}")
         except Exception as e:
             log.warning(f"memory_update_failed user_id={message.user_id} error={type(e).__name__} action=continuing")
             # Continue - memory update failure doesn't block response
+        trace.mark("memory_update")
 
         # Step 6: Ensure response is never empty (final safety check)
         if not response or not isinstance(response, str) or not response.strip():
@@ -486,6 +690,7 @@ async def process_message(message: NormalizedMessage) -> str:
             f"ai_processing_complete user_id={message.user_id} "
             f"intent={intent_value} decision_path=rule_based"
         )
+        trace.decide(_PATH_INTENT)
         return response.strip()
 
     except Exception as e:
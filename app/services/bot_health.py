@@ -0,0 +1,253 @@
+"""Per-bot delivery health for Telegram sends.
+
+send_message used to log 401/403/429 and return False, and callers (the
+legacy webhook, the outbox, broadcasts) simply tried again or moved on,
+spending requests Telegram was going to reject anyway.
+
+This module tracks, per bot token:
+- A circuit breaker: consecutive 401s, 5xx responses or transport errors
+  open it, and sends fail fast without a request until a cooldown passes;
+  then a single probe send decides whether it closes again (half-open)
+- A 429 park: Telegram's retry_after is honored by not sending as that bot
+  until it expires, instead of retrying into the limit; senders get the
+  park's end time back and reschedule (see TelegramService.try_send_message)
+- A negative cache of chats that answered 403 (bot blocked by the user or
+  removed from the group), so they are skipped until the entry expires
+
+All state is per process and keyed by bot token, so a reconnected bot with
+a new token starts healthy. state_for() is exposed per integration through
+the Telegram status endpoint and /api/diagnostics/bots.
+"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.config import settings
+from app.services import metrics
+
+log = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class BotCircuit:
+    """Breaker and rate-limit state for one bot token."""
+
+    __slots__ = ("state", "failures", "opened_at", "probing", "parked_until", "blocked_chats", "last_error", "trips")
+
+    def __init__(self) -> None:
+        self.state = CLOSED
+        self.failures = 0  # Consecutive breaker-relevant failures
+        self.opened_at = 0.0
+        self.probing = False  # A half-open probe send is in flight
+        self.parked_until = 0.0  # monotonic time until which sends wait (429 retry_after)
+        self.blocked_chats = 0  # Entries in the negative cache for this bot
+        self.last_error: Optional[str] = None
+        self.trips = 0  # Times the breaker has opened
+
+
+class BotHealth:
+    """Circuit breakers, 429 parking and blocked-chat cache for all bots."""
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        open_seconds: float,
+        blocked_chat_ttl: float,
+        max_blocked_chats: int,
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_seconds = open_seconds
+        self.blocked_chat_ttl = blocked_chat_ttl
+        self.max_blocked_chats = max_blocked_chats
+        self._circuits: Dict[str, BotCircuit] = {}
+        self._blocked: "OrderedDict[Tuple[str, int], float]" = OrderedDict()
+
+        self._opened = metrics.counter("telegram_breaker_opened")
+        self._skipped_open = metrics.counter("telegram_send_skipped", reason="breaker_open")
+        self._skipped_blocked = metrics.counter("telegram_send_skipped", reason="blocked_chat")
+        self._parked = metrics.counter("telegram_send_parked")
+        metrics.register_gauge("telegram_breakers_open", self.open_count)
+        metrics.register_gauge("telegram_blocked_chats", lambda: len(self._blocked))
+
+    def _circuit(self, bot_token: str) -> BotCircuit:
+        circuit = self._circuits.get(bot_token)
+        if circuit is None:
+            circuit = self._circuits[bot_token] = BotCircuit()
+        return circuit
+
+    def open_count(self) -> int:
+        """Number of bots whose breaker is currently not closed."""
+        return sum(1 for circuit in self._circuits.values() if circuit.state != CLOSED)
+
+    # ----- breaker -----
+
+    def allow(self, bot_token: str) -> bool:
+        """
+        Check whether a send may be attempted for this bot.
+
+        Returns:
+            False while the breaker is open (or a half-open probe is already in flight)
+        """
+        circuit = self._circuits.get(bot_token)
+        if circuit is None or circuit.state == CLOSED:
+            return True
+        if circuit.state == OPEN:
+            if time.monotonic() - circuit.opened_at < self.open_seconds:
+                self._skipped_open.inc()
+                return False
+            circuit.state = HALF_OPEN
+            log.info(f"telegram_breaker_half_open bot_id={bot_token.split(':', 1)[0]}")
+        if circuit.probing:
+            self._skipped_open.inc()
+            return False
+        circuit.probing = True
+        return True
+
+    def record_success(self, bot_token: str) -> None:
+        """A request reached Telegram and was accepted."""
+        circuit = self._circuits.get(bot_token)
+        if circuit is None:
+            return
+        circuit.failures = 0
+        circuit.probing = False
+        if circuit.state != CLOSED:
+            circuit.state = CLOSED
+            log.info(f"telegram_breaker_closed bot_id={bot_token.split(':', 1)[0]}")
+
+    def record_failure(self, bot_token: str, error: str) -> None:
+        """
+        A failure that says the bot (not the chat) is unhealthy: 401, 5xx or transport error.
+
+        Args:
+            bot_token: Bot that failed
+            error: Short description, e.g. "401" or "ConnectTimeout"
+        """
+        circuit = self._circuit(bot_token)
+        circuit.failures += 1
+        circuit.probing = False
+        circuit.last_error = error
+        if circuit.state == HALF_OPEN or (circuit.state == CLOSED and circuit.failures >= self.failure_threshold):
+            circuit.state = OPEN
+            circuit.opened_at = time.monotonic()
+            circuit.trips += 1
+            self._opened.inc()
+            log.warning(
+                f"telegram_breaker_opened bot_id={bot_token.split(':', 1)[0]} "
+                f"failures={circuit.failures} error={error} cooldown={self.open_seconds}"
+            )
+
+    def release(self, bot_token: str) -> None:
+        """A send finished without telling us anything about bot health (e.g. 400, 403, 429)."""
+        circuit = self._circuits.get(bot_token)
+        if circuit is not None:
+            circuit.probing = False
+
+    def reset(self, bot_token: str) -> None:
+        """Forget a bot's breaker and park state (e.g. after its token was re-validated)."""
+        circuit = self._circuits.get(bot_token)
+        if circuit is not None:
+            circuit.state = CLOSED
+            circuit.failures = 0
+            circuit.probing = False
+            circuit.parked_until = 0.0
+
+    # ----- 429 parking -----
+
+    def park(self, bot_token: str, retry_after: float) -> None:
+        """Hold every send for this bot for retry_after seconds (Telegram 429)."""
+        circuit = self._circuit(bot_token)
+        circuit.parked_until = max(circuit.parked_until, time.monotonic() + retry_after)
+        circuit.probing = False
+        self._parked.inc()
+        log.warning(f"telegram_bot_parked bot_id={bot_token.split(':', 1)[0]} retry_after={retry_after}")
+
+    def parked_until(self, bot_token: str) -> float:
+        """
+        End of the bot's 429 park.
+
+        Returns:
+            monotonic time until which the bot must not send, or 0.0 if it
+            is not parked
+        """
+        circuit = self._circuits.get(bot_token)
+        if circuit is None or circuit.parked_until <= time.monotonic():
+            return 0.0
+        return circuit.parked_until
+
+    # ----- blocked chats -----
+
+    def block_chat(self, bot_token: str, chat_id: int) -> None:
+        """Remember that this chat rejected the bot (403)."""
+        key = (bot_token, chat_id)
+        if key not in self._blocked:
+            self._circuit(bot_token).blocked_chats += 1
+        self._blocked[key] = time.monotonic() + self.blocked_chat_ttl
+        self._blocked.move_to_end(key)
+        while len(self._blocked) > self.max_blocked_chats:
+            evicted, _ = self._blocked.popitem(last=False)
+            self._forget_blocked(evicted)
+
+    def is_chat_blocked(self, bot_token: str, chat_id: int) -> bool:
+        """True if this chat returned 403 recently; counts the skipped send."""
+        if not self._blocked:
+            return False
+        key = (bot_token, chat_id)
+        expires_at = self._blocked.get(key)
+        if expires_at is None:
+            return False
+        if expires_at <= time.monotonic():
+            del self._blocked[key]
+            self._forget_blocked(key)
+            return False
+        self._skipped_blocked.inc()
+        return True
+
+    def unblock_chat(self, bot_token: str, chat_id: int) -> None:
+        """Drop a chat from the negative cache (e.g. the user messaged the bot again)."""
+        key = (bot_token, chat_id)
+        if self._blocked.pop(key, None) is not None:
+            self._forget_blocked(key)
+
+    def _forget_blocked(self, key: Tuple[str, int]) -> None:
+        circuit = self._circuits.get(key[0])
+        if circuit is not None and circuit.blocked_chats > 0:
+            circuit.blocked_chats -= 1
+
+    # ----- reporting -----
+
+    def state_for(self, bot_token: str) -> dict:
+        """
+        Delivery health for one bot, for status endpoints.
+
+        Returns:
+            Dict with breaker state, consecutive failures, seconds until the
+            breaker may probe again, seconds the bot is parked for (429),
+            blocked chat count and the last error
+        """
+        circuit = self._circuits.get(bot_token) or BotCircuit()
+        now = time.monotonic()
+        retry_in = 0.0
+        if circuit.state == OPEN:
+            retry_in = max(0.0, circuit.opened_at + self.open_seconds - now)
+        return {
+            "breaker": circuit.state,
+            "consecutive_failures": circuit.failures,
+            "breaker_retry_in_seconds": round(retry_in, 1),
+            "breaker_trips": circuit.trips,
+            "parked_for_seconds": round(max(0.0, circuit.parked_until - now), 1),
+            "blocked_chats": circuit.blocked_chats,
+            "last_error": circuit.last_error,
+        }
+
+
+# Process-wide delivery health used by TelegramService.send_message
+bot_health = BotHealth(
+    failure_threshold=settings.telegram_breaker_failure_threshold,
+    open_seconds=settings.telegram_breaker_open_seconds,
+    blocked_chat_ttl=settings.telegram_blocked_chat_ttl,
+    max_blocked_chats=settings.telegram_blocked_chat_max,
+)
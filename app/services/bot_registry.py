@@ -0,0 +1,328 @@
+"""In-process index of connected Telegram bots.
+
+This module keeps a small in-memory index of active Telegram integrations so
+that webhook requests can be mapped to their bot token and business without
+touching the database:
+
+- Each integration gets its own webhook URL (/telegram/webhook/{integration_id})
+- Telegram echoes a per-bot secret in the X-Telegram-Bot-Api-Secret-Token header
+- The index is loaded on startup and refreshed on connect/disconnect
+- Integration ids that are not found are remembered for
+  BOT_REGISTRY_MISS_TTL seconds, so requests to unknown webhook URLs do not
+  each cost a database query
+
+It doubles as the process-level credentials cache: each entry holds the
+decoded credentials of one integration together with its
+credentials_version. connect/disconnect bump the version, and a periodic
+refresh compares versions (a query on two integer columns) so other workers
+re-decode only the rows that actually changed.
+
+The secret is derived from the bot token and SECRET_KEY, so every worker
+computes the same value without storing it anywhere.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.database import get_db_context
+from app.models import ChannelIntegration
+from app.services import metrics
+from app.services.state_store import BoundedStateStore
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class BotEntry:
+    """Resolved routing data for one Telegram integration."""
+
+    integration_id: int
+    business_id: int
+    bot_token: str
+    bot_username: Optional[str]
+    channel_name: Optional[str]
+    secret_token: str
+    updated_at: Optional[datetime] = None
+    version: int = 0  # ChannelIntegration.credentials_version the entry was decoded from
+
+
+# In-memory index: {integration_id: BotEntry}
+_bots: Dict[int, BotEntry] = {}
+
+# Integration ids not found in the database: {integration_id: retry after (monotonic)}
+_misses = BoundedStateStore(
+    "bot_registry_misses",
+    max_entries=10000,
+    idle_ttl_seconds=settings.bot_registry_miss_ttl,
+)
+
+# Background task running refresh_bots periodically
+_refresh_task: Optional[asyncio.Task] = None
+
+_decodes = metrics.counter("bot_registry_credential_decodes")
+metrics.register_gauge("bot_registry_bots", lambda: len(_bots))
+
+
+def webhook_secret_for(bot_token: str) -> str:
+    """
+    Derive the webhook secret_token for a bot.
+
+    Telegram allows 1-256 characters from [A-Za-z0-9_-], so a hex digest fits.
+
+    Args:
+        bot_token: Telegram bot token
+
+    Returns:
+        Deterministic secret string for this bot
+    """
+    return hmac.new(
+        settings.secret_key.encode("utf-8"),
+        bot_token.encode("utf-8"),
+        hashlib.sha256,
+    ).hexdigest()
+
+
+def verify_webhook_secret(bot: BotEntry, secret_token: Optional[str]) -> bool:
+    """Check the secret_token header Telegram sent against the bot's secret."""
+    if not secret_token:
+        return False
+    return hmac.compare_digest(bot.secret_token, secret_token)
+
+
+def _entry_from_integration(integration) -> Optional[BotEntry]:
+    """Build a BotEntry from a ChannelIntegration row (None if unusable)."""
+    if not integration.is_active or integration.channel != "telegram" or not integration.credentials:
+        return None
+    _decodes.inc()
+    try:
+        credentials = json.loads(integration.credentials)
+    except (TypeError, ValueError):
+        log.warning(f"bot_registry_invalid_credentials integration_id={integration.id}")
+        return None
+
+    bot_token = credentials.get("bot_token")
+    if not bot_token:
+        return None
+
+    return BotEntry(
+        integration_id=integration.id,
+        business_id=integration.business_id,
+        bot_token=bot_token,
+        bot_username=credentials.get("bot_username"),
+        channel_name=integration.channel_name,
+        secret_token=webhook_secret_for(bot_token),
+        updated_at=integration.updated_at,
+        version=integration.credentials_version or 0,
+    )
+
+
+def register_integration(integration) -> Optional[BotEntry]:
+    """
+    Add or refresh an integration in the index.
+
+    Inactive integrations (or ones without a bot token) are removed instead.
+
+    Args:
+        integration: ChannelIntegration row
+
+    Returns:
+        The indexed BotEntry, or None if the integration was dropped
+    """
+    entry = _entry_from_integration(integration)
+    if entry is None:
+        _bots.pop(integration.id, None)
+        return None
+    _bots[entry.integration_id] = entry
+    _misses.pop(entry.integration_id, None)
+    log.info(
+        f"bot_registered integration_id={entry.integration_id} "
+        f"business_id={entry.business_id} bot=@{entry.bot_username}"
+    )
+    return entry
+
+
+def unregister_integration(integration_id: int) -> None:
+    """Remove an integration from the index."""
+    if _bots.pop(integration_id, None) is not None:
+        log.info(f"bot_unregistered integration_id={integration_id}")
+
+
+def get_bot(integration_id: int) -> Optional[BotEntry]:
+    """Look up a bot by integration id (no database access)."""
+    return _bots.get(integration_id)
+
+
+def _recently_missed(integration_id: int) -> bool:
+    retry_after = _misses.get(integration_id)
+    return retry_after is not None and time.monotonic() < retry_after
+
+
+def load_bot(integration_id: int) -> Optional[BotEntry]:
+    """
+    Look up a bot, loading it from the database on a miss (blocking).
+
+    Ids not found (or not usable) are remembered for BOT_REGISTRY_MISS_TTL
+    seconds; database errors are not.
+    """
+    entry = _bots.get(integration_id)
+    if entry is not None:
+        return entry
+    if _recently_missed(integration_id):
+        return None
+
+    try:
+        with get_db_context() as db:
+            integration = db.query(ChannelIntegration).filter(
+                ChannelIntegration.id == integration_id
+            ).first()
+            entry = register_integration(integration) if integration is not None else None
+    except Exception as e:
+        log.warning(f"bot_registry_load_failed integration_id={integration_id} error={type(e).__name__}")
+        return None
+    if entry is None:
+        _misses[integration_id] = time.monotonic() + settings.bot_registry_miss_ttl
+    return entry
+
+
+async def get_or_load_bot(integration_id: int) -> Optional[BotEntry]:
+    """
+    Look up a bot, loading it from the database (in a thread) on a miss.
+
+    Only the worker that handled connect/disconnect refreshes its index
+    directly; other workers pick the integration up here on first use.
+    """
+    entry = _bots.get(integration_id)
+    if entry is not None:
+        return entry
+    if _recently_missed(integration_id):
+        return None
+    return await asyncio.to_thread(load_bot, integration_id)
+
+
+def credentials_for(integration) -> Optional[BotEntry]:
+    """
+    Decoded credentials for an integration row, decoding only on a version change.
+
+    Args:
+        integration: ChannelIntegration row (already loaded by the caller)
+
+    Returns:
+        Cached or freshly indexed BotEntry, or None if the integration is
+        inactive or has no usable bot token
+    """
+    entry = _bots.get(integration.id)
+    if entry is not None and entry.version == (integration.credentials_version or 0):
+        return entry
+    return register_integration(integration)
+
+
+def find_by_token(bot_token: str) -> List[BotEntry]:
+    """Return all indexed integrations using a bot token (no database access)."""
+    return [entry for entry in _bots.values() if entry.bot_token == bot_token]
+
+
+def all_bots() -> List[BotEntry]:
+    """Return all indexed bots, most recently updated first."""
+    return sorted(
+        _bots.values(),
+        key=lambda entry: entry.updated_at or datetime.min,
+        reverse=True,
+    )
+
+
+def load_bots(db) -> int:
+    """
+    (Re)build the index from all active Telegram integrations.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Number of bots indexed
+    """
+    integrations = db.query(ChannelIntegration).filter(
+        ChannelIntegration.channel == "telegram",
+        ChannelIntegration.is_active == True
+    ).all()
+
+    _bots.clear()
+    for integration in integrations:
+        register_integration(integration)
+    log.info(f"bot_registry_loaded count={len(_bots)}")
+    return len(_bots)
+
+
+def refresh_bots(db) -> int:
+    """
+    Bring the index in line with the database using credentials_version.
+
+    Only (id, credentials_version) is read for all active Telegram
+    integrations; full rows are loaded and decoded just for integrations
+    that are new or whose version changed. Integrations that are no longer
+    active are dropped.
+
+    Args:
+        db: Database session
+
+    Returns:
+        Number of entries added, updated or removed
+    """
+    versions = dict(
+        db.query(ChannelIntegration.id, ChannelIntegration.credentials_version).filter(
+            ChannelIntegration.channel == "telegram",
+            ChannelIntegration.is_active == True
+        ).all()
+    )
+
+    removed = [integration_id for integration_id in _bots if integration_id not in versions]
+    for integration_id in removed:
+        unregister_integration(integration_id)
+
+    stale = [
+        integration_id for integration_id, version in versions.items()
+        if integration_id not in _bots or _bots[integration_id].version != (version or 0)
+    ]
+    if stale:
+        for integration in db.query(ChannelIntegration).filter(ChannelIntegration.id.in_(stale)).all():
+            register_integration(integration)
+
+    if removed or stale:
+        log.info(f"bot_registry_refreshed updated={len(stale)} removed={len(removed)} count={len(_bots)}")
+    return len(removed) + len(stale)
+
+
+def _refresh_once() -> int:
+    with get_db_context() as db:
+        return refresh_bots(db)
+
+
+async def _refresh_loop(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(_refresh_once)
+        except Exception as e:
+            log.warning(f"bot_registry_refresh_failed error={type(e).__name__}")
+
+
+def start_refresh(interval: float) -> None:
+    """Start the periodic version check (called on application startup)."""
+    global _refresh_task
+    if interval > 0 and _refresh_task is None:
+        _refresh_task = asyncio.create_task(_refresh_loop(interval), name="bot-registry-refresh")
+
+
+async def stop_refresh() -> None:
+    """Stop the periodic version check (called on application shutdown)."""
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        await asyncio.gather(_refresh_task, return_exceptions=True)
+        _refresh_task = None
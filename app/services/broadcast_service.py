@@ -0,0 +1,323 @@
+"""Rate-limited bulk broadcasts to a business's Telegram audience.
+
+A broadcast sends one text (e.g. ad copy from the ads studio) to every
+distinct Conversation.user_id of a business and channel.
+
+Design:
+- The audience is read from the database in keyset-paged chunks in user_id
+  order (one short query per chunk), so memory stays flat regardless of
+  audience size and no connection is held between chunks
+- Each chunk is sent concurrently, paced by a per-bot broadcast bucket and
+  the outbox's shared per-bot bucket, so broadcasts and live replies
+  together stay under Telegram's limits
+- After each chunk the cursor (last user_id) and counters are checkpointed;
+  a restart resumes after the cursor, re-sending at most one chunk
+- A lease (owner + expiry, renewed at every checkpoint) ensures only one
+  worker runs a broadcast; broadcasts with an expired lease are resumed
+  on startup
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, or_, select, update
+
+from app.config import settings
+from app.database import SessionLocal, get_db_context
+from app.models import Broadcast, Conversation
+from app.services import bot_registry, metrics
+from app.services.bot_health import bot_health
+from app.services.telegram import TelegramService
+from app.services.telegram_outbox import TokenBucket, outbox
+
+log = logging.getLogger(__name__)
+
+# Statuses a broadcast can still be (re)started from
+ACTIVE_STATUSES = ("pending", "running")
+
+
+class AudienceStream:
+    """
+    Keyset-paged broadcast audience (blocking; use from a thread).
+
+    Yields distinct user_ids in ascending order, after an optional cursor.
+    Each chunk is one short query (user_id > last ORDER BY user_id LIMIT n,
+    served by ix_conversations_business_channel_user) in its own session, so
+    no connection or transaction is held while a chunk is being sent.
+    """
+
+    def __init__(self, business_id: int, channel: str, after: Optional[str], chunk_size: int):
+        self.business_id = business_id
+        self.channel = channel
+        self.after = after
+        self.chunk_size = chunk_size
+
+    def next_chunk(self) -> List[str]:
+        """Next batch of user_ids (empty when the audience is exhausted)."""
+        query = (
+            select(Conversation.user_id)
+            .where(Conversation.business_id == self.business_id, Conversation.channel == self.channel)
+            .distinct()
+            .order_by(Conversation.user_id)
+            .limit(self.chunk_size)
+        )
+        if self.after is not None:
+            query = query.where(Conversation.user_id > self.after)
+        db = SessionLocal()
+        try:
+            user_ids = [row[0] for row in db.execute(query)]
+        finally:
+            db.close()
+        if user_ids:
+            self.after = user_ids[-1]
+        return user_ids
+
+
+class BroadcastEngine:
+    """Runs broadcasts as background tasks with checkpointing and leases."""
+
+    def __init__(self, rate: float, concurrency: int, chunk_size: int, lease_seconds: float):
+        self.rate = rate
+        self.concurrency = max(1, concurrency)
+        self.chunk_size = max(1, chunk_size)
+        self.lease_seconds = lease_seconds
+        # Identifies this worker in lease_owner
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+
+        self._sent = metrics.counter("broadcast_sent")
+        self._failed = metrics.counter("broadcast_failed")
+        self._chunk_ms = metrics.histogram("broadcast_chunk_ms")
+        metrics.register_gauge("broadcasts_running", lambda: len(self._tasks))
+
+    # ----- lifecycle -----
+
+    def start(self, broadcast_id: int) -> bool:
+        """
+        Run a broadcast in the background (no-op if it already runs here).
+
+        Returns:
+            True if a task was started
+        """
+        if broadcast_id in self._tasks:
+            return False
+        task = asyncio.create_task(self._run(broadcast_id), name=f"broadcast-{broadcast_id}")
+        self._tasks[broadcast_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
+        return True
+
+    async def resume_pending(self) -> int:
+        """
+        Start every unfinished broadcast whose lease has expired (called on startup).
+
+        Returns:
+            Number of broadcasts started
+        """
+        now = datetime.utcnow()
+
+        def find() -> List[int]:
+            with get_db_context() as db:
+                rows = db.query(Broadcast.id).filter(
+                    Broadcast.status.in_(ACTIVE_STATUSES),
+                    or_(Broadcast.lease_expires_at.is_(None), Broadcast.lease_expires_at < now),
+                ).all()
+                return [row[0] for row in rows]
+
+        broadcast_ids = await asyncio.to_thread(find)
+        started = sum(1 for broadcast_id in broadcast_ids if self.start(broadcast_id))
+        if started:
+            log.info(f"broadcasts_resumed count={started}")
+        return started
+
+    def stop_broadcast(self, broadcast_id: int) -> None:
+        """Stop a broadcast running in this worker (e.g. after it was cancelled)."""
+        task = self._tasks.get(broadcast_id)
+        if task is not None:
+            task.cancel()
+
+    async def stop(self) -> None:
+        """Stop all broadcasts and release their leases so they resume promptly."""
+        tasks = list(self._tasks.items())
+        for _, task in tasks:
+            task.cancel()
+        await asyncio.gather(*(task for _, task in tasks), return_exceptions=True)
+        if tasks:
+            try:
+                await asyncio.to_thread(self._release_leases, [broadcast_id for broadcast_id, _ in tasks])
+            except Exception as e:
+                log.warning(f"broadcast_lease_release_failed error={type(e).__name__}")
+        log.info("broadcast_engine_stopped")
+
+    # ----- database steps (blocking, run in threads) -----
+
+    def _claim(self, broadcast_id: int) -> Optional[Tuple[int, int, str, str, Optional[str]]]:
+        """Take the lease; returns (business_id, integration_id, channel, text, cursor) or None."""
+        now = datetime.utcnow()
+        with get_db_context() as db:
+            claimed = db.execute(
+                update(Broadcast)
+                .where(
+                    Broadcast.id == broadcast_id,
+                    Broadcast.status.in_(ACTIVE_STATUSES),
+                    or_(
+                        Broadcast.lease_owner.is_(None),
+                        Broadcast.lease_owner == self.owner,
+                        Broadcast.lease_expires_at < now,
+                    ),
+                )
+                .values(
+                    status="running",
+                    lease_owner=self.owner,
+                    lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                    started_at=func.coalesce(Broadcast.started_at, now),
+                    updated_at=now,
+                )
+                .returning(
+                    Broadcast.business_id,
+                    Broadcast.integration_id,
+                    Broadcast.channel,
+                    Broadcast.text,
+                    Broadcast.cursor_user_id,
+                )
+            ).first()
+            return tuple(claimed) if claimed is not None else None
+
+    def _checkpoint(self, broadcast_id: int, cursor: str, sent: int, failed: int) -> Optional[str]:
+        """Record progress and renew the lease; returns the current status (None if lost)."""
+        now = datetime.utcnow()
+        with get_db_context() as db:
+            row = db.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id, Broadcast.lease_owner == self.owner)
+                .values(
+                    cursor_user_id=cursor,
+                    sent_count=Broadcast.sent_count + sent,
+                    failed_count=Broadcast.failed_count + failed,
+                    lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                    updated_at=now,
+                )
+                .returning(Broadcast.status)
+            ).first()
+            return row[0] if row is not None else None
+
+    def _finish(self, broadcast_id: int, status: str, error: Optional[str] = None) -> None:
+        now = datetime.utcnow()
+        with get_db_context() as db:
+            db.query(Broadcast).filter(
+                Broadcast.id == broadcast_id,
+                Broadcast.lease_owner == self.owner,
+                Broadcast.status.in_(ACTIVE_STATUSES),
+            ).update(
+                {
+                    "status": status,
+                    "error": error,
+                    "completed_at": now,
+                    "lease_owner": None,
+                    "lease_expires_at": None,
+                    "updated_at": now,
+                },
+                synchronize_session=False,
+            )
+
+    def _release_leases(self, broadcast_ids: List[int]) -> None:
+        with get_db_context() as db:
+            db.query(Broadcast).filter(
+                Broadcast.id.in_(broadcast_ids),
+                Broadcast.lease_owner == self.owner,
+            ).update({"lease_owner": None, "lease_expires_at": None}, synchronize_session=False)
+
+    # ----- sending -----
+
+    def _bucket(self, bot_token: str) -> TokenBucket:
+        bucket = self._buckets.get(bot_token)
+        if bucket is None:
+            bucket = self._buckets[bot_token] = TokenBucket(self.rate, max(1.0, self.rate))
+        return bucket
+
+    async def _send_chunk(self, bot_token: str, text: str, user_ids: List[str]) -> Tuple[int, int]:
+        """Send to one chunk of recipients; returns (sent, failed)."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        service = TelegramService(bot_token)
+        broadcast_bucket = self._bucket(bot_token)
+        shared_bucket = outbox.bot_bucket(bot_token)
+
+        async def send(user_id: str) -> bool:
+            try:
+                chat_id = int(user_id)
+            except (TypeError, ValueError):
+                return False
+            async with semaphore:
+                for _ in range(settings.telegram_send_max_retries + 1):
+                    # The broadcast paces itself: wait out a 429 park here, in its own task
+                    parked_for = bot_health.parked_until(bot_token) - time.monotonic()
+                    if parked_for > 0:
+                        await asyncio.sleep(parked_for)
+                    await broadcast_bucket.acquire()
+                    await shared_bucket.acquire()
+                    result = await service.try_send_message(chat_id, text)
+                    if result.retry_at is None:
+                        return result.sent
+                return False
+
+        results = await asyncio.gather(*(send(user_id) for user_id in user_ids))
+        sent = sum(1 for result in results if result)
+        return sent, len(results) - sent
+
+    async def _run(self, broadcast_id: int) -> None:
+        claimed = await asyncio.to_thread(self._claim, broadcast_id)
+        if claimed is None:
+            log.info(f"broadcast_not_claimed broadcast_id={broadcast_id}")
+            return
+        business_id, integration_id, channel, text, cursor = claimed
+
+        bot = await bot_registry.get_or_load_bot(integration_id)
+        if bot is None:
+            log.warning(f"broadcast_failed broadcast_id={broadcast_id} reason=integration_not_connected")
+            await asyncio.to_thread(self._finish, broadcast_id, "failed", "Telegram integration is not connected")
+            return
+
+        log.info(f"broadcast_started broadcast_id={broadcast_id} business_id={business_id} resume_after={cursor}")
+        stream = AudienceStream(business_id, channel, cursor, self.chunk_size)
+        try:
+            while True:
+                user_ids = await asyncio.to_thread(stream.next_chunk)
+                if not user_ids:
+                    break
+
+                started = asyncio.get_running_loop().time()
+                sent, failed = await self._send_chunk(bot.bot_token, text, user_ids)
+                self._chunk_ms.observe((asyncio.get_running_loop().time() - started) * 1000)
+                self._sent.inc(sent)
+                self._failed.inc(failed)
+
+                status = await asyncio.to_thread(self._checkpoint, broadcast_id, user_ids[-1], sent, failed)
+                if status != "running":
+                    # Cancelled, or the lease was taken over after a stall
+                    log.info(f"broadcast_stopped broadcast_id={broadcast_id} status={status}")
+                    return
+
+            await asyncio.to_thread(self._finish, broadcast_id, "completed")
+            log.info(f"broadcast_completed broadcast_id={broadcast_id}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.error(f"broadcast_error broadcast_id={broadcast_id} error={type(e).__name__} message={str(e)}", exc_info=True)
+            try:
+                await asyncio.to_thread(self._finish, broadcast_id, "failed", f"{type(e).__name__}: {e}")
+            except Exception:
+                pass  # Lease expires and the broadcast is resumed later
+
+
+# Process-wide broadcast engine
+broadcast_engine = BroadcastEngine(
+    rate=settings.broadcast_rate_limit,
+    concurrency=settings.broadcast_concurrency,
+    chunk_size=settings.broadcast_chunk_size,
+    lease_seconds=settings.broadcast_lease_seconds,
+)
@@ -0,0 +1,231 @@
+"""Coalescing of rapid-fire messages from the same chat.
+
+Fast typers often split one thought over several messages ("hi", "do you
+deliver", "to Nairobi?"). Answering each one separately costs a brain
+invocation, an outbound send and a database write per message, and the
+spam check then answers with "please slow down" - yet another send.
+
+With TELEGRAM_COALESCE_WINDOW set, the webhook pipeline debounces instead:
+- The first message of a chat opens a burst; a background task waits until
+  the chat has been quiet for the window (bounded by max_wait, or until
+  max_messages have arrived)
+- Every message, including the first, is acknowledged at once, so a burst
+  does not hold a webhook request (or a load shedding in-flight slot) open
+- The burst is processed as one merged message, producing one reply
+
+Long polling gets the same effect without waiting: updates of one chat in
+the same getUpdates batch are merged before processing (coalesce_batch).
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+from app.config import settings
+from app.services import metrics
+from app.services.telegram_parser import MAX_MESSAGE_LENGTH, InboundMessage, ParsedUpdate
+
+log = logging.getLogger(__name__)
+
+
+def merge_messages(messages: List[InboundMessage]) -> InboundMessage:
+    """
+    Merge a burst into one message (texts joined by newlines, in arrival order).
+
+    The last message supplies the timestamp and reply metadata; the merged
+    text is truncated to the usual message length limit.
+    """
+    if len(messages) == 1:
+        return messages[0]
+    first, last = messages[0], messages[-1]
+    text = "\n".join(message.message_text for message in messages)
+    if len(text) > MAX_MESSAGE_LENGTH:
+        text = text[:MAX_MESSAGE_LENGTH] + "..."
+    metadata = dict(last.metadata or {})
+    metadata["coalesced_count"] = len(messages)
+    metadata["coalesced_message_ids"] = [(message.metadata or {}).get("message_id") for message in messages]
+    return InboundMessage(
+        user_id=first.user_id,
+        message_text=text,
+        timestamp=last.timestamp,
+        metadata=metadata,
+        channel=first.channel,
+        language=first.language,
+    )
+
+
+class _Burst:
+    __slots__ = ("messages", "first_at", "last_at", "full", "closed")
+
+    def __init__(self, message: InboundMessage, now: float):
+        self.messages = [message]
+        self.first_at = now
+        self.last_at = now
+        self.full = asyncio.Event()
+        self.closed = False
+
+
+class BurstCoalescer:
+    """Debounces messages per chat key; one caller per burst processes the merged message."""
+
+    def __init__(self, window_seconds: float, max_wait_seconds: float, max_messages: int):
+        self.window = window_seconds
+        self.max_wait = max(window_seconds, max_wait_seconds)
+        self.max_messages = max(1, max_messages)
+        self._bursts: Dict[Hashable, _Burst] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+        self._coalesced = metrics.counter("telegram_coalesce_bursts")
+        self._absorbed = metrics.counter("telegram_coalesce_absorbed")
+        metrics.register_gauge("telegram_coalesce_open", lambda: len(self._bursts))
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def _join(self, key: Hashable, message: InboundMessage) -> bool:
+        """Add a message to the chat's open burst; False if none is open."""
+        burst = self._bursts.get(key)
+        if burst is None or burst.closed:
+            return False
+        burst.messages.append(message)
+        burst.last_at = time.monotonic()
+        if len(burst.messages) >= self.max_messages:
+            burst.full.set()
+        self._absorbed.inc()
+        return True
+
+    def _open(self, key: Hashable, message: InboundMessage) -> _Burst:
+        burst = self._bursts[key] = _Burst(message, time.monotonic())
+        return burst
+
+    async def _collect(self, key: Hashable, burst: _Burst) -> InboundMessage:
+        """Wait for a burst to end and return its merged message."""
+        try:
+            while not burst.full.is_set():
+                deadline = min(burst.last_at + self.window, burst.first_at + self.max_wait)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(burst.full.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass  # Re-check: a later message may have extended the window
+        finally:
+            burst.closed = True
+            if self._bursts.get(key) is burst:
+                del self._bursts[key]
+
+        if len(burst.messages) > 1:
+            self._coalesced.inc()
+            log.info(f"burst_coalesced key={key} messages={len(burst.messages)}")
+        return merge_messages(burst.messages)
+
+    async def submit(self, key: Hashable, message: InboundMessage) -> Optional[InboundMessage]:
+        """
+        Add a message to its chat's burst.
+
+        Args:
+            key: Chat identity, e.g. (integration_id, chat_id)
+            message: Normalized inbound message
+
+        Returns:
+            The merged message for the caller that opened the burst (after
+            the burst has ended), or None if the message joined a burst that
+            another caller will process
+        """
+        if self._join(key, message):
+            return None
+        return await self._collect(key, self._open(key, message))
+
+    def submit_nowait(
+        self,
+        key: Hashable,
+        message: InboundMessage,
+        process: Callable[[InboundMessage], Awaitable[None]],
+    ) -> bool:
+        """
+        Add a message to its chat's burst without waiting for the burst to end.
+
+        The message that opens a burst starts a background task that awaits
+        process(merged message) once the burst has ended.
+
+        Args:
+            key: Chat identity, e.g. (integration_id, chat_id)
+            message: Normalized inbound message
+            process: Coroutine function handling the merged message
+
+        Returns:
+            True if the message opened a burst, False if it joined one
+        """
+        if self._join(key, message):
+            return False
+        burst = self._open(key, message)
+
+        async def run() -> None:
+            try:
+                await process(await self._collect(key, burst))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error(f"burst_processing_failed key={key} error={type(e).__name__}", exc_info=True)
+
+        task = asyncio.create_task(run(), name=f"burst-{key}")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def stop(self) -> None:
+        """Process the open bursts now (called on shutdown)."""
+        for burst in list(self._bursts.values()):
+            burst.full.set()
+        tasks = list(self._tasks)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        log.info(f"burst_coalescer_stopped drained={len(tasks)}")
+
+    def coalesce_batch(self, updates: List[ParsedUpdate]) -> List[ParsedUpdate]:
+        """
+        Merge consecutive text updates of one chat (e.g. from one getUpdates batch).
+
+        Non-text updates end a run. Each merged update keeps the last
+        update_id of its run.
+
+        Args:
+            updates: Updates of a single chat, in update_id order
+
+        Returns:
+            Updates to process, in order
+        """
+        result: List[ParsedUpdate] = []
+        run: List[ParsedUpdate] = []
+
+        def close_run() -> None:
+            if len(run) == 1:
+                result.append(run[0])
+            elif run:
+                last = run[-1]
+                merged = merge_messages([update.message for update in run])
+                result.append(ParsedUpdate(last.update_id, last.chat_id, merged, last.kind))
+                self._coalesced.inc()
+                self._absorbed.inc(len(run) - 1)
+            run.clear()
+
+        for update in updates:
+            if update.message is None:
+                close_run()
+                result.append(update)
+                continue
+            run.append(update)
+            if len(run) >= self.max_messages:
+                close_run()
+        close_run()
+        return result
+
+
+# Process-wide coalescer used by the Telegram update pipeline
+burst_coalescer = BurstCoalescer(
+    window_seconds=settings.telegram_coalesce_window,
+    max_wait_seconds=settings.telegram_coalesce_max_wait,
+    max_messages=settings.telegram_coalesce_max_messages,
+)
@@ -5,17 +5,212 @@ It handles errors gracefully and never crashes the application.
 
 The service is designed to be called AFTER bot replies are generated and sent,
 ensuring that message sending is never affected by database operations.
+
+Conversations are written behind: save_conversation() appends the row to an
+in-memory buffer and a background task flushes it with one multi-row INSERT
+per batch (on size or time thresholds), instead of one commit per message.
 """
+import asyncio
 import logging
+import time
+from datetime import datetime
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert
 
+from app.config import settings
 from app.models import Conversation
 from app.database import get_db_context
+from app.services import metrics
 from app.services.ai_brain import detect_intent
 from app.schemas import NormalizedMessage, MessageChannel
 
 log = logging.getLogger(__name__)
 
 
+class ConversationWriteBuffer:
+    """
+    Write-behind buffer for Conversation rows.
+
+    - Rows are flushed when batch_size rows are pending or every
+      flush_interval seconds, whichever comes first
+    - At most max_pending rows are held; add() waits for a flush when
+      the buffer is full (backpressure instead of unbounded memory)
+    - A batch whose INSERT fails is kept and retried first, after a backoff
+      (retry_backoff seconds, doubling per failure, max 30s) during which
+      nothing is flushed; it is dropped only after max_retries failures, so
+      a short database outage does not lose conversations
+    - stop() flushes everything still pending (graceful shutdown; one last
+      attempt, without backoff)
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        flush_interval: float,
+        max_pending: int,
+        max_retries: int = 5,
+        retry_backoff: float = 1.0,
+    ):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_pending = max(self.batch_size, max_pending)
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+
+        self._pending: List[Dict[str, Any]] = []
+        self._retries: Deque[Tuple[List[Dict[str, Any]], int]] = deque()  # (batch, failures), oldest first
+        self._retry_at = 0.0  # monotonic time before which nothing is flushed
+        self._cond: Optional[asyncio.Condition] = None
+        self._flush_now: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+
+        self._flushed = metrics.counter("conversation_buffer_flushed_rows")
+        self._dropped = metrics.counter("conversation_buffer_dropped_rows")
+        self._waits = metrics.counter("conversation_buffer_backpressure_waits")
+        self._failures = metrics.counter("conversation_buffer_flush_failures")
+        self._flush_latency = metrics.histogram("conversation_buffer_flush_ms")
+        metrics.register_gauge("conversation_buffer_pending", self.depth)
+
+    @property
+    def running(self) -> bool:
+        """True while the buffer accepts rows."""
+        return self._running
+
+    def depth(self) -> int:
+        """Number of rows waiting to be flushed (including batches awaiting a retry)."""
+        return len(self._pending) + sum(len(batch) for batch, _ in self._retries)
+
+    def start(self) -> None:
+        """Start the background flusher (must be called from the running event loop)."""
+        if self._running:
+            return
+        self._cond = asyncio.Condition()
+        self._flush_now = asyncio.Event()
+        self._running = True
+        self._task = asyncio.create_task(self._flush_loop(), name="conversation-flusher")
+        log.info(f"conversation_buffer_started batch_size={self.batch_size} interval={self.flush_interval}s")
+
+    async def stop(self) -> None:
+        """Stop accepting rows and flush everything still pending."""
+        if not self._running:
+            return
+        self._running = False
+        self._flush_now.set()
+        async with self._cond:
+            self._cond.notify_all()  # Release writers waiting on backpressure
+        await self._task
+        log.info("conversation_buffer_stopped")
+
+    async def add(self, row: Dict[str, Any]) -> bool:
+        """
+        Buffer one Conversation row.
+
+        Returns:
+            True if buffered, False if the buffer has been stopped
+        """
+        async with self._cond:
+            while self._running and self.depth() >= self.max_pending:
+                self._waits.inc()
+                self._flush_now.set()
+                await self._cond.wait()
+            if not self._running:
+                return False
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._flush_now.set()
+        return True
+
+    async def _flush_loop(self) -> None:
+        while self._running:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush()
+        await self.flush(final=True)
+
+    def _next_batch(self) -> Optional[Tuple[List[Dict[str, Any]], int]]:
+        if self._retries:
+            return self._retries.popleft()
+        if not self._pending:
+            return None
+        batch = self._pending[:self.batch_size]
+        del self._pending[:self.batch_size]
+        return batch, 0
+
+    async def flush(self, final: bool = False) -> None:
+        """
+        Write pending rows in batch_size chunks, retried batches first.
+
+        Stops at the first failed batch (the database is likely down) and
+        waits out the backoff before the next flush.
+
+        Args:
+            final: Last flush on shutdown: ignore the backoff and drop what fails
+        """
+        if not final and time.monotonic() < self._retry_at:
+            return
+        while True:
+            item = self._next_batch()
+            if item is None:
+                return
+            batch, failures = item
+            async with self._cond:
+                self._cond.notify_all()  # Space freed - wake writers under backpressure
+
+            started = time.monotonic()
+            try:
+                await asyncio.to_thread(_insert_conversations, batch)
+                self._flushed.inc(len(batch))
+                log.info(f"conversations_flushed count={len(batch)}")
+                continue
+            except Exception as e:
+                failures += 1
+                self._failures.inc()
+                if final or failures > self.max_retries:
+                    self._dropped.inc(len(batch))
+                    log.error(
+                        f"conversation_flush_error count={len(batch)} failures={failures} action=dropped "
+                        f"error={type(e).__name__} message={str(e)}",
+                        exc_info=True
+                    )
+                    if final:
+                        continue
+                    self._retry_at = time.monotonic() + self.retry_backoff
+                else:
+                    self._retries.appendleft((batch, failures))
+                    backoff = min(30.0, self.retry_backoff * 2 ** (failures - 1))
+                    self._retry_at = time.monotonic() + backoff
+                    log.warning(
+                        f"conversation_flush_error count={len(batch)} failures={failures} action=retry "
+                        f"retry_in={backoff}s error={type(e).__name__}"
+                    )
+            finally:
+                self._flush_latency.observe((time.monotonic() - started) * 1000)
+            return
+
+
+def _insert_conversations(rows: List[Dict[str, Any]]) -> None:
+    """Insert rows with a single executemany (rendered as a multi-row INSERT)."""
+    with get_db_context() as db:
+        db.execute(insert(Conversation), rows)
+        # get_db_context() automatically commits on success
+
+
+# Process-wide write-behind buffer (started/stopped by the app lifespan)
+conversation_buffer = ConversationWriteBuffer(
+    batch_size=settings.conversation_batch_size,
+    flush_interval=settings.conversation_flush_interval,
+    max_pending=settings.conversation_buffer_max,
+    max_retries=settings.conversation_flush_max_retries,
+    retry_backoff=settings.conversation_flush_retry_backoff,
+)
+
+
 async def save_conversation(
     user_message: str,
     bot_reply: str,
@@ -39,14 +234,13 @@ async def save_conversation(
         intent: Detected intent (optional, will be detected if not provided)
 
     Returns:
-        True if conversation saved successfully, False otherwise
+        True if conversation saved (or buffered for the next flush), False otherwise
     """
     try:
         # If intent not provided, detect it from user message
         if intent is None:
             try:
                 # Create a temporary NormalizedMessage to detect intent
-                from datetime import datetime
                 temp_message = NormalizedMessage(
                     channel=MessageChannel.TELEGRAM,  # Default, not used for detection
                     user_id=user_id,
@@ -65,6 +259,21 @@ async def save_conversation(
             log.warning(f"conversation_save_validation_failed user_id={user_id} business_id={business_id} reason=missing_fields")
             return False
 
+        # Buffer for the next batched INSERT when the write-behind buffer is running
+        if conversation_buffer.running:
+            buffered = await conversation_buffer.add({
+                "business_id": business_id,
+                "user_id": user_id,
+                "channel": channel,
+                "user_message": user_message,
+                "bot_reply": bot_reply,
+                "intent": intent,
+                "created_at": datetime.utcnow(),
+            })
+            if buffered:
+                log.debug(f"conversation_buffered user_id={user_id} business_id={business_id} channel={channel} intent={intent}")
+                return True
+
         # Save to database
         with get_db_context() as db:
             conversation = Conversation(
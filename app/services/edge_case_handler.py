@@ -6,7 +6,10 @@ without external services or infrastructure.
 import logging
 import re
 import time
-from typing import Dict, Optional, Tuple
+from typing import Optional, Tuple
+
+from app.services.keyword_matcher import keyword_rules
+from app.services.user_session import TIMESTAMP_RING_SIZE, get_session, peek_session, session_key
 
 log = logging.getLogger(__name__)
 
@@ -17,14 +20,24 @@ SPAM_MESSAGE_LIMIT = 5  # Max messages in spam window
 SPAM_WINDOW_SECONDS = 10  # Time window for spam detection
 UNKNOWN_INTENT_THRESHOLD = 3  # Consecutive unknown intents before special response
 
-# In-memory spam tracking: {user_id: [timestamps]}
-_spam_tracker: Dict[str, list] = {}
+# The spam check counts message times kept in the session ring
+assert TIMESTAMP_RING_SIZE >= SPAM_MESSAGE_LIMIT, "user_session.TIMESTAMP_RING_SIZE must be >= SPAM_MESSAGE_LIMIT"
+
+# Spam timestamps and unknown-intent streaks are kept in each user's
+# UserSession (see user_session)
 
-# Unknown intent tracking: {user_id: count}
-_unknown_intent_tracker: Dict[str, int] = {}
+# Unsupported action patterns, checked in this order (whole words, "*" = prefix)
+UNSUPPORTED_ACTION_KEYWORDS = {
+    "file_upload": ["upload*", "send file", "attach*", "share file"],
+    "video_call": ["video call", "video chat", "face time", "video"],
+    "payment": ["pay", "payment*", "credit card", "billing", "invoice", "charge"],
+    "account_creation": ["create account", "sign up", "register", "new account"],
+    "admin_action": ["delete", "remove user", "ban", "admin", "moderator"],
+}
+keyword_rules.add_group("unsupported_action", UNSUPPORTED_ACTION_KEYWORDS)
 
 
-def is_spam(user_id: str) -> Tuple[bool, Optional[str]]:
+def is_spam(user_id: str, business_id: Optional[int] = None, channel: Optional[str] = None) -> Tuple[bool, Optional[str]]:
     """
     Check if user is sending messages too rapidly (spam detection).
 
@@ -33,6 +46,9 @@ def is_spam(user_id: str) -> Tuple[bool, Optional[str]]:
 
     Args:
         user_id: Platform-specific user identifier
+        business_id: Business the message belongs to (with channel, selects
+            the user's session for that business, see user_session.session_key)
+        channel: Channel of the message
 
     Returns:
         Tuple of (is_spam: bool, reason: Optional[str])
@@ -45,28 +61,22 @@ def is_spam(user_id: str) -> Tuple[bool, Optional[str]]:
 
         current_time = time.time()
 
-        # Initialize tracker for user if needed
-        if user_id not in _spam_tracker:
-            _spam_tracker[user_id] = []
-
-        # Clean old timestamps (outside spam window)
-        _spam_tracker[user_id] = [
-            ts for ts in _spam_tracker[user_id]
-            if current_time - ts < SPAM_WINDOW_SECONDS
-        ]
+        # Recent message times (inside spam window) from the session's ring
+        session = get_session(session_key(user_id, business_id, channel))
+        recent, last_time = session.recent_messages(current_time, SPAM_WINDOW_SECONDS)
 
         # Check if too many messages in window
-        if len(_spam_tracker[user_id]) >= SPAM_MESSAGE_LIMIT:
-            return True, f"Too many messages ({len(_spam_tracker[user_id])}) in {SPAM_WINDOW_SECONDS} seconds"
+        if recent >= SPAM_MESSAGE_LIMIT:
+            return True, f"Too many messages ({recent}) in {SPAM_WINDOW_SECONDS} seconds"
 
         # Check time since last message
-        if _spam_tracker[user_id]:
-            time_since_last = current_time - _spam_tracker[user_id][-1]
+        if last_time is not None:
+            time_since_last = current_time - last_time
             if time_since_last < SPAM_THRESHOLD_SECONDS:
                 return True, f"Messages sent too rapidly ({time_since_last:.2f}s apart)"
 
         # Add current message timestamp
-        _spam_tracker[user_id].append(current_time)
+        session.add_message_time(current_time)
 
         return False, None
 
@@ -136,13 +146,20 @@ def is_emoji_or_symbol_only(message_text: str) -> bool:
         return False  # Fail open - treat as normal message
 
 
-def track_unknown_intent(user_id: str, intent: str) -> int:
+def track_unknown_intent(
+    user_id: str,
+    intent: str,
+    business_id: Optional[int] = None,
+    channel: Optional[str] = None,
+) -> int:
     """
     Track consecutive unknown intents for a user.
 
     Args:
         user_id: Platform-specific user identifier
         intent: Detected intent
+        business_id: Business the message belongs to (see is_spam)
+        channel: Channel of the message
 
     Returns:
         Count of consecutive unknown intents
@@ -151,26 +168,22 @@ def track_unknown_intent(user_id: str, intent: str) -> int:
         if not user_id or not isinstance(user_id, str):
             return 0
 
-        if intent == "unknown":
-            # Increment unknown count
-            _unknown_intent_tracker[user_id] = _unknown_intent_tracker.get(user_id, 0) + 1
-        else:
-            # Reset count on any known intent
-            _unknown_intent_tracker[user_id] = 0
-
-        return _unknown_intent_tracker.get(user_id, 0)
+        # Increment on unknown, reset on any known intent
+        return get_session(session_key(user_id, business_id, channel)).track_intent(intent)
 
     except Exception as e:
         log.warning(f"unknown_intent_tracking_error user_id={user_id} error={type(e).__name__}")
         return 0
 
 
-def get_unknown_intent_count(user_id: str) -> int:
+def get_unknown_intent_count(user_id: str, business_id: Optional[int] = None, channel: Optional[str] = None) -> int:
     """
     Get current count of consecutive unknown intents for a user.
 
     Args:
         user_id: Platform-specific user identifier
+        business_id: Business the message belongs to (see is_spam)
+        channel: Channel of the message
 
     Returns:
         Count of consecutive unknown intents
@@ -178,21 +191,25 @@ def get_unknown_intent_count(user_id: str) -> int:
     try:
         if not user_id or not isinstance(user_id, str):
             return 0
-        return _unknown_intent_tracker.get(user_id, 0)
+        session = peek_session(session_key(user_id, business_id, channel))
+        return session.unknown_streak if session is not None else 0
     except Exception:
         return 0
 
 
-def reset_unknown_intent_count(user_id: str) -> None:
+def reset_unknown_intent_count(user_id: str, business_id: Optional[int] = None, channel: Optional[str] = None) -> None:
     """
     Reset unknown intent count for a user.
 
     Args:
         user_id: Platform-specific user identifier
+        business_id: Business the message belongs to (see is_spam)
+        channel: Channel of the message
     """
     try:
-        if user_id in _unknown_intent_tracker:
-            _unknown_intent_tracker[user_id] = 0
+        session = peek_session(session_key(user_id, business_id, channel))
+        if session is not None:
+            session.unknown_streak = 0
     except Exception:
         pass  # Non-critical, fail silently
 
@@ -220,20 +237,9 @@ def is_unsupported_action(message_text: str) -> Tuple[bool, Optional[str]]:
         if not message_text or not isinstance(message_text, str):
             return False, None
 
-        message_lower = message_text.lower().strip()
-
-        # Unsupported action patterns
-        unsupported_patterns = {
-            "file_upload": ["upload", "send file", "attach", "share file"],
-            "video_call": ["video call", "video chat", "face time", "video"],
-            "payment": ["pay", "payment", "credit card", "billing", "invoice", "charge"],
-            "account_creation": ["create account", "sign up", "register", "new account"],
-            "admin_action": ["delete", "remove user", "ban", "admin", "moderator"],
-        }
-
-        for action_type, keywords in unsupported_patterns.items():
-            if any(keyword in message_lower for keyword in keywords):
-                return True, action_type
+        action_type = keyword_rules.first(message_text, "unsupported_action")
+        if action_type:
+            return True, action_type
 
         return False, None
 
@@ -0,0 +1,212 @@
+"""Compiled multi-pattern keyword matching (Aho-Corasick).
+
+Intent and action detection used to rebuild keyword lists on every call and
+test them one by one with `keyword in message_lower`, which costs one scan
+of the text per keyword and matches inside words ("hi" in "this").
+
+KeywordRules compiles every registered rule group into a single Aho-Corasick
+automaton, so one pass over the text finds every keyword of every group:
+- Rule groups (e.g. "intent", "action") map labels to keyword lists; label
+  order is priority order (first = highest)
+- Matches must start and end on word boundaries; a trailing "*" makes a
+  keyword a prefix ("upload*" also matches "uploading")
+- Scan results are cached per text, so callers that inspect the same
+  message for several groups share one pass
+
+Groups are registered at import time by the modules that own the keywords
+(ai_brain, processor, edge_case_handler); the automaton is (re)built lazily
+on the first scan after a change.
+"""
+import logging
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# Scanned texts remembered (most messages are checked by several groups)
+SCAN_CACHE_SIZE = 1024
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton over a fixed set of patterns.
+
+    Patterns are added with add() and compiled once with build(); iter_matches()
+    then reports every occurrence in a single pass, in time linear in the
+    text length plus the number of matches (independent of pattern count).
+    """
+
+    def __init__(self) -> None:
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        self._lengths: List[int] = []
+        self._built = False
+
+    def add(self, pattern: str) -> int:
+        """
+        Add a pattern (before build()).
+
+        Returns:
+            Pattern index reported by iter_matches()
+        """
+        state = 0
+        for ch in pattern:
+            next_state = self._goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][ch] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = next_state
+        index = len(self._lengths)
+        self._lengths.append(len(pattern))
+        self._out[state] = self._out[state] + (index,)
+        self._built = False
+        return index
+
+    def build(self) -> None:
+        """Compute failure links (breadth first) and merge outputs along them."""
+        queue = list(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+        self._built = True
+
+    def iter_matches(self, text: str) -> Iterable[Tuple[int, int]]:
+        """
+        Yield (pattern_index, end_position) for every occurrence in text.
+
+        end_position is the index just past the match.
+        """
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for position, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                for index in out[state]:
+                    yield index, position + 1
+
+    def pattern_length(self, index: int) -> int:
+        return self._lengths[index]
+
+
+class KeywordRules:
+    """Named groups of prioritized keyword rules sharing one automaton."""
+
+    def __init__(self, cache_size: int = SCAN_CACHE_SIZE):
+        self._groups: "OrderedDict[str, List[Tuple[str, List[str]]]]" = OrderedDict()
+        self._automaton: Optional[AhoCorasick] = None
+        # Per pattern index: (group, label, priority, is_prefix)
+        self._patterns: List[Tuple[str, str, int, bool]] = []
+        self._cache: "OrderedDict[str, Dict[str, Tuple[str, ...]]]" = OrderedDict()
+        self._cache_size = cache_size
+        self.version = 0  # Bumped whenever the rules change
+
+    def add_group(self, group: str, rules: Dict[str, Iterable[str]]) -> None:
+        """
+        Register (or replace) a rule group.
+
+        Args:
+            group: Group name, e.g. "intent"
+            rules: {label: keywords}, in priority order (first = highest).
+                Keywords are matched case-insensitively on word boundaries;
+                a trailing "*" allows any word continuation.
+        """
+        self._groups[group] = [(label, list(keywords)) for label, keywords in rules.items()]
+        self._automaton = None
+        self._cache.clear()
+        self.version += 1
+
+    def _compile(self) -> AhoCorasick:
+        automaton = AhoCorasick()
+        patterns: List[Tuple[str, str, int, bool]] = []
+        for group, rules in self._groups.items():
+            for priority, (label, keywords) in enumerate(rules):
+                for keyword in keywords:
+                    keyword = keyword.lower().strip()
+                    is_prefix = keyword.endswith("*")
+                    keyword = keyword.rstrip("*")
+                    if not keyword:
+                        continue
+                    automaton.add(keyword)
+                    patterns.append((group, label, priority, is_prefix))
+        automaton.build()
+        self._patterns = patterns
+        self._automaton = automaton
+        log.info(f"keyword_rules_compiled groups={len(self._groups)} patterns={len(patterns)}")
+        return automaton
+
+    def scan(self, text: str) -> Dict[str, Tuple[str, ...]]:
+        """
+        Find every matching label of every group in one pass.
+
+        Args:
+            text: Message text (any case)
+
+        Returns:
+            {group: labels}, labels sorted by priority (highest first);
+            groups without matches are omitted
+        """
+        if not text:
+            return {}
+        cached = self._cache.get(text)
+        if cached is not None:
+            self._cache.move_to_end(text)
+            return cached
+
+        automaton = self._automaton or self._compile()
+        lowered = text.lower()
+        length = len(lowered)
+        found: Dict[str, Dict[str, int]] = {}
+        for index, end in automaton.iter_matches(lowered):
+            group, label, priority, is_prefix = self._patterns[index]
+            start = end - automaton.pattern_length(index)
+            if start > 0 and _is_word_char(lowered[start - 1]):
+                continue
+            if not is_prefix and end < length and _is_word_char(lowered[end]):
+                continue
+            found.setdefault(group, {})[label] = priority
+
+        result = {
+            group: tuple(sorted(labels, key=labels.get))
+            for group, labels in found.items()
+        }
+        self._cache[text] = result
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def first(self, text: str, group: str) -> Optional[str]:
+        """
+        Highest-priority matching label of a group.
+
+        Returns:
+            Label, or None if no keyword of the group occurs in text
+        """
+        labels = self.scan(text).get(group)
+        return labels[0] if labels else None
+
+
+# Process-wide rules shared by intent and action detection
+keyword_rules = KeywordRules()
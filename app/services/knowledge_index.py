@@ -0,0 +1,244 @@
+"""BM25 retrieval over knowledge base entries.
+
+find_answer used to scan every entry three times per message with substring
+checks and return the first hit rather than the best one. KnowledgeIndex is
+built once when knowledge is loaded and scores only the entries that share
+a term with the message:
+- Entries are tokenized (lowercase words, stopwords dropped, plural "s"
+  folded) into an inverted index {term: [(entry, weighted tf), ...]}
+- Question and keyword terms count double; answer terms count once, so
+  answers still help recall without dominating
+- Queries are scored with Okapi BM25 (k1=1.2, b=0.75) over the postings of
+  their own terms only, rarest term first. Common terms (in more than 5% of
+  entries, and at least 256) carry little IDF weight; they only re-rank
+  entries already found by rarer terms, looked up per candidate instead of
+  walking their long postings. Cost follows how rare the message's words
+  are rather than how many entries exist
+- Each hit carries a confidence in [0, 1]: its score relative to that of
+  an average-length entry mentioning every query term once in its question
+  (terms the index has never seen are ignored), which makes one threshold
+  usable across queries and knowledge bases
+
+With semantic=True (and NumPy installed) the index also embeds each
+entry's question and keywords for similar(), a character n-gram fallback
+for paraphrases BM25 cannot match (see semantic_index). Stopwords are left
+out of the n-grams too, and a similar() hit must share a word stem (its
+first STEM_LENGTH letters, e.g. "month" for "monthly") with the query, so
+filler words alone never produce an answer.
+"""
+import heapq
+import math
+import re
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from app.services import semantic_index
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+QUESTION_WEIGHT = 2
+KEYWORD_WEIGHT = 2
+ANSWER_WEIGHT = 1
+
+# BM25 term weight of one question mention in an average-length entry;
+# the per-term reference for confidence
+_REFERENCE_TF = QUESTION_WEIGHT * (BM25_K1 + 1) / (QUESTION_WEIGHT + BM25_K1)
+
+# Terms in more entries than this fraction (and MIN_COMMON_DF) only re-rank candidates
+COMMON_TERM_FRACTION = 0.05
+MIN_COMMON_DF = 256
+
+# Leading letters two words must share to count as the same stem in similar()
+STEM_LENGTH = 4
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = frozenset(
+    """
+    a about am an and any are as at be but by can could did do does for from
+    get got had has have hello hey hi how i i'm if in is it its me my no not
+    of on or our please so than that the their them then there these they
+    this to us was we were what when where which who why will with would you
+    your
+    """.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into index terms.
+
+    Args:
+        text: Any text (question, answer, keyword or user message)
+
+    Returns:
+        Lowercase terms without stopwords, plural "s" folded
+        ("plans" -> "plan", "access" stays)
+    """
+    terms = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        terms.append(token)
+    return terms
+
+
+def stems(text: str) -> FrozenSet[str]:
+    """Word stems of a text's terms (see tokenize), for the similar() overlap check."""
+    return frozenset(term[:STEM_LENGTH] for term in tokenize(text))
+
+
+@dataclass(frozen=True)
+class KnowledgeHit:
+    """One retrieved entry."""
+
+    question: str
+    answer: str
+    score: float  # Raw BM25 score
+    confidence: float  # 0.0 - 1.0, comparable across queries
+
+
+class KnowledgeIndex:
+    """Immutable BM25 inverted index over knowledge entries."""
+
+    def __init__(self, entries: Iterable[Dict], semantic: bool = False):
+        """
+        Build the index.
+
+        Args:
+            entries: Dicts with "question" and "answer" strings and an optional
+                "keywords" list; entries without a usable answer are skipped
+            semantic: Also build the n-gram similarity index for similar()
+                (ignored without NumPy)
+        """
+        self._entries: List[Tuple[str, str]] = []
+        semantic_texts: List[str] = []
+        self._stems: List[FrozenSet[str]] = []
+        self._lengths: List[float] = []
+        postings: Dict[str, Dict[int, float]] = {}
+
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            question = entry.get("question")
+            answer = entry.get("answer")
+            if not isinstance(answer, str) or not answer.strip():
+                continue
+            question = question if isinstance(question, str) else ""
+            keywords = [keyword for keyword in entry.get("keywords") or [] if isinstance(keyword, str)]
+
+            weighted: Dict[str, float] = {}
+            fields = [(question, QUESTION_WEIGHT), (answer, ANSWER_WEIGHT)]
+            fields.extend((keyword, KEYWORD_WEIGHT) for keyword in keywords)
+            for text, weight in fields:
+                for term in tokenize(text):
+                    weighted[term] = weighted.get(term, 0.0) + weight
+
+            doc_id = len(self._entries)
+            self._entries.append((question, answer.strip()))
+            semantic_texts.append(" ".join([question, *keywords]))
+            if semantic:
+                self._stems.append(stems(semantic_texts[-1]))
+            self._lengths.append(sum(weighted.values()))
+            for term, tf in weighted.items():
+                postings.setdefault(term, {})[doc_id] = tf
+
+        count = len(self._entries)
+        self._avg_length = (sum(self._lengths) / count) if count else 0.0
+        self._idf: Dict[str, float] = {}
+        self._postings = postings
+        for term, docs in postings.items():
+            df = len(docs)
+            self._idf[term] = math.log(1 + (count - df + 0.5) / (df + 0.5))
+        self._common_df = max(MIN_COMMON_DF, int(count * COMMON_TERM_FRACTION))
+        # Per-entry BM25 length normalization, precomputed once
+        self._norms = [
+            BM25_K1 * (1 - BM25_B + BM25_B * length / self._avg_length) if self._avg_length else BM25_K1
+            for length in self._lengths
+        ]
+        self._semantic = (
+            semantic_index.SemanticIndex(semantic_texts, STOPWORDS)
+            if semantic and semantic_index.available()
+            else None
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def term_count(self) -> int:
+        return len(self._postings)
+
+    def search(self, query: str, top_k: int = 3, min_confidence: float = 0.0) -> List[KnowledgeHit]:
+        """
+        Best-matching entries for a query.
+
+        Args:
+            query: User message
+            top_k: Max hits returned
+            min_confidence: Hits below this confidence are dropped
+
+        Returns:
+            Hits ordered by score, best first (empty if nothing matches)
+        """
+        terms = set(tokenize(query)) if query else set()
+        known = sorted((term for term in terms if term in self._postings), key=lambda term: -self._idf[term])
+        scores: Dict[int, float] = {}
+        query_weight = 0.0
+        norms = self._norms
+        for term in known:
+            postings = self._postings[term]
+            idf = self._idf[term]
+            query_weight += idf * _REFERENCE_TF
+            if scores and len(postings) > self._common_df:
+                # Common term: re-rank the candidates only
+                for doc_id in scores:
+                    tf = postings.get(doc_id)
+                    if tf:
+                        scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + norms[doc_id])
+                continue
+            for doc_id, tf in postings.items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norms[doc_id])
+
+        if not scores or query_weight <= 0:
+            return []
+
+        hits = []
+        for doc_id, score in heapq.nlargest(top_k, scores.items(), key=lambda item: item[1]):
+            confidence = min(1.0, score / query_weight)
+            if confidence < min_confidence:
+                break
+            question, answer = self._entries[doc_id]
+            hits.append(KnowledgeHit(question, answer, round(score, 4), round(confidence, 4)))
+        return hits
+
+    def best(self, query: str, min_confidence: float = 0.0) -> Optional[KnowledgeHit]:
+        """Top hit at or above min_confidence, or None."""
+        hits = self.search(query, top_k=1, min_confidence=min_confidence)
+        return hits[0] if hits else None
+
+    def similar(self, query: str, top_k: int = 3, min_similarity: float = 0.0) -> List[KnowledgeHit]:
+        """
+        Entries whose question/keywords are most similar to the query
+        (character n-gram cosine similarity).
+
+        Returns:
+            Hits ordered by similarity, best first (score = confidence =
+            similarity), each sharing a word stem with the query; empty if
+            the semantic index was not built
+        """
+        if self._semantic is None:
+            return []
+        query_stems = stems(query)
+        hits = []
+        for doc_id, similarity in self._semantic.search(query, top_k):
+            if similarity < min_similarity:
+                break
+            if not query_stems & self._stems[doc_id]:
+                continue  # Only n-grams in common, no word
+            question, answer = self._entries[doc_id]
+            hits.append(KnowledgeHit(question, answer, round(similarity, 4), round(min(1.0, similarity), 4)))
+        return hits
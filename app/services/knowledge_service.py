@@ -1,11 +1,14 @@
 """Knowledge service for retrieving answers from FAQ/knowledge base.
 
 This module provides a simple RAG-lite system that:
-- Loads knowledge from JSON file
-- Performs simple keyword/substring matching
-- Returns relevant answers based on user queries
-
-Currently uses simple text matching but can be upgraded to
+- Loads the global knowledge from JSON file
+- Builds a BM25 inverted index over it once at load time
+- Answers from a business's own KnowledgeEntry rows when it has any
+  (indexes cached per business, see tenant_knowledge), otherwise from
+  the global knowledge
+- Returns the best-scoring answers for user queries
+
+Currently uses lexical (BM25) ranking but can be upgraded to
 vector embeddings and semantic search (real RAG) later.
 """
 import json
@@ -13,11 +16,17 @@ import logging
 from pathlib import Path
 from typing import Dict, List, Optional
 
+from app.config import settings
+from app.services.knowledge_index import KnowledgeHit, KnowledgeIndex
+from app.services.tenant_knowledge import tenant_knowledge
+
 log = logging.getLogger(__name__)
 
 # In-memory knowledge store
 _knowledge_base: List[Dict[str, str]] = []
+_knowledge_index: Optional[KnowledgeIndex] = None
 _knowledge_loaded: bool = False
+_knowledge_generation: int = 0  # Bumped on every (re)load
 
 
 def load_knowledge(knowledge_file: str = "faq.json") -> bool:
@@ -40,7 +49,7 @@ def load_knowledge(knowledge_file: str = "faq.json") -> bool:
     Returns:
         True if knowledge loaded successfully, False otherwise
     """
-    global _knowledge_base, _knowledge_loaded
+    global _knowledge_base, _knowledge_index, _knowledge_loaded, _knowledge_generation
 
     try:
         # Try to find the file in the project root
@@ -73,8 +82,10 @@ def load_knowledge(knowledge_file: str = "faq.json") -> bool:
                 log.error("Each knowledge entry must have 'question' and 'answer' fields")
                 return False
 
+        _knowledge_index = KnowledgeIndex(_knowledge_base, semantic=settings.semantic_search_enabled)
         _knowledge_loaded = True
-        log.info(f"Loaded {len(_knowledge_base)} knowledge entries from {knowledge_file}")
+        _knowledge_generation += 1
+        log.info(f"Loaded {len(_knowledge_base)} knowledge entries from {knowledge_file} (index_terms={_knowledge_index.term_count})")
         return True
 
     except json.JSONDecodeError as e:
@@ -85,122 +96,124 @@ def load_knowledge(knowledge_file: str = "faq.json") -> bool:
         return False
 
 
-def find_answer(message_text: str) -> Optional[str]:
+def _index_for(business_id: Optional[int]) -> Optional[KnowledgeIndex]:
+    """The business's cached index if it has entries, else the global one."""
+    if business_id is not None:
+        index = tenant_knowledge.get(business_id)
+        if index is not None and len(index):
+            return index
+    return _knowledge_index if _knowledge_loaded else None
+
+
+def search_knowledge(
+    message_text: str,
+    top_k: int = 3,
+    min_confidence: Optional[float] = None,
+    business_id: Optional[int] = None,
+    semantic: bool = True,
+) -> List[KnowledgeHit]:
     """
-    Find an answer from knowledge base using simple keyword/substring matching.
+    Rank knowledge entries against a message with BM25.
 
-    Matching strategy:
-    1. Check if message contains any keywords from knowledge entries
-    2. Check if message contains question text (substring match)
-    3. Return the first matching answer
+    Uses the business's own knowledge when its index is loaded
+    (tenant_knowledge.prepare) and not empty, otherwise the global knowledge.
+    When BM25 finds nothing confident enough, falls back to character
+    n-gram similarity (SEMANTIC_SEARCH_ENABLED, needs NumPy). Never
+    touches the database.
 
     Args:
         message_text: User's message text to search for
+        top_k: Max hits returned
+        min_confidence: Minimum hit confidence (0.0 - 1.0);
+            defaults to KNOWLEDGE_MIN_CONFIDENCE
+        business_id: Business the message belongs to (None = global only)
+        semantic: Use the n-gram fallback when BM25 finds nothing
 
     Returns:
-        Answer string if match found, None otherwise
-        Never raises exceptions - returns None on any error
-
-    Error Handling:
-        - Handles None or empty message_text
-        - Handles non-string message_text
-        - Handles corrupted knowledge base entries
-        - Handles missing or invalid entry fields
-        - Always returns None on errors (never crashes)
+        Hits ordered by score, best first; empty if nothing is relevant
+        Never raises exceptions - returns [] on any error
     """
     try:
-        # Validate knowledge base is loaded
-        if not _knowledge_loaded:
-            return None  # Silent return - not an error condition
-
-        if not _knowledge_base or not isinstance(_knowledge_base, list):
-            return None
+        # Validate a knowledge base is loaded
+        index = _index_for(business_id)
+        if index is None:
+            return []  # Silent return - not an error condition
 
         # Validate input
         if not message_text:
-            return None
+            return []
 
         if not isinstance(message_text, str):
             try:
                 message_text = str(message_text)
             except Exception:
                 log.warning(f"Could not convert message_text to string: {type(message_text)}")
-                return None
-
-        message_lower = message_text.lower().strip()
-        if not message_lower:
-            return None
-
-        # Strategy 1: Check keywords (if provided)
-        try:
-            for entry in _knowledge_base:
-                if not isinstance(entry, dict):
-                    continue  # Skip invalid entries
-                
-                keywords = entry.get("keywords", [])
-                if not isinstance(keywords, list):
-                    continue
-                
-                if keywords:
-                    # Check if any keyword appears in message
-                    for keyword in keywords:
-                        try:
-                            if isinstance(keyword, str) and keyword.lower() in message_lower:
-                                answer = entry.get("answer")
-                                if answer and isinstance(answer, str) and answer.strip():
-                                    log.debug(f"knowledge_keyword_match keyword={keyword}")
-                                    return answer.strip()
-                        except Exception as e:
-                            log.debug(f"Error checking keyword '{keyword}': {e}")
-                            continue
-        except Exception as e:
-            log.warning(f"Error in keyword matching strategy: {e}")
-
-        # Strategy 2: Check if question text appears in message (substring match)
-        try:
-            for entry in _knowledge_base:
-                if not isinstance(entry, dict):
-                    continue
-                
-                question = entry.get("question", "")
-                if not isinstance(question, str):
-                    continue
-                
-                question_lower = question.lower()
-                if question_lower and question_lower in message_lower:
-                    answer = entry.get("answer")
-                    if answer and isinstance(answer, str) and answer.strip():
-                        log.debug(f"knowledge_question_match question_length={len(question)}")
-                        return answer.strip()
-        except Exception as e:
-            log.warning(f"Error in question substring matching: {e}")
-
-        # Strategy 3: Check if message appears in question (reverse substring)
-        try:
-            for entry in _knowledge_base:
-                if not isinstance(entry, dict):
-                    continue
-                
-                question = entry.get("question", "")
-                if not isinstance(question, str):
-                    continue
-                
-                question_lower = question.lower()
-                if question_lower and message_lower in question_lower:
-                    answer = entry.get("answer")
-                    if answer and isinstance(answer, str) and answer.strip():
-                        log.debug(f"knowledge_reverse_match")
-                        return answer.strip()
-        except Exception as e:
-            log.warning(f"Error in reverse substring matching: {e}")
-
-        # No match found
-        return None
+                return []
+
+        if min_confidence is None:
+            min_confidence = settings.knowledge_min_confidence
+        hits = index.search(message_text, top_k=top_k, min_confidence=min_confidence)
+        if not hits and semantic:
+            hits = index.similar(message_text, top_k=top_k, min_similarity=settings.semantic_min_similarity)
+        return hits
 
     except Exception as e:
         # Catch-all for any unexpected errors
-        log.error(f"Unexpected error in find_answer: {e}", exc_info=True)
+        log.error(f"Unexpected error in search_knowledge: {e}", exc_info=True)
+        return []
+
+
+def find_answer(message_text: str, business_id: Optional[int] = None, semantic: bool = True) -> Optional[str]:
+    """
+    Find the best answer from the business's (or the global) knowledge base.
+
+    Matching strategy:
+    1. Score entries sharing terms with the message (BM25 over question,
+       keywords and answer; see knowledge_index)
+    2. Return the highest-scoring answer if its confidence reaches
+       KNOWLEDGE_MIN_CONFIDENCE
+    3. Otherwise (with semantic) the most similar entry by character
+       n-grams, if it reaches SEMANTIC_MIN_SIMILARITY
+
+    Args:
+        message_text: User's message text to search for
+        business_id: Business the message belongs to (None = global only)
+        semantic: Allow step 3; ai_brain only does for messages no intent
+            rule recognizes
+
+    Returns:
+        Answer string if match found, None otherwise
+        Never raises exceptions - returns None on any error
+
+    Error Handling:
+        - Handles None or empty message_text
+        - Handles non-string message_text
+        - Corrupted or answerless entries are skipped when the index is built
+        - Always returns None on errors (never crashes)
+    """
+    hits = search_knowledge(message_text, top_k=1, business_id=business_id, semantic=semantic)
+    if not hits:
         return None
+    log.debug(f"knowledge_match score={hits[0].score} confidence={hits[0].confidence}")
+    return hits[0].answer
+
+
+def knowledge_version(business_id: Optional[int] = None) -> tuple:
+    """
+    Identifies the knowledge answers for a business are currently drawn from.
+
+    Changes whenever the global knowledge is reloaded or the business's
+    cached index is rebuilt, so results derived from find_answer can be
+    cached against it.
+
+    Args:
+        business_id: Business (None = global knowledge only)
+
+    Returns:
+        Hashable version token
+    """
+    tenant_version = tenant_knowledge.version(business_id) if business_id is not None else None
+    return (_knowledge_generation, tenant_version)
 
 
 def get_knowledge_count() -> int:
@@ -0,0 +1,168 @@
+"""Admission control and staged degradation for Telegram update intake.
+
+When the database pool is exhausted, webhook requests used to pile up until
+they timed out, and Telegram then retried them into the same overload.
+
+LoadShedder turns the current load into a pressure value (0.0 = idle,
+1.0 = at capacity), the highest of:
+- webhook requests in flight / WEBHOOK_MAX_INFLIGHT
+- queued work (outbox + conversation buffer + tenant scheduler waits)
+  / WEBHOOK_MAX_QUEUE
+- database connections checked out / pool size + overflow
+
+and maps it to a stage, each one shedding more work:
+0 normal
+1 skip_persist     - replies are sent but conversations are not saved
+2 knowledge_only   - replies come from the knowledge base only (no memory,
+                     no brain), and are not saved
+3 reject           - the webhook answers 429 with Retry-After; Telegram
+                     re-delivers the update later. The poller stops fetching
+                     instead (updates wait on Telegram's side).
+
+Every decision is counted in metrics (webhook_shed{stage=...}) and the
+current pressure/stage are exported as gauges.
+"""
+import logging
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from app.config import settings
+from app.database import pool_usage
+from app.services import metrics
+from app.services.conversation_service import conversation_buffer
+from app.services.knowledge_service import find_answer
+from app.services.telegram_outbox import outbox
+from app.services.tenant_scheduler import tenant_scheduler
+
+log = logging.getLogger(__name__)
+
+NORMAL = 0
+SKIP_PERSIST = 1
+KNOWLEDGE_ONLY = 2
+REJECT = 3
+
+STAGE_NAMES = ("normal", "skip_persist", "knowledge_only", "reject")
+
+# Sent in knowledge_only mode when the knowledge base has no answer
+DEGRADED_RESPONSE = (
+    "Thanks for your message! We're handling a lot of conversations right now. "
+    "Please give us a moment and ask again shortly."
+)
+
+
+class Overloaded(Exception):
+    """Raised by LoadShedder.admit() when a request must be rejected."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Overloaded, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class LoadShedder:
+    """Computes load pressure and the resulting shedding stage."""
+
+    def __init__(
+        self,
+        max_inflight: int,
+        max_queue: int,
+        persist_at: float,
+        knowledge_at: float,
+        reject_at: float,
+        retry_after: int,
+        enabled: bool = True,
+    ):
+        self.max_inflight = max(1, max_inflight)
+        self.max_queue = max(1, max_queue)
+        self.thresholds = (persist_at, knowledge_at, reject_at)
+        self.retry_after = retry_after
+        self.enabled = enabled
+        self.inflight = 0
+        self._last_stage = NORMAL
+
+        self._decisions = [metrics.counter("webhook_shed", stage=name) for name in STAGE_NAMES]
+        metrics.register_gauge("webhook_inflight", lambda: self.inflight)
+        metrics.register_gauge("load_pressure", lambda: round(self.pressure(), 3))
+        metrics.register_gauge("load_shed_stage", lambda: STAGE_NAMES[self.stage()])
+
+    def queued(self) -> int:
+        """Work accepted but not yet done, across the pipeline's queues."""
+        return outbox.depth() + conversation_buffer.depth() + tenant_scheduler.waiting()
+
+    def pressure(self) -> float:
+        """Current load as a fraction of capacity (can exceed 1.0)."""
+        return max(
+            self.inflight / self.max_inflight,
+            self.queued() / self.max_queue,
+            pool_usage(),
+        )
+
+    def stage(self) -> int:
+        """Shedding stage for the current pressure."""
+        if not self.enabled:
+            return NORMAL
+        pressure = self.pressure()
+        stage = NORMAL
+        for index, threshold in enumerate(self.thresholds, start=1):
+            if pressure >= threshold:
+                stage = index
+        if stage != self._last_stage:
+            log_fn = log.warning if stage > self._last_stage else log.info
+            log_fn(f"load_shed_stage_changed stage={STAGE_NAMES[stage]} previous={STAGE_NAMES[self._last_stage]} pressure={pressure:.2f}")
+            self._last_stage = stage
+        return stage
+
+    @contextmanager
+    def admit(self) -> Iterator[int]:
+        """
+        Admit one webhook request and track it as in flight.
+
+        Yields:
+            The stage the request must be processed at (never REJECT)
+
+        Raises:
+            Overloaded: when the request should be rejected
+        """
+        stage = self.stage()
+        self._decisions[stage].inc()
+        if stage >= REJECT:
+            raise Overloaded(self.retry_after)
+        self.inflight += 1
+        try:
+            yield stage
+        finally:
+            self.inflight -= 1
+
+    def record(self, stage: int) -> None:
+        """Count a decision made outside admit() (e.g. by the poller)."""
+        self._decisions[stage].inc()
+
+
+def degraded_reply(message_text: Optional[str], business_id: Optional[int] = None) -> str:
+    """
+    Knowledge-base-only reply used in the knowledge_only stage.
+
+    Only knowledge already cached in memory is used (no database access).
+
+    Args:
+        message_text: Inbound message text
+        business_id: Business the message belongs to
+
+    Returns:
+        The matching knowledge base answer, or DEGRADED_RESPONSE
+    """
+    answer = find_answer(message_text, business_id) if message_text else None
+    if answer and answer.strip():
+        return answer.strip()
+    return DEGRADED_RESPONSE
+
+
+# Process-wide load shedder for Telegram update intake
+load_shedder = LoadShedder(
+    max_inflight=settings.webhook_max_inflight,
+    max_queue=settings.webhook_max_queue,
+    persist_at=settings.load_shed_persist_at,
+    knowledge_at=settings.load_shed_knowledge_at,
+    reject_at=settings.load_shed_reject_at,
+    retry_after=settings.load_shed_retry_after,
+    enabled=settings.load_shedding_enabled,
+)
@@ -1,21 +1,55 @@
 """In-memory conversation memory for tracking user interactions.
 
 This module provides a simple in-memory store for conversation context.
-Memory is stored per user_id and tracks conversation history.
-
-Currently uses a dictionary (in-memory) but can be replaced with
-Redis or a database later without changing the interface.
+Memory is stored per user_id (per business and channel when the business
+is known) and tracks conversation history.
+
+Memory is kept in the user's UserSession (see user_session.session_key),
+shared with the spam and unknown-intent trackers; this module exposes it as a dict
+so it can be replaced with Redis or a database later without changing
+the interface.
+
+Memory is also persisted to the conversation_memory table (read by the
+dashboard), keyed on (business_id, user_id, channel):
+- update_memory() with a business and channel marks the record dirty;
+  memory_writer flushes dirty records every MEMORY_FLUSH_INTERVAL seconds
+  with one multi-row INSERT ... ON CONFLICT DO UPDATE
+- load_memory() restores a user's memory from the table when the worker
+  has none (cold miss after a restart or eviction)
 """
+import asyncio
+import json
 import logging
-from typing import Dict, Optional
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.config import settings
+from app.database import get_db_context
+from app.models import ConversationMemory
+from app.services import metrics
+from app.services.user_session import (
+    UserSession,
+    all_sessions,
+    drop_session,
+    get_session,
+    peek_session,
+    replace_session,
+    session_key,
+)
 
 log = logging.getLogger(__name__)
 
-# In-memory store: {user_id: {last_intent: str, message_count: int, unknown_intent_count: int}}
-_memory_store: Dict[str, Dict[str, any]] = {}
+# After a failed load, cold misses skip the database for this many seconds
+LOAD_RETRY_SECONDS = 5.0
+
+MemoryKey = Tuple[int, str, str]  # (business_id, user_id, channel)
 
 
-def get_memory(user_id: str) -> Dict[str, any]:
+def get_memory(user_id: str, business_id: Optional[int] = None, channel: Optional[str] = None) -> Dict[str, any]:
     """
     Get conversation memory for a user.
 
@@ -27,6 +61,9 @@ def get_memory(user_id: str) -> Dict[str, any]:
 
     Args:
         user_id: Platform-specific user identifier
+        business_id: Business the conversation belongs to (memory is kept
+            separately per business and channel)
+        channel: Channel of the conversation (e.g. "telegram")
 
     Returns:
         Dictionary with memory data:
@@ -38,7 +75,6 @@ def get_memory(user_id: str) -> Dict[str, any]:
 
     Error Handling:
         - Handles None or invalid user_id
-        - Handles corrupted memory entries
         - Always returns valid default structure
     """
     # Safe default
@@ -54,33 +90,22 @@ def get_memory(user_id: str) -> Dict[str, any]:
             log.warning(f"Invalid user_id provided to get_memory: {type(user_id)}")
             return default_memory.copy()
 
-        if user_id not in _memory_store:
-            return default_memory.copy()
-
-        # Get memory and validate structure
-        memory = _memory_store.get(user_id)
-        if not isinstance(memory, dict):
-            log.warning(f"Memory entry for user {user_id} is not a dict, resetting")
-            _memory_store[user_id] = default_memory.copy()
+        session = peek_session(session_key(user_id, business_id, channel))
+        if session is None:
             return default_memory.copy()
-
-        # Validate and fix memory structure
-        result = memory.copy()
-        if "last_intent" not in result:
-            result["last_intent"] = None
-        if "message_count" not in result or not isinstance(result["message_count"], (int, float)):
-            result["message_count"] = 0
-        if "unknown_intent_count" not in result or not isinstance(result["unknown_intent_count"], (int, float)):
-            result["unknown_intent_count"] = 0
-
-        return result
+        return session.as_memory()
 
     except Exception as e:
         log.error(f"Error getting memory for user {user_id}: {e}", exc_info=True)
         return default_memory.copy()
 
 
-def update_memory(user_id: str, intent: str) -> None:
+def update_memory(
+    user_id: str,
+    intent: str,
+    business_id: Optional[int] = None,
+    channel: Optional[str] = None,
+) -> None:
     """
     Update conversation memory for a user.
 
@@ -91,12 +116,13 @@ def update_memory(user_id: str, intent: str) -> None:
     Args:
         user_id: Platform-specific user identifier
         intent: Detected intent string (e.g., "greeting", "pricing")
-        unknown_intent_count: Count of consecutive unknown intents (optional)
+        business_id: Business the conversation belongs to (with channel,
+            the memory is persisted to conversation_memory)
+        channel: Channel of the conversation (e.g. "telegram")
 
     Error Handling:
         - Handles None or invalid user_id
         - Handles None or invalid intent
-        - Resets corrupted memory entries
         - Never raises exceptions (logs errors instead)
     """
     try:
@@ -115,52 +141,19 @@ def update_memory(user_id: str, intent: str) -> None:
                 log.warning(f"Could not convert intent to string: {type(intent)}")
                 intent = "unknown"
 
-        # Initialize memory if needed
-        if user_id not in _memory_store:
-            _memory_store[user_id] = {
-                "last_intent": None,
-                "message_count": 0,
-                "unknown_intent_count": 0,
-            }
-
-        # Validate existing memory structure
-        if not isinstance(_memory_store[user_id], dict):
-            log.warning(f"Memory entry for user {user_id} is corrupted, resetting")
-            _memory_store[user_id] = {
-                "last_intent": None,
-                "message_count": 0,
-                "unknown_intent_count": 0,
-            }
-
-        # Update memory safely
-        _memory_store[user_id]["last_intent"] = intent
-        
-        # Safely increment message_count
-        current_count = _memory_store[user_id].get("message_count", 0)
-        if isinstance(current_count, (int, float)):
-            _memory_store[user_id]["message_count"] = int(current_count) + 1
-        else:
-            log.warning(f"Invalid message_count for user {user_id}, resetting to 1")
-            _memory_store[user_id]["message_count"] = 1
-
-        # Update unknown_intent_count based on intent
-        # If intent is "unknown", increment count; otherwise reset to 0
-        if intent == "unknown":
-            current_unknown = _memory_store[user_id].get("unknown_intent_count", 0)
-            if isinstance(current_unknown, (int, float)):
-                _memory_store[user_id]["unknown_intent_count"] = int(current_unknown) + 1
-            else:
-                _memory_store[user_id]["unknown_intent_count"] = 1
-        else:
-            # Reset unknown count when a known intent is detected
-            _memory_store[user_id]["unknown_intent_count"] = 0
+        # Sets last_intent and increments message_count; the unknown-intent
+        # streak (unknown_intent_count) is kept by track_unknown_intent()
+        get_session(session_key(user_id, business_id, channel)).record_intent(intent)
+
+        if business_id is not None and channel:
+            memory_writer.mark(business_id, user_id, channel)
 
     except Exception as e:
         log.error(f"Error updating memory for user {user_id}: {e}", exc_info=True)
         # Don't raise - memory update failures shouldn't crash the system
 
 
-def clear_memory(user_id: str) -> None:
+def clear_memory(user_id: str, business_id: Optional[int] = None, channel: Optional[str] = None) -> None:
     """
     Clear conversation memory for a user.
 
@@ -168,9 +161,10 @@ def clear_memory(user_id: str) -> None:
 
     Args:
         user_id: Platform-specific user identifier
+        business_id: Business the conversation belongs to
+        channel: Channel of the conversation
     """
-    if user_id in _memory_store:
-        del _memory_store[user_id]
+    drop_session(session_key(user_id, business_id, channel))
 
 
 def get_all_memory() -> Dict[str, Dict[str, any]]:
@@ -178,7 +172,235 @@ def get_all_memory() -> Dict[str, Dict[str, any]]:
     Get all conversation memory (for debugging/admin purposes).
 
     Returns:
-        Dictionary of all user memories
+        Dictionary of all user memories, keyed by user_session.session_key()
     """
-    return _memory_store.copy()
+    return {
+        key: session.as_memory()
+        for key, session in all_sessions().items()
+        if session.message_count
+    }
+
 
+
+class MemoryWriteBuffer:
+    """
+    Write-behind persistence of conversation memory to conversation_memory.
+
+    - Dirty records are coalesced per (business_id, user_id, channel), so a
+      user sending many messages between flushes costs one row
+    - A flush writes every dirty record with one INSERT ... ON CONFLICT DO
+      UPDATE per memory_flush_batch_size rows (normally one statement),
+      reading the session as it is at flush time
+    - A row is only overwritten by a newer one (updated_at), so a worker
+      flushing late cannot roll back what another worker wrote
+    - Failed flushes keep the records dirty and retry on the next one
+    - stop() flushes everything still pending (graceful shutdown)
+    """
+
+    def __init__(self, enabled: bool, flush_interval: float, batch_size: int, load_timeout: float):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, batch_size)
+        self.load_timeout = load_timeout
+
+        self._dirty: Dict[MemoryKey, datetime] = {}  # key -> time of the last update
+        self._flush_now: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+        self._load_retry_at = 0.0
+
+        self._flushed = metrics.counter("memory_flushed_rows")
+        self._flush_errors = metrics.counter("memory_flush_errors")
+        self._loads_hit = metrics.counter("memory_loads", result="hit")
+        self._loads_miss = metrics.counter("memory_loads", result="miss")
+        self._loads_error = metrics.counter("memory_loads", result="error")
+        self._flush_latency = metrics.histogram("memory_flush_ms")
+        self._load_latency = metrics.histogram("memory_load_ms")
+        metrics.register_gauge("memory_dirty", lambda: len(self._dirty))
+
+    def mark(self, business_id: int, user_id: str, channel: str) -> None:
+        """Record that a user's memory changed (written with the next flush)."""
+        if not self.enabled:
+            return
+        self._dirty[(business_id, user_id, channel)] = datetime.utcnow()
+        if len(self._dirty) >= self.batch_size and self._flush_now is not None:
+            self._flush_now.set()
+
+    def start(self) -> None:
+        """Start the background flusher (must be called from the running event loop)."""
+        if self._running or not self.enabled:
+            return
+        self._flush_now = asyncio.Event()
+        self._running = True
+        self._task = asyncio.create_task(self._flush_loop(), name="memory-flusher")
+        log.info(f"memory_writer_started interval={self.flush_interval}s batch_size={self.batch_size}")
+
+    async def stop(self) -> None:
+        """Stop the flusher and write everything still pending."""
+        if not self._running:
+            return
+        self._running = False
+        self._flush_now.set()
+        await self._task
+        log.info("memory_writer_stopped")
+
+    async def _flush_loop(self) -> None:
+        while self._running:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush()
+        await self.flush()
+
+    def _take_rows(self) -> List[Dict[str, object]]:
+        rows = []
+        for (business_id, user_id, channel), updated_at in self._dirty.items():
+            session = peek_session(session_key(user_id, business_id, channel))
+            if session is None or not session.message_count:
+                continue  # Evicted or cleared since it was marked
+            rows.append({
+                "business_id": business_id,
+                "user_id": user_id,
+                "channel": channel,
+                "last_intent": session.last_intent,
+                "message_count": session.message_count,
+                "context_data": json.dumps({"unknown_intent_count": session.unknown_streak}),
+                "updated_at": updated_at,
+            })
+        self._dirty.clear()
+        return rows
+
+    async def flush(self) -> None:
+        """Upsert all dirty records (one statement per batch_size rows)."""
+        if not self._dirty:
+            return
+        rows = self._take_rows()
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            started = time.monotonic()
+            try:
+                await asyncio.to_thread(_upsert_memory, batch)
+                self._flushed.inc(len(batch))
+                log.debug(f"memory_flushed count={len(batch)}")
+            except Exception as e:
+                self._flush_errors.inc()
+                for row in batch:
+                    # Retried with the next flush unless updated again meanwhile
+                    self._dirty.setdefault((row["business_id"], row["user_id"], row["channel"]), row["updated_at"])
+                log.error(f"memory_flush_error count={len(batch)} error={type(e).__name__} message={str(e)}")
+            finally:
+                self._flush_latency.observe((time.monotonic() - started) * 1000)
+
+    async def load(self, user_id: str, business_id: Optional[int], channel: Optional[str]) -> bool:
+        """
+        Restore a user's memory for a business from conversation_memory if
+        this worker has none.
+
+        Args:
+            user_id: Platform-specific user identifier
+            business_id: Business the conversation belongs to
+            channel: Channel of the conversation
+
+        Returns:
+            True if memory was restored. Never raises; on errors or timeouts
+            the user starts with fresh memory.
+        """
+        if (
+            not self.enabled
+            or business_id is None
+            or not channel
+            or not user_id
+            or not isinstance(user_id, str)
+        ):
+            return False
+        key = session_key(user_id, business_id, channel)
+        if peek_session(key) is not None:
+            return False
+        if time.monotonic() < self._load_retry_at:
+            return False
+
+        started = time.monotonic()
+        try:
+            row = await asyncio.wait_for(
+                asyncio.to_thread(_select_memory, business_id, user_id, channel), timeout=self.load_timeout
+            )
+        except Exception as e:
+            self._loads_error.inc()
+            self._load_retry_at = time.monotonic() + LOAD_RETRY_SECONDS
+            log.warning(
+                f"memory_load_failed user_id={user_id} business_id={business_id} "
+                f"error={type(e).__name__} action=fresh_memory"
+            )
+            return False
+        finally:
+            self._load_latency.observe((time.monotonic() - started) * 1000)
+
+        if row is None:
+            self._loads_miss.inc()
+            return False
+        # Another message may have created the session while we waited
+        if peek_session(key) is not None:
+            return False
+        last_intent, message_count, context_data = row
+        try:
+            context = json.loads(context_data) if context_data else {}
+        except ValueError:
+            context = {}
+        replace_session(key, UserSession.from_memory({
+            "last_intent": last_intent,
+            "message_count": message_count,
+            "unknown_intent_count": context.get("unknown_intent_count", 0) if isinstance(context, dict) else 0,
+        }))
+        self._loads_hit.inc()
+        return True
+
+
+def _upsert_memory(rows: List[Dict[str, object]]) -> None:
+    """Write rows with a single multi-row INSERT ... ON CONFLICT DO UPDATE."""
+    statement = pg_insert(ConversationMemory).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=["business_id", "user_id", "channel"],
+        set_={
+            "last_intent": statement.excluded.last_intent,
+            "message_count": statement.excluded.message_count,
+            "context_data": statement.excluded.context_data,
+            "updated_at": statement.excluded.updated_at,
+        },
+        where=ConversationMemory.updated_at <= statement.excluded.updated_at,
+    )
+    with get_db_context() as db:
+        db.execute(statement)
+        # get_db_context() automatically commits on success
+
+
+def _select_memory(business_id: int, user_id: str, channel: str) -> Optional[Tuple[Optional[str], int, Optional[str]]]:
+    """(last_intent, message_count, context_data) of a stored memory, or None."""
+    with get_db_context() as db:
+        row = db.execute(
+            select(
+                ConversationMemory.last_intent,
+                ConversationMemory.message_count,
+                ConversationMemory.context_data,
+            ).where(
+                ConversationMemory.business_id == business_id,
+                ConversationMemory.user_id == user_id,
+                ConversationMemory.channel == channel,
+            )
+        ).first()
+        return tuple(row) if row is not None else None
+
+
+async def load_memory(user_id: str, business_id: Optional[int], channel: Optional[str]) -> bool:
+    """Restore a user's persisted memory on a cold miss (see MemoryWriteBuffer.load)."""
+    return await memory_writer.load(user_id, business_id, channel)
+
+
+# Process-wide memory persistence (started/stopped by the app lifespan)
+memory_writer = MemoryWriteBuffer(
+    enabled=settings.memory_persistence_enabled,
+    flush_interval=settings.memory_flush_interval,
+    batch_size=settings.memory_flush_batch_size,
+    load_timeout=settings.memory_load_timeout,
+)
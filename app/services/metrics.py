@@ -0,0 +1,147 @@
+"""Lightweight in-process metrics for runtime diagnostics.
+
+This module provides a tiny metrics registry with:
+- Counters (monotonic totals, e.g. messages sent)
+- Gauges (callables sampled on read, e.g. queue depth)
+- Histograms (fixed-bucket latency distributions with percentile estimates)
+
+Metrics are per-process and exposed through /api/diagnostics/metrics.
+There is no external dependency; recording a value is a dict lookup and
+a couple of integer operations.
+"""
+import bisect
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# Default latency buckets in milliseconds (upper bounds)
+DEFAULT_BUCKETS_MS: Tuple[float, ...] = (
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000,
+)
+
+# Buckets for in-process steps that usually take microseconds
+FINE_BUCKETS_MS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 1000,
+)
+
+
+def _metric_key(name: str, labels: Dict[str, object]) -> str:
+    """Build a stable key like name{a=1,b=x} for a metric and its labels."""
+    if not labels:
+        return name
+    label_str = ",".join(f"{k}={labels[k]}" for k in sorted(labels))
+    return f"{name}{{{label_str}}}"
+
+
+class Counter:
+    """Monotonic counter."""
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        """Increase the counter."""
+        self.value += amount
+
+
+class Histogram:
+    """Fixed-bucket histogram for latency-style measurements (milliseconds)."""
+
+    __slots__ = ("bounds", "counts", "count", "total", "max")
+
+    def __init__(self, bounds: Tuple[float, ...] = DEFAULT_BUCKETS_MS) -> None:
+        self.bounds = bounds
+        self.counts: List[int] = [0] * (len(bounds) + 1)  # Last bucket is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record one measurement."""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        Estimate a percentile from the buckets.
+
+        Returns the upper bound of the bucket containing the q-th
+        measurement, capped at the observed max.
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict[str, object]:
+        """Summary suitable for JSON output."""
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 3) if self.count else None,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": round(self.max, 3),
+        }
+
+
+# Registries: {metric_key: metric}
+_counters: Dict[str, Counter] = {}
+_histograms: Dict[str, Histogram] = {}
+_gauges: Dict[str, Callable[[], object]] = {}
+
+
+def counter(name: str, **labels) -> Counter:
+    """Get or create a counter."""
+    key = _metric_key(name, labels)
+    metric = _counters.get(key)
+    if metric is None:
+        metric = _counters[key] = Counter()
+    return metric
+
+
+def histogram(name: str, bounds: Tuple[float, ...] = DEFAULT_BUCKETS_MS, **labels) -> Histogram:
+    """Get or create a histogram (bounds only apply when it is created)."""
+    key = _metric_key(name, labels)
+    metric = _histograms.get(key)
+    if metric is None:
+        metric = _histograms[key] = Histogram(bounds)
+    return metric
+
+
+def register_gauge(name: str, fn: Callable[[], object], **labels) -> None:
+    """Register a gauge whose value is sampled by calling fn on read."""
+    _gauges[_metric_key(name, labels)] = fn
+
+
+def snapshot() -> Dict[str, Dict[str, object]]:
+    """
+    Read all metrics.
+
+    Returns:
+        {"counters": {...}, "gauges": {...}, "histograms": {...}}
+    """
+    gauges = {}
+    for key, fn in _gauges.items():
+        try:
+            gauges[key] = fn()
+        except Exception as e:
+            log.debug(f"gauge_read_failed gauge={key} error={type(e).__name__}")
+            gauges[key] = None
+
+    return {
+        "counters": {key: metric.value for key, metric in _counters.items()},
+        "gauges": gauges,
+        "histograms": {key: metric.snapshot() for key, metric in _histograms.items()},
+    }
@@ -0,0 +1,166 @@
+"""Per-stage latency of the ai_brain message pipeline.
+
+ai_brain.process_message runs a fixed sequence of stages (spam check,
+length check, ..., knowledge lookup, intent detection, memory update) and
+returns from whichever one decides the reply. PipelineTiming records:
+- ai_stage_ms{stage=...}: duration of every stage that ran
+- ai_pipeline_ms{path=...}: total duration per decision path (spam,
+  knowledge_base, rule_based, ...)
+- The tail: for messages at or above the p99 of recent totals, the
+  time spent in each stage, so /api/diagnostics/pipeline can show which
+  stage dominates slow messages, plus the most recent slow breakdowns
+
+A trace is a list of (stage, ms) appended by mark(), each stage measured
+from the previous mark, and folded into the histograms once the message
+is done. With PIPELINE_TIMING_ENABLED=false, start() returns a shared
+no-op trace and the pipeline only pays for a few empty method calls.
+"""
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, List, Tuple
+
+from app.config import settings
+from app.services import metrics
+
+log = logging.getLogger(__name__)
+
+# The p99 threshold of the tail is recomputed every this many messages, exactly,
+# over the totals of the last TAIL_WINDOW messages
+TAIL_REFRESH_EVERY = 256
+TAIL_WINDOW = 2048
+SLOW_SAMPLES = 20  # Recent slow breakdowns kept for diagnostics
+
+
+class Trace:
+    """Stage durations of one message."""
+
+    __slots__ = ("_timing", "_started", "_last", "stages", "path")
+
+    def __init__(self, timing: "PipelineTiming"):
+        self._timing = timing
+        self._started = self._last = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+        self.path = "fallback"
+
+    def mark(self, stage: str) -> None:
+        """Close a stage: everything since the previous mark is attributed to it."""
+        now = time.perf_counter()
+        self.stages.append((stage, (now - self._last) * 1000))
+        self._last = now
+
+    def decide(self, path: str) -> None:
+        """Record which decision path produced the reply."""
+        self.path = path
+
+    def finish(self) -> None:
+        """Record the trace (call once, when the reply is ready)."""
+        self._timing._record(self, (time.perf_counter() - self._started) * 1000)
+
+
+class _NullTrace:
+    """Trace used when timing is disabled."""
+
+    __slots__ = ()
+
+    def mark(self, stage: str) -> None:
+        pass
+
+    def decide(self, path: str) -> None:
+        pass
+
+    def finish(self) -> None:
+        pass
+
+
+_NULL_TRACE = _NullTrace()
+
+
+class PipelineTiming:
+    """Histograms of ai_brain stage and end-to-end latency."""
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self._stage_ms: Dict[str, metrics.Histogram] = {}
+        self._path_ms: Dict[str, metrics.Histogram] = {}
+        self._total_ms = metrics.histogram("ai_pipeline_ms", bounds=metrics.FINE_BUCKETS_MS, path="all")
+
+        self._tail_threshold = float("inf")  # No tail until the first estimate
+        self._recent_totals: Deque[float] = deque(maxlen=TAIL_WINDOW)
+        self._tail_messages = 0
+        self._tail_stage_ms: Dict[str, float] = {}
+        self._tail_total_ms = 0.0
+        self._slow: Deque[dict] = deque(maxlen=SLOW_SAMPLES)
+
+    def start(self):
+        """
+        Start timing one message.
+
+        Returns:
+            A Trace, or a no-op trace when timing is disabled
+        """
+        return Trace(self) if self.enabled else _NULL_TRACE
+
+    def _record(self, trace: Trace, total_ms: float) -> None:
+        for stage, ms in trace.stages:
+            histogram = self._stage_ms.get(stage)
+            if histogram is None:
+                histogram = self._stage_ms[stage] = metrics.histogram(
+                    "ai_stage_ms", bounds=metrics.FINE_BUCKETS_MS, stage=stage
+                )
+            histogram.observe(ms)
+
+        path_histogram = self._path_ms.get(trace.path)
+        if path_histogram is None:
+            path_histogram = self._path_ms[trace.path] = metrics.histogram(
+                "ai_pipeline_ms", bounds=metrics.FINE_BUCKETS_MS, path=trace.path
+            )
+        path_histogram.observe(total_ms)
+        self._total_ms.observe(total_ms)
+
+        self._recent_totals.append(total_ms)
+        if self._total_ms.count % TAIL_REFRESH_EVERY == 0:
+            self._tail_threshold = _percentile(self._recent_totals, 0.99)
+        if total_ms >= self._tail_threshold:
+            self._tail_messages += 1
+            self._tail_total_ms += total_ms
+            for stage, ms in trace.stages:
+                self._tail_stage_ms[stage] = self._tail_stage_ms.get(stage, 0.0) + ms
+            self._slow.append({
+                "total_ms": round(total_ms, 3),
+                "path": trace.path,
+                "stages": {stage: round(ms, 3) for stage, ms in trace.stages},
+            })
+
+    def snapshot(self) -> dict:
+        """Stage and path latencies plus the p99 tail breakdown, for diagnostics."""
+        stage_total = sum(histogram.total for histogram in self._stage_ms.values()) or 1.0
+        tail_total = self._tail_total_ms or 1.0
+        return {
+            "enabled": self.enabled,
+            "total": self._total_ms.snapshot(),
+            "paths": {path: histogram.snapshot() for path, histogram in self._path_ms.items()},
+            "stages": {
+                stage: {**histogram.snapshot(), "share": round(histogram.total / stage_total, 4)}
+                for stage, histogram in self._stage_ms.items()
+            },
+            "p99_tail": {
+                "threshold_ms": self._tail_threshold if self._tail_threshold != float("inf") else None,
+                "messages": self._tail_messages,
+                "stage_share": {
+                    stage: round(ms / tail_total, 4)
+                    for stage, ms in sorted(self._tail_stage_ms.items(), key=lambda item: -item[1])
+                },
+                "recent": list(self._slow),
+            },
+        }
+
+
+def _percentile(values: Deque[float], q: float) -> float:
+    """Exact q-th percentile (nearest rank) of a non-empty window."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+# Process-wide pipeline timing
+pipeline_timing = PipelineTiming(enabled=settings.pipeline_timing_enabled)
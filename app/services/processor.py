@@ -11,9 +11,11 @@ The AI layer (ai.generate_response) is responsible for all text generation.
 import logging
 
 from enum import Enum
+from typing import Optional
 
 from app.schemas import NormalizedMessage
 from app.services.ai_brain import process_message as ai_brain_process
+from app.services.keyword_matcher import keyword_rules
 
 log = logging.getLogger(__name__)
 
@@ -26,6 +28,14 @@ class MessageIntent(str, Enum):
     OTHER = "other"
 
 
+# Keywords per intent, greetings first (whole words)
+MESSAGE_INTENT_KEYWORDS = {
+    MessageIntent.GREETING.value: ["hi", "hello", "hey", "greetings", "good morning", "good afternoon", "good evening"],
+    MessageIntent.PRICING.value: ["price", "prices", "cost", "costs", "pricing", "how much", "fee", "fees", "charge", "subscription", "plan", "plans"],
+}
+keyword_rules.add_group("message_intent", MESSAGE_INTENT_KEYWORDS)
+
+
 def detect_intent(message: NormalizedMessage) -> MessageIntent:
     """
     Detect the intent of a normalized message.
@@ -39,17 +49,10 @@ def detect_intent(message: NormalizedMessage) -> MessageIntent:
     Returns:
         MessageIntent enum value (greeting, pricing, or other)
     """
-    message_lower = message.message_text.lower().strip()
-
-    # Check for greetings
-    greeting_keywords = ["hi", "hello", "hey", "greetings", "good morning", "good afternoon", "good evening"]
-    if any(keyword in message_lower for keyword in greeting_keywords):
-        return MessageIntent.GREETING
-
-    # Check for pricing-related queries
-    pricing_keywords = ["price", "cost", "pricing", "how much", "fee", "charge", "subscription", "plan"]
-    if any(keyword in message_lower for keyword in pricing_keywords):
-        return MessageIntent.PRICING
+    # Greetings take precedence over pricing
+    label = keyword_rules.first(message.message_text, "message_intent")
+    if label:
+        return MessageIntent(label)
 
     # Default to other
     return MessageIntent.OTHER
@@ -178,7 +181,7 @@ async def generate_ai_response(message: NormalizedMessage, intent: MessageIntent
         return _get_fallback_response()
 
 
-async def process_message(message: NormalizedMessage) -> str:
+async def process_message(message: NormalizedMessage, business_id: Optional[int] = None) -> str:
     """
     Process a normalized message and return a text response.
 
@@ -204,6 +207,7 @@ async def process_message(message: NormalizedMessage) -> str:
 
     Args:
         message: Normalized message from any platform (Telegram, WhatsApp, Instagram)
+        business_id: Business the message belongs to (selects its knowledge base)
 
     Returns:
         Text response generated by the AI brain (never from processor)
@@ -224,7 +228,7 @@ async def process_message(message: NormalizedMessage) -> str:
     # Delegate to rule-based AI brain
     # AI brain handles all response generation
     try:
-        response = await ai_brain_process(message)
+        response = await ai_brain_process(message, business_id)
         
         # Validate response is not empty/None
         if not response or not isinstance(response, str) or not response.strip():
@@ -0,0 +1,207 @@
+"""Minimal pipelined client for Redis-protocol (RESP2) servers.
+
+Only what the shared state backend needs, without a Redis dependency:
+- One TCP connection per client, opened lazily (TLS for rediss://, then
+  AUTH/SELECT from the URL)
+- pipeline() writes a batch of commands in one write and waits for their
+  replies: one network round trip however many commands it carries
+- Any number of callers can pipeline concurrently on the same connection;
+  the server answers in order, so a reader task resolves the waiting
+  futures first-in first-out
+- A broken connection fails every pending command with ConnectionError and
+  is reopened by the next call
+
+URL format: redis[s]://[[username]:password@]host[:port][/db]
+"""
+import asyncio
+import logging
+import ssl
+from collections import deque
+from typing import Any, Deque, List, Optional, Sequence
+from urllib.parse import unquote, urlparse
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PORT = 6379
+SCHEMES = ("redis", "rediss")  # rediss = TLS
+
+
+class RespError(Exception):
+    """Error reply from the server (e.g. WRONGTYPE, unknown command)."""
+
+
+def encode_command(args: Sequence[Any]) -> bytes:
+    """Encode one command as a RESP array of bulk strings."""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, (bytes, bytearray, memoryview)):
+            data = bytes(arg)
+        elif isinstance(arg, str):
+            data = arg.encode("utf-8")
+        else:
+            data = str(arg).encode("ascii")
+        parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    """
+    Read one RESP reply.
+
+    Returns:
+        str (simple string), int, bytes or None (bulk string), list (array),
+        or a RespError instance for error replies
+
+    Raises:
+        ConnectionError: on EOF or a malformed reply
+    """
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("connection closed by server")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode("utf-8")
+    if kind == b"-":
+        return RespError(payload.decode("utf-8", "replace"))
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        length = int(payload)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise ConnectionError(f"unexpected RESP reply type {kind!r}")
+
+
+class RespClient:
+    """Pipelining Redis-protocol client over a single connection."""
+
+    def __init__(self, url: str, timeout: float = 1.0):
+        """
+        Args:
+            url: redis[s]://[[username]:password@]host[:port][/db]
+            timeout: Seconds to connect, and to wait for a pipeline's replies
+
+        Raises:
+            ValueError: if the URL scheme is not redis or rediss
+        """
+        parsed = urlparse(url)
+        if parsed.scheme not in SCHEMES:
+            raise ValueError(f"unsupported Redis URL scheme {parsed.scheme!r} (expected redis:// or rediss://)")
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or DEFAULT_PORT
+        self.tls = parsed.scheme == "rediss"
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Deque[asyncio.Future] = deque()
+        self._connect_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self) -> None:
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None:
+                return
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(
+                    self.host, self.port, ssl=ssl.create_default_context() if self.tls else None
+                ),
+                timeout=self.timeout,
+            )
+            self._reader_task = asyncio.create_task(self._read_loop(self._reader), name="resp-reader")
+            setup = []
+            if self.password and self.username:
+                setup.append(("AUTH", self.username, self.password))  # ACL user (Redis 6+)
+            elif self.password:
+                setup.append(("AUTH", self.password))
+            if self.db:
+                setup.append(("SELECT", self.db))
+            if setup:
+                await self._wait(self._send(setup))
+            log.info(f"resp_connected host={self.host} port={self.port} db={self.db} tls={self.tls}")
+
+    def _send(self, commands: Sequence[Sequence[Any]]) -> List[asyncio.Future]:
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in commands]
+        self._pending.extend(futures)
+        self._writer.write(b"".join(encode_command(command) for command in commands))
+        return futures
+
+    async def _wait(self, futures: List[asyncio.Future]) -> List[Any]:
+        return await asyncio.wait_for(asyncio.gather(*futures), timeout=self.timeout)
+
+    async def pipeline(self, commands: Sequence[Sequence[Any]]) -> List[Any]:
+        """
+        Send commands in one write and return their replies, in order.
+
+        Raises:
+            RespError: if any command got an error reply
+            ConnectionError / asyncio.TimeoutError: if the server is unreachable
+        """
+        if not commands:
+            return []
+        if self._writer is None:
+            await self._connect()
+        futures = self._send(commands)
+        await self._writer.drain()
+        return await self._wait(futures)
+
+    async def execute(self, *command: Any) -> Any:
+        """Send one command and return its reply."""
+        return (await self.pipeline([command]))[0]
+
+    async def _read_loop(self, reader: asyncio.StreamReader) -> None:
+        error: Exception = ConnectionError("connection closed")
+        try:
+            while True:
+                reply = await read_reply(reader)
+                future = self._pending.popleft()
+                if future.done():
+                    continue  # Caller timed out; the reply is discarded
+                if isinstance(reply, RespError):
+                    future.set_exception(reply)
+                else:
+                    future.set_result(reply)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = e if isinstance(e, ConnectionError) else ConnectionError(f"{type(e).__name__}: {e}")
+            log.warning(f"resp_connection_lost host={self.host} port={self.port} error={type(e).__name__}")
+        finally:
+            self._reset(error)
+
+    def _reset(self, error: Exception) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+    async def close(self) -> None:
+        """Close the connection (pending commands fail)."""
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._reader_task = None
+        self._reset(ConnectionError("client closed"))
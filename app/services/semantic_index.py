@@ -0,0 +1,188 @@
+"""Hashed character n-gram similarity search (optional, needs NumPy).
+
+BM25 only matches whole (plural-folded) words, so paraphrases and word
+forms it has never seen ("monthly" vs "month", "costing", typos) score
+nothing. SemanticIndex embeds each entry as a hashed bag of character
+n-grams - no model, no GPU, no network:
+- Every word contributes its boundary-padded character 3-grams ("<co",
+  "cos", "ost", "st>"), hashed (crc32) into SEMANTIC_DIM buckets; stopwords
+  passed to the index ("what", "your", "there") contribute nothing, so
+  filler words cannot make unrelated texts look alike
+- Buckets are IDF-weighted and each vector is L2-normalized, so the score
+  of a query against an entry is their cosine similarity
+- All vectors of an index live in one contiguous column-compressed
+  (CSC) matrix: for every bucket, the entries that use it and their
+  weights. A query is scored with one sparse matrix-vector product
+  (np.bincount over the postings of the query's own buckets) and the
+  top k of the touched entries are picked with np.argpartition
+- On large indexes, buckets shared by more than a tenth of the entries
+  (mostly n-grams of filler words) are left out of the query; they carry
+  almost no IDF weight
+
+Compared with a dense (entries x dims) float32 matrix, the product only
+reads the entries sharing an n-gram with the query rather than the whole
+matrix, which keeps 50k-entry lookups well under a millisecond on one
+core. Without NumPy, available() is False and callers skip this stage.
+"""
+import logging
+import math
+import re
+import zlib
+from typing import AbstractSet, Dict, Iterable, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # Optional; without it the semantic stage is skipped
+    np = None
+
+log = logging.getLogger(__name__)
+
+SEMANTIC_DIM = 1 << 18  # Hash buckets (collisions are rare at this size)
+NGRAM_SIZE = 3
+
+# On indexes with at least PRUNE_MIN_ENTRIES entries, query buckets used by
+# more than this fraction of the entries are skipped
+PRUNE_MIN_ENTRIES = 1000
+PRUNE_FRACTION = 0.1
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def available() -> bool:
+    """True if NumPy is installed."""
+    return np is not None
+
+
+def features(text: str, stopwords: AbstractSet[str] = frozenset()) -> Dict[int, float]:
+    """
+    Hashed character n-gram counts of a text.
+
+    Args:
+        text: Any text
+        stopwords: Lowercase words to leave out
+
+    Returns:
+        {bucket: count}
+    """
+    counts: Dict[int, float] = {}
+    for word in _WORD_RE.findall(text.lower()):
+        if word in stopwords:
+            continue
+        padded = f"<{word}>"
+        for start in range(len(padded) - NGRAM_SIZE + 1):
+            gram = padded[start:start + NGRAM_SIZE]
+            bucket = zlib.crc32(gram.encode("utf-8")) & (SEMANTIC_DIM - 1)
+            counts[bucket] = counts.get(bucket, 0.0) + 1.0
+    return counts
+
+
+class SemanticIndex:
+    """Immutable cosine-similarity index over hashed n-gram vectors."""
+
+    def __init__(self, texts: Iterable[str], stopwords: AbstractSet[str] = frozenset()):
+        """
+        Build the index.
+
+        Args:
+            texts: One text per entry (e.g. question + keywords); the
+                position of a text is its entry id in search results
+            stopwords: Words ignored in entries and queries
+
+        Raises:
+            RuntimeError: if NumPy is not installed
+        """
+        if np is None:
+            raise RuntimeError("SemanticIndex requires numpy")
+
+        self._stopwords = stopwords
+        vectors = [features(text or "", stopwords) for text in texts]
+        self.size = len(vectors)
+        df: Dict[int, int] = {}
+        for vector in vectors:
+            for bucket in vector:
+                df[bucket] = df.get(bucket, 0) + 1
+        self._idf = {bucket: math.log((1 + self.size) / (1 + count)) + 1.0 for bucket, count in df.items()}
+
+        # Weighted, normalized (bucket, entry, weight) triples, then grouped
+        # by bucket into the CSC arrays
+        flat_buckets: List[int] = []
+        flat_rows: List[int] = []
+        flat_values: List[float] = []
+        for entry_id, vector in enumerate(vectors):
+            weighted = {bucket: (1 + math.log(count)) * self._idf[bucket] for bucket, count in vector.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weighted.values())) or 1.0
+            for bucket, weight in weighted.items():
+                flat_buckets.append(bucket)
+                flat_rows.append(entry_id)
+                flat_values.append(weight / norm)
+
+        bucket_array = np.array(flat_buckets, dtype=np.int64)
+        order = np.argsort(bucket_array, kind="stable")
+        buckets, counts = np.unique(bucket_array, return_counts=True)
+        self._columns: Dict[int, int] = {int(bucket): position for position, bucket in enumerate(buckets)}
+        self._indptr = np.zeros(len(buckets) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self._indptr[1:])
+        self._rows = np.array(flat_rows, dtype=np.int32)[order]
+        self._values = np.array(flat_values, dtype=np.float32)[order]
+        self._prune_above = (
+            int(self.size * PRUNE_FRACTION) if self.size >= PRUNE_MIN_ENTRIES else self.size + 1
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the matrix arrays."""
+        return int(self._indptr.nbytes + self._rows.nbytes + self._values.nbytes)
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[int, float]]:
+        """
+        Entries most similar to a query.
+
+        Args:
+            query: User message
+            top_k: Max results
+
+        Returns:
+            [(entry_id, cosine similarity)], best first; entries sharing
+            nothing with the query are omitted
+        """
+        if not self.size or not query:
+            return []
+        weighted = {}
+        unseen_idf = math.log(1 + self.size) + 1.0
+        norm = 0.0
+        for bucket, count in features(query, self._stopwords).items():
+            position = self._columns.get(bucket)
+            weight = (1 + math.log(count)) * (self._idf[bucket] if position is not None else unseen_idf)
+            norm += weight * weight
+            if position is not None:
+                weighted[position] = weight
+        if not weighted:
+            return []
+        norm = math.sqrt(norm)
+
+        row_parts, value_parts = [], []
+        indptr = self._indptr
+        for position, weight in weighted.items():
+            start, end = indptr[position], indptr[position + 1]
+            if end - start > self._prune_above:
+                continue
+            row_parts.append(self._rows[start:end])
+            value_parts.append(self._values[start:end] * (weight / norm))
+        if not row_parts:
+            return []
+        scores = np.bincount(
+            np.concatenate(row_parts),
+            weights=np.concatenate(value_parts),
+            minlength=self.size,
+        )
+
+        # Select among the entries the product touched; argpartition over
+        # the full, mostly-zero score vector degrades on all those ties
+        touched = np.flatnonzero(scores > 0)
+        touched_scores = scores[touched]
+        if top_k < len(touched):
+            best = np.argpartition(touched_scores, -top_k)[-top_k:]
+        else:
+            best = np.arange(len(touched))
+        best = best[np.argsort(-touched_scores[best])]
+        return [(int(touched[position]), float(touched_scores[position])) for position in best]
@@ -0,0 +1,307 @@
+"""Shared per-user session state across workers.
+
+UserSessions (conversation memory, spam window, unknown-intent streak) live
+in each worker's memory, so with several uvicorn workers a user's state
+depended on which process served the message. STATE_BACKEND selects where
+sessions are shared:
+- memory (default): nothing is shared; every call below is a no-op
+- postgres: the user_sessions table (UserSessionState)
+- redis: any Redis-protocol server (see resp; benchmarks.fake_redis is a
+  local stand-in)
+
+SharedSessions keeps the local sessions in step with the backend at a cost
+of one network round trip per message:
+- refresh(user_id), awaited before the spam check, loads the user's
+  session and, in the same round trip, writes every session changed on
+  this worker since the last exchange (a Redis pipeline, or one Postgres
+  statement with the upsert as a CTE)
+- touch(user_id) after the reply marks the session dirty; an idle worker
+  flushes dirty sessions every STATE_FLUSH_INTERVAL seconds in one batch
+
+Sessions are stored under their user_session.session_key(), so a user has
+one shared record per business and channel.
+
+A user's accepted messages are at least SPAM_THRESHOLD_SECONDS (2s) apart,
+so with a flush interval well below that the next worker to see the user
+reads what the previous one wrote. Messages racing in the same instant on
+two workers are last-writer-wins. Backend errors and timeouts fail open:
+the worker carries on with its local session and retries the writes.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Set
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.config import settings
+from app.database import get_db_context
+from app.models import UserSessionState
+from app.services import metrics
+from app.services.resp import RespClient
+from app.services.user_session import UserSession, peek_session, replace_session
+
+log = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = "wycly:session:"
+
+# Delete expired user_sessions rows once every this many Postgres flushes
+POSTGRES_CLEANUP_EVERY = 1000
+
+# Flush early once this many sessions are dirty
+FLUSH_BATCH_SIZE = 500
+
+
+class StateBackend:
+    """
+    Where sessions are shared. The base class shares nothing (one process).
+
+    Backends exchange serialized sessions ({user_id: UserSession.to_bytes()}).
+    """
+
+    name = "memory"
+    shared = False
+
+    async def exchange(self, user_id: Optional[str], writes: Dict[str, bytes]) -> Optional[bytes]:
+        """
+        Write sessions and load one, in a single round trip.
+
+        Args:
+            user_id: Session to load (None = write only)
+            writes: Sessions to store
+
+        Returns:
+            The stored record of user_id as it was before these writes, or
+            None if there is none (or user_id is None)
+        """
+        return None
+
+    async def close(self) -> None:
+        pass
+
+
+class PostgresStateBackend(StateBackend):
+    """Sessions in the user_sessions table."""
+
+    name = "postgres"
+    shared = True
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._flushes = 0
+
+    def _exchange(self, user_id: Optional[str], writes: Dict[str, bytes]) -> Optional[bytes]:
+        now = datetime.utcnow()
+        upsert = None
+        if writes:
+            upsert = pg_insert(UserSessionState).values(
+                [{"user_id": key, "data": data, "updated_at": now} for key, data in writes.items()]
+            )
+            upsert = upsert.on_conflict_do_update(
+                index_elements=["user_id"],
+                set_={"data": upsert.excluded.data, "updated_at": upsert.excluded.updated_at},
+            )
+
+        with get_db_context() as db:
+            if user_id is None:
+                db.execute(upsert)
+                self._flushes += 1
+                if self._flushes % POSTGRES_CLEANUP_EVERY == 0:
+                    cutoff = now - timedelta(seconds=self.ttl_seconds)
+                    db.execute(delete(UserSessionState).where(UserSessionState.updated_at < cutoff))
+                return None
+
+            query = select(UserSessionState.data).where(
+                UserSessionState.user_id == user_id,
+                UserSessionState.updated_at >= now - timedelta(seconds=self.ttl_seconds),
+            )
+            if upsert is not None:
+                # One statement: the SELECT reads the snapshot before the upsert
+                query = query.add_cte(upsert.returning(UserSessionState.user_id).cte("saved"))
+            return db.execute(query).scalar()
+
+    async def exchange(self, user_id: Optional[str], writes: Dict[str, bytes]) -> Optional[bytes]:
+        if user_id is None and not writes:
+            return None
+        return await asyncio.to_thread(self._exchange, user_id, writes)
+
+
+class RedisStateBackend(StateBackend):
+    """Sessions as Redis strings with an idle TTL (PX), exchanged in one pipeline."""
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str, ttl_seconds: float, timeout: float):
+        self.ttl_ms = int(ttl_seconds * 1000)
+        self._client = RespClient(url, timeout=timeout)
+
+    async def exchange(self, user_id: Optional[str], writes: Dict[str, bytes]) -> Optional[bytes]:
+        commands = []
+        if user_id is not None:
+            commands.append(("GET", REDIS_KEY_PREFIX + user_id))
+        commands.extend(("SET", REDIS_KEY_PREFIX + key, data, "PX", self.ttl_ms) for key, data in writes.items())
+        if not commands:
+            return None
+        replies = await self._client.pipeline(commands)
+        return replies[0] if user_id is not None else None
+
+    async def close(self) -> None:
+        await self._client.close()
+
+
+class SharedSessions:
+    """Keeps this worker's UserSessions in step with a StateBackend."""
+
+    def __init__(self, backend: StateBackend, flush_interval: float, timeout: float):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self._dirty: Set[str] = set()
+        self._flush_now: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+
+        self._round_trips = metrics.counter("state_backend_round_trips", backend=backend.name)
+        self._load_errors = metrics.counter("state_backend_errors", backend=backend.name, op="load")
+        self._flush_errors = metrics.counter("state_backend_errors", backend=backend.name, op="flush")
+        self._written = metrics.counter("state_backend_written", backend=backend.name)
+        self._load_ms = metrics.histogram("state_backend_ms", backend=backend.name, op="load")
+        self._flush_ms = metrics.histogram("state_backend_ms", backend=backend.name, op="flush")
+        metrics.register_gauge("state_backend_dirty", lambda: len(self._dirty), backend=backend.name)
+
+    @property
+    def shared(self) -> bool:
+        return self.backend.shared
+
+    def _take_writes(self) -> Dict[str, bytes]:
+        writes = {}
+        for user_id in self._dirty:
+            session = peek_session(user_id)
+            if session is not None:
+                writes[user_id] = session.to_bytes()
+        self._dirty.clear()
+        return writes
+
+    async def _exchange(self, user_id: Optional[str], writes: Dict[str, bytes]) -> Optional[bytes]:
+        self._round_trips.inc()
+        return await asyncio.wait_for(self.backend.exchange(user_id, writes), timeout=self.timeout)
+
+    async def refresh(self, user_id: str) -> None:
+        """
+        Bring a user's local session up to date before processing a message
+        (and write this worker's pending sessions along the way).
+
+        One round trip; never raises.
+        """
+        if not self.backend.shared or not user_id or not isinstance(user_id, str):
+            return
+        writes = self._take_writes()
+        started = time.monotonic()
+        try:
+            data = await self._exchange(user_id, writes)
+        except Exception as e:
+            self._load_errors.inc()
+            self._dirty.update(writes)  # Retried with the next exchange
+            log.warning(
+                f"state_load_failed backend={self.backend.name} user_id={user_id} "
+                f"error={type(e).__name__} action=using_local_session"
+            )
+            return
+        finally:
+            self._load_ms.observe((time.monotonic() - started) * 1000)
+        self._written.inc(len(writes))
+
+        # A session this worker just wrote is at least as new as the stored one;
+        # no stored session (new user, expired) keeps whatever is local
+        if data is None or user_id in writes:
+            return
+        try:
+            replace_session(user_id, UserSession.from_bytes(data))
+        except Exception as e:
+            log.warning(f"state_record_invalid backend={self.backend.name} user_id={user_id} error={type(e).__name__}")
+
+    def touch(self, user_id: Optional[str]) -> None:
+        """Mark a user's session as changed (written with the next exchange)."""
+        if not self.backend.shared or not user_id or not isinstance(user_id, str):
+            return
+        self._dirty.add(user_id)
+        if len(self._dirty) >= FLUSH_BATCH_SIZE and self._flush_now is not None:
+            self._flush_now.set()
+
+    async def flush(self) -> None:
+        """Write all dirty sessions in one round trip."""
+        if not self._dirty:
+            return
+        writes = self._take_writes()
+        if not writes:
+            return
+        started = time.monotonic()
+        try:
+            await self._exchange(None, writes)
+            self._written.inc(len(writes))
+        except Exception as e:
+            self._flush_errors.inc()
+            self._dirty.update(writes)
+            log.warning(
+                f"state_flush_failed backend={self.backend.name} count={len(writes)} error={type(e).__name__}"
+            )
+        finally:
+            self._flush_ms.observe((time.monotonic() - started) * 1000)
+
+    def start(self) -> None:
+        """Start the background flusher (no-op for the in-process backend)."""
+        if self._running or not self.backend.shared:
+            return
+        self._flush_now = asyncio.Event()
+        self._running = True
+        self._task = asyncio.create_task(self._flush_loop(), name="session-flusher")
+        log.info(f"shared_sessions_started backend={self.backend.name} interval={self.flush_interval}s")
+
+    async def stop(self) -> None:
+        """Flush what is pending and close the backend."""
+        if not self._running:
+            return
+        self._running = False
+        self._flush_now.set()
+        await self._task
+        await self.backend.close()
+        log.info(f"shared_sessions_stopped backend={self.backend.name}")
+
+    async def _flush_loop(self) -> None:
+        while self._running:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush()
+        await self.flush()
+
+
+def build_backend(name: str) -> StateBackend:
+    """
+    Backend for a STATE_BACKEND value (unknown values fall back to memory).
+    """
+    name = (name or "memory").strip().lower()
+    if name == "postgres":
+        return PostgresStateBackend(ttl_seconds=settings.user_state_idle_ttl_seconds)
+    if name == "redis":
+        return RedisStateBackend(
+            settings.redis_url,
+            ttl_seconds=settings.user_state_idle_ttl_seconds,
+            timeout=settings.state_backend_timeout,
+        )
+    if name != "memory":
+        log.warning(f"state_backend_unknown name={name} action=using_memory")
+    return StateBackend()
+
+
+# Process-wide session sharing
+shared_sessions = SharedSessions(
+    build_backend(settings.state_backend),
+    flush_interval=settings.state_flush_interval,
+    timeout=settings.state_backend_timeout,
+)
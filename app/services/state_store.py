@@ -0,0 +1,149 @@
+"""Bounded per-user state for long-running workers.
+
+Conversation memory, spam timestamps and unknown-intent streaks used to live
+in plain dicts with one entry per user ever seen, so a worker's memory grew
+for as long as it ran. BoundedStateStore is a drop-in dict replacement that
+stays bounded:
+- Idle TTL: an entry not read or written for idle_ttl_seconds is gone
+  (checked on access, so an expired entry is never returned)
+- LRU: beyond max_entries, the least recently used entry is evicted
+- Sweeping: at most every sweep_interval seconds, a write also drops expired
+  entries from the cold end of the LRU order; since that order is access
+  order the sweep stops at the first live entry, so it costs O(expired)
+
+Sizes are exposed as state_store_entries{store=...} and evictions as
+state_store_evictions{store=...,reason=lru|ttl}. Like the dicts it replaces,
+a store is per process and meant to be used from the event loop.
+"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterator, MutableMapping, Optional
+
+from app.services import metrics
+
+log = logging.getLogger(__name__)
+
+DEFAULT_SWEEP_INTERVAL = 60.0  # Seconds
+
+_MISSING = object()
+
+
+class BoundedStateStore(MutableMapping):
+    """Dict with idle-TTL expiry and LRU eviction."""
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int,
+        idle_ttl_seconds: float,
+        sweep_interval: float = DEFAULT_SWEEP_INTERVAL,
+    ):
+        """
+        Args:
+            name: Label of the store in metrics
+            max_entries: LRU bound (at least 1)
+            idle_ttl_seconds: Entries unused for longer than this expire
+            sweep_interval: Min seconds between sweeps of expired entries
+        """
+        self.name = name
+        self.max_entries = max(1, max_entries)
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.sweep_interval = sweep_interval
+        # key -> [value, last used (monotonic)], least recently used first
+        self._entries: "OrderedDict[Hashable, list]" = OrderedDict()
+        self._last_sweep = time.monotonic()
+
+        self._lru_evictions = metrics.counter("state_store_evictions", store=name, reason="lru")
+        self._ttl_evictions = metrics.counter("state_store_evictions", store=name, reason="ttl")
+        metrics.register_gauge("state_store_entries", lambda: len(self._entries), store=name)
+
+    def _live(self, key: Hashable, now: float) -> Optional[list]:
+        """The entry for key if it has not expired (expired entries are dropped)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if now - entry[1] > self.idle_ttl_seconds:
+            del self._entries[key]
+            self._ttl_evictions.inc()
+            return None
+        return entry
+
+    def __getitem__(self, key: Hashable) -> Any:
+        entry = self.get(key, _MISSING)
+        if entry is _MISSING:
+            raise KeyError(key)
+        return entry
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry[0] = value
+            entry[1] = now
+            self._entries.move_to_end(key)
+        else:
+            self._entries[key] = [value, now]
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._lru_evictions.inc()
+        if now - self._last_sweep >= self.sweep_interval:
+            self.sweep(now)
+
+    def __delitem__(self, key: Hashable) -> None:
+        del self._entries[key]
+
+    def __contains__(self, key: object) -> bool:
+        return self._live(key, time.monotonic()) is not None
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        now = time.monotonic()
+        if now - entry[1] > self.idle_ttl_seconds:
+            del self._entries[key]
+            self._ttl_evictions.inc()
+            return default
+        entry[1] = now
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def copy(self) -> Dict[Hashable, Any]:
+        """Plain dict of the live entries (does not refresh them)."""
+        now = time.monotonic()
+        return {
+            key: entry[0]
+            for key, entry in list(self._entries.items())
+            if now - entry[1] <= self.idle_ttl_seconds
+        }
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """
+        Drop expired entries.
+
+        Returns:
+            Number of entries dropped
+        """
+        now = time.monotonic() if now is None else now
+        self._last_sweep = now
+        dropped = 0
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry[1] <= self.idle_ttl_seconds:
+                break
+            del self._entries[key]
+            dropped += 1
+        if dropped:
+            self._ttl_evictions.inc(dropped)
+            log.debug(f"state_store_swept store={self.name} dropped={dropped} remaining={len(self._entries)}")
+        return dropped
@@ -1,14 +1,77 @@
 """Telegram Bot API service for sending messages and normalizing Telegram data."""
 import logging
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Optional
+from typing import Awaitable, Callable, Optional
 
 import httpx
 
+from app.config import settings
 from app.schemas import MessageChannel, NormalizedMessage, TelegramUpdate
+from app.services.bot_health import bot_health
+from app.services.telegram_outbox import OutboundMessage, outbox
 
 log = logging.getLogger(__name__)
 
+# Application-scoped HTTP client shared by every Telegram call site.
+# Created by the FastAPI lifespan handler and closed on shutdown, so
+# connections to api.telegram.org are reused instead of re-handshaking
+# TCP+TLS for every message.
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _build_http_client() -> httpx.AsyncClient:
+    """Create the pooled client from settings."""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.telegram_http_max_connections,
+            max_keepalive_connections=settings.telegram_http_max_keepalive,
+            keepalive_expiry=settings.telegram_http_keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(
+            settings.telegram_http_timeout,
+            connect=settings.telegram_http_connect_timeout,
+        ),
+    )
+
+
+def start_http_client() -> httpx.AsyncClient:
+    """
+    Create the shared Telegram HTTP client (called on application startup).
+
+    Returns:
+        The shared AsyncClient
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = _build_http_client()
+        log.info(
+            f"telegram_http_client_started max_connections={settings.telegram_http_max_connections} "
+            f"max_keepalive={settings.telegram_http_max_keepalive}"
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the shared Telegram HTTP client (called on application shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+        log.info("telegram_http_client_closed")
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared Telegram HTTP client.
+
+    Falls back to creating it lazily when used outside the app lifespan
+    (scripts, one-off tasks).
+    """
+    if _http_client is None or _http_client.is_closed:
+        return start_http_client()
+    return _http_client
+
 
 def normalize_telegram_message(update: TelegramUpdate) -> Optional[NormalizedMessage]:
     """
@@ -161,61 +224,177 @@ def normalize_telegram_message(update: TelegramUpdate) -> Optional[NormalizedMes
         return None
 
 
+def _retry_after(error_detail) -> float:
+    """Seconds to wait from a 429 response body (parameters.retry_after), default 1."""
+    if isinstance(error_detail, dict):
+        parameters = error_detail.get("parameters")
+        if isinstance(parameters, dict):
+            retry_after = parameters.get("retry_after")
+            if isinstance(retry_after, (int, float)) and retry_after > 0:
+                return float(retry_after)
+    return 1.0
+
+
+@dataclass(frozen=True)
+class SendResult:
+    """Outcome of one send attempt."""
+
+    sent: bool
+    # monotonic time the bot's 429 park ends, when the message may be retried then
+    retry_at: Optional[float] = None
+
+
 class TelegramService:
     """Service for interacting with Telegram Bot API."""
 
-    BASE_URL = "https://api.telegram.org"
-
     def __init__(self, bot_token: str):
         """Initialize Telegram service with bot token."""
         self.bot_token = bot_token
-        self.api_url = f"{self.BASE_URL}/bot{bot_token}"
+        self.api_url = f"{settings.telegram_api_base_url.rstrip('/')}/bot{bot_token}"
+
+    async def request(
+        self,
+        method: str,
+        payload: Optional[dict] = None,
+        timeout: Optional[float] = None,
+    ) -> httpx.Response:
+        """
+        Call a Bot API method through the shared connection pool.
 
-    async def send_message(self, chat_id: int, text: str) -> bool:
+        The response is returned as-is; callers decide how to handle
+        non-2xx statuses (e.g. via response.raise_for_status()).
+
+        Args:
+            method: Bot API method name (e.g. "getMe", "setWebhook")
+            payload: Optional JSON parameters for the method
+            timeout: Optional read timeout override (e.g. for getUpdates long polls)
+
+        Returns:
+            Raw httpx response
         """
-        Send a text message to a Telegram chat.
+        client = get_http_client()
+        request_timeout = httpx.USE_CLIENT_DEFAULT
+        if timeout is not None:
+            request_timeout = httpx.Timeout(timeout, connect=settings.telegram_http_connect_timeout)
+        return await client.post(f"{self.api_url}/{method}", json=payload or {}, timeout=request_timeout)
+
+    async def try_send_message(self, chat_id: int, text: str) -> SendResult:
+        """
+        Make one attempt to send a text message to a Telegram chat; never waits.
+
+        Delivery health is tracked per bot (see bot_health): sends fail fast
+        while the bot's circuit breaker is open or the chat has blocked the
+        bot. While the bot is parked by a 429 nothing is sent and the result
+        carries the park's end, so the caller can reschedule the message
+        (the outbox does) instead of sleeping.
 
         Args:
             chat_id: Telegram chat ID to send message to
             text: Message text to send
 
         Returns:
-            True if message sent successfully, False otherwise
+            SendResult: sent, or not sent with retry_at set if the message
+            may be retried once the bot's park ends
         """
-        url = f"{self.api_url}/sendMessage"
+        if bot_health.is_chat_blocked(self.bot_token, chat_id):
+            log.debug(f"telegram_send_skipped chat_id={chat_id} reason=blocked_chat")
+            return SendResult(False)
+
+        parked_until = bot_health.parked_until(self.bot_token)
+        if parked_until:
+            return SendResult(False, retry_at=parked_until)
+        if not bot_health.allow(self.bot_token):
+            log.debug(f"telegram_send_skipped chat_id={chat_id} reason=breaker_open")
+            return SendResult(False)
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    url,
-                    json={
-                        "chat_id": chat_id,
-                        "text": text,
-                    },
-                    timeout=10.0,
-                )
-                response.raise_for_status()
-                return True
-        except httpx.HTTPStatusError as e:
-            error_detail = ""
-            try:
-                error_detail = e.response.json()
-            except:
-                error_detail = e.response.text if hasattr(e.response, 'text') else str(e)
-            
-            log.error(
-                f"HTTP error sending message to chat_id {chat_id}: {e.response.status_code} - {error_detail}"
+            response = await self.request(
+                "sendMessage",
+                {
+                    "chat_id": chat_id,
+                    "text": text,
+                },
             )
-            # Log specific error codes
-            if e.response.status_code == 401:
-                log.error("Bot token is invalid or unauthorized. Check the bot token in your channel integration.")
-            elif e.response.status_code == 403:
-                log.error("Bot is blocked by user or doesn't have permission to send messages.")
-            elif e.response.status_code == 400:
-                log.error(f"Bad request: {error_detail}")
-            return False
+        except httpx.HTTPError as e:
+            bot_health.record_failure(self.bot_token, type(e).__name__)
+            log.error(f"Failed to send message to chat_id {chat_id}: {type(e).__name__}: {e}")
+            return SendResult(False)
         except Exception as e:
+            bot_health.release(self.bot_token)
             log.error(f"Failed to send message to chat_id {chat_id}: {type(e).__name__}: {e}", exc_info=True)
-            return False
+            return SendResult(False)
+
+        if response.is_success:
+            bot_health.record_success(self.bot_token)
+            return SendResult(True)
+
+        status_code = response.status_code
+        try:
+            error_detail = response.json()
+        except ValueError:
+            error_detail = response.text
+
+        if status_code == 429:
+            retry_after = _retry_after(error_detail)
+            bot_health.park(self.bot_token, retry_after)
+            if retry_after <= settings.telegram_max_retry_after:
+                return SendResult(False, retry_at=bot_health.parked_until(self.bot_token))
+            log.error(f"Rate limited sending message to chat_id {chat_id}: retry_after={retry_after}, giving up")
+            return SendResult(False)
+
+        log.error(f"HTTP error sending message to chat_id {chat_id}: {status_code} - {error_detail}")
+        # Log specific error codes
+        if status_code == 401:
+            bot_health.record_failure(self.bot_token, "401")
+            log.error("Bot token is invalid or unauthorized. Check the bot token in your channel integration.")
+        elif status_code == 403:
+            bot_health.release(self.bot_token)
+            bot_health.block_chat(self.bot_token, chat_id)
+            log.error("Bot is blocked by user or doesn't have permission to send messages.")
+        elif status_code >= 500:
+            bot_health.record_failure(self.bot_token, str(status_code))
+        else:
+            bot_health.release(self.bot_token)
+            if status_code == 400:
+                log.error(f"Bad request: {error_detail}")
+        return SendResult(False)
+
+    async def send_message(self, chat_id: int, text: str) -> bool:
+        """
+        Send a text message to a Telegram chat (one attempt, see try_send_message).
+
+        A bot parked by a 429 is not waited for: the send fails and the
+        caller decides whether to retry later.
+
+        Args:
+            chat_id: Telegram chat ID to send message to
+            text: Message text to send
+
+        Returns:
+            True if message sent successfully, False otherwise
+        """
+        return (await self.try_send_message(chat_id, text)).sent
+
+    def enqueue_message(
+        self,
+        chat_id: int,
+        text: str,
+        on_sent: Optional[Callable[[bool], Awaitable[None]]] = None,
+    ) -> bool:
+        """
+        Queue a text message for asynchronous delivery.
 
+        The outbox preserves per-chat ordering and applies Telegram's
+        per-bot and per-chat rate limits.
 
+        Args:
+            chat_id: Telegram chat ID to send message to
+            text: Message text to send
+            on_sent: Optional coroutine called with the delivery result
+
+        Returns:
+            True if queued, False if the caller should send directly instead
+        """
+        return outbox.enqueue(
+            OutboundMessage(bot_token=self.bot_token, chat_id=chat_id, text=text, on_sent=on_sent)
+        )
@@ -0,0 +1,424 @@
+"""Asynchronous outbound queue for Telegram replies.
+
+The webhook enqueues replies here and acknowledges Telegram immediately,
+instead of waiting for the sendMessage round-trip and the database save.
+
+Design:
+- A fixed pool of asyncio workers, each with its own queue
+- Every (bot, chat) pair is pinned to one worker, so replies to the same
+  chat are delivered in the order they were enqueued
+- Token buckets enforce Telegram's limits: ~30 msg/s per bot overall and
+  ~1 msg/s per chat (with a small burst)
+- Workers never sleep on a bucket: a chat whose next message has no token
+  yet is put on the worker's delay heap (ordered by the time its token will
+  be free), later messages of that chat queue behind it, and the worker
+  moves on to other chats and bots. Chats that only wait for their bot's
+  bucket queue per bot, so each freed bot token wakes exactly one chat
+- A bot parked by a 429 (bot_health) is treated like an empty bot bucket
+  until the park ends; a send answered with 429 goes back to the head of
+  its chat and is retried then (up to TELEGRAM_SEND_MAX_RETRIES times)
+- Messages a worker holds back count against its queue size, so a parked
+  bot fills the queue and enqueue() refuses instead of growing without bound
+- Queue depth, queue wait and send latency are exported as metrics
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+import zlib
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.logging_context import get_request_id, set_request_id
+from app.services import metrics
+from app.services.bot_health import bot_health
+
+log = logging.getLogger(__name__)
+
+# Max per-chat buckets kept in memory; evicted chats simply start with a full bucket
+MAX_CHAT_BUCKETS = 50000
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter for a single event loop.
+
+    reserve() takes a token immediately and returns how long the caller
+    must wait before using it, so concurrent callers are spaced out fairly
+    without a lock.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Consume one token and return the delay (seconds) before it is valid."""
+        self._refill()
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def available_in(self) -> float:
+        """Seconds until a token is free (0.0 = now); nothing is consumed."""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        """Consume one token (after available_in() returned 0)."""
+        self.tokens -= 1
+
+    async def acquire(self) -> None:
+        """Wait until a token is available."""
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+@dataclass
+class OutboundMessage:
+    """A reply waiting to be delivered."""
+
+    bot_token: str
+    chat_id: int
+    text: str
+    # Called with the delivery result once the send has been attempted
+    on_sent: Optional[Callable[[bool], Awaitable[None]]] = None
+    request_id: Optional[str] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+    retries: int = 0  # Sends answered with 429 so far
+
+
+class TelegramOutbox:
+    """Worker pool that drains outbound replies under Telegram's rate limits."""
+
+    def __init__(
+        self,
+        workers: int,
+        max_queue: int,
+        bot_rate: float,
+        bot_burst: int,
+        chat_rate: float,
+        chat_burst: int,
+    ):
+        self.worker_count = max(1, workers)
+        self.queue_size = max(1, max_queue // self.worker_count)
+        self.bot_rate = bot_rate
+        self.bot_burst = bot_burst
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._callbacks: set = set()  # Keep references to running on_sent tasks
+        self._held: List[int] = [0] * self.worker_count  # Per worker, messages held for rate limits
+        self._bot_buckets: Dict[str, TokenBucket] = {}
+        self._chat_buckets: "OrderedDict[tuple, TokenBucket]" = OrderedDict()
+        self._running = False
+
+        self._latency = metrics.histogram("telegram_send_latency_ms")
+        self._wait = metrics.histogram("telegram_outbox_wait_ms")
+        self._sent = metrics.counter("telegram_outbox_sent")
+        self._failed = metrics.counter("telegram_outbox_failed")
+        self._rejected = metrics.counter("telegram_outbox_rejected")
+        self._deferred = metrics.counter("telegram_outbox_deferred")
+        self._retried = metrics.counter("telegram_outbox_retried")
+        metrics.register_gauge("telegram_outbox_depth", self.depth)
+
+    @property
+    def running(self) -> bool:
+        """True while workers are accepting messages."""
+        return self._running
+
+    def depth(self) -> int:
+        """Total number of messages waiting across all workers."""
+        return sum(queue.qsize() for queue in self._queues) + sum(self._held)
+
+    def start(self) -> None:
+        """Start the worker pool (must be called from the running event loop)."""
+        if self._running:
+            return
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(self.worker_count)]
+        self._tasks = [
+            asyncio.create_task(self._worker(index, queue), name=f"telegram-outbox-{index}")
+            for index, queue in enumerate(self._queues)
+        ]
+        self._running = True
+        log.info(f"telegram_outbox_started workers={self.worker_count} queue_size={self.queue_size}")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        Stop accepting messages and drain what is already queued.
+
+        Args:
+            timeout: Max seconds to wait for queued messages to be sent
+        """
+        if not self._running:
+            return
+        self._running = False
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._queues)),
+                timeout=timeout,
+            )
+        except asyncio.TimeoutError:
+            log.warning(f"telegram_outbox_drain_timeout pending={self.depth()}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._callbacks:
+            await asyncio.gather(*self._callbacks, return_exceptions=True)
+        self._tasks = []
+        log.info("telegram_outbox_stopped")
+
+    def enqueue(self, message: OutboundMessage) -> bool:
+        """
+        Queue a message for delivery.
+
+        Returns:
+            True if queued, False if the outbox is not running or the
+            chat's worker is full (queued plus held-back messages reach
+            the queue size; callers should send directly)
+        """
+        if not self._running:
+            return False
+        if message.request_id is None:
+            message.request_id = get_request_id()
+        shard = zlib.crc32(f"{message.bot_token}:{message.chat_id}".encode("utf-8")) % self.worker_count
+        queue = self._queues[shard]
+        if queue.qsize() + self._held[shard] < self.queue_size:
+            queue.put_nowait(message)
+            return True
+        self._rejected.inc()
+        log.warning(f"telegram_outbox_full chat_id={message.chat_id} worker={shard}")
+        return False
+
+    def bot_bucket(self, bot_token: str) -> TokenBucket:
+        """
+        Per-bot rate limiter shared by everything sending as this bot.
+
+        Other senders (e.g. broadcasts) acquire from it too, so replies and
+        bulk sends together stay under Telegram's per-bot limit.
+        """
+        bucket = self._bot_buckets.get(bot_token)
+        if bucket is None:
+            bucket = self._bot_buckets[bot_token] = TokenBucket(self.bot_rate, self.bot_burst)
+        return bucket
+
+    def _chat_bucket(self, bot_token: str, chat_id: int) -> TokenBucket:
+        key = (bot_token, chat_id)
+        bucket = self._chat_buckets.get(key)
+        if bucket is None:
+            bucket = self._chat_buckets[key] = TokenBucket(self.chat_rate, self.chat_burst)
+            if len(self._chat_buckets) > MAX_CHAT_BUCKETS:
+                self._chat_buckets.popitem(last=False)
+        else:
+            self._chat_buckets.move_to_end(key)
+        return bucket
+
+    async def _worker(self, index: int, queue: asyncio.Queue) -> None:
+        """Deliver messages from one queue, in order per chat, without sleeping on rate limits."""
+        # Imported here to avoid a circular import (telegram.py exposes the outbox)
+        from app.services.telegram import TelegramService
+
+        state = _WorkerState()
+        while True:
+            key = None
+            if state.timers and state.timers[0][0] <= time.monotonic():
+                _, _, chat_key, bot_token = heapq.heappop(state.timers)
+                if bot_token is not None:
+                    key = self._next_for_bot(state, bot_token)
+                elif self._route(state, chat_key):
+                    key = chat_key
+            else:
+                timeout = max(0.0, state.timers[0][0] - time.monotonic()) if state.timers else None
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    continue
+                chat_key = (message.bot_token, message.chat_id)
+                self._held[index] += 1
+                lane = state.lanes.get(chat_key)
+                if lane is not None:
+                    lane.append(message)  # Behind an earlier message of this chat
+                    continue
+                state.lanes[chat_key] = deque((message,))
+                if self._route(state, chat_key):
+                    key = chat_key
+            if key is None:
+                continue
+
+            lane = state.lanes[key]
+            message = lane.popleft()
+            self._held[index] -= 1
+            if lane:
+                state.schedule(0.0, chat_key=key)
+            else:
+                del state.lanes[key]
+            retry_at = None
+            try:
+                retry_at = await self._deliver(index, message, TelegramService)
+            finally:
+                if retry_at is None:
+                    queue.task_done()
+            if retry_at is not None:
+                # Back to the head of its chat; the bot's park holds it until retry_at
+                self._held[index] += 1
+                lane = state.lanes.get(key)
+                if lane is not None:
+                    lane.appendleft(message)  # The lane is already scheduled
+                else:
+                    state.lanes[key] = deque((message,))
+                    state.schedule(max(0.0, retry_at - time.monotonic()), chat_key=key)
+
+    def _route(self, state: "_WorkerState", key: Tuple[str, int]) -> bool:
+        """
+        Take the tokens for the head message of a chat, or schedule it.
+
+        Returns:
+            True if the tokens were taken and the message can be sent now
+        """
+        bot_token = key[0]
+        chat_bucket = self._chat_bucket(bot_token, key[1])
+        delay = chat_bucket.available_in()
+        if delay > 0:
+            self._deferred.inc()
+            state.schedule(delay, chat_key=key)
+            return False
+
+        waiting = state.bot_waiting.get(bot_token)
+        if waiting is not None:
+            # Chats already waiting on this bot go first
+            self._deferred.inc()
+            waiting.append(key)
+            return False
+        delay = self._bot_delay(bot_token)
+        if delay > 0:
+            self._deferred.inc()
+            state.bot_waiting[bot_token] = deque((key,))
+            state.schedule(delay, bot_token=bot_token)
+            return False
+
+        chat_bucket.take()
+        self.bot_bucket(bot_token).take()
+        return True
+
+    def _bot_delay(self, bot_token: str) -> float:
+        """Seconds until the bot may send: its bucket, or its 429 park."""
+        delay = self.bot_bucket(bot_token).available_in()
+        parked_until = bot_health.parked_until(bot_token)
+        if parked_until:
+            delay = max(delay, parked_until - time.monotonic())
+        return delay
+
+    def _next_for_bot(self, state: "_WorkerState", bot_token: str) -> Optional[Tuple[str, int]]:
+        """A bot's timer fired: release the first waiting chat if its token is free."""
+        waiting = state.bot_waiting[bot_token]
+        bucket = self.bot_bucket(bot_token)
+        delay = self._bot_delay(bot_token)
+        if delay > 0:
+            state.schedule(delay, bot_token=bot_token)  # Other senders took the token, or a 429 parked the bot
+            return None
+
+        key = waiting.popleft()
+        bucket.take()
+        self._chat_bucket(*key).take()  # Checked when the chat started waiting on the bot
+        if waiting:
+            state.schedule(bucket.available_in(), bot_token=bot_token)
+        else:
+            del state.bot_waiting[bot_token]
+        return key
+
+    async def _deliver(self, index: int, message: OutboundMessage, service_class) -> Optional[float]:
+        """
+        Send one message whose tokens have been taken, then run its callback.
+
+        Returns:
+            The time to retry at if the bot is parked by a 429 and the message
+            has retries left, else None (the message is finished)
+        """
+        try:
+            set_request_id(message.request_id)
+            started = time.monotonic()
+            result = await service_class(message.bot_token).try_send_message(message.chat_id, message.text)
+            self._latency.observe((time.monotonic() - started) * 1000)
+            if result.retry_at is not None and message.retries < settings.telegram_send_max_retries:
+                message.retries += 1
+                self._retried.inc()
+                return result.retry_at
+            self._wait.observe((started - message.enqueued_at) * 1000)
+            success = result.sent
+            (self._sent if success else self._failed).inc()
+
+            if message.on_sent is not None:
+                # Run callbacks (e.g. conversation save) off the delivery path
+                task = asyncio.create_task(self._run_callback(message, success))
+                self._callbacks.add(task)
+                task.add_done_callback(self._callbacks.discard)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._failed.inc()
+            log.error(f"telegram_outbox_error worker={index} chat_id={message.chat_id} error={type(e).__name__}", exc_info=True)
+        return None
+
+    async def _run_callback(self, message: OutboundMessage, success: bool) -> None:
+        set_request_id(message.request_id)
+        try:
+            await message.on_sent(success)
+        except Exception as e:
+            log.error(f"telegram_outbox_callback_error chat_id={message.chat_id} error={type(e).__name__}", exc_info=True)
+
+
+class _WorkerState:
+    """
+    Messages one outbox worker holds back for rate limits.
+
+    - lanes: per chat, its messages in order; the head is the next to send
+    - timers: heap of (ready time, seq, chat key, bot token); a chat timer
+      fires when the chat's bucket has a token, a bot timer when the bot's has
+    - bot_waiting: per bot, chats whose head message only waits for the bot
+      bucket, in arrival order, so each freed bot token wakes one chat
+    """
+
+    __slots__ = ("lanes", "timers", "bot_waiting", "sequence")
+
+    def __init__(self) -> None:
+        self.lanes: Dict[Tuple[str, int], Deque[OutboundMessage]] = {}
+        self.timers: List[Tuple[float, int, Optional[Tuple[str, int]], Optional[str]]] = []
+        self.bot_waiting: Dict[str, Deque[Tuple[str, int]]] = {}
+        self.sequence = itertools.count()
+
+    def schedule(
+        self,
+        delay: float,
+        chat_key: Optional[Tuple[str, int]] = None,
+        bot_token: Optional[str] = None,
+    ) -> None:
+        heapq.heappush(self.timers, (time.monotonic() + delay, next(self.sequence), chat_key, bot_token))
+
+
+# Process-wide outbox used by TelegramService.enqueue_message
+outbox = TelegramOutbox(
+    workers=settings.telegram_outbox_workers,
+    max_queue=settings.telegram_outbox_max_queue,
+    bot_rate=settings.telegram_bot_rate_limit,
+    bot_burst=settings.telegram_bot_rate_burst,
+    chat_rate=settings.telegram_chat_rate_limit,
+    chat_burst=settings.telegram_chat_rate_burst,
+)
@@ -0,0 +1,176 @@
+"""Fast-path parsing of Telegram updates.
+
+The webhook used to let FastAPI validate every request into the Pydantic
+TelegramUpdate model, then normalize_telegram_message re-walked it with
+isinstance checks and built a Pydantic NormalizedMessage. Neither model adds
+anything on this hot path: Telegram is a trusted sender (the secret token is
+checked first) and only a handful of fields are used.
+
+This module decodes the raw request body once (orjson when installed, the
+standard json module otherwise) and extracts just those fields into slotted
+structs:
+- ParsedUpdate: update_id, chat_id and the inbound message (if any)
+- InboundMessage: drop-in for NormalizedMessage in the processing pipeline
+  (channel, user_id, message_text, timestamp, language, metadata)
+
+Semantics match normalize_telegram_message: text messages only, 2000
+character truncation, user_id from "from" with chat.id as the fallback.
+Pydantic models stay at API boundaries (dashboard, test endpoints).
+"""
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.schemas import MessageChannel
+
+try:
+    import orjson
+except ImportError:  # Optional speed-up; the standard library decoder is used instead
+    orjson = None
+
+log = logging.getLogger(__name__)
+
+# Longer texts are truncated before processing (same limit as normalize_telegram_message)
+MAX_MESSAGE_LENGTH = 2000
+
+# Update fields that can carry a message, in priority order
+MESSAGE_FIELDS = ("message", "channel_post", "edited_message", "edited_channel_post")
+
+_TELEGRAM_CHANNEL = MessageChannel.TELEGRAM.value
+
+
+def loads(body: bytes) -> Any:
+    """Decode a JSON request body with the fastest available decoder."""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+class InboundMessage:
+    """Normalized inbound text message (lightweight NormalizedMessage equivalent)."""
+
+    __slots__ = ("channel", "user_id", "message_text", "timestamp", "language", "metadata")
+
+    def __init__(
+        self,
+        user_id: str,
+        message_text: str,
+        timestamp: datetime,
+        metadata: Dict[str, Any],
+        channel: str = _TELEGRAM_CHANNEL,
+        language: Optional[str] = None,
+    ):
+        self.channel = channel
+        self.user_id = user_id
+        self.message_text = message_text
+        self.timestamp = timestamp
+        self.language = language
+        self.metadata = metadata
+
+    def __repr__(self) -> str:
+        return f"InboundMessage(channel={self.channel!r}, user_id={self.user_id!r}, text_length={len(self.message_text)})"
+
+
+class ParsedUpdate:
+    """The parts of a Telegram update the pipeline uses."""
+
+    __slots__ = ("update_id", "chat_id", "message", "kind")
+
+    def __init__(self, update_id: int, chat_id: Optional[int], message: Optional[InboundMessage], kind: Optional[str]):
+        self.update_id = update_id
+        self.chat_id = chat_id  # Reply destination, known even for non-text messages
+        self.message = message  # None for updates without usable text
+        self.kind = kind  # Which update field carried the message ("message", "channel_post", ...)
+
+
+def update_from_dict(data: Any) -> Optional[ParsedUpdate]:
+    """
+    Extract a ParsedUpdate from a decoded update object.
+
+    Args:
+        data: Decoded JSON update (as POSTed to the webhook or returned by getUpdates)
+
+    Returns:
+        ParsedUpdate, or None if the payload is not a Telegram update
+    """
+    if type(data) is not dict:
+        return None
+    update_id = data.get("update_id")
+    if type(update_id) is not int:
+        return None
+
+    message_data = None
+    kind = None
+    for field in MESSAGE_FIELDS:
+        message_data = data.get(field)
+        if message_data:
+            kind = field
+            break
+    if type(message_data) is not dict:
+        return ParsedUpdate(update_id, None, None, None)
+
+    chat = message_data.get("chat")
+    if type(chat) is not dict:
+        chat = {}
+    chat_id = chat.get("id")
+    if type(chat_id) is not int:
+        chat_id = None
+
+    text = message_data.get("text")
+    if type(text) is not str:
+        # Non-text message (photo, sticker, ...)
+        return ParsedUpdate(update_id, chat_id, None, kind)
+    text = text.strip()
+    if not text:
+        return ParsedUpdate(update_id, chat_id, None, kind)
+    if len(text) > MAX_MESSAGE_LENGTH:
+        log.warning(f"message_too_long length={len(text)} max={MAX_MESSAGE_LENGTH}")
+        text = text[:MAX_MESSAGE_LENGTH] + "..."
+
+    # Channel posts have no "from"; fall back to the chat id
+    from_user = message_data.get("from")
+    user_id = from_user.get("id") if type(from_user) is dict else None
+    if user_id is None:
+        user_id = chat_id
+    if user_id is None:
+        log.warning("Could not extract user_id from update")
+        return ParsedUpdate(update_id, chat_id, None, kind)
+
+    date = message_data.get("date")
+    try:
+        timestamp = datetime.utcfromtimestamp(date) if type(date) in (int, float) and date else datetime.utcnow()
+    except (ValueError, OSError, OverflowError):
+        timestamp = datetime.utcnow()
+
+    metadata = {
+        "update_id": update_id,
+        "chat_id": chat_id,
+        "message_id": message_data.get("message_id"),
+        "chat_type": chat.get("type"),
+    }
+    reply_to = message_data.get("reply_to_message")
+    if type(reply_to) is dict:
+        metadata["reply_to_message_id"] = reply_to.get("message_id")
+    forward_from = message_data.get("forward_from")
+    if type(forward_from) is dict:
+        metadata["forward_from_id"] = forward_from.get("id")
+
+    return ParsedUpdate(update_id, chat_id, InboundMessage(str(user_id), text, timestamp, metadata), kind)
+
+
+def parse_update(body: bytes) -> Optional[ParsedUpdate]:
+    """
+    Parse a raw webhook request body.
+
+    Args:
+        body: Request body bytes
+
+    Returns:
+        ParsedUpdate, or None if the body is not valid JSON or not an update
+    """
+    try:
+        data = loads(body)
+    except ValueError:
+        return None
+    return update_from_dict(data)
@@ -0,0 +1,231 @@
+"""Long-polling (getUpdates) ingestion for Telegram bots.
+
+Alternative to webhooks for deployments without a public HTTPS URL
+(TELEGRAM_UPDATE_MODE=polling). Each connected bot gets one background
+task that:
+- Long-polls getUpdates with the last committed offset
+- Processes the batch through the same pipeline as webhooks
+  (telegram_updates.handle_update), chats concurrently and each chat's
+  updates in order
+- Commits the offset (max update_id + 1) only after the whole batch has
+  been processed, so a crash re-delivers the batch instead of losing it
+
+Telegram allows only one getUpdates consumer per bot, so polling mode
+must run in a single worker process.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+from app.config import settings
+from app.services import bot_registry, metrics
+from app.services.bot_registry import BotEntry
+from app.services.burst_coalescer import burst_coalescer
+from app.services.load_shedder import KNOWLEDGE_ONLY, REJECT, load_shedder
+from app.services.telegram import TelegramService
+from app.services.telegram_parser import ParsedUpdate, loads, update_from_dict
+from app.services.telegram_updates import handle_update
+
+log = logging.getLogger(__name__)
+
+# Update types the pipeline understands
+ALLOWED_UPDATES = ["message", "edited_message", "channel_post", "edited_channel_post"]
+
+# Backoff after failed polls (seconds)
+MIN_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+
+
+def polling_enabled() -> bool:
+    """True when updates are ingested by long polling instead of webhooks."""
+    return settings.telegram_update_mode.strip().lower() == "polling"
+
+
+class TelegramPoller:
+    """Runs one getUpdates loop per connected bot."""
+
+    def __init__(self, poll_timeout: int, limit: int, concurrency: int):
+        self.poll_timeout = poll_timeout
+        self.limit = limit
+        self.concurrency = max(1, concurrency)
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._offsets: Dict[int, int] = {}
+
+        self._batch_size = metrics.histogram("telegram_poll_batch_size")
+        self._batch_ms = metrics.histogram("telegram_poll_batch_ms")
+        self._updates = metrics.counter("telegram_poll_updates")
+        self._errors = metrics.counter("telegram_poll_errors")
+        metrics.register_gauge("telegram_pollers", lambda: len(self._tasks))
+
+    def start(self) -> int:
+        """
+        Start pollers for every bot in the index (called on application startup).
+
+        Returns:
+            Number of bots being polled
+        """
+        for bot in bot_registry.all_bots():
+            self.start_bot(bot)
+        log.info(f"telegram_poller_started bots={len(self._tasks)}")
+        return len(self._tasks)
+
+    def start_bot(self, bot: BotEntry) -> None:
+        """Start (or restart with the current token) the poller for one bot."""
+        self.stop_bot(bot.integration_id)
+        self._tasks[bot.integration_id] = asyncio.create_task(
+            self._poll_loop(bot.integration_id),
+            name=f"telegram-poller-{bot.integration_id}",
+        )
+
+    def stop_bot(self, integration_id: int) -> None:
+        """Stop polling one bot (e.g. after disconnect)."""
+        task = self._tasks.pop(integration_id, None)
+        if task is not None:
+            task.cancel()
+
+    async def stop(self) -> None:
+        """Cancel all pollers (called on application shutdown)."""
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        log.info("telegram_poller_stopped")
+
+    async def _poll_loop(self, integration_id: int) -> None:
+        """Fetch and process batches for one bot until cancelled or disconnected."""
+        backoff = MIN_BACKOFF
+        while True:
+            # Re-read the entry each round so token changes and disconnects apply
+            bot = bot_registry.get_bot(integration_id)
+            if bot is None:
+                log.info(f"telegram_poller_bot_removed integration_id={integration_id}")
+                self._tasks.pop(integration_id, None)
+                return
+
+            # Under overload, leave updates on Telegram's side until pressure drops
+            if load_shedder.stage() >= REJECT:
+                load_shedder.record(REJECT)
+                await asyncio.sleep(MIN_BACKOFF)
+                continue
+
+            try:
+                updates = await self._fetch(bot)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._errors.inc()
+                log.warning(
+                    f"telegram_poll_failed integration_id={integration_id} "
+                    f"error={type(e).__name__} retry_in={backoff}s"
+                )
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                continue
+
+            backoff = MIN_BACKOFF
+            if updates:
+                await self._process_batch(bot, updates)
+
+    async def _fetch(self, bot: BotEntry) -> List[dict]:
+        """Long-poll getUpdates from the last committed offset."""
+        payload = {
+            "timeout": self.poll_timeout,
+            "limit": self.limit,
+            "allowed_updates": ALLOWED_UPDATES,
+        }
+        offset = self._offsets.get(bot.integration_id)
+        if offset is not None:
+            payload["offset"] = offset
+
+        response = await TelegramService(bot.bot_token).request(
+            "getUpdates",
+            payload,
+            # The server holds the request for up to poll_timeout seconds
+            timeout=self.poll_timeout + settings.telegram_http_timeout,
+        )
+        if response.status_code == 409:
+            # A webhook is still set (bot connected in webhook mode), or another
+            # process is polling this bot; clear the webhook and retry after backoff
+            log.warning(f"telegram_poll_conflict integration_id={bot.integration_id} body={response.text[:200]}")
+            await delete_webhook(bot.bot_token)
+        response.raise_for_status()
+        return loads(response.content).get("result") or []
+
+    async def _process_batch(self, bot: BotEntry, raw_updates: List[dict]) -> None:
+        """
+        Process one getUpdates batch, then commit its offset.
+
+        Updates for the same chat are handled sequentially (replies keep their
+        order); different chats run concurrently up to the configured limit.
+        With coalescing enabled, a chat's consecutive text messages in the
+        batch are merged and answered once.
+        """
+        started = asyncio.get_running_loop().time()
+        by_chat: Dict[Optional[int], List[ParsedUpdate]] = defaultdict(list)
+        max_update_id = None
+        for raw in raw_updates:
+            update = update_from_dict(raw)
+            if update is None:
+                log.warning(f"telegram_poll_invalid_update integration_id={bot.integration_id}")
+                continue
+            if max_update_id is None or update.update_id > max_update_id:
+                max_update_id = update.update_id
+            by_chat[update.chat_id].append(update)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_chat(updates: List[ParsedUpdate]) -> None:
+            if burst_coalescer.enabled:
+                updates = burst_coalescer.coalesce_batch(updates)
+            async with semaphore:
+                for update in updates:
+                    try:
+                        # The batch was already coalesced; don't wait for more
+                        stage = min(load_shedder.stage(), KNOWLEDGE_ONLY)
+                        await handle_update(update, bot, coalesce=False, shed_stage=stage)
+                    except Exception as e:
+                        # handle_update never raises, but one bad update must not stall the bot
+                        log.error(
+                            f"telegram_poll_update_error integration_id={bot.integration_id} "
+                            f"update_id={update.update_id} error={type(e).__name__}",
+                            exc_info=True,
+                        )
+
+        await asyncio.gather(*(run_chat(updates) for updates in by_chat.values()))
+
+        if max_update_id is not None:
+            self._offsets[bot.integration_id] = max_update_id + 1
+        self._updates.inc(len(raw_updates))
+        self._batch_size.observe(len(raw_updates))
+        self._batch_ms.observe((asyncio.get_running_loop().time() - started) * 1000)
+        log.info(
+            f"telegram_poll_batch_processed integration_id={bot.integration_id} "
+            f"updates={len(raw_updates)} chats={len(by_chat)} next_offset={self._offsets.get(bot.integration_id)}"
+        )
+
+
+async def delete_webhook(bot_token: str) -> bool:
+    """
+    Remove a bot's webhook so getUpdates can be used (Telegram rejects both at once).
+
+    Returns:
+        True if Telegram confirmed the webhook was removed
+    """
+    try:
+        response = await TelegramService(bot_token).request("deleteWebhook")
+        response.raise_for_status()
+        return bool(response.json().get("ok"))
+    except httpx.HTTPError as e:
+        log.warning(f"telegram_delete_webhook_failed error={type(e).__name__}")
+        return False
+
+
+# Process-wide poller (only started when TELEGRAM_UPDATE_MODE=polling)
+telegram_poller = TelegramPoller(
+    poll_timeout=settings.telegram_poll_timeout,
+    limit=settings.telegram_poll_limit,
+    concurrency=settings.telegram_poll_concurrency,
+)
@@ -0,0 +1,404 @@
+"""Processing pipeline for incoming Telegram updates.
+
+Shared by both ingestion modes:
+- Webhooks (app/routes/telegram.py) hand each POSTed update to handle_update
+- Long polling (app/services/telegram_poller.py) feeds getUpdates batches through it
+
+Both parse updates with app/services/telegram_parser.py first, so the pipeline
+works on ParsedUpdate/InboundMessage rather than Pydantic models.
+"""
+import logging
+from typing import Optional
+
+from fastapi import BackgroundTasks
+
+from app.config import settings
+from app.logging_context import set_request_id
+from app.services import bot_registry
+from app.services.bot_health import bot_health
+from app.services.bot_registry import BotEntry
+from app.services.burst_coalescer import burst_coalescer
+from app.services.load_shedder import KNOWLEDGE_ONLY, NORMAL, SKIP_PERSIST, STAGE_NAMES, degraded_reply, load_shedder
+from app.services.processor import process_message
+from app.services.telegram import TelegramService
+from app.services.telegram_parser import ParsedUpdate
+from app.services.tenant_scheduler import tenant_scheduler
+from app.services.conversation_service import save_conversation_from_normalized
+from app.services.update_dedup import update_deduplicator
+
+log = logging.getLogger(__name__)
+
+# Safe default response - used if all else fails
+SAFE_DEFAULT_RESPONSE = "I'm here to help! How can I assist you today?"
+
+
+async def _send_reply(chat_id: int, text: str, bot: Optional[BotEntry]) -> Optional[BotEntry]:
+    """
+    Send a reply and return the bot that delivered it.
+
+    Updates arriving on a per-integration webhook already know their bot; the
+    reply goes through the outbox when it accepts it (rate limits, 429
+    rescheduling), else exactly one direct send is attempted, which fails
+    while the bot is parked by a 429. Updates on the legacy shared webhook fall
+    back to trying every indexed bot, most recently updated first; bots whose
+    circuit breaker is open are skipped without a request (see bot_health).
+
+    Args:
+        chat_id: Telegram chat ID to reply to
+        text: Reply text
+        bot: Bot resolved from the webhook URL (None for the legacy webhook)
+
+    Returns:
+        BotEntry that sent the message, or None if no bot could send it
+    """
+    if bot and TelegramService(bot.bot_token).enqueue_message(chat_id, text):
+        return bot
+
+    candidates = [bot] if bot else bot_registry.all_bots()
+
+    if not bot and len(candidates) > 1:
+        log.warning(
+            f"Multiple active Telegram integrations found ({len(candidates)}) for legacy webhook. "
+            f"This can cause non-deterministic business_id assignment. "
+            f"Integration IDs: {[c.integration_id for c in candidates]}, Business IDs: {[c.business_id for c in candidates]}"
+        )
+
+    for candidate in candidates:
+        try:
+            bot_service = TelegramService(candidate.bot_token)
+            if await bot_service.send_message(chat_id, text):
+                return candidate
+        except Exception as e:
+            log.debug(f"tried_bot_token integration_id={candidate.integration_id} error={type(e).__name__}")
+            continue
+    return None
+
+
+async def _save_conversation(normalized_message, reply_text: str, business_id: int) -> None:
+    """Save a conversation, logging the outcome (never raises)."""
+    try:
+        log.info(f"SAVING_CONVERSATION: user_id={normalized_message.user_id} business_id={business_id} channel={normalized_message.channel}")
+        save_success = await save_conversation_from_normalized(
+            normalized_message=normalized_message,
+            bot_reply=reply_text,
+            business_id=business_id,
+        )
+        if save_success:
+            log.info(f"✅ CONVERSATION_SAVED: user_id={normalized_message.user_id} business_id={business_id} channel={normalized_message.channel}")
+        else:
+            log.warning(f"❌ CONVERSATION_SAVE_FAILED: user_id={normalized_message.user_id} business_id={business_id} channel={normalized_message.channel}")
+    except Exception as e:
+        # save_conversation_from_normalized should never raise, but double-check
+        log.error(f"❌ CONVERSATION_SAVE_ERROR: user_id={normalized_message.user_id} business_id={business_id} error={type(e).__name__} message={str(e)}", exc_info=True)
+
+
+def _enqueue_reply(chat_id: int, text: str, bot: BotEntry, normalized_message, persist: bool = True) -> bool:
+    """
+    Queue a reply on the outbox; the conversation is saved after delivery.
+
+    The business is known from the bot, so the conversation is saved even
+    if the send itself fails (for debugging/analytics), unless persist is
+    False (load shedding).
+
+    Returns:
+        True if queued, False if the caller must send directly
+    """
+    async def on_sent(success: bool) -> None:
+        if success:
+            log.info(f"reply_sent chat_id={chat_id} user_id={normalized_message.user_id} business_id={bot.business_id} integration_id={bot.integration_id}")
+        else:
+            log.error(f"reply_send_failed chat_id={chat_id} user_id={normalized_message.user_id} integration_id={bot.integration_id}")
+        if persist:
+            await _save_conversation(normalized_message, text, bot.business_id)
+
+    return TelegramService(bot.bot_token).enqueue_message(chat_id, text, on_sent=on_sent)
+
+
+def _inline_reply(chat_id: int, text: str) -> dict:
+    """
+    Build a webhook response body that makes Telegram send the reply itself.
+
+    Telegram executes a Bot API method returned from a webhook, which saves
+    an entire outbound sendMessage request.
+    """
+    return {"method": "sendMessage", "chat_id": chat_id, "text": text}
+
+
+async def handle_update(
+    update: ParsedUpdate,
+    bot: Optional[BotEntry] = None,
+    background_tasks: Optional[BackgroundTasks] = None,
+    coalesce: bool = True,
+    shed_stage: int = NORMAL,
+) -> dict:
+    """
+    Normalize a Telegram update, generate a reply, send it and save the conversation.
+
+    Execution flow:
+    1. Receive a parsed Telegram update (webhook POST or getUpdates batch)
+    2. Take its platform-agnostic InboundMessage (normalized while parsing)
+    3. Pass normalized message to processor (AI Brain)
+    4. Use processor response as reply text
+    5. Return the reply inline (TELEGRAM_INLINE_REPLIES), queue it on the outbox
+       (known bot) or send it directly (legacy webhook)
+    6. Save conversation to database (non-blocking, error-safe)
+
+    All Telegram-specific logic is isolated to the parsing step.
+    After parsing, only the platform-agnostic message is used.
+
+    Important:
+    - Bot reply is sent BEFORE saving conversation
+    - Conversation saving is non-blocking and error-safe
+    - Telegram reply is sent even if database save fails
+    - ALWAYS returns a reply to the user, even on errors
+    - With TELEGRAM_COALESCE_WINDOW set (and coalesce=True), a chat's
+      rapid-fire messages are merged and answered once (burst_coalescer);
+      the update is acknowledged at once and answered in the background
+    - Steps 3-6 run in a per-business slot from tenant_scheduler, so one busy
+      business cannot starve the others
+    - Under overload (shed_stage from load_shedder) the conversation is not
+      saved, and from KNOWLEDGE_ONLY the reply comes from the knowledge base only
+    - Re-deliveries are skipped per bot (update_dedup); an update that is not
+      processed to the end is forgotten again so Telegram's retry gets through
+    """
+    # Generate unique request ID for this request
+    request_id = set_request_id()
+
+    # Log incoming webhook with more details
+    try:
+        log.info(
+            f"webhook_received update_id={update.update_id} "
+            f"integration_id={bot.integration_id if bot else None} "
+            f"kind={update.kind} has_text={update.message is not None}"
+        )
+    except Exception as log_error:
+        log.warning(f"webhook_logging_error error={type(log_error).__name__}")
+        # Don't fail on logging
+
+    # Telegram re-delivers an update when we are slow or fail; process each one once.
+    # update_ids are only unique per bot, so the legacy webhook (bot unknown) is not deduplicated
+    bot_key = bot.integration_id if bot else "legacy"
+    if bot is not None and await update_deduplicator.is_duplicate(bot_key, update.update_id):
+        log.info(f"webhook_duplicate_skipped update_id={update.update_id} bot={bot_key}")
+        return {"ok": True}
+
+    try:
+        return await _handle_accepted(update, bot, bot_key, background_tasks, coalesce, shed_stage)
+    except BaseException:
+        # Not processed (e.g. the request was cancelled): let Telegram's retry through
+        if bot is not None:
+            await update_deduplicator.forget(bot_key, update.update_id)
+        raise
+
+
+async def _handle_accepted(
+    update: ParsedUpdate,
+    bot: Optional[BotEntry],
+    bot_key,
+    background_tasks: Optional[BackgroundTasks],
+    coalesce: bool,
+    shed_stage: int,
+) -> dict:
+    """Coalesce and process an update that passed deduplication (see handle_update)."""
+    # A chat that messages the bot has (un)blocked it since any earlier 403
+    if bot and update.chat_id is not None:
+        bot_health.unblock_chat(bot.bot_token, update.chat_id)
+
+    # Optional debounce: merge a chat's rapid-fire messages into one reply.
+    # The webhook is acknowledged at once; the burst is answered in the background
+    inbound = update.message
+    if coalesce and burst_coalescer.enabled and inbound is not None and update.chat_id is not None:
+
+        async def process_burst(merged) -> None:
+            # The request that admitted the update is gone: re-check the load, like the poller
+            stage = min(load_shedder.stage(), KNOWLEDGE_ONLY)
+            async with tenant_scheduler.slot(bot.business_id if bot else None):
+                await _process_update(update, merged, bot, None, stage)
+
+        if not burst_coalescer.submit_nowait((bot_key, update.chat_id), inbound, process_burst):
+            log.info(f"message_coalesced update_id={update.update_id} chat_id={update.chat_id}")
+        return {"ok": True}
+
+    # Weighted fair share of processing capacity per business (tenant_scheduler)
+    async with tenant_scheduler.slot(bot.business_id if bot else None):
+        return await _process_update(update, inbound, bot, background_tasks, shed_stage)
+
+
+async def _process_update(
+    update: ParsedUpdate,
+    inbound,
+    bot: Optional[BotEntry],
+    background_tasks: Optional[BackgroundTasks],
+    shed_stage: int = NORMAL,
+) -> dict:
+    """
+    Generate, deliver and save the reply for an accepted update (steps 1-6 of handle_update).
+
+    Args:
+        update: Parsed update (already deduplicated)
+        inbound: Its InboundMessage, possibly merged from a burst (None for non-text updates)
+        bot: Bot resolved from the webhook URL (None for the legacy webhook)
+        background_tasks: Present when the webhook can still return an inline reply
+        shed_stage: Load shedding stage the update was admitted at
+    """
+    reply_text = SAFE_DEFAULT_RESPONSE
+    normalized_message = None
+    chat_id = None
+    used_bot = None  # Track which bot (and therefore business) was used
+    reply_queued = False  # True once the outbox owns delivery and saving
+    # Inline replies need a known bot and a response we can still attach them to
+    inline_enabled = bool(bot and background_tasks is not None and settings.telegram_inline_replies)
+    inline_response = None
+    # Under load, replies are still delivered but conversations are not saved
+    persist = shed_stage < SKIP_PERSIST
+
+    try:
+        # Step 1: The payload was normalized while parsing (telegram_parser)
+        # Text messages carry a platform-agnostic InboundMessage
+        normalized_message = inbound
+        if normalized_message:
+            log.info(
+                f"message_normalized user_id={normalized_message.user_id} "
+                f"channel={normalized_message.channel} "
+                f"text_length={len(normalized_message.message_text)}"
+            )
+
+        # Step 2: Validate normalization succeeded and extract chat_id
+        if not normalized_message:
+            log.warning("normalization_failed reason=no_message_data")
+            # The parser still knows the chat for non-text messages
+            chat_id = update.chat_id
+
+            # Send safe default response if we have chat_id
+            if chat_id:
+                try:
+                    chat_id_int = int(chat_id) if chat_id is not None else None
+                    if chat_id_int and inline_enabled:
+                        log.info(f"default_response_inline chat_id={chat_id_int}")
+                        return _inline_reply(chat_id_int, SAFE_DEFAULT_RESPONSE)
+                    if chat_id_int:
+                        if await _send_reply(chat_id_int, SAFE_DEFAULT_RESPONSE, bot):
+                            log.info(f"default_response_sent chat_id={chat_id_int}")
+                        else:
+                            log.warning(f"no_bot_token_available chat_id={chat_id_int} - No active Telegram integration found")
+                except Exception as e:
+                    log.error(f"send_default_failed chat_id={chat_id} error={type(e).__name__}")
+
+            return {"ok": True}
+
+        # Validate normalized message has required fields
+        if not normalized_message.message_text or not normalized_message.message_text.strip():
+            log.warning(f"empty_message user_id={normalized_message.user_id}")
+            # Use safe default but continue processing
+            normalized_message.message_text = ""
+
+        # Step 3: Process message through AI Brain (processor)
+        # This is the ONLY source of reply text generation
+        try:
+            if shed_stage >= KNOWLEDGE_ONLY:
+                reply_text = degraded_reply(normalized_message.message_text, bot.business_id if bot else None)
+                log.info(f"processing_shed user_id={normalized_message.user_id} stage={STAGE_NAMES[shed_stage]}")
+            else:
+                reply_text = await process_message(normalized_message, bot.business_id if bot else None)
+            # Validate reply is not empty/None
+            if not reply_text or not reply_text.strip():
+                log.warning(f"empty_response user_id={normalized_message.user_id} action=using_default")
+                reply_text = SAFE_DEFAULT_RESPONSE
+            else:
+                log.debug(f"response_generated user_id={normalized_message.user_id} response_length={len(reply_text)}")
+        except Exception as e:
+            log.error(f"processing_failed user_id={normalized_message.user_id} error={type(e).__name__} message={str(e)}", exc_info=True)
+            reply_text = SAFE_DEFAULT_RESPONSE
+
+        # Step 4: Extract reply destination from normalized message metadata
+        # Metadata contains platform-specific data needed for sending replies
+        try:
+            chat_id = normalized_message.metadata.get("chat_id") if normalized_message.metadata else None
+            if not chat_id:
+                # Fallback: use the chat id the parser extracted from the update
+                log.warning(f"chat_id_not_in_metadata user_id={normalized_message.user_id} attempting_fallback")
+                chat_id = update.chat_id
+        except Exception as e:
+            log.error(f"chat_id_extraction_failed error={type(e).__name__}", exc_info=True)
+            chat_id = None
+
+        # Step 5: Send reply using processor-generated text
+        # This MUST happen before saving conversation to ensure user receives reply
+        # Bot behavior is unchanged - reply is sent regardless of what happens next
+        if chat_id:
+            try:
+                # Ensure chat_id is an int (Telegram API requires int)
+                chat_id_int = int(chat_id) if chat_id is not None else None
+                if chat_id_int:
+                    log.info(f"attempting_reply chat_id={chat_id_int} user_id={normalized_message.user_id} reply_length={len(reply_text)}")
+
+                    # Known bot: answer in the webhook response itself, or hand the
+                    # reply (and the save) to the outbox and acknowledge immediately
+                    if inline_enabled:
+                        inline_response = _inline_reply(chat_id_int, reply_text)
+                        used_bot = bot
+                        log.info(
+                            f"reply_inline chat_id={chat_id_int} user_id={normalized_message.user_id} "
+                            f"business_id={bot.business_id} integration_id={bot.integration_id}"
+                        )
+                    elif bot and _enqueue_reply(chat_id_int, reply_text, bot, normalized_message, persist):
+                        reply_queued = True
+                        log.info(
+                            f"reply_queued chat_id={chat_id_int} user_id={normalized_message.user_id} "
+                            f"business_id={bot.business_id} integration_id={bot.integration_id}"
+                        )
+                    else:
+                        used_bot = await _send_reply(chat_id_int, reply_text, bot)
+                        if used_bot:
+                            log.info(
+                                f"reply_sent chat_id={chat_id_int} user_id={normalized_message.user_id} "
+                                f"bot={used_bot.channel_name} business_id={used_bot.business_id} integration_id={used_bot.integration_id}"
+                            )
+                        else:
+                            log.error(f"reply_send_failed chat_id={chat_id_int} user_id={normalized_message.user_id} - No active Telegram integration found. Connect your bot via the dashboard.")
+                else:
+                    log.error(f"invalid_chat_id chat_id={chat_id} user_id={normalized_message.user_id} type={type(chat_id)}")
+            except (ValueError, TypeError) as e:
+                log.error(f"chat_id_conversion_failed chat_id={chat_id} error={type(e).__name__} message={str(e)}", exc_info=True)
+            except Exception as e:
+                log.error(f"send_message_error chat_id={chat_id} error={type(e).__name__} message={str(e)}", exc_info=True)
+        else:
+            log.error(f"no_chat_id user_id={normalized_message.user_id} metadata={normalized_message.metadata}")
+
+    except Exception as e:
+        # Catch-all for any unexpected errors in the main flow
+        log.error(f"webhook_error error={type(e).__name__} message={str(e)}", exc_info=True)
+        # Try to send safe default response if we have chat_id
+        if chat_id:
+            try:
+                chat_id_int = int(chat_id) if isinstance(chat_id, (int, str)) else None
+                if chat_id_int and inline_enabled:
+                    inline_response = _inline_reply(chat_id_int, SAFE_DEFAULT_RESPONSE)
+                    log.info(f"fallback_response_inline chat_id={chat_id_int}")
+                elif chat_id_int:
+                    if await _send_reply(chat_id_int, SAFE_DEFAULT_RESPONSE, bot):
+                        log.info(f"fallback_response_sent chat_id={chat_id_int}")
+                    else:
+                        log.warning(f"no_bot_token_available chat_id={chat_id_int} - No active Telegram integration found")
+            except Exception:
+                pass  # Already logged, don't crash
+
+    # Step 6: Save conversation to database (AFTER reply is sent/attempted)
+    # This is non-blocking and error-safe - failures don't affect bot behavior
+    # Queued replies are saved by the outbox once delivery has been attempted;
+    # inline replies are saved after the webhook response has been returned
+    if not reply_queued and not persist:
+        if normalized_message:
+            log.info(f"conversation_save_shed user_id={normalized_message.user_id} stage={STAGE_NAMES[shed_stage]}")
+    elif not reply_queued:
+        used_business_id = used_bot.business_id if used_bot else None
+        if normalized_message and used_business_id and inline_response is not None:
+            background_tasks.add_task(_save_conversation, normalized_message, reply_text, used_business_id)
+        elif normalized_message and used_business_id:
+            await _save_conversation(normalized_message, reply_text, used_business_id)
+        elif normalized_message and not used_business_id:
+            log.warning(f"⚠️ CONVERSATION_SAVE_SKIPPED: user_id={normalized_message.user_id} reason=no_business_id_available (used_business_id is None)")
+
+    if inline_response is not None:
+        return inline_response
+    return {"ok": True}
@@ -0,0 +1,286 @@
+"""Per-business knowledge indexes built from KnowledgeEntry rows.
+
+Businesses maintain their own knowledge base (knowledge_entries), but the bot
+only ever answered from the global faq.json. TenantKnowledgeCache keeps one
+BM25 KnowledgeIndex per business, built lazily from its active entries:
+
+- Every KnowledgeEntry insert/update/delete made through the ORM bumps
+  Business.knowledge_version in the same transaction (mapper events below);
+  after commit the writing worker drops its cached index at once
+- Bulk session.execute(update/delete(KnowledgeEntry)) and query.update()/
+  delete() skip the mapper events; they bump every business whose rows
+  match the statement's WHERE clause instead (do_orm_execute hook). A bulk
+  UPDATE that moves rows to another business must bump the new one itself
+- Other workers re-read the version (one integer column) at most every
+  KNOWLEDGE_VERSION_CHECK_INTERVAL seconds per business and rebuild only
+  when it changed
+- At most KNOWLEDGE_CACHE_MAX_TENANTS indexes are kept; the least recently
+  used business is evicted first, so memory stays bounded with thousands of
+  businesses
+
+Loading and rechecking read the database in a thread (prepare(), awaited
+once per message); the lookup itself (get()) is memory-only. Raw SQL
+writes to knowledge_entries (text(), Core connections) must call
+bump_knowledge_version() themselves.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import ORMExecuteState, Session, object_session
+
+from app.config import settings
+from app.database import get_db_context
+from app.models import Business, KnowledgeEntry
+from app.services import metrics
+from app.services.knowledge_index import KnowledgeIndex
+
+log = logging.getLogger(__name__)
+
+
+def _parse_keywords(raw: Optional[str]) -> List[str]:
+    """KnowledgeEntry.keywords is a JSON array; tolerate comma-separated text."""
+    if not raw:
+        return []
+    try:
+        value = json.loads(raw)
+    except (TypeError, ValueError):
+        return [part.strip() for part in raw.split(",") if part.strip()]
+    if isinstance(value, list):
+        return [keyword for keyword in value if isinstance(keyword, str)]
+    return [value] if isinstance(value, str) else []
+
+
+class _CachedKnowledge:
+    __slots__ = ("index", "version", "checked_at")
+
+    def __init__(self, index: KnowledgeIndex, version: int, checked_at: float):
+        self.index = index
+        self.version = version
+        self.checked_at = checked_at
+
+
+class TenantKnowledgeCache:
+    """LRU of per-business knowledge indexes, validated by knowledge_version."""
+
+    def __init__(self, max_tenants: int, recheck_seconds: float):
+        self.max_tenants = max(1, max_tenants)
+        self.recheck_seconds = recheck_seconds
+        self._tenants: "OrderedDict[int, _CachedKnowledge]" = OrderedDict()
+        self._loading: Dict[int, asyncio.Task] = {}
+
+        self._builds = metrics.counter("tenant_knowledge_builds")
+        self._evictions = metrics.counter("tenant_knowledge_evictions")
+        metrics.register_gauge("tenant_knowledge_cached", lambda: len(self._tenants))
+        metrics.register_gauge(
+            "tenant_knowledge_entries",
+            lambda: sum(len(cached.index) for cached in self._tenants.values()),
+        )
+
+    def get(self, business_id: int) -> Optional[KnowledgeIndex]:
+        """
+        Cached index of a business, without touching the database.
+
+        Returns:
+            The index (possibly empty), or None if it is not loaded
+        """
+        cached = self._tenants.get(business_id)
+        if cached is None:
+            return None
+        self._touch(business_id)
+        return cached.index
+
+    def version(self, business_id: int) -> Optional[int]:
+        """knowledge_version of the cached index, or None if not loaded."""
+        cached = self._tenants.get(business_id)
+        return cached.version if cached is not None else None
+
+    def _touch(self, business_id: int) -> None:
+        try:
+            self._tenants.move_to_end(business_id)
+        except KeyError:
+            pass  # Invalidated by a commit in another thread meanwhile
+
+    def _fetch(self, business_id: int, known_version: Optional[int]) -> Tuple[Optional[int], Optional[KnowledgeIndex]]:
+        """
+        Read a business's knowledge_version and, if it differs from known_version,
+        build a new index from its active entries (blocking).
+
+        Returns:
+            (version, new index); version is None if the business does not
+            exist, the index is None if known_version is still current
+        """
+        with get_db_context() as db:
+            version = db.query(Business.knowledge_version).filter(Business.id == business_id).scalar()
+            if version is None or version == known_version:
+                return version, None
+            started = time.monotonic()
+            rows = db.query(KnowledgeEntry.question, KnowledgeEntry.answer, KnowledgeEntry.keywords).filter(
+                KnowledgeEntry.business_id == business_id,
+                KnowledgeEntry.is_active == True,
+            ).all()
+
+        entries = (
+            {"question": question, "answer": answer, "keywords": _parse_keywords(keywords)}
+            for question, answer, keywords in rows
+        )
+        index = KnowledgeIndex(entries, semantic=settings.semantic_search_enabled)
+        log.info(
+            f"tenant_knowledge_built business_id={business_id} version={version} "
+            f"entries={len(index)} duration_ms={(time.monotonic() - started) * 1000:.1f}"
+        )
+        return version, index
+
+    async def _refresh(self, business_id: int) -> Optional[KnowledgeIndex]:
+        cached = self._tenants.get(business_id)
+        version, index = await asyncio.to_thread(
+            self._fetch, business_id, cached.version if cached is not None else None
+        )
+        now = time.monotonic()
+        if version is None:
+            self._tenants.pop(business_id, None)
+            return None
+        if index is None:
+            # Unchanged; the entry may have been invalidated while we checked
+            current = self._tenants.get(business_id)
+            if current is None:
+                return await self._refresh(business_id)
+            current.checked_at = now
+            self._touch(business_id)
+            return current.index
+
+        self._builds.inc()
+        self._tenants[business_id] = _CachedKnowledge(index, version, now)
+        self._touch(business_id)
+        while len(self._tenants) > self.max_tenants:
+            self._tenants.popitem(last=False)
+            self._evictions.inc()
+        return index
+
+    async def prepare(self, business_id: Optional[int]) -> Optional[KnowledgeIndex]:
+        """
+        Make sure a business's index is loaded and current.
+
+        Only every KNOWLEDGE_VERSION_CHECK_INTERVAL seconds per business does
+        this touch the database (in a thread); concurrent calls for the same
+        business share one load. Failures are logged and the previously
+        cached index (if any) is kept.
+
+        Args:
+            business_id: Business the message belongs to (None = no tenant)
+
+        Returns:
+            The index, or None if unavailable
+        """
+        if business_id is None:
+            return None
+        cached = self._tenants.get(business_id)
+        if cached is not None and time.monotonic() - cached.checked_at < self.recheck_seconds:
+            self._touch(business_id)
+            return cached.index
+
+        task = self._loading.get(business_id)
+        if task is None:
+            task = asyncio.ensure_future(self._refresh(business_id))
+            self._loading[business_id] = task
+            task.add_done_callback(lambda _: self._loading.pop(business_id, None))
+        try:
+            return await asyncio.shield(task)
+        except Exception as e:
+            log.warning(f"tenant_knowledge_load_failed business_id={business_id} error={type(e).__name__}")
+            if cached is None:
+                return None
+            cached.checked_at = time.monotonic()  # Keep serving it; retry after the next interval
+            return cached.index
+
+    def invalidate(self, business_id: int) -> None:
+        """Drop a business's cached index (rebuilt on next use)."""
+        if self._tenants.pop(business_id, None) is not None:
+            log.info(f"tenant_knowledge_invalidated business_id={business_id}")
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Cached businesses, least recently used first, for diagnostics."""
+        now = time.monotonic()
+        return {
+            str(business_id): {
+                "entries": len(cached.index),
+                "terms": cached.index.term_count,
+                "version": cached.version,
+                "checked_seconds_ago": round(now - cached.checked_at, 1),
+            }
+            for business_id, cached in self._tenants.items()
+        }
+
+
+def bump_knowledge_version(db: Session, business_id: int) -> None:
+    """
+    Invalidate cached knowledge of a business after writes that bypass the ORM.
+
+    Args:
+        db: Session the writes were made in (the bump commits with them)
+        business_id: Business whose knowledge changed
+    """
+    db.execute(
+        update(Business)
+        .where(Business.id == business_id)
+        .values(knowledge_version=Business.knowledge_version + 1)
+    )
+    db.info.setdefault("knowledge_changed", set()).add(business_id)
+
+
+def _on_knowledge_entry_write(mapper, connection, target: KnowledgeEntry) -> None:
+    business_ids = {target.business_id}
+    # An entry moved to another business changes both
+    business_ids.update(inspect(target).attrs.business_id.history.deleted or ())
+    business_ids.discard(None)
+    for business_id in business_ids:
+        connection.execute(
+            update(Business.__table__)
+            .where(Business.__table__.c.id == business_id)
+            .values(knowledge_version=Business.__table__.c.knowledge_version + 1)
+        )
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("knowledge_changed", set()).update(business_ids)
+
+
+for _event in ("after_insert", "after_update", "after_delete"):
+    event.listen(KnowledgeEntry, _event, _on_knowledge_entry_write)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _on_bulk_knowledge_write(state: ORMExecuteState) -> None:
+    if not (state.is_update or state.is_delete):
+        return
+    mapper = state.bind_mapper
+    if mapper is None or mapper.class_ is not KnowledgeEntry:
+        return
+    # Businesses whose rows are about to change, read in the same transaction
+    query = select(KnowledgeEntry.business_id).distinct()
+    if state.statement.whereclause is not None:
+        query = query.where(state.statement.whereclause)
+    business_ids = set(state.session.execute(query).scalars())
+    for business_id in business_ids:
+        bump_knowledge_version(state.session, business_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    for business_id in session.info.pop("knowledge_changed", ()):
+        tenant_knowledge.invalidate(business_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session: Session) -> None:
+    session.info.pop("knowledge_changed", None)
+
+
+# Process-wide cache of per-business knowledge indexes
+tenant_knowledge = TenantKnowledgeCache(
+    max_tenants=settings.knowledge_cache_max_tenants,
+    recheck_seconds=settings.knowledge_version_check_interval,
+)
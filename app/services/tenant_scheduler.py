@@ -0,0 +1,217 @@
+"""Weighted fair scheduling of update processing across businesses.
+
+Every business shares one processing path (brain, send, save). Without a
+scheduler, a business whose bot goes viral fills the event loop and the
+database pool, and every other business's replies wait behind it.
+
+TenantScheduler hands out processing slots between intake (webhook or
+poller, after dedup/coalescing) and process_message/send:
+- At most max_concurrency updates are processed at once in this worker
+- Each business may hold at most its own cap of those slots
+- When updates are waiting, free slots go to businesses by deficit round
+  robin: each visit adds the business's share to its deficit, and every
+  slot granted costs 1, so over time slots are split in proportion to the
+  shares regardless of how many updates each business sends
+- Time spent waiting for a slot is recorded per business
+  (tenant_queue_wait_ms{business_id=...})
+
+Shares and caps come from TENANT_OVERRIDES (JSON, e.g.
+{"12": {"share": 4, "max_concurrency": 32}}), falling back to the defaults.
+Updates from the legacy shared webhook (business unknown) form their own
+tenant. max_concurrency = 0 turns scheduling off.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Hashable, Optional
+
+from app.config import settings
+from app.services import metrics
+
+log = logging.getLogger(__name__)
+
+
+class TenantState:
+    """Queue and accounting for one business."""
+
+    __slots__ = ("key", "share", "cap", "running", "deficit", "waiters", "active", "wait_ms", "granted")
+
+    def __init__(self, key: Hashable, share: float, cap: int):
+        self.key = key
+        self.share = share
+        self.cap = cap
+        self.running = 0
+        self.deficit = 0.0
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.active = False  # In the round-robin ring
+        self.wait_ms = metrics.histogram("tenant_queue_wait_ms", business_id=key)
+        self.granted = metrics.counter("tenant_updates_processed", business_id=key)
+
+
+class TenantScheduler:
+    """Deficit-round-robin slot scheduler keyed by business_id."""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        default_share: float,
+        default_cap: int,
+        overrides: Optional[Dict[str, Dict[str, float]]] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.default_share = default_share if default_share > 0 else 1.0
+        self.default_cap = default_cap
+        self._overrides = {str(key): value for key, value in (overrides or {}).items()}
+        self._tenants: Dict[Hashable, TenantState] = {}
+        self._ring: Deque[TenantState] = deque()  # Tenants with waiters, in round-robin order
+        self._running = 0
+
+        metrics.register_gauge("tenant_slots_in_use", lambda: self._running)
+        metrics.register_gauge("tenant_updates_waiting", self.waiting)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrency > 0
+
+    def waiting(self) -> int:
+        """Updates currently waiting for a slot, across all businesses."""
+        return sum(len(tenant.waiters) for tenant in self._ring)
+
+    def _tenant(self, key: Hashable) -> TenantState:
+        tenant = self._tenants.get(key)
+        if tenant is None:
+            override = self._overrides.get(str(key), {})
+            share = float(override.get("share", self.default_share))
+            cap = int(override.get("max_concurrency", self.default_cap)) or self.max_concurrency
+            tenant = self._tenants[key] = TenantState(key, share if share > 0 else self.default_share, cap)
+        return tenant
+
+    def configure(self, key: Hashable, share: Optional[float] = None, max_concurrency: Optional[int] = None) -> None:
+        """
+        Change a business's share and/or concurrency cap at runtime.
+
+        Args:
+            key: business_id
+            share: Relative weight (> 0)
+            max_concurrency: Max slots the business may hold at once (0 = global limit)
+        """
+        tenant = self._tenant(key)
+        if share is not None and share > 0:
+            tenant.share = share
+        if max_concurrency is not None:
+            tenant.cap = max_concurrency or self.max_concurrency
+        self._dispatch()
+
+    # ----- slots -----
+
+    async def acquire(self, key: Hashable) -> None:
+        """Wait for a processing slot for this business."""
+        tenant = self._tenant(key)
+        if not self._ring and self._running < self.max_concurrency and tenant.running < tenant.cap:
+            # Nobody is waiting: take the slot without queueing
+            self._grant(tenant)
+            tenant.wait_ms.observe(0.0)
+            return
+
+        started = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        tenant.waiters.append(waiter)
+        if not tenant.active:
+            tenant.active = True
+            self._ring.append(tenant)
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just before the cancellation landed; give it back
+                self.release(key)
+            else:
+                try:
+                    tenant.waiters.remove(waiter)
+                except ValueError:
+                    pass
+            raise
+        tenant.wait_ms.observe((time.monotonic() - started) * 1000)
+
+    def release(self, key: Hashable) -> None:
+        """Return a slot taken with acquire()."""
+        tenant = self._tenants.get(key)
+        if tenant is None or tenant.running <= 0:
+            return
+        tenant.running -= 1
+        self._running -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, key: Hashable) -> AsyncIterator[None]:
+        """Hold a processing slot for the duration of the block (no-op when disabled)."""
+        if not self.enabled:
+            yield
+            return
+        await self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release(key)
+
+    def _grant(self, tenant: TenantState) -> None:
+        tenant.running += 1
+        self._running += 1
+        tenant.granted.inc()
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiting businesses in deficit round robin order."""
+        capped = 0  # Consecutive ring entries skipped because they are at their cap
+        while self._running < self.max_concurrency and self._ring and capped < len(self._ring):
+            tenant = self._ring[0]
+            while tenant.waiters and tenant.waiters[0].done():
+                tenant.waiters.popleft()  # Cancelled while waiting
+            if not tenant.waiters:
+                # Idle tenants leave the ring and do not bank credit
+                self._ring.popleft()
+                tenant.active = False
+                tenant.deficit = 0.0
+                capped = 0
+                continue
+            if tenant.running >= tenant.cap:
+                self._ring.rotate(-1)
+                capped += 1
+                continue
+            if tenant.deficit < 1:
+                # New round for this tenant
+                tenant.deficit += tenant.share
+                if tenant.deficit < 1:
+                    self._ring.rotate(-1)
+                    capped = 0  # Credit keeps growing, so the ring still makes progress
+                continue
+
+            tenant.deficit -= 1
+            self._grant(tenant)
+            tenant.waiters.popleft().set_result(None)
+            capped = 0
+            if tenant.deficit < 1:
+                self._ring.rotate(-1)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Per-business scheduling state, for diagnostics."""
+        return {
+            str(tenant.key): {
+                "share": tenant.share,
+                "max_concurrency": tenant.cap,
+                "running": tenant.running,
+                "waiting": len(tenant.waiters),
+            }
+            for tenant in self._tenants.values()
+        }
+
+
+# Process-wide scheduler used by the Telegram update pipeline
+tenant_scheduler = TenantScheduler(
+    max_concurrency=settings.tenant_max_concurrency,
+    default_share=settings.tenant_default_share,
+    default_cap=settings.tenant_default_concurrency,
+    overrides=settings.tenant_overrides,
+)
@@ -0,0 +1,155 @@
+"""Deduplication of Telegram webhook deliveries.
+
+Telegram retries a webhook delivery whenever our handler is slow or fails,
+re-sending the same update_id. Processing a retry again would produce a
+duplicate reply, a duplicate Conversation row and inflated dashboard counts.
+
+This module tracks (bot, update_id) pairs that have already been accepted:
+- A bounded in-process LRU with a TTL answers the common case for free
+- Optionally (TELEGRAM_DEDUP_SHARED), a processed_updates table shared by
+  all workers catches retries that land on a different process, using a
+  single INSERT ... ON CONFLICT DO NOTHING per new update
+- An update whose processing fails or is cancelled after it was marked is
+  forgotten again (forget()), so Telegram's retry of it is not skipped
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Hashable, Tuple
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.config import settings
+from app.database import get_db_context
+from app.models import ProcessedUpdate
+from app.services import metrics
+
+log = logging.getLogger(__name__)
+
+# Delete expired shared rows once every this many shared inserts
+SHARED_CLEANUP_EVERY = 1000
+
+
+class UpdateDeduplicator:
+    """Bounded LRU set of recently seen (bot, update_id) keys with a TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float, shared: bool = False):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self._seen: "OrderedDict[Tuple[Hashable, int], float]" = OrderedDict()
+        self._shared_inserts = 0
+
+        self._duplicates = metrics.counter("telegram_updates_duplicate")
+        self._shared_duplicates = metrics.counter("telegram_updates_duplicate_shared")
+        metrics.register_gauge("telegram_dedup_entries", lambda: len(self._seen))
+
+    def seen_locally(self, bot_key: Hashable, update_id: int) -> bool:
+        """
+        Check-and-mark an update in the local LRU.
+
+        Returns:
+            True if this update was already seen (and is still within the TTL)
+        """
+        key = (bot_key, update_id)
+        now = time.monotonic()
+        expires_at = self._seen.get(key)
+        if expires_at is not None and expires_at > now:
+            self._seen.move_to_end(key)
+            return True
+
+        self._seen[key] = now + self.ttl_seconds
+        self._seen.move_to_end(key)
+        # Evict the least recently seen keys (also drops expired ones at the head)
+        while len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+        return False
+
+    async def forget(self, bot_key: Hashable, update_id) -> None:
+        """
+        Un-mark an update accepted by is_duplicate() whose processing did not
+        finish, so Telegram's re-delivery is processed instead of skipped.
+
+        Errors fail open - a shared claim that cannot be released only means
+        the retry is skipped, as it would have been before.
+        """
+        if not isinstance(update_id, int):
+            return
+        self._seen.pop((bot_key, update_id), None)
+        if not self.shared:
+            return
+        try:
+            await asyncio.to_thread(self._release_shared, bot_key, update_id)
+        except Exception as e:
+            log.warning(f"dedup_shared_release_failed bot={bot_key} update_id={update_id} error={type(e).__name__}")
+
+    def _claim_shared(self, bot_key: Hashable, update_id: int) -> bool:
+        """Claim an update in the shared table. Returns False if another worker already did."""
+        with get_db_context() as db:
+            result = db.execute(
+                pg_insert(ProcessedUpdate)
+                .values(bot_key=str(bot_key), update_id=update_id, created_at=datetime.utcnow())
+                .on_conflict_do_nothing(index_elements=["bot_key", "update_id"])
+            )
+            claimed = result.rowcount == 1
+
+            self._shared_inserts += 1
+            if self._shared_inserts % SHARED_CLEANUP_EVERY == 0:
+                cutoff = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+                db.query(ProcessedUpdate).filter(ProcessedUpdate.created_at < cutoff).delete(
+                    synchronize_session=False
+                )
+            return claimed
+
+    def _release_shared(self, bot_key: Hashable, update_id: int) -> None:
+        """Delete a claim made by _claim_shared()."""
+        with get_db_context() as db:
+            db.query(ProcessedUpdate).filter(
+                ProcessedUpdate.bot_key == str(bot_key),
+                ProcessedUpdate.update_id == update_id,
+            ).delete(synchronize_session=False)
+
+    async def is_duplicate(self, bot_key: Hashable, update_id) -> bool:
+        """
+        Check whether an update has already been accepted, marking it if not.
+
+        Errors fail open - an update is never dropped because dedup failed.
+
+        Args:
+            bot_key: Identifies the bot the update belongs to (update_id is per bot)
+            update_id: Telegram update_id
+
+        Returns:
+            True if the update is a retry that should be acknowledged and skipped
+        """
+        if not isinstance(update_id, int):
+            return False
+
+        if self.seen_locally(bot_key, update_id):
+            self._duplicates.inc()
+            return True
+
+        if not self.shared:
+            return False
+
+        try:
+            claimed = await asyncio.to_thread(self._claim_shared, bot_key, update_id)
+        except Exception as e:
+            log.warning(f"dedup_shared_check_failed bot={bot_key} update_id={update_id} error={type(e).__name__}")
+            return False
+
+        if not claimed:
+            self._duplicates.inc()
+            self._shared_duplicates.inc()
+            return True
+        return False
+
+
+# Process-wide deduplicator used by the Telegram webhooks
+update_deduplicator = UpdateDeduplicator(
+    max_entries=settings.telegram_dedup_max_entries,
+    ttl_seconds=settings.telegram_dedup_ttl_seconds,
+    shared=settings.telegram_dedup_shared,
+)
@@ -0,0 +1,212 @@
+"""Compact per-user session state.
+
+Everything the brain keeps about a user lives in one UserSession:
+- intent: the last intent as a small interned code (see intent_code())
+- message_count and unknown_streak (consecutive unknown intents); the
+  streak used to be counted twice, in conversation memory and in a separate
+  tracker, and is now one field, maintained by track_intent() (the
+  tracker's rules, which are what replies depend on)
+- a fixed ring of the last TIMESTAMP_RING_SIZE message times for the spam
+  check, instead of a growing list per user
+
+Sessions are __slots__ objects with a preallocated array("d") ring, held
+in one BoundedStateStore (idle TTL + LRU, see state_store), so each message
+looks up a single object. A user talking to several businesses has one
+session per (business, channel) - see session_key() - so conversation
+memory never crosses from one business to another. memory.get_memory()/update_memory() and the
+edge_case_handler trackers are views over this record. With a shared
+STATE_BACKEND, sessions are also exchanged with other workers as
+to_bytes() records (see state_backend).
+"""
+import logging
+import struct
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.state_store import BoundedStateStore
+
+log = logging.getLogger(__name__)
+
+# Message times kept per user; must be >= edge_case_handler.SPAM_MESSAGE_LIMIT
+TIMESTAMP_RING_SIZE = 5
+
+# Distinct intent names interned; further names are stored as "unknown"
+MAX_INTENT_CODES = 256
+
+# Serialized session: message_count, unknown_streak, ring head, ring, then
+# the last intent name (UTF-8, empty = none)
+_RECORD = struct.Struct(f"<IIB{TIMESTAMP_RING_SIZE}d")
+_MAX_COUNT = 2 ** 32 - 1
+
+_intent_names: List[Optional[str]] = [None]  # Code 0 = no intent yet
+_intent_codes: Dict[str, int] = {}
+
+
+def intent_code(name: str) -> int:
+    """
+    Small integer code for an intent name (assigned on first use).
+
+    Args:
+        name: Intent value (e.g. "greeting")
+
+    Returns:
+        Code >= 1
+    """
+    code = _intent_codes.get(name)
+    if code is None:
+        if len(_intent_names) >= MAX_INTENT_CODES:
+            log.warning(f"intent_codes_exhausted intent={name} action=stored_as_unknown")
+            return intent_code("unknown")
+        code = _intent_codes[name] = len(_intent_names)
+        _intent_names.append(name)
+    return code
+
+
+class UserSession:
+    """State of one user."""
+
+    __slots__ = ("intent", "message_count", "unknown_streak", "stamps", "stamp_head")
+
+    def __init__(self):
+        self.intent = 0
+        self.message_count = 0
+        self.unknown_streak = 0
+        self.stamps = array("d", bytes(8 * TIMESTAMP_RING_SIZE))  # 0.0 = empty slot
+        self.stamp_head = 0
+
+    @property
+    def last_intent(self) -> Optional[str]:
+        return _intent_names[self.intent]
+
+    def track_intent(self, intent: str) -> int:
+        """
+        Update the unknown-intent streak: +1 on "unknown", reset otherwise.
+
+        Returns:
+            The streak
+        """
+        self.unknown_streak = self.unknown_streak + 1 if intent == "unknown" else 0
+        return self.unknown_streak
+
+    def record_intent(self, intent: str) -> None:
+        """Finish a message: remember its intent and count it."""
+        self.intent = intent_code(intent)
+        self.message_count += 1
+
+    def recent_messages(self, now: float, window: float) -> Tuple[int, Optional[float]]:
+        """
+        Message times in the ring newer than window seconds.
+
+        Returns:
+            (count, most recent time or None)
+        """
+        count = 0
+        for stamp in self.stamps:
+            if stamp and now - stamp < window:
+                count += 1
+        last = self.stamps[self.stamp_head - 1]
+        return count, (last if count and last else None)
+
+    def add_message_time(self, now: float) -> None:
+        self.stamps[self.stamp_head] = now
+        self.stamp_head = (self.stamp_head + 1) % TIMESTAMP_RING_SIZE
+
+    def to_bytes(self) -> bytes:
+        """Compact record for a shared state backend."""
+        name = _intent_names[self.intent]
+        return _RECORD.pack(
+            min(self.message_count, _MAX_COUNT),
+            min(self.unknown_streak, _MAX_COUNT),
+            self.stamp_head,
+            *self.stamps,
+        ) + (name.encode("utf-8") if name else b"")
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "UserSession":
+        """
+        Rebuild a session from to_bytes().
+
+        Raises:
+            struct.error / ValueError: if the record is malformed
+        """
+        message_count, unknown_streak, stamp_head, *stamps = _RECORD.unpack_from(data)
+        session = cls()
+        session.message_count = message_count
+        session.unknown_streak = unknown_streak
+        session.stamp_head = stamp_head % TIMESTAMP_RING_SIZE
+        session.stamps = array("d", stamps)
+        name = bytes(data[_RECORD.size:]).decode("utf-8")
+        session.intent = intent_code(name) if name else 0
+        return session
+
+    def as_memory(self) -> Dict[str, object]:
+        """The conversation memory dict served by memory.get_memory()."""
+        return {
+            "last_intent": _intent_names[self.intent],
+            "message_count": self.message_count,
+            "unknown_intent_count": self.unknown_streak,
+        }
+
+    @classmethod
+    def from_memory(cls, memory: Dict[str, object]) -> "UserSession":
+        """Session rebuilt from an as_memory() dict (no message times)."""
+        session = cls()
+        last_intent = memory.get("last_intent")
+        session.intent = intent_code(last_intent) if last_intent else 0
+        session.message_count = int(memory.get("message_count") or 0)
+        session.unknown_streak = int(memory.get("unknown_intent_count") or 0)
+        return session
+
+
+def session_key(user_id: str, business_id: Optional[int] = None, channel: Optional[str] = None) -> str:
+    """
+    Key of the session a message is tracked in.
+
+    Args:
+        user_id: Platform-specific user identifier
+        business_id: Business the conversation belongs to (None = not known)
+        channel: Channel of the conversation (e.g. "telegram")
+
+    Returns:
+        The bare user_id without a business, else one key per
+        (business_id, channel, user_id), like the conversation_memory rows
+    """
+    if business_id is None:
+        return user_id
+    return f"{business_id}:{channel or ''}:{user_id}"
+
+
+# Process-wide sessions: {session_key(): UserSession}
+_sessions = BoundedStateStore(
+    "user_session",
+    max_entries=settings.user_state_max_entries,
+    idle_ttl_seconds=settings.user_state_idle_ttl_seconds,
+)
+
+
+def get_session(user_id: str) -> UserSession:
+    """Session of a user, created on first use."""
+    session = _sessions.get(user_id)
+    if session is None:
+        session = _sessions[user_id] = UserSession()
+    return session
+
+
+def peek_session(user_id: str) -> Optional[UserSession]:
+    """Session of a user, or None if there is none (nothing is created)."""
+    return _sessions.get(user_id)
+
+
+def replace_session(user_id: str, session: UserSession) -> None:
+    """Install a session (e.g. loaded from a shared backend) for a user."""
+    _sessions[user_id] = session
+
+
+def drop_session(user_id: str) -> None:
+    _sessions.pop(user_id, None)
+
+
+def all_sessions() -> Dict[str, UserSession]:
+    """Live sessions (for debugging/admin purposes)."""
+    return _sessions.copy()
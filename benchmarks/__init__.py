@@ -0,0 +1 @@
+"""Performance benchmarks for the Wycly backend (run with python -m benchmarks.<name>)."""
@@ -0,0 +1,128 @@
+"""Local stand-in for a Redis server.
+
+Speaks enough of the Redis protocol (RESP2) for the shared session backend
+(STATE_BACKEND=redis): PING, AUTH, SELECT, GET, SET (EX/PX), MGET, DEL,
+DBSIZE and FLUSHALL, with key expiry. An optional latency is added once per
+batch of commands read from a connection, so a pipelined batch costs one
+simulated round trip like it does against a real server. Point the backend
+at it with:
+
+    STATE_BACKEND=redis REDIS_URL=redis://127.0.0.1:6390/0
+
+Usage:
+    python -m benchmarks.fake_redis --port 6390 --latency-ms 0.5
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from app.services.resp import RespError, read_reply
+
+
+class FakeRedis:
+    """In-memory key space and the connection handler serving it."""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.data: Dict[bytes, Tuple[bytes, Optional[float]]] = {}  # key -> (value, expires at)
+        self.calls: Counter = Counter()
+        self.batches = 0
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self.data[key]
+            return None
+        return value
+
+    def run(self, command: List[bytes]):
+        """Execute one command; returns the reply value (RespError for errors)."""
+        name = command[0].decode("ascii", "replace").upper() if command else ""
+        args = command[1:]
+        self.calls[name] += 1
+        if name == "PING":
+            return "PONG"
+        if name in ("AUTH", "SELECT", "FLUSHALL"):
+            if name == "FLUSHALL":
+                self.data.clear()
+            return "OK"
+        if name == "GET" and len(args) == 1:
+            return self._get(args[0])
+        if name == "MGET" and args:
+            return [self._get(key) for key in args]
+        if name == "SET" and len(args) >= 2:
+            expires_at = None
+            options = [arg.upper() for arg in args[2:]]
+            if len(options) >= 2 and options[0] in (b"EX", b"PX"):
+                seconds = float(options[1]) / (1000 if options[0] == b"PX" else 1)
+                expires_at = time.monotonic() + seconds
+            self.data[args[0]] = (args[1], expires_at)
+            return "OK"
+        if name == "DEL":
+            return sum(1 for key in args if self.data.pop(key, None) is not None)
+        if name == "DBSIZE":
+            return len(self.data)
+        return RespError(f"ERR unknown command or wrong arguments for '{name}'")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                commands = [await read_reply(reader)]
+                # Everything already buffered belongs to the same pipeline
+                while b"\r\n" in reader._buffer:
+                    commands.append(await read_reply(reader))
+                self.batches += 1
+                if self.latency_ms:
+                    await asyncio.sleep(self.latency_ms / 1000)
+                writer.write(b"".join(_encode_reply(self.run(command)) for command in commands))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+def _encode_reply(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, RespError):
+        return b"-%s\r\n" % str(value).encode("utf-8")
+    if isinstance(value, str):
+        return b"+%s\r\n" % value.encode("utf-8")
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(_encode_reply(item) for item in value)
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+async def start_server(host: str, port: int, latency_ms: float = 0.0) -> Tuple[FakeRedis, asyncio.AbstractServer]:
+    """Start serving on host:port (port 0 = any free port)."""
+    fake = FakeRedis(latency_ms=latency_ms)
+    server = await asyncio.start_server(fake.handle, host, port)
+    return fake, server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Redis server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added once per pipelined batch")
+    args = parser.parse_args()
+
+    async def serve() -> None:
+        _, server = await start_server(args.host, args.port, args.latency_ms)
+        print(f"fake redis listening on {args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Local stand-in for api.telegram.org.
+
+Serves the Bot API methods the backend uses (sendMessage, getMe, setWebhook,
+deleteWebhook, getUpdates) with configurable latency and injected failures,
+so throughput can be measured without touching Telegram or hitting its real
+rate limits. Point the backend at it with:
+
+    TELEGRAM_API_BASE_URL=http://127.0.0.1:8081
+
+Usage:
+    python -m benchmarks.fake_telegram --port 8081 --latency-ms 40 --jitter-ms 15 \
+        --error-429 0.01 --error-403 0.005 --error-5xx 0.005
+
+GET /stats returns request counts per method and status; POST /stats/reset clears them.
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+@dataclass
+class FakeTelegramConfig:
+    """Latency and failure injection settings."""
+
+    latency_ms: float = 30.0
+    jitter_ms: float = 10.0
+    error_429: float = 0.0  # Fraction of sendMessage calls answered with 429 Too Many Requests
+    error_403: float = 0.0  # ...with 403 Forbidden (bot blocked by the user)
+    error_5xx: float = 0.0  # ...with 502 Bad Gateway
+    retry_after: int = 1  # retry_after returned with 429 responses
+    seed: Optional[int] = None
+
+
+@dataclass
+class FakeTelegramStats:
+    """Request counters collected by the fake server."""
+
+    calls: Counter = field(default_factory=Counter)  # {"sendMessage 200": n}
+    delivered: int = 0
+    first_delivery: Optional[float] = None
+    last_delivery: Optional[float] = None
+
+    def reset(self) -> None:
+        self.calls.clear()
+        self.delivered = 0
+        self.first_delivery = None
+        self.last_delivery = None
+
+    def as_dict(self) -> Dict:
+        return {
+            "calls": dict(self.calls),
+            "delivered": self.delivered,
+            "first_delivery": self.first_delivery,
+            "last_delivery": self.last_delivery,
+        }
+
+
+def _error(status_code: int, description: str, parameters: Optional[dict] = None) -> JSONResponse:
+    body = {"ok": False, "error_code": status_code, "description": description}
+    if parameters:
+        body["parameters"] = parameters
+    return JSONResponse(body, status_code=status_code)
+
+
+def create_app(config: FakeTelegramConfig) -> FastAPI:
+    """Build the fake Bot API application."""
+    app = FastAPI(title="Fake Telegram Bot API")
+    rng = random.Random(config.seed)
+    stats = FakeTelegramStats()
+
+    async def simulate_latency() -> None:
+        delay = max(0.0, config.latency_ms + rng.uniform(-config.jitter_ms, config.jitter_ms))
+        if delay:
+            await asyncio.sleep(delay / 1000)
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats.as_dict()
+
+    @app.post("/stats/reset")
+    async def reset_stats():
+        stats.reset()
+        return {"ok": True}
+
+    @app.post("/bot{token}/{method}")
+    async def bot_method(token: str, method: str, request: Request):
+        try:
+            payload = await request.json()
+        except ValueError:
+            payload = {}
+
+        if method == "getUpdates":
+            # Nothing to deliver; hold the long poll briefly like Telegram does
+            await asyncio.sleep(min(float(payload.get("timeout", 0) or 0), 1.0))
+            stats.calls["getUpdates 200"] += 1
+            return {"ok": True, "result": []}
+
+        await simulate_latency()
+
+        if method == "sendMessage":
+            roll = rng.random()
+            if roll < config.error_429:
+                stats.calls["sendMessage 429"] += 1
+                return _error(429, f"Too Many Requests: retry after {config.retry_after}", {"retry_after": config.retry_after})
+            roll -= config.error_429
+            if roll < config.error_403:
+                stats.calls["sendMessage 403"] += 1
+                return _error(403, "Forbidden: bot was blocked by the user")
+            roll -= config.error_403
+            if roll < config.error_5xx:
+                stats.calls["sendMessage 502"] += 1
+                return _error(502, "Bad Gateway")
+
+            now = time.time()
+            stats.calls["sendMessage 200"] += 1
+            stats.delivered += 1
+            stats.first_delivery = stats.first_delivery or now
+            stats.last_delivery = now
+            return {
+                "ok": True,
+                "result": {
+                    "message_id": stats.delivered,
+                    "chat": {"id": payload.get("chat_id")},
+                    "date": int(now),
+                    "text": payload.get("text"),
+                },
+            }
+
+        stats.calls[f"{method} 200"] += 1
+        if method == "getMe":
+            return {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Bench", "username": f"bench_{token[:6]}_bot"}}
+        if method in ("setWebhook", "deleteWebhook"):
+            return {"ok": True, "result": True, "description": "Webhook was set" if method == "setWebhook" else "Webhook was deleted"}
+        return {"ok": True, "result": True}
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Register the fake server options (shared with the throughput driver)."""
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="Mean Bot API latency")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="Uniform +/- latency jitter")
+    parser.add_argument("--error-429", type=float, default=0.0, help="Fraction of sends rejected with 429")
+    parser.add_argument("--error-403", type=float, default=0.0, help="Fraction of sends rejected with 403")
+    parser.add_argument("--error-5xx", type=float, default=0.0, help="Fraction of sends failing with 502")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after seconds for 429 responses")
+
+
+def config_from_args(args: argparse.Namespace) -> FakeTelegramConfig:
+    return FakeTelegramConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_429=args.error_429,
+        error_403=args.error_403,
+        error_5xx=args.error_5xx,
+        retry_after=args.retry_after,
+        seed=getattr(args, "seed", None),
+    )
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--seed", type=int, default=None)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Microbenchmark: per-message cost of keyword intent/action matching.
+
+Compares, on the same synthetic message texts and growing rule sets:
+- substring: what detect_intent/is_unsupported_action did before the
+  compiled matcher - lowercase the text, then `any(keyword in text)` per
+  label, one scan of the text per keyword
+- automaton: keyword_matcher.KeywordRules (one Aho-Corasick pass for every
+  label of every group); the per-text scan cache is disabled so every
+  message is really scanned
+
+The production rule groups are registered first; --rules adds synthetic
+labels with random keywords on top, showing how each approach scales with
+the number of rules.
+
+Usage:
+    DATABASE_URL=postgresql://u:p@localhost/db python -m benchmarks.keyword_matching --messages 5000 --rules 0,100,1000,5000
+
+(DATABASE_URL only needs to be set; nothing connects to it.)
+"""
+import argparse
+import logging
+import random
+import string
+import time
+from typing import Callable, Dict, List
+
+from benchmarks.payloads import generate_updates
+
+KEYWORDS_PER_RULE = 5
+
+
+def _synthetic_rules(count: int, rng: random.Random) -> Dict[str, List[str]]:
+    def word() -> str:
+        return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+
+    return {
+        f"rule_{index}": [
+            " ".join(word() for _ in range(rng.randint(1, 2))) for _ in range(KEYWORDS_PER_RULE)
+        ]
+        for index in range(count)
+    }
+
+
+def _time_per_message(fn: Callable[[str], object], texts: List[str], repeat: int) -> float:
+    """Best-of-repeat microseconds per message."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for text in texts:
+            fn(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(texts) * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare substring and Aho-Corasick keyword matching")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--rules", default="0,100,1000,5000", help="Comma-separated synthetic rule counts")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    # Importing these modules registers the production rule groups
+    from app.services import ai_brain, edge_case_handler, processor
+    from app.services.keyword_matcher import KeywordRules
+
+    texts = [
+        update["message"]["text"]
+        for update in generate_updates(args.messages, seed=args.seed)
+        if isinstance(update.get("message", {}).get("text"), str)
+    ]
+    production = {
+        "intent": ai_brain.INTENT_KEYWORDS,
+        "message_intent": processor.MESSAGE_INTENT_KEYWORDS,
+        "unsupported_action": edge_case_handler.UNSUPPORTED_ACTION_KEYWORDS,
+    }
+    rng = random.Random(args.seed)
+
+    print(f"\nKeyword matching ({len(texts)} messages, best of {args.repeat})")
+    print(f"  {'rules':>6} {'keywords':>9} {'substring us/msg':>17} {'automaton us/msg':>17} {'speedup':>8}")
+    for count in (int(value) for value in args.rules.split(",")):
+        groups = dict(production)
+        groups["synthetic"] = _synthetic_rules(count, rng)
+        keyword_lists = [
+            [keyword.rstrip("*") for keyword in keywords]
+            for rules in groups.values()
+            for keywords in rules.values()
+        ]
+        total_rules = sum(len(rules) for rules in groups.values())
+        total_keywords = sum(len(keywords) for keywords in keyword_lists)
+
+        def substring(text: str) -> list:
+            lowered = text.lower().strip()
+            return [any(keyword in lowered for keyword in keywords) for keywords in keyword_lists]
+
+        rules = KeywordRules(cache_size=0)
+        for group, group_rules in groups.items():
+            rules.add_group(group, group_rules)
+        rules.scan("warm up")  # Compile outside the timing
+
+        substring_us = _time_per_message(substring, texts, args.repeat)
+        automaton_us = _time_per_message(rules.scan, texts, args.repeat)
+        print(
+            f"  {total_rules:>6} {total_keywords:>9} {substring_us:>17.2f} {automaton_us:>17.2f} "
+            f"{substring_us / automaton_us:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
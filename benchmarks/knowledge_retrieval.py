@@ -0,0 +1,148 @@
+"""Microbenchmark: knowledge-base retrieval cost as the knowledge base grows.
+
+Compares, on the same synthetic knowledge base and messages:
+- linear: what find_answer did before the BM25 index - three passes over
+  every entry (keyword substring, question-in-message, message-in-question),
+  returning the first hit
+- bm25: knowledge_index.KnowledgeIndex.search (top 3), which only scores
+  entries sharing a term with the message
+
+Entries are generated from a Zipf-distributed vocabulary so that some words
+are common across many entries (as "price" or "order" are in real FAQs).
+Half of the messages paraphrase an entry's question (some of its words,
+shuffled, plus filler); the other half are unrelated chatter. Reported per
+size: index build time, per-message latency p50/p95 for both approaches,
+and how often each returned the paraphrased entry (hit@1).
+
+Usage:
+    DATABASE_URL=postgresql://u:p@localhost/db python -m benchmarks.knowledge_retrieval --sizes 1000,10000,50000 --messages 2000
+
+(DATABASE_URL only needs to be set; nothing connects to it.)
+"""
+import argparse
+import logging
+import random
+import string
+import time
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.stats import summarize
+
+
+def _vocabulary(size: int, rng: random.Random) -> List[str]:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10))))
+    return sorted(words)
+
+
+def _zipf_weights(size: int) -> List[float]:
+    return [1.0 / (rank + 1) for rank in range(size)]
+
+
+def _knowledge_base(count: int, vocabulary: List[str], weights: List[float], rng: random.Random) -> List[Dict]:
+    entries = []
+    for index in range(count):
+        question = rng.choices(vocabulary, weights, k=rng.randint(4, 9))
+        answer = rng.choices(vocabulary, weights, k=rng.randint(15, 40))
+        keywords = rng.sample(question, k=min(3, len(question)))
+        entries.append({
+            "question": " ".join(question).capitalize() + "?",
+            "answer": f"Answer {index}: " + " ".join(answer) + ".",
+            "keywords": keywords,
+        })
+    return entries
+
+
+def _messages(count: int, entries: List[Dict], vocabulary: List[str], rng: random.Random) -> List[Tuple[str, Optional[int]]]:
+    """(message, index of the paraphrased entry or None)."""
+    filler = ["hi", "please", "can you tell me", "i want to know", "thanks", "quick question"]
+    messages = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            target = rng.randrange(len(entries))
+            words = entries[target]["question"].rstrip("?").lower().split()
+            words = rng.sample(words, k=max(2, len(words) * 2 // 3))
+            messages.append((f"{rng.choice(filler)} {' '.join(words)}", target))
+        else:
+            chatter = " ".join(rng.choice(vocabulary[-2000:]) for _ in range(rng.randint(2, 8)))
+            messages.append((f"{rng.choice(filler)} {chatter}", None))
+    return messages
+
+
+def _linear_find(entries: List[Dict], message_text: str) -> Optional[str]:
+    """The pre-index find_answer: three linear passes, first hit wins."""
+    message_lower = message_text.lower().strip()
+    for entry in entries:
+        for keyword in entry.get("keywords", []):
+            if keyword.lower() in message_lower:
+                return entry["answer"]
+    for entry in entries:
+        question_lower = entry["question"].lower()
+        if question_lower and question_lower in message_lower:
+            return entry["answer"]
+    for entry in entries:
+        question_lower = entry["question"].lower()
+        if question_lower and message_lower in question_lower:
+            return entry["answer"]
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare linear and BM25 knowledge retrieval")
+    parser.add_argument("--sizes", default="1000,10000,50000", help="Comma-separated knowledge base sizes")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--linear-messages", type=int, default=200, help="Messages timed for the (slow) linear scan")
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    from app.services.knowledge_index import KnowledgeIndex
+
+    rng = random.Random(args.seed)
+    vocabulary = _vocabulary(args.vocabulary, rng)
+    weights = _zipf_weights(len(vocabulary))
+
+    print(f"\nKnowledge retrieval ({args.messages} messages for bm25, {args.linear_messages} for linear, top 3)")
+    print(
+        f"  {'entries':>8} {'build ms':>9} {'terms':>7} {'linear p50/p95 ms':>18} "
+        f"{'bm25 p50/p95 ms':>16} {'linear hit@1':>13} {'bm25 hit@1':>11}"
+    )
+    for size in (int(value) for value in args.sizes.split(",")):
+        entries = _knowledge_base(size, vocabulary, weights, rng)
+        messages = _messages(args.messages, entries, vocabulary, rng)
+
+        started = time.perf_counter()
+        index = KnowledgeIndex(entries)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        bm25_ms, bm25_hits, paraphrases = [], 0, 0
+        for text, target in messages:
+            started = time.perf_counter()
+            hits = index.search(text, top_k=3)
+            bm25_ms.append((time.perf_counter() - started) * 1000)
+            if target is not None:
+                paraphrases += 1
+                bm25_hits += bool(hits) and hits[0].answer == entries[target]["answer"]
+
+        linear_ms, linear_hits, linear_paraphrases = [], 0, 0
+        for text, target in messages[:args.linear_messages]:
+            started = time.perf_counter()
+            answer = _linear_find(entries, text)
+            linear_ms.append((time.perf_counter() - started) * 1000)
+            if target is not None:
+                linear_paraphrases += 1
+                linear_hits += answer == entries[target]["answer"]
+
+        bm25, linear = summarize(bm25_ms), summarize(linear_ms)
+        print(
+            f"  {size:>8} {build_ms:>9.0f} {index.term_count:>7} "
+            f"{linear['p50']:>8.3f}/{linear['p95']:<9.3f} {bm25['p50']:>7.3f}/{bm25['p95']:<8.3f} "
+            f"{linear_hits / max(1, linear_paraphrases):>13.1%} {bm25_hits / max(1, paraphrases):>11.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Microbenchmark: per-update CPU cost of webhook parsing and normalization.
+
+Compares, on the same synthetic payload bytes:
+- pydantic: what the webhook did before the fast path - decode the body,
+  validate it into TelegramUpdate (as FastAPI does for a model parameter),
+  then normalize_telegram_message into a Pydantic NormalizedMessage
+- fast: telegram_parser.parse_update on the raw bytes (orjson if installed)
+
+Usage:
+    DATABASE_URL=postgresql://u:p@localhost/db python -m benchmarks.parse_updates --updates 20000 --repeat 5
+
+(DATABASE_URL only needs to be set; nothing connects to it.)
+"""
+import argparse
+import json
+import logging
+import time
+from typing import Callable, List
+
+from benchmarks.payloads import generate_updates
+
+
+def _time_per_update(fn: Callable[[bytes], object], bodies: List[bytes], repeat: int) -> float:
+    """Best-of-repeat microseconds per update."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for body in bodies:
+            fn(body)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(bodies) * 1_000_000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare Pydantic and fast-path update parsing")
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # Long-text payloads log a truncation warning per update; keep that out of the timing
+    logging.disable(logging.WARNING)
+
+    from app.schemas import TelegramUpdate
+    from app.services import telegram_parser
+    from app.services.telegram import normalize_telegram_message
+
+    bodies = [
+        json.dumps(update, ensure_ascii=False).encode("utf-8")
+        for update in generate_updates(args.updates, seed=args.seed)
+    ]
+
+    def pydantic_path(body: bytes):
+        return normalize_telegram_message(TelegramUpdate.model_validate(json.loads(body)))
+
+    def fast_path(body: bytes):
+        return telegram_parser.parse_update(body)
+
+    # Sanity check: both paths agree on what they extract
+    for body in bodies[:500]:
+        slow, fast = pydantic_path(body), fast_path(body).message
+        assert (slow is None) == (fast is None), body
+        if slow is not None:
+            assert (slow.user_id, slow.message_text, slow.metadata) == (fast.user_id, fast.message_text, fast.metadata), body
+
+    pydantic_us = _time_per_update(pydantic_path, bodies, args.repeat)
+    fast_us = _time_per_update(fast_path, bodies, args.repeat)
+    average_size = sum(len(body) for body in bodies) / len(bodies)
+
+    decoder = "orjson" if telegram_parser.orjson is not None else "json (install orjson for more)"
+    print(f"\nUpdate parsing ({len(bodies)} updates, avg {average_size:.0f} bytes, best of {args.repeat}, decoder={decoder})")
+    print(f"  pydantic + normalize:  {pydantic_us:8.2f} us/update  ({1_000_000 / pydantic_us:,.0f} updates/sec)")
+    print(f"  fast path:             {fast_us:8.2f} us/update  ({1_000_000 / fast_us:,.0f} updates/sec)")
+    print(f"  speedup:               {pydantic_us / fast_us:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
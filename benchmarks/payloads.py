@@ -0,0 +1,160 @@
+"""Synthetic Telegram update generator for benchmarks.
+
+Produces raw webhook payloads (dicts, as Telegram POSTs them) with a realistic
+mix of traffic:
+- Short messages for every intent the brain knows (greeting, help, pricing,
+  human handoff) plus knowledge-base questions and unknown text
+- Long texts (including ones above the 2000 character truncation limit)
+- Emoji-only messages
+- Channel posts (no "from" field)
+- Non-text updates (stickers) that normalize to nothing
+
+Usage:
+    python -m benchmarks.payloads --count 5 --seed 1
+"""
+import argparse
+import json
+import random
+import time
+from typing import Dict, Iterator, List, Optional
+
+GREETINGS = ["hi", "hello", "hey there", "good morning", "Hello there!"]
+HELP = ["help", "what can you do?", "how can you help me", "I need support", "instructions please"]
+PRICING = ["how much does it cost?", "what is your pricing", "tell me about plans", "subscription fee?"]
+HUMAN = ["talk to someone", "I want a real person", "customer service please", "agent"]
+KNOWLEDGE = [
+    "How do I get started?",
+    "Do you offer a free trial?",
+    "what payment methods do you accept",
+    "can I cancel my subscription anytime",
+]
+UNKNOWN = ["asdf qwer", "the weather is nice today", "42", "ok", "thanks"]
+EMOJI = ["😀", "👍👍👍", "🔥🚀✨", "❤️", "🤔❓"]
+LOREM = (
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua. "
+)
+
+# (kind, weight) - roughly what a busy support bot sees
+DEFAULT_MIX = [
+    ("greeting", 20),
+    ("help", 10),
+    ("pricing", 15),
+    ("human", 5),
+    ("knowledge", 15),
+    ("unknown", 15),
+    ("long", 5),
+    ("emoji", 5),
+    ("channel_post", 5),
+    ("sticker", 5),
+]
+
+
+def _text_for(kind: str, rng: random.Random) -> Optional[str]:
+    """Message text for one payload kind (None for non-text updates)."""
+    if kind == "greeting":
+        return rng.choice(GREETINGS)
+    if kind == "help":
+        return rng.choice(HELP)
+    if kind == "pricing":
+        return rng.choice(PRICING)
+    if kind == "human":
+        return rng.choice(HUMAN)
+    if kind == "knowledge":
+        return rng.choice(KNOWLEDGE)
+    if kind == "emoji":
+        return rng.choice(EMOJI)
+    if kind == "long":
+        # Between ~500 and ~3000 characters, so some exceed the truncation limit
+        return (LOREM * rng.randint(4, 25)) + rng.choice(PRICING)
+    if kind == "sticker":
+        return None
+    return rng.choice(UNKNOWN)
+
+
+def make_update(
+    update_id: int,
+    chat_id: int,
+    kind: str,
+    rng: random.Random,
+    date: Optional[int] = None,
+) -> Dict:
+    """
+    Build a single raw Telegram update payload.
+
+    Args:
+        update_id: Telegram update_id
+        chat_id: Chat (and user) id the message comes from
+        kind: One of the DEFAULT_MIX kinds
+        rng: Random source
+        date: Unix timestamp (defaults to now)
+
+    Returns:
+        Payload dict as Telegram would POST it to the webhook
+    """
+    date = date if date is not None else int(time.time())
+    if kind == "channel_post":
+        return {
+            "update_id": update_id,
+            "channel_post": {
+                "message_id": update_id,
+                "chat": {"id": -1000000000000 - chat_id, "type": "channel", "title": f"Channel {chat_id}"},
+                "date": date,
+                "text": rng.choice(GREETINGS + PRICING + UNKNOWN),
+            },
+        }
+
+    message = {
+        "message_id": update_id,
+        "from": {"id": chat_id, "is_bot": False, "first_name": f"User{chat_id}", "language_code": "en"},
+        "chat": {"id": chat_id, "type": "private", "first_name": f"User{chat_id}"},
+        "date": date,
+    }
+    text = _text_for(kind, rng)
+    if text is None:
+        message["sticker"] = {"file_id": f"sticker-{update_id}", "emoji": "👍", "width": 512, "height": 512}
+    else:
+        message["text"] = text
+    return {"update_id": update_id, "message": message}
+
+
+def generate_updates(
+    count: int,
+    chats: int = 1000,
+    seed: int = 42,
+    start_update_id: int = 1,
+    mix: Optional[List] = None,
+) -> Iterator[Dict]:
+    """
+    Generate a deterministic stream of synthetic updates.
+
+    Args:
+        count: Number of updates
+        chats: Number of distinct chats messages are spread over
+        seed: Random seed (same seed, same stream)
+        start_update_id: First update_id
+        mix: Optional [(kind, weight), ...] overriding DEFAULT_MIX
+
+    Yields:
+        Raw update payload dicts
+    """
+    rng = random.Random(seed)
+    kinds, weights = zip(*(mix or DEFAULT_MIX))
+    for offset in range(count):
+        kind = rng.choices(kinds, weights=weights)[0]
+        chat_id = 100000 + rng.randrange(chats)
+        yield make_update(start_update_id + offset, chat_id, kind, rng)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Print synthetic Telegram updates as JSON lines")
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    for update in generate_updates(args.count, chats=args.chats, seed=args.seed):
+        print(json.dumps(update, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Microbenchmark: latency of the character n-gram similarity stage.
+
+Builds semantic_index.SemanticIndex over synthetic knowledge bases (same
+generator as benchmarks.knowledge_retrieval) and times SemanticIndex.search
+(top 3) on messages that paraphrase an entry with typos (a character
+dropped from some words) or are unrelated. For comparison it also times the
+dense equivalent: the same hashed vectors folded into a (entries x --dense-dim)
+float32 matrix, scored with one dense matrix-vector product plus
+np.argpartition.
+
+Reported per size: build time, matrix memory, search p50/p95/p99 for both
+layouts, and how often the sparse index ranked the paraphrased entry first.
+
+Usage:
+    DATABASE_URL=postgresql://u:p@localhost/db python -m benchmarks.semantic_search --sizes 1000,10000,50000
+
+(DATABASE_URL only needs to be set; nothing connects to it. Needs numpy.)
+"""
+import argparse
+import logging
+import random
+import time
+from typing import List, Optional, Tuple
+
+from benchmarks.knowledge_retrieval import _knowledge_base, _vocabulary, _zipf_weights
+from benchmarks.stats import summarize
+
+
+def _typo(word: str, rng: random.Random) -> str:
+    if len(word) < 5:
+        return word
+    position = rng.randrange(1, len(word) - 1)
+    return word[:position] + word[position + 1:]
+
+
+def _messages(count: int, texts: List[str], vocabulary: List[str], rng: random.Random) -> List[Tuple[str, Optional[int]]]:
+    messages = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            target = rng.randrange(len(texts))
+            words = texts[target].lower().rstrip("?").split()
+            words = [_typo(word, rng) if rng.random() < 0.4 else word for word in rng.sample(words, k=max(2, len(words) // 2))]
+            messages.append((" ".join(words), target))
+        else:
+            messages.append((" ".join(rng.choice(vocabulary[-2000:]) for _ in range(rng.randint(2, 8))), None))
+    return messages
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Time the hashed n-gram similarity search")
+    parser.add_argument("--sizes", default="1000,10000,50000", help="Comma-separated knowledge base sizes")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--dense-dim", type=int, default=256, help="Dimensions of the dense comparison matrix")
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    import numpy as np
+
+    from app.services.semantic_index import SemanticIndex, features
+
+    rng = random.Random(args.seed)
+    vocabulary = _vocabulary(args.vocabulary, rng)
+    weights = _zipf_weights(len(vocabulary))
+
+    print(f"\nSemantic search ({args.messages} messages, top 3, dense comparison at {args.dense_dim} dims)")
+    print(
+        f"  {'entries':>8} {'build ms':>9} {'sparse MB':>10} {'sparse p50/p95/p99 ms':>22} "
+        f"{'dense MB':>9} {'dense p50/p95/p99 ms':>21} {'hit@1':>7}"
+    )
+    for size in (int(value) for value in args.sizes.split(",")):
+        entries = _knowledge_base(size, vocabulary, weights, rng)
+        texts = [" ".join([entry["question"], *entry["keywords"]]) for entry in entries]
+        messages = _messages(args.messages, [entry["question"] for entry in entries], vocabulary, rng)
+
+        started = time.perf_counter()
+        index = SemanticIndex(texts)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        sparse_ms, hits, paraphrases = [], 0, 0
+        for text, target in messages:
+            started = time.perf_counter()
+            results = index.search(text, top_k=3)
+            sparse_ms.append((time.perf_counter() - started) * 1000)
+            if target is not None:
+                paraphrases += 1
+                hits += bool(results) and results[0][0] == target
+
+        # Dense baseline: same n-gram features folded into fewer dimensions
+        dense = np.zeros((size, args.dense_dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for bucket, count in features(text).items():
+                dense[row, bucket % args.dense_dim] += count
+        dense /= np.maximum(np.linalg.norm(dense, axis=1, keepdims=True), 1e-9)
+        dense_ms = []
+        for text, _ in messages:
+            started = time.perf_counter()
+            query = np.zeros(args.dense_dim, dtype=np.float32)
+            for bucket, count in features(text).items():
+                query[bucket % args.dense_dim] += count
+            scores = dense @ query
+            top = np.argpartition(scores, -3)[-3:]
+            top[np.argsort(-scores[top])]
+            dense_ms.append((time.perf_counter() - started) * 1000)
+
+        sparse, dense_summary = summarize(sparse_ms), summarize(dense_ms)
+        print(
+            f"  {size:>8} {build_ms:>9.0f} {index.nbytes / 1e6:>10.1f} "
+            f"{sparse['p50']:>8.3f}/{sparse['p95']:.3f}/{sparse['p99']:<7.3f} "
+            f"{dense.nbytes / 1e6:>9.1f} {dense_summary['p50']:>7.3f}/{dense_summary['p95']:.3f}/{dense_summary['p99']:<6.3f} "
+            f"{hits / max(1, paraphrases):>7.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Microbenchmark: bytes of per-user state, three parallel stores vs one session.
+
+Builds the state of --users users the way a conversation leaves it (a few
+messages each: last intent, message count, unknown streak, recent message
+times) in two layouts and measures the allocations with tracemalloc:
+- parallel: what the services kept before UserSession - a memory dict
+  {"last_intent", "message_count", "unknown_intent_count"}, a list of spam
+  timestamps and an unknown-intent counter, each in its own
+  BoundedStateStore
+- session: one user_session.UserSession (slots, interned intent code,
+  array("d") timestamp ring) in a single BoundedStateStore
+
+Reported per layout: bytes per user for the records alone and including the
+store entries (user id strings are allocated beforehand and not counted).
+
+Usage:
+    DATABASE_URL=postgresql://u:p@localhost/db python -m benchmarks.session_memory --users 100000
+
+(DATABASE_URL only needs to be set; nothing connects to it.)
+"""
+import argparse
+import gc
+import logging
+import random
+import tracemalloc
+from typing import Callable, List, Tuple
+
+INTENTS = ("greeting", "help", "pricing", "human", "unknown")
+
+
+def _conversations(count: int, rng: random.Random) -> List[Tuple[str, str, int, int, List[float]]]:
+    """(user id, last intent, message count, unknown streak, recent message times)."""
+    now = 1_700_000_000.0
+    return [
+        (
+            f"tg:{rng.randrange(10**9, 10**10)}",
+            rng.choice(INTENTS),
+            rng.randint(1, 40),
+            rng.randint(0, 3),
+            sorted(now - rng.uniform(0, 10) for _ in range(rng.randint(1, 5))),
+        )
+        for _ in range(count)
+    ]
+
+
+def _measure(build: Callable[[], object]) -> Tuple[int, object]:
+    """Bytes allocated (and still held) by build(), plus its result."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return held, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bytes per user of per-user state layouts")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    from app.services.state_store import BoundedStateStore
+    from app.services.user_session import UserSession, intent_code
+
+    conversations = _conversations(args.users, random.Random(args.seed))
+    for intent in INTENTS:
+        intent_code(intent)
+
+    def parallel_records():
+        records = []
+        for _, intent, count, streak, stamps in conversations:
+            records.append({"last_intent": intent, "message_count": count, "unknown_intent_count": streak})
+            records.append([stamp + 0.0 for stamp in stamps])  # Fresh floats, as time.time() gives
+            records.append(streak)
+        return records
+
+    def session_record(intent: str, count: int, streak: int, stamps: List[float]) -> UserSession:
+        session = UserSession()
+        session.record_intent(intent)
+        session.message_count = count
+        session.unknown_streak = streak
+        for stamp in stamps:
+            session.add_message_time(stamp)
+        return session
+
+    def session_records():
+        return [session_record(intent, count, streak, stamps) for _, intent, count, streak, stamps in conversations]
+
+    def parallel_stores():
+        memory, spam, unknown = (
+            BoundedStateStore(f"bench_{name}", max_entries=args.users, idle_ttl_seconds=3600)
+            for name in ("memory", "spam", "unknown")
+        )
+        for user_id, intent, count, streak, stamps in conversations:
+            memory[user_id] = {"last_intent": intent, "message_count": count, "unknown_intent_count": streak}
+            spam[user_id] = [stamp + 0.0 for stamp in stamps]
+            unknown[user_id] = streak
+        return memory, spam, unknown
+
+    def session_store():
+        sessions = BoundedStateStore("bench_session", max_entries=args.users, idle_ttl_seconds=3600)
+        for user_id, intent, count, streak, stamps in conversations:
+            sessions[user_id] = session_record(intent, count, streak, stamps)
+        return sessions
+
+    print(f"\nPer-user state ({args.users:,} users)")
+    print(f"  {'layout':>10} {'records B/user':>15} {'with stores B/user':>19}")
+    for name, records, stores in (
+        ("parallel", parallel_records, parallel_stores),
+        ("session", session_records, session_store),
+    ):
+        record_bytes, kept = _measure(records)
+        del kept
+        store_bytes, kept = _measure(stores)
+        del kept
+        print(f"  {name:>10} {record_bytes / args.users:>15.0f} {store_bytes / args.users:>19.0f}")
+
+
+if __name__ == "__main__":
+    main()
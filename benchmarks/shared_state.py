@@ -0,0 +1,188 @@
+"""Benchmark: per-user session state across several workers.
+
+Replays one conversation stream (--users users, --rounds messages each,
+mixed known/unknown intents) through ai_brain.process_message, sending each
+message to a randomly chosen simulated worker. A worker is its own local
+session store plus its own SharedSessions; between rounds every worker
+flushes, as its background flusher would during the >= 2s a user waits
+between accepted messages. Runs:
+- reference: one worker (what a single process answers)
+- per-worker state: --workers workers, STATE_BACKEND=memory
+- shared state: --workers workers on the chosen backend
+
+Reported per run: replies that differ from the reference, users whose final
+message_count is wrong, backend round trips per message, and per-message
+latency p50/p99. Workers are simulated in one process (the local store and
+shared_sessions are swapped before each message), so the messages run one at
+a time; the spam clock is simulated too.
+
+Usage:
+    DATABASE_URL=postgresql://u:p@localhost/db python -m benchmarks.shared_state --latency-ms 0.5
+    DATABASE_URL=postgresql://... python -m benchmarks.shared_state --backend postgres
+
+With --backend redis (default) a local fake server is started unless
+--redis-url is given (see benchmarks.fake_redis). --backend postgres needs a
+reachable DATABASE_URL with the user_sessions table.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.stats import summarize
+
+TEXTS = ("hi", "hello", "price?", "help", "pricing plans", "blah blah", "qwerty", "zzz", "asdf")
+
+
+class _Clock:
+    """Stands in for the time module in edge_case_handler (spam window)."""
+
+    def __init__(self) -> None:
+        self.now = 1_700_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+def _stream(users: int, rounds: int, seed: int) -> List[List[Tuple[str, str]]]:
+    """Rounds of (user id, text), one message per user per round."""
+    rng = random.Random(seed)
+    user_ids = [f"tg:{rng.randrange(10**9, 10**10)}" for _ in range(users)]
+    stream = []
+    for _ in range(rounds):
+        batch = [(user_id, rng.choice(TEXTS)) for user_id in user_ids]
+        rng.shuffle(batch)
+        stream.append(batch)
+    return stream
+
+
+async def _run(stream, workers: int, backend_factory, seed: int) -> Dict[str, object]:
+    from app.config import settings
+    from app.schemas import NormalizedMessage
+    from app.services import ai_brain, edge_case_handler, user_session
+    from app.services.state_backend import SharedSessions
+    from app.services.state_store import BoundedStateStore
+
+    clock = _Clock()
+    edge_case_handler.time = clock
+    rng = random.Random(seed)
+    pool = []
+    for number in range(workers):
+        store = BoundedStateStore(f"bench_worker_{number}", max_entries=10**7, idle_ttl_seconds=10**9)
+        shared = SharedSessions(
+            backend_factory(),
+            flush_interval=settings.state_flush_interval,
+            timeout=settings.state_backend_timeout,
+        )
+        pool.append((store, shared))
+
+    replies: List[str] = []
+    latencies: List[float] = []
+    last_worker: Dict[str, int] = {}
+    sent: Dict[str, int] = {}
+    round_trips = 0
+    try:
+        for batch in stream:
+            clock.now += 3.0  # Past the spam threshold for every user
+            for user_id, text in batch:
+                number = rng.randrange(workers)
+                store, shared = pool[number]
+                user_session._sessions = store
+                ai_brain.shared_sessions = shared
+                before = shared._round_trips.value
+                started = time.perf_counter()
+                reply = await ai_brain.process_message(
+                    NormalizedMessage(channel="telegram", user_id=user_id, message_text=text)
+                )
+                latencies.append((time.perf_counter() - started) * 1000)
+                round_trips += shared._round_trips.value - before
+                replies.append(reply)
+                last_worker[user_id] = number
+                sent[user_id] = sent.get(user_id, 0) + 1
+            for store, shared in pool:
+                user_session._sessions = store
+                await shared.flush()
+    finally:
+        for store, shared in pool:
+            await shared.backend.close()
+
+    wrong_counts = 0
+    for user_id, count in sent.items():
+        session = pool[last_worker[user_id]][0].get(user_id)
+        if session is None or session.message_count != count:
+            wrong_counts += 1
+    return {
+        "replies": replies,
+        "wrong_counts": wrong_counts,
+        "round_trips": round_trips,
+        "latency": summarize(latencies),
+    }
+
+
+def _report(label: str, result: Dict[str, object], reference: Optional[List[str]], users: int) -> None:
+    replies = result["replies"]
+    differing = sum(1 for a, b in zip(replies, reference) if a != b) if reference else 0
+    latency = result["latency"]
+    print(
+        f"  {label:<22} {differing:>9} {result['wrong_counts']:>7}/{users:<6} "
+        f"{result['round_trips'] / len(replies):>8.2f} {latency['p50']:>8.3f} {latency['p99']:>8.3f}"
+    )
+
+
+async def _main(args: argparse.Namespace) -> None:
+    from app.services import knowledge_service
+    from app.services.state_backend import PostgresStateBackend, RedisStateBackend, StateBackend
+
+    knowledge_service.load_knowledge()
+    stream = _stream(args.users, args.rounds, args.seed)
+
+    server = None
+    if args.backend == "redis":
+        redis_url = args.redis_url
+        if redis_url is None:
+            from benchmarks.fake_redis import start_server
+
+            _, server = await start_server("127.0.0.1", 0, args.latency_ms)
+            redis_url = f"redis://127.0.0.1:{server.sockets[0].getsockname()[1]}/0"
+        shared_factory = lambda: RedisStateBackend(redis_url, ttl_seconds=3600, timeout=args.timeout)
+    else:
+        shared_factory = lambda: PostgresStateBackend(ttl_seconds=3600)
+
+    print(
+        f"\nShared session state ({args.users} users x {args.rounds} messages, "
+        f"{args.workers} workers, backend={args.backend})"
+    )
+    print(f"  {'run':<22} {'replies!=':>9} {'bad count':>14} {'rt/msg':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    try:
+        reference = await _run(stream, 1, StateBackend, args.seed)
+        _report("reference (1 worker)", reference, None, args.users)
+        local = await _run(stream, args.workers, StateBackend, args.seed)
+        _report("per-worker state", local, reference["replies"], args.users)
+        shared = await _run(stream, args.workers, shared_factory, args.seed)
+        _report(f"shared ({args.backend})", shared, reference["replies"], args.users)
+    finally:
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Session state continuity across workers")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=20, help="Messages per user")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--backend", choices=("redis", "postgres"), default="redis")
+    parser.add_argument("--redis-url", default=None, help="Use a real server instead of the fake one")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fake Redis latency per round trip")
+    parser.add_argument("--timeout", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
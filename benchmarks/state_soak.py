@@ -0,0 +1,77 @@
+"""Soak test: process memory while millions of distinct users send a message.
+
+Every simulated message does what ai_brain does to per-user state: a spam
+check (edge_case_handler.is_spam), unknown-intent tracking and a
+conversation memory update, each for a user id never seen before. RSS is
+sampled every --report-every users.
+
+With the bounded session store, RSS levels off once USER_STATE_MAX_ENTRIES
+users are held and stays flat; with --unbounded it is swapped for a plain
+dict (no eviction) and RSS grows with every user.
+
+Usage:
+    DATABASE_URL=postgresql://u:p@localhost/db python -m benchmarks.state_soak --users 2000000
+    DATABASE_URL=postgresql://u:p@localhost/db python -m benchmarks.state_soak --users 2000000 --unbounded
+
+(DATABASE_URL only needs to be set; nothing connects to it. Set
+USER_STATE_MAX_ENTRIES to try other bounds. RSS is read from /proc, so
+Linux only.)
+"""
+import argparse
+import gc
+import logging
+import os
+import time
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as statm:
+        resident_pages = int(statm.read().split()[1])
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="RSS of per-user state under millions of distinct users")
+    parser.add_argument("--users", type=int, default=2_000_000)
+    parser.add_argument("--report-every", type=int, default=250_000)
+    parser.add_argument("--unbounded", action="store_true", help="Use a plain dict (no eviction)")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    from app.services import edge_case_handler, memory, metrics, user_session
+
+    if args.unbounded:
+        user_session._sessions = {}
+
+    intents = ("greeting", "pricing", "help", "unknown")
+    gc.collect()
+    baseline = _rss_mb()
+    print(f"\nPer-user state soak ({'unbounded dict' if args.unbounded else 'bounded store'}, {args.users:,} users)")
+    print(f"  {'users':>10} {'rss MB':>8} {'+MB':>7} {'sessions':>9} {'us/user':>8}")
+    started = time.perf_counter()
+    for number in range(1, args.users + 1):
+        user_id = f"tg:{number}"
+        intent = intents[number % len(intents)]
+        edge_case_handler.is_spam(user_id)
+        edge_case_handler.track_unknown_intent(user_id, intent)
+        memory.update_memory(user_id, intent)
+        if number % args.report_every == 0:
+            elapsed = time.perf_counter() - started
+            rss = _rss_mb()
+            print(
+                f"  {number:>10,} {rss:>8.1f} {rss - baseline:>7.1f} {len(user_session._sessions):>9} "
+                f"{elapsed / args.report_every * 1e6:>8.2f}"
+            )
+            started = time.perf_counter()
+
+    if not args.unbounded:
+        evictions = {
+            key: value for key, value in metrics.snapshot()["counters"].items()
+            if key.startswith("state_store_evictions")
+        }
+        print(f"  evictions: {evictions}")
+
+
+if __name__ == "__main__":
+    main()
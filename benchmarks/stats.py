@@ -0,0 +1,43 @@
+"""Small helpers shared by the benchmark scripts."""
+from typing import Dict, List, Optional, Sequence
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> Optional[float]:
+    """
+    Nearest-rank percentile of an already sorted sequence.
+
+    Args:
+        sorted_values: Measurements in ascending order
+        q: Percentile as a fraction (0.95 for p95)
+
+    Returns:
+        The percentile value, or None for an empty sequence
+    """
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    """Summarize measurements (e.g. latencies in ms) as count/avg/p50/p95/p99/max."""
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "avg": round(sum(ordered) / len(ordered), 3) if ordered else None,
+        "p50": percentile(ordered, 0.50),
+        "p95": percentile(ordered, 0.95),
+        "p99": percentile(ordered, 0.99),
+        "max": ordered[-1] if ordered else None,
+    }
+
+
+def format_summary(label: str, summary: Dict[str, Optional[float]], unit: str = "ms") -> str:
+    """Render a summary as one aligned report line."""
+    def fmt(value):
+        return "-" if value is None else f"{value:.2f}{unit}"
+
+    return (
+        f"{label:<28} n={summary['count']:<7} avg={fmt(summary['avg'])} p50={fmt(summary['p50'])} "
+        f"p95={fmt(summary['p95'])} p99={fmt(summary['p99'])} max={fmt(summary['max'])}"
+    )
@@ -0,0 +1,222 @@
+"""End-to-end webhook throughput benchmark.
+
+Drives the real application (in-process, through its ASGI interface) with
+synthetic updates and measures the full webhook -> brain -> send -> save
+path against the local fake Bot API server:
+
+1. Starts benchmarks.fake_telegram in a subprocess with the requested
+   latency/error profile and points TELEGRAM_API_BASE_URL at it
+2. Runs the app lifespan (HTTP pool, outbox, conversation buffer) and
+   registers synthetic bots in the bot index
+3. POSTs generated updates to /telegram/webhook/{integration_id} from
+   --concurrency parallel senders
+4. Waits until the fake server has received the replies, then reports
+   webhook latency percentiles, acknowledged updates/sec and delivered
+   replies/sec, plus the app's own send/queue/flush metrics
+
+Conversations are saved to DATABASE_URL; without a reachable database the
+save step fails (and is reported) but everything else is still measured.
+
+Usage:
+    DATABASE_URL=postgresql://... python -m benchmarks.webhook_throughput \
+        --updates 5000 --concurrency 100 --bots 4 --latency-ms 40 --error-429 0.01
+
+Telegram's real per-bot/per-chat limits apply to the outbox; raise them for
+raw-capacity runs, e.g. TELEGRAM_BOT_RATE_LIMIT=100000 TELEGRAM_CHAT_RATE_LIMIT=100000.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks import fake_telegram
+from benchmarks.payloads import generate_updates
+from benchmarks.stats import format_summary, summarize
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Webhook -> brain -> send -> save throughput benchmark")
+    parser.add_argument("--updates", type=int, default=2000, help="Number of updates to POST")
+    parser.add_argument("--concurrency", type=int, default=50, help="Parallel webhook requests")
+    parser.add_argument("--bots", type=int, default=1, help="Synthetic bots (integrations) to spread updates over")
+    parser.add_argument("--chats", type=int, default=1000, help="Distinct chats per run")
+    parser.add_argument("--business-id", type=int, default=1, help="business_id the synthetic bots belong to")
+    parser.add_argument("--mode", choices=["queued", "direct", "inline"], default="queued",
+                        help="queued: outbox delivery; direct: send+save inside the request; inline: reply in the response")
+    parser.add_argument("--drain-timeout", type=float, default=120.0, help="Max seconds to wait for queued replies")
+    parser.add_argument("--port", type=int, default=0, help="Fake Bot API port (default: random free port)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    fake_telegram.add_arguments(parser)
+    return parser.parse_args()
+
+
+async def _start_fake_server(args: argparse.Namespace, port: int) -> asyncio.subprocess.Process:
+    """Launch the fake Bot API and wait until it answers."""
+    command = [
+        sys.executable, "-m", "benchmarks.fake_telegram",
+        "--port", str(port), "--seed", str(args.seed),
+        "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+        "--error-429", str(args.error_429), "--error-403", str(args.error_403),
+        "--error-5xx", str(args.error_5xx), "--retry-after", str(args.retry_after),
+    ]
+    process = await asyncio.create_subprocess_exec(*command)
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(f"http://127.0.0.1:{port}/stats")
+                return process
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"Fake Telegram server did not start on port {port}")
+
+
+def _register_bots(count: int, business_id: int) -> List:
+    """Add synthetic Telegram integrations to the in-process bot index."""
+    from app.models import ChannelIntegration
+    from app.services import bot_registry
+
+    bots = []
+    for index in range(count):
+        integration = ChannelIntegration(
+            id=900000 + index,
+            business_id=business_id,
+            channel="telegram",
+            channel_name=f"Benchmark bot {index}",
+            credentials=json.dumps({"bot_token": f"{900000 + index}:BENCHMARK-TOKEN", "bot_username": f"bench{index}_bot"}),
+            is_active=True,
+        )
+        bots.append(bot_registry.register_integration(integration))
+    return bots
+
+
+async def run(args: argparse.Namespace) -> Dict:
+    from app.main import app
+    from app.services import metrics
+    from app.services.telegram_outbox import outbox
+
+    updates = list(generate_updates(args.updates, chats=args.chats, seed=args.seed))
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    inline_replies = 0
+
+    async with app.router.lifespan_context(app):
+        if args.mode == "direct":
+            # Without the outbox the request itself sends and saves
+            await outbox.stop()
+        bots = _register_bots(args.bots, args.business_id)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for index, update in enumerate(updates):
+            queue.put_nowait((bots[index % len(bots)], update))
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+            async def sender() -> None:
+                nonlocal inline_replies
+                while not queue.empty():
+                    bot, update = queue.get_nowait()
+                    started = time.perf_counter()
+                    response = await client.post(
+                        f"/telegram/webhook/{bot.integration_id}",
+                        json=update,
+                        headers={"X-Telegram-Bot-Api-Secret-Token": bot.secret_token},
+                    )
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                    if response.status_code == 200 and response.json().get("method") == "sendMessage":
+                        inline_replies += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(sender() for _ in range(args.concurrency)))
+            ack_elapsed = time.perf_counter() - started
+
+            # Draining the outbox waits for every queued send and its conversation save
+            if args.mode == "queued":
+                await outbox.stop(timeout=args.drain_timeout)
+            delivered_elapsed = time.perf_counter() - started
+
+        async with httpx.AsyncClient() as stats_client:
+            fake_stats = (await stats_client.get(f"{os.environ['TELEGRAM_API_BASE_URL']}/stats")).json()
+
+        snapshot = metrics.snapshot()
+
+    delivered = fake_stats["delivered"] + inline_replies
+    return {
+        "mode": args.mode,
+        "updates": len(updates),
+        "concurrency": args.concurrency,
+        "bots": args.bots,
+        "statuses": statuses,
+        "webhook_latency_ms": summarize(latencies),
+        "acked_per_sec": round(len(updates) / ack_elapsed, 1) if ack_elapsed else None,
+        "delivered": delivered,
+        "delivered_per_sec": round(delivered / delivered_elapsed, 1) if delivered_elapsed else None,
+        "ack_elapsed_s": round(ack_elapsed, 3),
+        "delivery_elapsed_s": round(delivered_elapsed, 3),
+        "telegram_api_calls": fake_stats["calls"],
+        "app_histograms": {
+            key: value for key, value in snapshot["histograms"].items()
+            if key.startswith(("telegram_send_latency_ms", "telegram_outbox_wait_ms", "conversation_flush_ms"))
+        },
+        "app_counters": {
+            key: value for key, value in snapshot["counters"].items()
+            if key.startswith(("telegram_outbox", "conversation_buffer", "telegram_updates", "telegram_coalesce", "webhook_shed"))
+        },
+    }
+
+
+def print_report(report: Dict) -> None:
+    print(f"\nWebhook throughput ({report['mode']}, {report['updates']} updates, "
+          f"concurrency={report['concurrency']}, bots={report['bots']})")
+    print(f"  HTTP statuses:        {report['statuses']}")
+    print(f"  Acknowledged:         {report['acked_per_sec']} updates/sec in {report['ack_elapsed_s']}s")
+    print(f"  Delivered:            {report['delivered']} replies, {report['delivered_per_sec']}/sec in {report['delivery_elapsed_s']}s")
+    print(f"  Bot API calls:        {report['telegram_api_calls']}")
+    print("  " + format_summary("webhook latency", report["webhook_latency_ms"]))
+    for key, summary in report["app_histograms"].items():
+        print("  " + format_summary(key, summary))
+    for key, value in report["app_counters"].items():
+        print(f"  {key:<28} {value}")
+
+
+def main() -> None:
+    args = parse_args()
+    port = args.port or _free_port()
+
+    # Settings are read at import time, so configure the app before importing it
+    os.environ["TELEGRAM_API_BASE_URL"] = f"http://127.0.0.1:{port}"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if args.mode == "inline":
+        os.environ["TELEGRAM_INLINE_REPLIES"] = "true"
+
+    async def run_with_server() -> Dict:
+        server = await _start_fake_server(args, port)
+        try:
+            return await run(args)
+        finally:
+            server.terminate()
+            await server.wait()
+
+    report = asyncio.run(run_with_server())
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
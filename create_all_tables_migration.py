@@ -393,6 +393,57 @@ CREATE INDEX IF NOT EXISTS idx_onboarding_progress_user_id ON onboarding_progres
 CREATE INDEX IF NOT EXISTS idx_onboarding_progress_business_id ON onboarding_progress(business_id);
 CREATE INDEX IF NOT EXISTS idx_onboarding_progress_step_key ON onboarding_progress(step_key);
 
+-- ========== BROADCAST TABLES ==========
+
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id SERIAL PRIMARY KEY,
+    business_id INTEGER REFERENCES businesses(id) NOT NULL,
+    integration_id INTEGER REFERENCES channel_integrations(id) NOT NULL,
+    channel VARCHAR DEFAULT 'telegram' NOT NULL,
+    ad_asset_id INTEGER REFERENCES ad_assets(id),
+    text TEXT NOT NULL,
+    status VARCHAR DEFAULT 'pending' NOT NULL,
+    sent_count INTEGER DEFAULT 0 NOT NULL,
+    failed_count INTEGER DEFAULT 0 NOT NULL,
+    cursor_user_id VARCHAR,
+    lease_owner VARCHAR,
+    lease_expires_at TIMESTAMP WITHOUT TIME ZONE,
+    error TEXT,
+    created_by_user_id INTEGER REFERENCES users(id),
+    started_at TIMESTAMP WITHOUT TIME ZONE,
+    completed_at TIMESTAMP WITHOUT TIME ZONE,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW() NOT NULL,
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW() NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_broadcasts_business_id ON broadcasts(business_id);
+CREATE INDEX IF NOT EXISTS idx_broadcasts_status ON broadcasts(status);
+
+-- Broadcast audience scans (DISTINCT user_id per business/channel)
+CREATE INDEX IF NOT EXISTS ix_conversations_business_channel_user ON conversations(business_id, channel, user_id);
+
+-- ========== WEBHOOK DEDUPLICATION TABLES ==========
+
+CREATE TABLE IF NOT EXISTS processed_updates (
+    id SERIAL PRIMARY KEY,
+    bot_key VARCHAR NOT NULL,
+    update_id BIGINT NOT NULL,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW() NOT NULL,
+    CONSTRAINT uq_processed_updates_bot_update UNIQUE (bot_key, update_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_processed_updates_created_at ON processed_updates(created_at);
+
+-- ========== SHARED SESSION STATE TABLES ==========
+
+CREATE TABLE IF NOT EXISTS user_sessions (
+    user_id VARCHAR PRIMARY KEY,
+    data BYTEA NOT NULL,
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW() NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_sessions_updated_at ON user_sessions(updated_at);
+
 -- ========== INSERT DEFAULT DATA ==========
 
 -- Insert default permissions
@@ -201,6 +201,70 @@ BEGIN
     END IF;
 END $$;
 
+-- ============================================
+-- 6. Add credentials_version to channel_integrations table
+--    (bumped on connect/disconnect so workers refresh cached bot credentials)
+-- ============================================
+DO $$ 
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns 
+        WHERE table_name = 'channel_integrations' AND column_name = 'credentials_version'
+    ) THEN
+        ALTER TABLE channel_integrations 
+        ADD COLUMN credentials_version INTEGER NOT NULL DEFAULT 1;
+        
+        RAISE NOTICE 'Added credentials_version column to channel_integrations table';
+    ELSE
+        RAISE NOTICE 'credentials_version column already exists in channel_integrations table';
+    END IF;
+END $$;
+
+-- ============================================
+-- 7. Add knowledge_version to businesses table
+--    (bumped on knowledge entry writes so workers rebuild cached knowledge indexes)
+-- ============================================
+DO $$ 
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns 
+        WHERE table_name = 'businesses' AND column_name = 'knowledge_version'
+    ) THEN
+        ALTER TABLE businesses 
+        ADD COLUMN knowledge_version INTEGER NOT NULL DEFAULT 1;
+        
+        RAISE NOTICE 'Added knowledge_version column to businesses table';
+    ELSE
+        RAISE NOTICE 'knowledge_version column already exists in businesses table';
+    END IF;
+END $$;
+
+-- ============================================
+-- 8. Add unique (business_id, user_id, channel) to conversation_memory
+--    (target of the batched memory upserts; duplicates keep the newest row)
+-- ============================================
+DO $$ 
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint 
+        WHERE conname = 'uq_conversation_memory_business_user_channel'
+    ) THEN
+        DELETE FROM conversation_memory older
+        USING conversation_memory newer
+        WHERE older.business_id = newer.business_id
+          AND older.user_id = newer.user_id
+          AND older.channel = newer.channel
+          AND (older.updated_at, older.id) < (newer.updated_at, newer.id);
+        
+        ALTER TABLE conversation_memory 
+        ADD CONSTRAINT uq_conversation_memory_business_user_channel UNIQUE (business_id, user_id, channel);
+        
+        RAISE NOTICE 'Added unique (business_id, user_id, channel) to conversation_memory table';
+    ELSE
+        RAISE NOTICE 'conversation_memory unique (business_id, user_id, channel) already exists';
+    END IF;
+END $$;
+
 -- ============================================
 -- Summary
 -- ============================================
@@ -213,7 +277,13 @@ SELECT
     CASE WHEN EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'messages' AND column_name = 'business_id') 
          THEN '✓ messages.business_id' ELSE '✗ messages.business_id' END as messages_col,
     CASE WHEN EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'conversation_memory' AND column_name = 'business_id') 
-         THEN '✓ conversation_memory.business_id' ELSE '✗ conversation_memory.business_id' END as memory_col;
+         THEN '✓ conversation_memory.business_id' ELSE '✗ conversation_memory.business_id' END as memory_col,
+    CASE WHEN EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'channel_integrations' AND column_name = 'credentials_version') 
+         THEN '✓ channel_integrations.credentials_version' ELSE '✗ channel_integrations.credentials_version' END as integrations_col,
+    CASE WHEN EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'businesses' AND column_name = 'knowledge_version') 
+         THEN '✓ businesses.knowledge_version' ELSE '✗ businesses.knowledge_version' END as businesses_col,
+    CASE WHEN EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_conversation_memory_business_user_channel') 
+         THEN '✓ conversation_memory unique key' ELSE '✗ conversation_memory unique key' END as memory_key;
 
 
 
@@ -0,0 +1,109 @@
+"""Tests for app.services.bot_health (per-bot circuits, 429 parks, blocked chats)."""
+import pytest
+
+from app.services import bot_health as bot_health_module
+from app.services.bot_health import CLOSED, HALF_OPEN, OPEN, BotHealth
+
+TOKEN = "123:abc"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(bot_health_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def health():
+    return BotHealth(failure_threshold=3, open_seconds=30, blocked_chat_ttl=60, max_blocked_chats=2)
+
+
+def test_breaker_opens_after_consecutive_failures(clock, health):
+    for _ in range(2):
+        health.record_failure(TOKEN, "500")
+    assert health.allow(TOKEN) is True
+
+    health.record_failure(TOKEN, "500")
+    assert health._circuits[TOKEN].state == OPEN
+    assert health.allow(TOKEN) is False
+
+
+def test_success_resets_the_failure_count(clock, health):
+    health.record_failure(TOKEN, "500")
+    health.record_failure(TOKEN, "500")
+    health.record_success(TOKEN)
+    health.record_failure(TOKEN, "500")
+
+    assert health._circuits[TOKEN].state == CLOSED
+
+
+def test_half_open_allows_a_single_probe(clock, health):
+    for _ in range(3):
+        health.record_failure(TOKEN, "401")
+    clock[0] += 31
+
+    assert health.allow(TOKEN) is True
+    assert health._circuits[TOKEN].state == HALF_OPEN
+    assert health.allow(TOKEN) is False  # Probe already in flight
+
+
+def test_probe_success_closes_and_probe_failure_reopens(clock, health):
+    for _ in range(3):
+        health.record_failure(TOKEN, "401")
+    clock[0] += 31
+    health.allow(TOKEN)
+    health.record_failure(TOKEN, "401")
+    assert health._circuits[TOKEN].state == OPEN
+    assert health._circuits[TOKEN].trips == 2
+
+    clock[0] += 31
+    health.allow(TOKEN)
+    health.record_success(TOKEN)
+    assert health._circuits[TOKEN].state == CLOSED
+    assert health.allow(TOKEN) is True
+
+
+def test_release_ends_a_probe_without_changing_state(clock, health):
+    for _ in range(3):
+        health.record_failure(TOKEN, "503")
+    clock[0] += 31
+    health.allow(TOKEN)
+    health.release(TOKEN)
+
+    assert health._circuits[TOKEN].state == HALF_OPEN
+    assert health.allow(TOKEN) is True
+
+
+def test_park_reports_the_end_of_the_park(clock, health):
+    assert health.parked_until(TOKEN) == 0.0
+
+    health.park(TOKEN, 5)
+    health.park(TOKEN, 2)  # A shorter park never shortens the current one
+    assert health.parked_until(TOKEN) == 1005.0
+
+    clock[0] += 5
+    assert health.parked_until(TOKEN) == 0.0
+
+
+def test_blocked_chats_expire_and_are_bounded(clock, health):
+    health.block_chat(TOKEN, 1)
+    assert health.is_chat_blocked(TOKEN, 1) is True
+    assert health.is_chat_blocked(TOKEN, 2) is False
+
+    health.block_chat(TOKEN, 2)
+    health.block_chat(TOKEN, 3)  # Evicts chat 1
+    assert health.is_chat_blocked(TOKEN, 1) is False
+    assert health._circuits[TOKEN].blocked_chats == 2
+
+    clock[0] += 61
+    assert health.is_chat_blocked(TOKEN, 2) is False
+    assert health._circuits[TOKEN].blocked_chats == 1
+
+
+def test_unblock_chat(clock, health):
+    health.block_chat(TOKEN, 1)
+    health.unblock_chat(TOKEN, 1)
+
+    assert health.is_chat_blocked(TOKEN, 1) is False
+    assert health.state_for(TOKEN)["blocked_chats"] == 0
@@ -0,0 +1,199 @@
+"""Tests for app.services.bot_registry (per-integration webhook routing)."""
+import asyncio
+import json
+
+import pytest
+
+from app.models import ChannelIntegration
+from app.services import bot_registry
+
+TOKEN = "123:abc"
+
+
+@pytest.fixture(autouse=True)
+def empty_registry():
+    bot_registry._bots.clear()
+    bot_registry._misses.clear()
+    yield
+    bot_registry._bots.clear()
+    bot_registry._misses.clear()
+
+
+@pytest.fixture
+def db(db_context, monkeypatch):
+    monkeypatch.setattr(bot_registry, "get_db_context", db_context)
+    return db_context
+
+
+def _integration(integration_id=1, token=TOKEN, **overrides):
+    fields = dict(
+        id=integration_id,
+        business_id=10,
+        channel="telegram",
+        channel_name="Shop bot",
+        credentials=json.dumps({"bot_token": token, "bot_username": "shop_bot"}),
+        is_active=True,
+    )
+    fields.update(overrides)
+    return ChannelIntegration(**fields)
+
+
+def test_webhook_secret_is_deterministic_and_per_bot():
+    secret = bot_registry.webhook_secret_for(TOKEN)
+
+    assert secret == bot_registry.webhook_secret_for(TOKEN)
+    assert secret != bot_registry.webhook_secret_for("456:def")
+    assert len(secret) <= 256 and secret.isalnum()
+
+
+def test_register_indexes_the_decoded_integration():
+    entry = bot_registry.register_integration(_integration())
+
+    assert entry.bot_token == TOKEN
+    assert entry.business_id == 10
+    assert entry.bot_username == "shop_bot"
+    assert bot_registry.get_bot(1) is entry
+
+
+@pytest.mark.parametrize("overrides", [
+    {"is_active": False},
+    {"channel": "whatsapp"},
+    {"credentials": None},
+    {"credentials": "not json"},
+    {"credentials": json.dumps({"bot_username": "no_token"})},
+])
+def test_unusable_integrations_are_dropped(overrides):
+    bot_registry.register_integration(_integration())
+
+    assert bot_registry.register_integration(_integration(**overrides)) is None
+    assert bot_registry.get_bot(1) is None
+
+
+def test_verify_webhook_secret():
+    entry = bot_registry.register_integration(_integration())
+
+    assert bot_registry.verify_webhook_secret(entry, entry.secret_token)
+    assert not bot_registry.verify_webhook_secret(entry, "wrong")
+    assert not bot_registry.verify_webhook_secret(entry, None)
+
+
+def test_unregister_removes_the_bot():
+    bot_registry.register_integration(_integration())
+    bot_registry.unregister_integration(1)
+    bot_registry.unregister_integration(1)  # Unknown ids are ignored
+
+    assert bot_registry.get_bot(1) is None
+
+
+def test_load_bots_indexes_only_active_telegram_integrations(db):
+    with db() as session:
+        session.add_all([
+            _integration(1),
+            _integration(2, token="456:def", is_active=False),
+            _integration(3, token="789:ghi", channel="whatsapp"),
+        ])
+    bot_registry.register_integration(_integration(9))  # Stale entry
+
+    with db() as session:
+        assert bot_registry.load_bots(session) == 1
+
+    assert [entry.integration_id for entry in bot_registry.all_bots()] == [1]
+
+
+def test_unknown_bot_is_loaded_from_the_database_on_first_use(db):
+    with db() as session:
+        session.add(_integration(5))
+
+    entry = asyncio.run(bot_registry.get_or_load_bot(5))
+
+    assert entry.integration_id == 5
+    assert bot_registry.get_bot(5) is entry
+    assert asyncio.run(bot_registry.get_or_load_bot(6)) is None
+
+
+def test_missing_bots_are_not_queried_again_within_the_ttl(db, monkeypatch):
+    queries = []
+    monkeypatch.setattr(bot_registry, "get_db_context", lambda: (queries.append(1), db())[1])
+
+    assert asyncio.run(bot_registry.get_or_load_bot(6)) is None
+    assert asyncio.run(bot_registry.get_or_load_bot(6)) is None
+    assert bot_registry.load_bot(6) is None
+
+    assert len(queries) == 1
+
+
+def test_registering_a_missed_bot_clears_the_miss(db):
+    assert bot_registry.load_bot(5) is None
+
+    bot_registry.register_integration(_integration(5))
+
+    assert asyncio.run(bot_registry.get_or_load_bot(5)).integration_id == 5
+
+
+def test_database_errors_are_not_remembered_as_misses(db, monkeypatch):
+    def broken_db():
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(bot_registry, "get_db_context", broken_db)
+    assert bot_registry.load_bot(5) is None
+
+    monkeypatch.setattr(bot_registry, "get_db_context", db)
+    with db() as session:
+        session.add(_integration(5))
+    assert bot_registry.load_bot(5).integration_id == 5
+
+
+def test_credentials_are_decoded_only_when_the_version_changes():
+    integration = _integration(credentials_version=1)
+    first = bot_registry.credentials_for(integration)
+    decodes = bot_registry._decodes.value
+
+    assert bot_registry.credentials_for(integration) is first
+    assert bot_registry._decodes.value == decodes
+
+    integration.credentials = json.dumps({"bot_token": "456:def"})
+    integration.credentials_version = 2
+    assert bot_registry.credentials_for(integration).bot_token == "456:def"
+    assert bot_registry._decodes.value == decodes + 1
+
+
+def test_find_by_token():
+    bot_registry.register_integration(_integration(1))
+    bot_registry.register_integration(_integration(2, token="456:def"))
+
+    assert [entry.integration_id for entry in bot_registry.find_by_token(TOKEN)] == [1]
+    assert bot_registry.find_by_token("unknown") == []
+
+
+def test_refresh_redecodes_only_changed_integrations(db):
+    with db() as session:
+        session.add_all([_integration(1, credentials_version=1), _integration(2, token="456:def", credentials_version=1)])
+    with db() as session:
+        bot_registry.load_bots(session)
+    with db() as session:
+        changed = session.get(ChannelIntegration, 2)
+        changed.credentials = json.dumps({"bot_token": "789:ghi"})
+        changed.credentials_version = 2
+        session.add(_integration(3, token="321:cba", credentials_version=1))
+    unchanged = bot_registry.get_bot(1)
+
+    with db() as session:
+        assert bot_registry.refresh_bots(session) == 2
+
+    assert bot_registry.get_bot(1) is unchanged
+    assert bot_registry.get_bot(2).bot_token == "789:ghi"
+    assert bot_registry.get_bot(3) is not None
+
+
+def test_refresh_drops_deactivated_integrations(db):
+    with db() as session:
+        session.add(_integration(1, credentials_version=1))
+    with db() as session:
+        bot_registry.load_bots(session)
+    with db() as session:
+        session.get(ChannelIntegration, 1).is_active = False
+
+    with db() as session:
+        assert bot_registry.refresh_bots(session) == 1
+    assert bot_registry.get_bot(1) is None
+
@@ -0,0 +1,186 @@
+"""Tests for app.services.broadcast_service (checkpointed, leased broadcasts)."""
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import Broadcast, Conversation
+from app.services import bot_registry, broadcast_service, telegram
+from app.services.bot_health import bot_health
+from app.services.bot_registry import BotEntry
+from app.services.broadcast_service import AudienceStream, BroadcastEngine
+from app.services.telegram import SendResult
+
+BOT = BotEntry(
+    integration_id=3,
+    business_id=1,
+    bot_token="123:abc",
+    bot_username="shop_bot",
+    channel_name=None,
+    secret_token="secret",
+)
+AUDIENCE = ["101", "102", "103", "104", "105"]
+
+
+@pytest.fixture
+def db(db_sessions, db_context, monkeypatch):
+    monkeypatch.setattr(broadcast_service, "get_db_context", db_context)
+    monkeypatch.setattr(broadcast_service, "SessionLocal", db_sessions)
+    monkeypatch.setitem(bot_registry._bots, BOT.integration_id, BOT)
+    with db_context() as session:
+        for user_id in AUDIENCE + ["not-a-chat"] + AUDIENCE[:2]:  # Repeat customers are sent once
+            session.add(Conversation(business_id=1, user_id=user_id, channel="telegram",
+                                     user_message="hi", bot_reply="hello", intent="greeting"))
+        session.add(Conversation(business_id=2, user_id="999", channel="telegram",
+                                 user_message="hi", bot_reply="hello", intent="greeting"))
+    return db_context
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    sent = []
+
+    async def fake_try_send_message(self, chat_id, text):
+        sent.append(chat_id)
+        return SendResult(chat_id != 104)
+
+    monkeypatch.setattr(telegram.TelegramService, "try_send_message", fake_try_send_message)
+    return sent
+
+
+def _engine():
+    return BroadcastEngine(rate=1000, concurrency=4, chunk_size=2, lease_seconds=60)
+
+
+def _create(db, **fields):
+    with db() as session:
+        broadcast = Broadcast(business_id=1, integration_id=BOT.integration_id, text="Sale!", **fields)
+        session.add(broadcast)
+        session.flush()
+        return broadcast.id
+
+
+def _load(db, broadcast_id):
+    with db() as session:
+        broadcast = session.get(Broadcast, broadcast_id)
+        session.expunge(broadcast)
+        return broadcast
+
+
+def test_audience_is_paged_by_key_without_holding_a_session(db, db_sessions, monkeypatch):
+    open_sessions = []
+
+    def tracked_session():
+        session = db_sessions()
+        open_sessions.append(session)
+        return session
+
+    monkeypatch.setattr(broadcast_service, "SessionLocal", tracked_session)
+    stream = AudienceStream(business_id=1, channel="telegram", after="101", chunk_size=2)
+
+    chunks = []
+    while True:
+        chunk = stream.next_chunk()
+        chunks.append(chunk)
+        assert all(not session.in_transaction() for session in open_sessions)  # Closed after each chunk
+        if not chunk:
+            break
+
+    assert chunks == [["102", "103"], ["104", "105"], ["not-a-chat"], []]
+    assert stream.after == "not-a-chat"
+
+
+def test_broadcast_reaches_each_customer_once_and_completes(db, sent):
+    broadcast_id = _create(db)
+
+    asyncio.run(_engine()._run(broadcast_id))
+
+    assert sorted(sent) == [101, 102, 103, 104, 105]
+    broadcast = _load(db, broadcast_id)
+    assert broadcast.status == "completed"
+    assert (broadcast.sent_count, broadcast.failed_count) == (4, 2)  # 104 failed, "not-a-chat" is no chat id
+    assert broadcast.cursor_user_id == "not-a-chat"
+    assert broadcast.lease_owner is None
+
+
+def test_broadcast_resumes_after_its_checkpoint(db, sent):
+    broadcast_id = _create(db, status="running", cursor_user_id="103", sent_count=3)
+
+    asyncio.run(_engine()._run(broadcast_id))
+
+    assert sorted(sent) == [104, 105]
+    assert _load(db, broadcast_id).sent_count == 4
+
+
+def test_cancelled_broadcast_stops_at_the_next_checkpoint(db, monkeypatch):
+    broadcast_id = _create(db)
+    sent = []
+
+    async def send_and_cancel(self, chat_id, text):
+        sent.append(chat_id)
+        with db() as session:
+            session.get(Broadcast, broadcast_id).status = "cancelled"
+        return SendResult(True)
+
+    monkeypatch.setattr(telegram.TelegramService, "try_send_message", send_and_cancel)
+
+    asyncio.run(_engine()._run(broadcast_id))
+
+    assert sorted(sent) == [101, 102]  # The chunk in flight
+    assert _load(db, broadcast_id).status == "cancelled"
+
+
+def test_rate_limited_sends_are_retried_after_the_park(db, monkeypatch):
+    broadcast_id = _create(db)
+    attempts = []
+
+    async def rate_limited_once(self, chat_id, text):
+        attempts.append(chat_id)
+        if chat_id == 101 and attempts.count(101) == 1:
+            bot_health.park(self.bot_token, 0.05)
+            return SendResult(False, retry_at=bot_health.parked_until(self.bot_token))
+        return SendResult(True)
+
+    monkeypatch.setattr(telegram.TelegramService, "try_send_message", rate_limited_once)
+    started = time.monotonic()
+    try:
+        asyncio.run(_engine()._run(broadcast_id))
+    finally:
+        bot_health.reset(BOT.bot_token)
+
+    assert attempts.count(101) == 2
+    assert _load(db, broadcast_id).sent_count == 5
+    assert time.monotonic() - started >= 0.05
+
+
+def test_broadcast_leased_by_another_worker_is_not_run(db, sent):
+    broadcast_id = _create(db, status="running", lease_owner="other-worker",
+                           lease_expires_at=datetime.utcnow() + timedelta(minutes=5))
+
+    asyncio.run(_engine()._run(broadcast_id))
+
+    assert sent == []
+    assert _load(db, broadcast_id).lease_owner == "other-worker"
+
+
+def test_expired_lease_is_taken_over(db, sent):
+    broadcast_id = _create(db, status="running", lease_owner="crashed-worker",
+                           lease_expires_at=datetime.utcnow() - timedelta(minutes=5))
+
+    asyncio.run(_engine()._run(broadcast_id))
+
+    assert _load(db, broadcast_id).status == "completed"
+
+
+def test_unconnected_integration_fails_the_broadcast(db, sent, monkeypatch):
+    monkeypatch.delitem(bot_registry._bots, BOT.integration_id)
+    monkeypatch.setattr(bot_registry, "get_db_context", db)
+    broadcast_id = _create(db)
+
+    asyncio.run(_engine()._run(broadcast_id))
+
+    broadcast = _load(db, broadcast_id)
+    assert broadcast.status == "failed"
+    assert "not connected" in broadcast.error
+    assert sent == []
@@ -0,0 +1,154 @@
+"""Tests for app.services.burst_coalescer (per-chat debouncing of rapid messages)."""
+import asyncio
+import time
+from datetime import datetime
+
+from app.services.burst_coalescer import BurstCoalescer, merge_messages
+from app.services.telegram_parser import InboundMessage, ParsedUpdate
+
+KEY = (1, 42)
+
+
+def _message(text, message_id=1):
+    return InboundMessage("42", text, datetime(2024, 1, 1), {"message_id": message_id, "chat_id": 42})
+
+
+def _update(update_id, text=None):
+    message = _message(text, update_id) if text is not None else None
+    return ParsedUpdate(update_id, 42, message, "message")
+
+
+def test_merge_joins_texts_and_keeps_the_last_reply_metadata():
+    merged = merge_messages([_message("hi", 1), _message("do you deliver", 2), _message("to Nairobi?", 3)])
+
+    assert merged.message_text == "hi\ndo you deliver\nto Nairobi?"
+    assert merged.metadata["message_id"] == 3
+    assert merged.metadata["coalesced_count"] == 3
+    assert merged.metadata["coalesced_message_ids"] == [1, 2, 3]
+
+
+def test_messages_within_the_window_are_merged():
+    coalescer = BurstCoalescer(window_seconds=0.05, max_wait_seconds=1, max_messages=10)
+
+    async def run():
+        opener = asyncio.create_task(coalescer.submit(KEY, _message("hi", 1)))
+        await asyncio.sleep(0.01)
+        joined = [await coalescer.submit(KEY, _message("there", 2)), await coalescer.submit(KEY, _message("!", 3))]
+        return await opener, joined
+
+    merged, joined = asyncio.run(run())
+
+    assert joined == [None, None]
+    assert merged.message_text == "hi\nthere\n!"
+
+
+def test_other_chats_are_not_merged():
+    coalescer = BurstCoalescer(window_seconds=0.02, max_wait_seconds=1, max_messages=10)
+
+    async def run():
+        return await asyncio.gather(coalescer.submit(KEY, _message("a")), coalescer.submit((1, 43), _message("b")))
+
+    assert [message.message_text for message in asyncio.run(run())] == ["a", "b"]
+
+
+def test_max_wait_caps_a_burst_that_keeps_growing():
+    coalescer = BurstCoalescer(window_seconds=0.05, max_wait_seconds=0.12, max_messages=100)
+
+    async def run():
+        started = time.monotonic()
+        opener = asyncio.create_task(coalescer.submit(KEY, _message("0")))
+        for index in range(1, 20):
+            await asyncio.sleep(0.02)  # Always inside the quiet window
+            if opener.done():
+                break
+            await coalescer.submit(KEY, _message(str(index)))
+        return await opener, time.monotonic() - started
+
+    merged, elapsed = asyncio.run(run())
+
+    assert elapsed < 0.3
+    assert 1 < merged.metadata["coalesced_count"] < 20
+
+
+def test_max_messages_flushes_early():
+    coalescer = BurstCoalescer(window_seconds=5, max_wait_seconds=5, max_messages=3)
+
+    async def run():
+        started = time.monotonic()
+        opener = asyncio.create_task(coalescer.submit(KEY, _message("a")))
+        await asyncio.sleep(0)
+        await coalescer.submit(KEY, _message("b"))
+        await coalescer.submit(KEY, _message("c"))
+        return await opener, time.monotonic() - started
+
+    merged, elapsed = asyncio.run(run())
+
+    assert merged.message_text == "a\nb\nc"
+    assert elapsed < 1
+
+
+def test_coalesce_batch_keeps_the_last_update_id_and_breaks_at_non_text():
+    coalescer = BurstCoalescer(window_seconds=1, max_wait_seconds=1, max_messages=10)
+    updates = [_update(1, "hi"), _update(2, "there"), _update(3), _update(4, "price?"), _update(5, "thanks")]
+
+    result = coalescer.coalesce_batch(updates)
+
+    assert [update.update_id for update in result] == [2, 3, 5]
+    assert result[0].message.message_text == "hi\nthere"
+    assert result[1].message is None
+    assert result[2].message.message_text == "price?\nthanks"
+
+
+def test_coalesce_batch_respects_max_messages():
+    coalescer = BurstCoalescer(window_seconds=1, max_wait_seconds=1, max_messages=2)
+
+    result = coalescer.coalesce_batch([_update(1, "a"), _update(2, "b"), _update(3, "c")])
+
+    assert [(update.update_id, update.message.message_text) for update in result] == [(2, "a\nb"), (3, "c")]
+
+
+def test_submit_nowait_answers_the_burst_in_the_background():
+    coalescer = BurstCoalescer(window_seconds=0.03, max_wait_seconds=1, max_messages=10)
+    processed = []
+
+    async def process(merged):
+        processed.append(merged.message_text)
+
+    async def run():
+        opened = [coalescer.submit_nowait(KEY, _message("hi", 1), process),
+                  coalescer.submit_nowait(KEY, _message("there", 2), process)]
+        early = list(processed)
+        await asyncio.sleep(0.1)
+        return opened, early
+
+    opened, early = asyncio.run(run())
+
+    assert opened == [True, False]
+    assert early == []  # Nothing waited for the burst
+    assert processed == ["hi\nthere"]
+
+
+def test_stop_answers_open_bursts_at_once():
+    coalescer = BurstCoalescer(window_seconds=30, max_wait_seconds=30, max_messages=10)
+    processed = []
+
+    async def process(merged):
+        processed.append(merged.message_text)
+
+    async def failing(merged):
+        raise RuntimeError("boom")
+
+    async def run():
+        coalescer.submit_nowait(KEY, _message("hi", 1), process)
+        coalescer.submit_nowait(KEY, _message("there", 2), process)
+        coalescer.submit_nowait((1, 43), _message("other"), failing)  # Logged, does not break stop()
+        await asyncio.sleep(0)
+        started = time.monotonic()
+        await coalescer.stop()
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(run())
+
+    assert processed == ["hi\nthere"]
+    assert elapsed < 1
+    assert coalescer._tasks == set()
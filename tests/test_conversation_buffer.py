@@ -0,0 +1,198 @@
+"""Tests for the write-behind conversation buffer in app.services.conversation_service."""
+import asyncio
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from app.models import Conversation
+from app.services import conversation_service
+from app.services.conversation_service import ConversationWriteBuffer
+
+
+def _row(index):
+    return {
+        "business_id": 1,
+        "user_id": f"u{index}",
+        "channel": "telegram",
+        "user_message": f"message {index}",
+        "bot_reply": "reply",
+        "intent": "unknown",
+        "created_at": datetime.utcnow(),
+    }
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    batches = []
+    monkeypatch.setattr(conversation_service, "_insert_conversations", lambda rows: batches.append(list(rows)))
+    return batches
+
+
+def test_full_batches_are_flushed_without_waiting_for_the_interval(batches):
+    async def run():
+        buffer = ConversationWriteBuffer(batch_size=3, flush_interval=60, max_pending=10)
+        buffer.start()
+        for index in range(3):
+            assert await buffer.add(_row(index))
+        await asyncio.sleep(0.05)
+        flushed = [len(batch) for batch in batches]
+        await buffer.stop()
+        return flushed
+
+    assert asyncio.run(run()) == [3]
+
+
+def test_partial_batches_are_flushed_on_the_interval(batches):
+    async def run():
+        buffer = ConversationWriteBuffer(batch_size=100, flush_interval=0.02, max_pending=100)
+        buffer.start()
+        await buffer.add(_row(0))
+        await asyncio.sleep(0.1)
+        flushed = [len(batch) for batch in batches]
+        await buffer.stop()
+        return flushed
+
+    assert asyncio.run(run()) == [1]
+
+
+def test_stop_flushes_pending_rows_and_refuses_new_ones(batches):
+    async def run():
+        buffer = ConversationWriteBuffer(batch_size=2, flush_interval=60, max_pending=10)
+        buffer.start()
+        await buffer.add(_row(0))
+        await buffer.stop()
+        return await buffer.add(_row(1))
+
+    assert asyncio.run(run()) is False
+    assert [row["user_id"] for batch in batches for row in batch] == ["u0"]
+
+
+def test_writers_wait_while_the_buffer_is_full(monkeypatch):
+    release = threading.Event()
+    batches = []
+
+    def slow_insert(rows):
+        release.wait(5)
+        batches.append(rows)
+
+    monkeypatch.setattr(conversation_service, "_insert_conversations", slow_insert)
+
+    async def run():
+        buffer = ConversationWriteBuffer(batch_size=2, flush_interval=60, max_pending=2)
+        buffer.start()
+        await buffer.add(_row(0))
+        await buffer.add(_row(1))  # Full batch: the flush takes it and blocks in the insert
+        await asyncio.sleep(0.02)
+        await buffer.add(_row(2))
+        await buffer.add(_row(3))  # Buffer full again
+        blocked = asyncio.create_task(buffer.add(_row(4)))
+        await asyncio.sleep(0.02)
+        was_blocked = not blocked.done()
+        release.set()
+        assert await blocked
+        await buffer.stop()
+        return was_blocked
+
+    assert asyncio.run(run()) is True
+    assert sum(len(batch) for batch in batches) == 5
+
+
+@pytest.fixture
+def flaky(monkeypatch):
+    """An insert that fails while outage["failures"] > 0."""
+    outage = {"failures": 0, "attempts": [], "written": []}
+
+    def insert(rows):
+        outage["attempts"].append(time.monotonic())
+        if outage["failures"]:
+            outage["failures"] -= 1
+            raise RuntimeError("database down")
+        outage["written"].extend(row["user_id"] for row in rows)
+
+    monkeypatch.setattr(conversation_service, "_insert_conversations", insert)
+    return outage
+
+
+def test_failed_batches_are_retried_with_backoff_and_in_order(flaky):
+    flaky["failures"] = 2
+
+    async def run():
+        buffer = ConversationWriteBuffer(batch_size=2, flush_interval=0.01, max_pending=10, retry_backoff=0.05)
+        dropped = buffer._dropped.value
+        buffer.start()
+        for index in range(4):
+            await buffer.add(_row(index))
+        await asyncio.sleep(0.4)
+        await buffer.stop()
+        return buffer._dropped.value - dropped
+
+    assert asyncio.run(run()) == 0
+    assert flaky["written"] == ["u0", "u1", "u2", "u3"]
+    first, second, third = flaky["attempts"][:3]
+    assert second - first >= 0.05
+    assert third - second >= 0.1  # Backoff doubles per failure
+
+
+def test_batch_is_dropped_after_max_retries(flaky):
+    flaky["failures"] = 2
+
+    async def run():
+        buffer = ConversationWriteBuffer(batch_size=2, flush_interval=0.01, max_pending=10,
+                                         max_retries=1, retry_backoff=0.01)
+        dropped = buffer._dropped.value
+        buffer.start()
+        for index in range(4):
+            await buffer.add(_row(index))
+        await asyncio.sleep(0.2)
+        await buffer.stop()
+        return buffer._dropped.value - dropped
+
+    assert asyncio.run(run()) == 2
+    assert flaky["written"] == ["u2", "u3"]
+
+
+def test_final_flush_ignores_the_backoff(flaky):
+    flaky["failures"] = 1
+
+    async def run():
+        buffer = ConversationWriteBuffer(batch_size=2, flush_interval=0.01, max_pending=10, retry_backoff=30.0)
+        buffer.start()
+        await buffer.add(_row(0))
+        await asyncio.sleep(0.05)  # Flushed, failed, now backing off for 30s
+        pending = buffer.depth()
+        await buffer.stop()
+        return pending
+
+    assert asyncio.run(run()) == 1
+    assert flaky["written"] == ["u0"]
+
+
+def test_rows_awaiting_a_retry_count_towards_backpressure(flaky):
+    flaky["failures"] = 1
+
+    async def run():
+        buffer = ConversationWriteBuffer(batch_size=2, flush_interval=0.01, max_pending=2, retry_backoff=0.1)
+        buffer.start()
+        await buffer.add(_row(0))
+        await buffer.add(_row(1))
+        await asyncio.sleep(0.03)  # The batch failed and awaits its retry
+        blocked = asyncio.create_task(buffer.add(_row(2)))
+        await asyncio.sleep(0.03)
+        was_blocked = not blocked.done()
+        assert await blocked
+        await buffer.stop()
+        return was_blocked
+
+    assert asyncio.run(run()) is True
+    assert flaky["written"] == ["u0", "u1", "u2"]
+
+
+def test_rows_are_inserted_in_one_statement(db_context, monkeypatch):
+    monkeypatch.setattr(conversation_service, "get_db_context", db_context)
+
+    conversation_service._insert_conversations([_row(0), _row(1)])
+
+    with db_context() as db:
+        assert sorted(row.user_id for row in db.query(Conversation)) == ["u0", "u1"]
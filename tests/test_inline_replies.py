@@ -0,0 +1,106 @@
+"""Tests for replies returned inline in the Telegram webhook response."""
+import asyncio
+import itertools
+
+import pytest
+from fastapi import BackgroundTasks
+
+from app.config import settings
+from app.services import telegram_updates
+from app.services.burst_coalescer import burst_coalescer
+from app.services.bot_registry import BotEntry
+from app.services.telegram_parser import update_from_dict
+
+BOT = BotEntry(
+    integration_id=1,
+    business_id=10,
+    bot_token="123:abc",
+    bot_username="shop_bot",
+    channel_name=None,
+    secret_token="secret",
+)
+
+# Unique per test, or the webhook deduplication would skip the update
+update_ids = itertools.count(1)
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    calls = {"saved": [], "sent": []}
+
+    async def fake_process_message(message, business_id=None):
+        return f"echo: {message.message_text}"
+
+    async def fake_save_conversation(message, reply_text, business_id):
+        calls["saved"].append((message.message_text, reply_text, business_id))
+
+    async def fake_send_reply(chat_id, text, bot):
+        calls["sent"].append((chat_id, text))
+        return bot or BOT  # The bot that sent it
+
+    monkeypatch.setattr(telegram_updates, "process_message", fake_process_message)
+    monkeypatch.setattr(telegram_updates, "_save_conversation", fake_save_conversation)
+    monkeypatch.setattr(telegram_updates, "_send_reply", fake_send_reply)
+    monkeypatch.setattr(telegram_updates, "_enqueue_reply", lambda *args: False)
+    return calls
+
+
+def _update(text="hello"):
+    return update_from_dict({"update_id": next(update_ids), "message": {
+        "message_id": 5,
+        "date": 0,
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Ann"},
+        "text": text,
+    }})
+
+
+def _handle(bot, background_tasks):
+    return asyncio.run(telegram_updates.handle_update(_update(), bot, background_tasks))
+
+
+def test_reply_is_returned_as_a_bot_api_method(monkeypatch, pipeline):
+    monkeypatch.setattr(settings, "telegram_inline_replies", True)
+    background_tasks = BackgroundTasks()
+
+    response = _handle(BOT, background_tasks)
+
+    assert response == {"method": "sendMessage", "chat_id": 42, "text": "echo: hello"}
+    assert pipeline["sent"] == []
+    # The conversation is saved after the response went out
+    assert pipeline["saved"] == []
+    asyncio.run(background_tasks())
+    assert pipeline["saved"] == [("hello", "echo: hello", 10)]
+
+
+def test_inline_mode_is_off_by_default(pipeline):
+    response = _handle(BOT, BackgroundTasks())
+
+    assert "method" not in response
+    assert pipeline["sent"] == [(42, "echo: hello")]
+
+
+def test_webhooks_without_a_known_bot_send_directly(monkeypatch, pipeline):
+    monkeypatch.setattr(settings, "telegram_inline_replies", True)
+
+    response = _handle(None, BackgroundTasks())
+
+    assert "method" not in response
+    assert pipeline["sent"] == [(42, "echo: hello")]
+
+
+def test_coalesced_webhooks_are_acknowledged_at_once(monkeypatch, pipeline):
+    monkeypatch.setattr(burst_coalescer, "window", 0.05)
+    monkeypatch.setattr(burst_coalescer, "max_wait", 1.0)
+
+    async def run():
+        response = await telegram_updates.handle_update(_update(), BOT, BackgroundTasks())
+        sent_before = list(pipeline["sent"])
+        await burst_coalescer.stop()
+        return response, sent_before
+
+    response, sent_before = asyncio.run(run())
+
+    assert response == {"ok": True}
+    assert sent_before == []  # Answered in the background
+    assert pipeline["sent"] == [(42, "echo: hello")]
@@ -0,0 +1,89 @@
+"""Tests for app.routes.integrations (connecting a Telegram bot)."""
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.config import settings
+from app.models import Business, ChannelIntegration, User
+from app.routes import integrations
+from app.routes.integrations import TelegramConnectRequest, connect_telegram
+from app.services import bot_registry, telegram
+
+TOKEN = "123456:" + "a" * 30
+OLD_TOKEN = "654321:" + "b" * 30
+
+
+@pytest.fixture
+def session(db_sessions, monkeypatch):
+    monkeypatch.setattr(settings, "public_url", "https://bots.example.com")
+    monkeypatch.setattr(integrations, "polling_enabled", lambda: False)
+    bot_registry._bots.clear()
+    db = db_sessions()
+    db.add(User(id=1, email="owner@example.com", hashed_password="x", role="business_owner", business_id=1))
+    db.add(Business(id=1, name="shop", owner_id=1))
+    db.commit()
+    yield db
+    db.close()
+    bot_registry._bots.clear()
+
+
+@pytest.fixture
+def bot_api(session, monkeypatch):
+    """Bot API stub: getMe succeeds; set_webhook_ok decides setWebhook's answer."""
+    api = {"set_webhook_ok": True, "in_transaction": []}
+
+    def handler(request):
+        method = request.url.path.rsplit("/", 1)[-1]
+        if method == "getMe":
+            return httpx.Response(200, json={"ok": True, "result": {"username": "shop_bot"}})
+        api["in_transaction"].append(session.in_transaction())
+        if api["set_webhook_ok"]:
+            return httpx.Response(200, json={"ok": True, "result": True})
+        return httpx.Response(200, json={"ok": False, "description": "bad webhook"})
+
+    monkeypatch.setattr(telegram, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return api
+
+
+def _connect(session):
+    owner = session.get(User, 1)
+    return asyncio.run(connect_telegram(TelegramConnectRequest(bot_token=TOKEN), owner, session))
+
+
+def test_integration_is_committed_before_the_webhook_call(session, bot_api):
+    response = _connect(session)
+
+    assert bot_api["in_transaction"] == [False]  # No transaction (row lock) held during setWebhook
+    assert response.webhook_url == f"https://bots.example.com/telegram/webhook/{response.id}"
+    assert bot_registry.get_bot(response.id).bot_token == TOKEN
+
+
+def test_rejected_webhook_deletes_a_new_integration(session, bot_api):
+    bot_api["set_webhook_ok"] = False
+
+    with pytest.raises(HTTPException):
+        _connect(session)
+
+    assert session.query(ChannelIntegration).count() == 0
+
+
+def test_rejected_webhook_restores_an_existing_integration(session, bot_api):
+    old_credentials = json.dumps({"bot_token": OLD_TOKEN, "bot_username": "old_bot"})
+    session.add(ChannelIntegration(id=5, business_id=1, channel="telegram", channel_name="Old bot",
+                                   credentials=old_credentials, is_active=True, credentials_version=3,
+                                   webhook_url="https://bots.example.com/telegram/webhook/5"))
+    session.commit()
+    bot_api["set_webhook_ok"] = False
+
+    with pytest.raises(HTTPException):
+        _connect(session)
+
+    session.expire_all()
+    integration = session.get(ChannelIntegration, 5)
+    assert integration.credentials == old_credentials
+    assert integration.channel_name == "Old bot"
+    assert integration.webhook_url == "https://bots.example.com/telegram/webhook/5"
+    assert integration.credentials_version == 5  # Bumped by the connect and again by the revert
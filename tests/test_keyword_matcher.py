@@ -0,0 +1,68 @@
+"""Tests for app.services.keyword_matcher."""
+import pytest
+
+from app.services.keyword_matcher import AhoCorasick, KeywordRules
+
+
+def test_automaton_reports_overlapping_matches():
+    automaton = AhoCorasick()
+    he, she, hers = automaton.add("he"), automaton.add("she"), automaton.add("hers")
+
+    matches = sorted(automaton.iter_matches("ushers"))
+
+    assert matches == sorted([(she, 4), (he, 4), (hers, 6)])
+
+
+@pytest.fixture
+def rules():
+    rules = KeywordRules()
+    rules.add_group("intent", {
+        "greeting": ["hi", "hello", "good morning"],
+        "pricing": ["price", "cost*"],
+    })
+    rules.add_group("action", {"upload": ["upload*", "send file"]})
+    return rules
+
+
+def test_matches_whole_words_only(rules):
+    assert rules.first("Hi there", "intent") == "greeting"
+    assert rules.first("this is it", "intent") is None  # "hi" inside "this"
+    assert rules.first("priceless", "intent") is None
+
+
+def test_trailing_star_matches_a_prefix(rules):
+    assert rules.first("what does it costs?", "intent") == "pricing"
+    assert rules.first("uploading now", "action") == "upload"
+
+
+def test_multi_word_keywords_and_case(rules):
+    assert rules.first("GOOD MORNING!", "intent") == "greeting"
+    assert rules.first("can I send file", "action") == "upload"
+
+
+def test_labels_are_ordered_by_priority(rules):
+    result = rules.scan("price? hello")
+
+    assert result["intent"] == ("greeting", "pricing")
+    assert "action" not in result
+
+
+def test_replacing_a_group_rebuilds_and_bumps_the_version(rules):
+    assert rules.first("hola", "intent") is None
+    version = rules.version
+
+    rules.add_group("intent", {"greeting": ["hola"]})
+
+    assert rules.version == version + 1
+    assert rules.first("hola", "intent") == "greeting"
+    assert rules.first("hello", "intent") is None
+
+
+def test_scan_cache_is_bounded():
+    rules = KeywordRules(cache_size=2)
+    rules.add_group("intent", {"greeting": ["hi"]})
+    for text in ("hi a", "hi b", "hi c"):
+        rules.scan(text)
+
+    assert list(rules._cache) == ["hi b", "hi c"]
+    assert rules.scan("") == {}
@@ -0,0 +1,70 @@
+"""Tests for app.services.knowledge_index (BM25 retrieval)."""
+import pytest
+
+from app.services import semantic_index
+from app.services.knowledge_index import KnowledgeIndex, tokenize
+
+ENTRIES = [
+    {"question": "What are your pricing plans?", "answer": "Basic is $10, Pro is $30.", "keywords": ["price", "cost"]},
+    {"question": "How do I reset my password?", "answer": "Use the forgot password link.", "keywords": ["login"]},
+    {"question": "Do you deliver to Nairobi?", "answer": "Yes, delivery takes two days.", "keywords": ["shipping"]},
+    {"question": "Ignored entry", "answer": "   "},
+    "not a dict",
+]
+
+
+@pytest.fixture(scope="module")
+def index():
+    return KnowledgeIndex(ENTRIES)
+
+
+def test_tokenize_drops_stopwords_and_folds_plurals():
+    assert tokenize("What are the Plans for access?") == ["plan", "access"]
+
+
+def test_entries_without_an_answer_are_skipped(index):
+    assert len(index) == 3
+
+
+def test_best_hit_wins_over_first_hit(index):
+    hit = index.best("I forgot my password")
+
+    assert hit.question == "How do I reset my password?"
+    assert hit.answer == "Use the forgot password link."
+
+
+def test_keywords_are_searchable(index):
+    assert index.best("shipping?").question == "Do you deliver to Nairobi?"
+
+
+def test_hits_are_ordered_and_limited(index):
+    hits = index.search("price of delivery", top_k=2)
+
+    assert len(hits) == 2
+    assert hits[0].score >= hits[1].score
+
+
+def test_confidence_is_bounded_and_filters(index):
+    hit = index.best("pricing plans price cost")
+
+    assert 0.0 < hit.confidence <= 1.0
+    assert index.best("pricing plans price cost", min_confidence=1.01) is None
+
+
+def test_unknown_or_empty_queries_have_no_hits(index):
+    assert index.search("zzz qqq") == []
+    assert index.search("") == []
+    assert index.search("what is the") == []  # Stopwords only
+
+
+def test_similar_without_the_semantic_index_is_empty(index):
+    assert index.similar("pricing") == []
+
+
+@pytest.mark.skipif(not semantic_index.available(), reason="NumPy not installed")
+def test_similar_matches_paraphrases():
+    semantic = KnowledgeIndex(ENTRIES, semantic=True)
+
+    hits = semantic.similar("reseting passwords", top_k=1)
+
+    assert hits[0].question == "How do I reset my password?"
@@ -0,0 +1,110 @@
+"""Tests for app.services.load_shedder (pressure, stages and admission)."""
+import pytest
+
+from app.services import load_shedder as load_shedder_module
+from app.services.load_shedder import (
+    DEGRADED_RESPONSE,
+    KNOWLEDGE_ONLY,
+    NORMAL,
+    REJECT,
+    SKIP_PERSIST,
+    LoadShedder,
+    Overloaded,
+    degraded_reply,
+)
+
+
+class _Depth:
+    def __init__(self, value=0):
+        self.value = value
+
+    def depth(self):
+        return self.value
+
+    def waiting(self):
+        return self.value
+
+
+@pytest.fixture
+def load(monkeypatch):
+    """Stub the queues and the database pool the pressure is computed from."""
+    load = {"outbox": _Depth(), "buffer": _Depth(), "scheduler": _Depth(), "pool": 0.0}
+    monkeypatch.setattr(load_shedder_module, "outbox", load["outbox"])
+    monkeypatch.setattr(load_shedder_module, "conversation_buffer", load["buffer"])
+    monkeypatch.setattr(load_shedder_module, "tenant_scheduler", load["scheduler"])
+    monkeypatch.setattr(load_shedder_module, "pool_usage", lambda: load["pool"])
+    return load
+
+
+def _shedder(enabled=True):
+    return LoadShedder(max_inflight=10, max_queue=100, persist_at=0.5, knowledge_at=0.75,
+                       reject_at=1.0, retry_after=7, enabled=enabled)
+
+
+@pytest.mark.parametrize("pool, stage", [
+    (0.0, NORMAL),
+    (0.49, NORMAL),
+    (0.5, SKIP_PERSIST),
+    (0.8, KNOWLEDGE_ONLY),
+    (1.0, REJECT),
+    (1.5, REJECT),
+])
+def test_stage_follows_the_pressure(load, pool, stage):
+    load["pool"] = pool
+
+    assert _shedder().stage() == stage
+
+
+def test_pressure_is_the_highest_of_inflight_queue_and_pool(load):
+    shedder = _shedder()
+    load["outbox"].value = 30
+    load["buffer"].value = 20
+    load["scheduler"].value = 10
+    load["pool"] = 0.2
+
+    assert shedder.pressure() == pytest.approx(0.6)  # 60 queued / 100
+    shedder.inflight = 9
+    assert shedder.pressure() == pytest.approx(0.9)
+
+
+def test_disabled_shedder_never_sheds(load):
+    load["pool"] = 2.0
+
+    assert _shedder(enabled=False).stage() == NORMAL
+
+
+def test_admit_tracks_inflight_and_yields_the_stage(load):
+    shedder = _shedder()
+
+    with shedder.admit() as stage:
+        assert stage == NORMAL
+        assert shedder.inflight == 1
+    assert shedder.inflight == 0
+
+
+def test_admit_raises_overloaded_at_reject(load):
+    shedder = _shedder()
+    load["pool"] = 1.0
+
+    with pytest.raises(Overloaded) as raised:
+        with shedder.admit():
+            pass
+    assert raised.value.retry_after == 7
+    assert shedder.inflight == 0
+
+
+def test_inflight_is_released_when_processing_fails(load):
+    shedder = _shedder()
+
+    with pytest.raises(RuntimeError):
+        with shedder.admit():
+            raise RuntimeError("boom")
+    assert shedder.inflight == 0
+
+
+def test_degraded_reply_uses_the_knowledge_base(monkeypatch):
+    monkeypatch.setattr(load_shedder_module, "find_answer", lambda text, *args: " Basic is $10. " if "price" in text else None)
+
+    assert degraded_reply("price?") == "Basic is $10."
+    assert degraded_reply("hello") == DEGRADED_RESPONSE
+    assert degraded_reply(None) == DEGRADED_RESPONSE
@@ -0,0 +1,111 @@
+"""Tests for app.services.memory (per-business conversation memory)."""
+import asyncio
+import json
+
+import pytest
+
+from app.services import memory, user_session
+from app.services.ai_brain import _reply_state
+from app.services.memory import MemoryWriteBuffer, get_memory, update_memory
+from app.services.state_store import BoundedStateStore
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    monkeypatch.setattr(
+        user_session, "_sessions", BoundedStateStore("test_sessions", max_entries=100, idle_ttl_seconds=3600)
+    )
+    writer = MemoryWriteBuffer(enabled=True, flush_interval=1.0, batch_size=100, load_timeout=1.0)
+    monkeypatch.setattr(memory, "memory_writer", writer)
+    return writer
+
+
+def test_memory_is_kept_per_business(writer):
+    update_memory("42", "pricing", 1, "telegram")
+    update_memory("42", "pricing", 1, "telegram")
+    update_memory("42", "greeting", 2, "telegram")
+
+    assert get_memory("42", 1, "telegram")["message_count"] == 2
+    assert get_memory("42", 2, "telegram") == {"last_intent": "greeting", "message_count": 1, "unknown_intent_count": 0}
+    assert get_memory("42")["message_count"] == 0
+
+
+def test_take_rows_writes_each_business_its_own_memory(writer):
+    update_memory("42", "pricing", 1, "telegram")
+    update_memory("42", "pricing", 1, "telegram")
+    update_memory("42", "greeting", 2, "telegram")
+
+    rows = {row["business_id"]: row for row in writer._take_rows()}
+
+    assert (rows[1]["last_intent"], rows[1]["message_count"]) == ("pricing", 2)
+    assert (rows[2]["last_intent"], rows[2]["message_count"]) == ("greeting", 1)
+    assert json.loads(rows[1]["context_data"]) == {"unknown_intent_count": 0}
+    assert writer._take_rows() == []  # Dirty set cleared
+
+
+def test_memory_without_a_business_is_not_persisted(writer):
+    update_memory("42", "pricing")
+
+    assert get_memory("42")["message_count"] == 1
+    assert writer._take_rows() == []
+
+
+def test_take_rows_skips_cleared_sessions(writer):
+    update_memory("42", "pricing", 1, "telegram")
+    memory.clear_memory("42", 1, "telegram")
+
+    assert writer._take_rows() == []
+
+
+def test_load_restores_only_the_matching_business(writer, monkeypatch):
+    stored = {(1, "42", "telegram"): ("pricing", 7, json.dumps({"unknown_intent_count": 1}))}
+    monkeypatch.setattr(memory, "_select_memory", lambda business_id, user_id, channel: stored.get((business_id, user_id, channel)))
+
+    assert asyncio.run(writer.load("42", 1, "telegram")) is True
+    assert asyncio.run(writer.load("42", 2, "telegram")) is False
+
+    assert get_memory("42", 1, "telegram") == {"last_intent": "pricing", "message_count": 7, "unknown_intent_count": 1}
+    assert get_memory("42", 2, "telegram")["message_count"] == 0
+    assert _reply_state("42", 1, "telegram") == ("pricing", True, False)
+    assert _reply_state("42", 2, "telegram") == (None, False, False)
+
+
+def test_load_skips_a_session_that_already_exists(writer, monkeypatch):
+    calls = []
+    monkeypatch.setattr(memory, "_select_memory", lambda *key: calls.append(key))
+    update_memory("42", "greeting", 1, "telegram")
+
+    assert asyncio.run(writer.load("42", 1, "telegram")) is False
+    assert calls == []
+
+
+def test_failed_flush_keeps_the_rows_dirty(writer, monkeypatch):
+    written = []
+
+    def failing_upsert(rows):
+        raise RuntimeError("database down")
+
+    update_memory("42", "pricing", 1, "telegram")
+    monkeypatch.setattr(memory, "_upsert_memory", failing_upsert)
+    asyncio.run(writer.flush())
+
+    monkeypatch.setattr(memory, "_upsert_memory", written.extend)
+    asyncio.run(writer.flush())
+
+    assert [row["user_id"] for row in written] == ["42"]
+    assert writer._flush_errors.value >= 1
+
+
+def test_failed_load_backs_off(writer, monkeypatch):
+    calls = []
+
+    def failing_select(*key):
+        calls.append(key)
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(memory, "_select_memory", failing_select)
+
+    assert asyncio.run(writer.load("42", 1, "telegram")) is False
+    assert asyncio.run(writer.load("43", 1, "telegram")) is False
+    assert len(calls) == 1  # The second cold miss skipped the database
+    assert get_memory("42")["message_count"] == 0
@@ -0,0 +1,100 @@
+"""Tests for app.services.pipeline_timing (per-stage latency of ai_brain)."""
+import asyncio
+
+import pytest
+
+from app.schemas import NormalizedMessage
+from app.services import ai_brain, metrics
+from app.services import pipeline_timing as pipeline_timing_module
+from app.services.pipeline_timing import PipelineTiming
+
+
+@pytest.fixture(autouse=True)
+def fresh_histograms(monkeypatch):
+    monkeypatch.setattr(metrics, "_histograms", {})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """perf_counter() in seconds, advanced by the test."""
+    now = [100.0]
+    monkeypatch.setattr(pipeline_timing_module.time, "perf_counter", lambda: now[0])
+    return now
+
+
+def _message(timing, clock, stages, path="rule_based"):
+    """Time one message whose stages take the given milliseconds."""
+    trace = timing.start()
+    for stage, ms in stages:
+        clock[0] += ms / 1000
+        trace.mark(stage)
+    trace.decide(path)
+    trace.finish()
+
+
+def test_each_mark_closes_the_stage_since_the_previous_one(clock):
+    timing = PipelineTiming(enabled=True)
+
+    _message(timing, clock, [("spam_check", 2), ("intent_detection", 6)], path="rule_based")
+
+    snapshot = timing.snapshot()
+    assert snapshot["stages"]["spam_check"]["max"] == pytest.approx(2)
+    assert snapshot["stages"]["intent_detection"]["max"] == pytest.approx(6)
+    assert snapshot["stages"]["intent_detection"]["share"] == pytest.approx(0.75)
+    assert snapshot["paths"]["rule_based"]["count"] == 1
+    assert snapshot["total"]["max"] == pytest.approx(8)
+
+
+def test_disabled_timing_records_nothing(clock):
+    timing = PipelineTiming(enabled=False)
+
+    _message(timing, clock, [("spam_check", 2)])
+
+    snapshot = timing.snapshot()
+    assert snapshot["enabled"] is False
+    assert snapshot["total"]["count"] == 0
+    assert snapshot["stages"] == {} and snapshot["paths"] == {}
+
+
+def test_slow_messages_feed_the_tail_breakdown(clock, monkeypatch):
+    monkeypatch.setattr(pipeline_timing_module, "TAIL_REFRESH_EVERY", 4)
+    timing = PipelineTiming(enabled=True)
+
+    for _ in range(4):
+        _message(timing, clock, [("intent_detection", 1)])
+    tail = timing.snapshot()["p99_tail"]
+    assert tail["threshold_ms"] is not None
+    messages = tail["messages"]
+
+    _message(timing, clock, [("intent_detection", 0.2)])
+    _message(timing, clock, [("knowledge_lookup", 40), ("memory_update", 10)], path="knowledge_base")
+
+    tail = timing.snapshot()["p99_tail"]
+    assert tail["messages"] == messages + 1
+    assert list(tail["stage_share"])[0] == "knowledge_lookup"  # Dominates the tail
+    assert tail["recent"][-1]["path"] == "knowledge_base"
+    assert tail["recent"][-1]["total_ms"] == pytest.approx(50)
+
+
+def test_process_message_records_its_decision_path(monkeypatch):
+    timing = PipelineTiming(enabled=True)
+    monkeypatch.setattr(ai_brain, "pipeline_timing", timing)
+    message = NormalizedMessage(channel="telegram", user_id="42", message_text="   ")
+
+    asyncio.run(ai_brain.process_message(message))
+
+    assert timing.snapshot()["paths"]["invalid"]["count"] == 1
+
+
+def test_tail_threshold_is_the_exact_p99_of_recent_totals(clock, monkeypatch):
+    monkeypatch.setattr(pipeline_timing_module, "TAIL_REFRESH_EVERY", 100)
+    timing = PipelineTiming(enabled=True)
+    for index in range(100):
+        _message(timing, clock, [("intent_detection", 0.6 + index * 0.001)])  # 0.600 ... 0.699ms
+    messages = timing.snapshot()["p99_tail"]["messages"]
+
+    _message(timing, clock, [("intent_detection", 0.62)])  # Same histogram bucket as the p99, but below it
+
+    tail = timing.snapshot()["p99_tail"]
+    assert tail["threshold_ms"] == pytest.approx(0.699)
+    assert tail["messages"] == messages
@@ -0,0 +1,58 @@
+"""Tests for ai_brain.ReplyCache."""
+import pytest
+
+from app.services import ai_brain
+from app.services.ai_brain import ReplyCache
+
+VERSION = (1, 1)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ai_brain.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_hit_returns_the_stored_reply(clock):
+    cache = ReplyCache(max_entries=10, ttl_seconds=60)
+    cache.put((1, "hi", None), VERSION, "Hello!", "greeting", "rule_based")
+
+    assert cache.get((1, "hi", None), VERSION) == ("Hello!", "greeting", "rule_based")
+    assert cache.get((2, "hi", None), VERSION) is None  # Other business
+
+
+def test_entries_of_an_old_version_are_dropped(clock):
+    cache = ReplyCache(max_entries=10, ttl_seconds=60)
+    cache.put((1, "hi", None), VERSION, "Hello!", "greeting", "rule_based")
+
+    assert cache.get((1, "hi", None), (2, 1)) is None
+    assert cache.get((1, "hi", None), VERSION) is None  # Removed by the stale lookup
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = ReplyCache(max_entries=10, ttl_seconds=60)
+    cache.put((1, "hi", None), VERSION, "Hello!", "greeting", "rule_based")
+
+    clock[0] += 61
+    assert cache.get((1, "hi", None), VERSION) is None
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = ReplyCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", VERSION, "A", "x", "p")
+    cache.put("b", VERSION, "B", "x", "p")
+    cache.get("a", VERSION)  # b is now the least recently used
+    cache.put("c", VERSION, "C", "x", "p")
+
+    assert cache.get("b", VERSION) is None
+    assert cache.get("a", VERSION) is not None
+    assert cache.get("c", VERSION) is not None
+
+
+def test_disabled_cache_stores_nothing(clock):
+    cache = ReplyCache(max_entries=0, ttl_seconds=60)
+    cache.put("a", VERSION, "A", "x", "p")
+
+    assert cache.enabled is False
+    assert cache.get("a", VERSION) is None
@@ -0,0 +1,69 @@
+"""Regression tests for the n-gram knowledge fallback on off-topic messages."""
+import asyncio
+
+import pytest
+
+from app.schemas import NormalizedMessage
+from app.services import ai_brain, knowledge_service
+from app.services.knowledge_index import KnowledgeIndex
+from app.services.semantic_index import features
+
+OFF_TOPIC = ["hello there", "good morning", "what are your hours", "weather today"]
+
+
+@pytest.fixture(scope="module")
+def faq_index():
+    assert knowledge_service.load_knowledge()
+    return knowledge_service._index_for(None)
+
+
+def _reply(text, user_id):
+    message = NormalizedMessage(channel="telegram", user_id=user_id, message_text=text)
+    return asyncio.run(ai_brain.process_message(message))
+
+
+def test_features_skip_stopwords():
+    assert features("what are your hours", {"what", "are", "your"}) == features("hours")
+
+
+@pytest.mark.parametrize("text", OFF_TOPIC)
+def test_off_topic_messages_have_no_similar_entry(faq_index, text):
+    assert faq_index.similar(text, 1, 0.0) == []
+
+
+@pytest.mark.parametrize("text", ["pricng", "costing?", "can i cancle"])
+def test_misspellings_still_find_their_entry(faq_index, text):
+    assert faq_index.similar(text, 1, knowledge_service.settings.semantic_min_similarity)
+
+
+def test_similar_needs_a_shared_stem():
+    index = KnowledgeIndex([{"question": "Where are you based?", "answer": "Nairobi."}], semantic=True)
+
+    assert index.similar("where are you", 1, 0.0) == []  # Stopwords only
+    assert index.similar("basedd", 1, 0.0)
+
+
+def test_greeting_gets_the_greeting_reply(faq_index):
+    reply = _reply("hello there", "semantic-greeting")
+
+    assert reply == ai_brain.generate_response_for_intent(ai_brain.Intent.GREETING, None, 0)
+
+
+def test_off_topic_question_gets_the_fallback_reply(faq_index):
+    reply = _reply("what are your hours", "semantic-off-topic")
+
+    assert not any(reply == entry.get("answer") for entry in knowledge_service._knowledge_base)
+
+
+def test_fuzzy_match_is_skipped_for_known_intents(monkeypatch):
+    calls = []
+
+    def fake_find_answer(text, business_id=None, semantic=True):
+        calls.append(semantic)
+        return "fuzzy answer" if semantic else None
+
+    monkeypatch.setattr(ai_brain, "find_answer", fake_find_answer)
+
+    assert _reply("hi there", "semantic-known") != "fuzzy answer"
+    assert calls == [False]
+    assert _reply("zxqv blorp", "semantic-unknown") == "fuzzy answer"
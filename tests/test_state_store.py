@@ -0,0 +1,75 @@
+"""Tests for app.services.state_store (bounded per-user state)."""
+import pytest
+
+from app.services import memory, user_session
+from app.services import state_store as state_store_module
+from app.services.state_store import BoundedStateStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(state_store_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _store(max_entries=3, idle_ttl_seconds=60, sweep_interval=3600):
+    return BoundedStateStore("test", max_entries=max_entries, idle_ttl_seconds=idle_ttl_seconds,
+                             sweep_interval=sweep_interval)
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    store = _store()
+    store["a"], store["b"], store["c"] = 1, 2, 3
+    assert store["a"] == 1  # Reading refreshes "a"
+
+    store["d"] = 4
+
+    assert sorted(store) == ["a", "c", "d"]
+    assert store._lru_evictions.value >= 1
+
+
+def test_idle_entries_expire_on_access(clock):
+    store = _store()
+    store["a"] = 1
+    clock[0] += 30
+    assert store.get("a") == 1  # Still live, and now used again
+
+    clock[0] += 61
+
+    assert "a" not in store
+    assert store.get("a", "default") == "default"
+    with pytest.raises(KeyError):
+        store["a"]
+    assert len(store) == 0
+
+
+def test_writes_sweep_expired_entries_from_the_cold_end(clock):
+    store = _store(max_entries=10, sweep_interval=10)
+    store["old1"], store["old2"] = 1, 2
+    clock[0] += 50
+    store["fresh"] = 3
+    clock[0] += 20  # old1 and old2 idle for 70s, fresh for 20s
+
+    store["new"] = 4
+
+    assert sorted(store) == ["fresh", "new"]
+
+
+def test_copy_skips_expired_entries(clock):
+    store = _store()
+    store["old"] = 1
+    clock[0] += 50
+    store["fresh"] = 2
+    clock[0] += 20
+
+    assert store.copy() == {"fresh": 2}
+
+
+def test_memory_forgets_the_least_recently_active_user(clock, monkeypatch):
+    monkeypatch.setattr(user_session, "_sessions", _store(max_entries=2))
+    for user_id in ("1", "2", "3"):
+        memory.update_memory(user_id, "greeting")
+
+    assert memory.get_memory("1")["message_count"] == 0
+    assert memory.get_memory("3") == {"last_intent": "greeting", "message_count": 1, "unknown_intent_count": 0}
@@ -0,0 +1,97 @@
+"""Tests for the shared Telegram HTTP client in app.services.telegram."""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.services import telegram
+from app.services.bot_health import bot_health
+from app.services.telegram import TelegramService
+
+TOKEN = "123:abc"
+RATE_LIMITED = "777:rate-limited"
+
+
+@pytest.fixture
+def api_calls(monkeypatch):
+    """Route the shared client to an in-process Bot API stand-in."""
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        body = json.loads(request.content or b"{}")
+        if body.get("chat_id") == 403:
+            return httpx.Response(403, json={"ok": False, "description": "Forbidden: bot was blocked by the user"})
+        return httpx.Response(200, json={"ok": True, "result": {}})
+
+    monkeypatch.setattr(telegram, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return seen
+
+
+def test_client_is_created_lazily_and_reused(monkeypatch):
+    monkeypatch.setattr(telegram, "_http_client", None)
+
+    async def run():
+        client = telegram.get_http_client()
+        assert telegram.get_http_client() is client
+        await telegram.close_http_client()
+        assert telegram._http_client is None
+        assert client.is_closed
+
+    asyncio.run(run())
+
+
+def test_calls_share_one_client(api_calls):
+    async def run():
+        service = TelegramService(TOKEN)
+        assert await service.send_message(42, "hi") is True
+        response = await service.request("getMe")
+        return response.json()
+
+    assert asyncio.run(run())["ok"] is True
+    assert [request.url.path for request in api_calls] == [f"/bot{TOKEN}/sendMessage", f"/bot{TOKEN}/getMe"]
+    assert json.loads(api_calls[0].content) == {"chat_id": 42, "text": "hi"}
+
+
+def test_send_message_reports_api_errors(api_calls):
+    assert asyncio.run(TelegramService(TOKEN).send_message(403, "hi")) is False
+
+
+@pytest.fixture
+def scripted(monkeypatch):
+    """A Bot API stand-in answering sendMessage with scripted responses."""
+    responses = []
+    calls = []
+
+    def handler(request):
+        calls.append(json.loads(request.content)["chat_id"])
+        return responses.pop(0) if responses else httpx.Response(200, json={"ok": True, "result": {}})
+
+    monkeypatch.setattr(telegram, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    yield responses, calls
+    bot_health.reset(RATE_LIMITED)
+
+
+def test_429_parks_the_bot_and_returns_the_retry_time(scripted):
+    responses, calls = scripted
+    responses.append(httpx.Response(429, json={"ok": False, "parameters": {"retry_after": 5}}))
+    service = TelegramService(RATE_LIMITED)
+
+    result = asyncio.run(service.try_send_message(42, "hi"))
+
+    assert result.sent is False
+    assert result.retry_at == bot_health.parked_until(RATE_LIMITED) > 0
+    assert asyncio.run(service.try_send_message(42, "hi")).retry_at == result.retry_at  # Parked: not sent
+    assert asyncio.run(service.send_message(42, "hi")) is False
+    assert calls == [42]
+
+
+def test_chat_that_blocked_the_bot_is_skipped(scripted):
+    responses, calls = scripted
+    responses.append(httpx.Response(403, json={"ok": False, "description": "Forbidden: bot was blocked by the user"}))
+    service = TelegramService(RATE_LIMITED)
+
+    assert asyncio.run(service.send_message(43, "hi")) is False
+    assert asyncio.run(service.send_message(43, "hi")) is False
+    assert calls == [43]
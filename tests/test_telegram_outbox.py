@@ -0,0 +1,218 @@
+"""Tests for app.services.telegram_outbox (sharded, rate-limited reply queue)."""
+import asyncio
+
+import pytest
+
+from app.services import telegram, telegram_outbox
+from app.services.bot_health import bot_health
+from app.services.telegram import SendResult
+from app.services.telegram_outbox import OutboundMessage, TelegramOutbox, TokenBucket
+
+BOT = "1:bot"
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    sent = []
+
+    async def fake_try_send_message(self, chat_id, text):
+        parked_until = bot_health.parked_until(self.bot_token)
+        if parked_until:
+            return SendResult(False, retry_at=parked_until)
+        sent.append((self.bot_token, chat_id, text))
+        return SendResult(chat_id != 403)
+
+    monkeypatch.setattr(telegram.TelegramService, "try_send_message", fake_try_send_message)
+    yield sent
+    bot_health.reset(BOT)
+
+
+def _outbox(max_queue=100):
+    return TelegramOutbox(workers=2, max_queue=max_queue, bot_rate=1000, bot_burst=100, chat_rate=1000, chat_burst=100)
+
+
+def test_token_bucket_spaces_out_reservations(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(telegram_outbox.time, "monotonic", lambda: now[0])
+    bucket = TokenBucket(rate=2.0, capacity=2)
+
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    now[0] += 1.0
+    assert bucket.reserve() == 0.5
+
+
+def test_token_bucket_checks_without_consuming(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(telegram_outbox.time, "monotonic", lambda: now[0])
+    bucket = TokenBucket(rate=2.0, capacity=1)
+
+    assert bucket.available_in() == 0.0
+    assert bucket.available_in() == 0.0  # Still there
+    bucket.take()
+    assert bucket.available_in() == 0.5
+    now[0] += 0.5
+    assert bucket.available_in() == 0.0
+
+
+def test_replies_to_a_chat_keep_their_order(sent):
+    async def run():
+        outbox = _outbox()
+        outbox.start()
+        for index in range(5):
+            assert outbox.enqueue(OutboundMessage(BOT, 7, f"m{index}"))
+            assert outbox.enqueue(OutboundMessage(BOT, 8, f"n{index}"))
+        await outbox.stop()
+
+    asyncio.run(run())
+
+    assert [text for _, chat_id, text in sent if chat_id == 7] == ["m0", "m1", "m2", "m3", "m4"]
+    assert [text for _, chat_id, text in sent if chat_id == 8] == ["n0", "n1", "n2", "n3", "n4"]
+
+
+def test_on_sent_gets_the_delivery_result(sent):
+    results = []
+
+    async def on_sent(success):
+        results.append(success)
+
+    async def run():
+        outbox = _outbox()
+        outbox.start()
+        outbox.enqueue(OutboundMessage(BOT, 7, "ok", on_sent=on_sent))
+        outbox.enqueue(OutboundMessage(BOT, 403, "blocked", on_sent=on_sent))
+        await outbox.stop()
+
+    asyncio.run(run())
+
+    assert sorted(results) == [False, True]
+
+
+def test_enqueue_is_refused_when_not_running(sent):
+    assert _outbox().enqueue(OutboundMessage(BOT, 7, "x")) is False
+
+
+def test_enqueue_is_refused_when_the_worker_queue_is_full(sent):
+    async def run():
+        outbox = TelegramOutbox(workers=1, max_queue=2, bot_rate=1000, bot_burst=100, chat_rate=1000, chat_burst=100)
+        outbox.start()
+        accepted = [outbox.enqueue(OutboundMessage(BOT, 7, str(index))) for index in range(3)]
+        await outbox.stop()
+        return accepted
+
+    assert asyncio.run(run()) == [True, True, False]
+    assert len(sent) == 2
+
+
+def test_parked_bot_is_bounded_by_the_queue_size(sent):
+    async def run():
+        outbox = TelegramOutbox(workers=1, max_queue=3, bot_rate=1000, bot_burst=100, chat_rate=1000, chat_burst=100)
+        outbox.start()
+        bot_health.park(BOT, 60)
+        accepted = [outbox.enqueue(OutboundMessage(BOT, chat_id, "x")) for chat_id in range(3)]
+        await asyncio.sleep(0.05)  # Workers move the messages into their lanes
+        refused = outbox.enqueue(OutboundMessage(BOT, 99, "x"))
+        depth = outbox.depth()
+        await outbox.stop(timeout=0.05)
+        return accepted, refused, depth
+
+    accepted, refused, depth = asyncio.run(run())
+
+    assert accepted == [True, True, True]
+    assert refused is False
+    assert depth == 3
+    assert sent == []
+
+
+def test_rate_limited_chat_does_not_hold_up_other_bots(sent):
+    other_bot = "2:bot"
+
+    async def run():
+        outbox = TelegramOutbox(workers=1, max_queue=100, bot_rate=1000, bot_burst=100, chat_rate=20, chat_burst=1)
+        outbox.start()
+        outbox.enqueue(OutboundMessage(BOT, 7, "first"))
+        outbox.enqueue(OutboundMessage(BOT, 7, "second"))  # No chat token for 50ms
+        outbox.enqueue(OutboundMessage(other_bot, 9, "other"))
+        await asyncio.sleep(0.02)
+        early = list(sent)
+        depth = outbox.depth()
+        await asyncio.sleep(0.1)
+        await outbox.stop()
+        return early, depth
+
+    early, depth = asyncio.run(run())
+
+    assert [text for _, _, text in early] == ["first", "other"]
+    assert depth == 1  # "second" is held, and counted
+    assert [text for _, _, text in sent] == ["first", "other", "second"]
+
+
+def test_deferred_chats_keep_their_order(sent):
+    async def run():
+        outbox = TelegramOutbox(workers=1, max_queue=100, bot_rate=1000, bot_burst=100, chat_rate=100, chat_burst=1)
+        outbox.start()
+        for index in range(4):
+            outbox.enqueue(OutboundMessage(BOT, 7, f"m{index}"))
+            outbox.enqueue(OutboundMessage(BOT, 8, f"n{index}"))
+        await outbox.stop()
+        return outbox._deferred.value
+
+    deferred = asyncio.run(run())
+
+    assert [text for _, chat_id, text in sent if chat_id == 7] == ["m0", "m1", "m2", "m3"]
+    assert [text for _, chat_id, text in sent if chat_id == 8] == ["n0", "n1", "n2", "n3"]
+    assert deferred > 0
+
+
+def test_parked_bot_does_not_hold_up_other_bots(sent):
+    other_bot = "2:bot"
+
+    async def run():
+        outbox = TelegramOutbox(workers=1, max_queue=100, bot_rate=1000, bot_burst=100, chat_rate=1000, chat_burst=100)
+        outbox.start()
+        bot_health.park(BOT, 0.05)
+        outbox.enqueue(OutboundMessage(BOT, 7, "m0"))
+        outbox.enqueue(OutboundMessage(BOT, 7, "m1"))
+        outbox.enqueue(OutboundMessage(other_bot, 9, "other"))
+        await asyncio.sleep(0.02)
+        early = list(sent)
+        await asyncio.sleep(0.1)
+        await outbox.stop()
+        return early
+
+    early = asyncio.run(run())
+
+    assert [text for _, _, text in early] == ["other"]
+    assert [text for _, _, text in sent] == ["other", "m0", "m1"]
+
+
+def test_rate_limited_send_is_retried_at_the_head_of_its_chat(monkeypatch):
+    sent = []
+
+    async def rate_limited_once(self, chat_id, text):
+        if text == "m0" and not sent:
+            sent.append("429")
+            bot_health.park(self.bot_token, 0.05)
+            return SendResult(False, retry_at=bot_health.parked_until(self.bot_token))
+        if bot_health.parked_until(self.bot_token):
+            return SendResult(False, retry_at=bot_health.parked_until(self.bot_token))
+        sent.append(text)
+        return SendResult(True)
+
+    monkeypatch.setattr(telegram.TelegramService, "try_send_message", rate_limited_once)
+
+    async def run():
+        outbox = _outbox()
+        outbox.start()
+        for index in range(3):
+            outbox.enqueue(OutboundMessage(BOT, 7, f"m{index}"))
+        await asyncio.sleep(0.15)
+        await outbox.stop()
+        return outbox._retried.value
+
+    try:
+        retried = asyncio.run(run())
+    finally:
+        bot_health.reset(BOT)
+
+    assert sent == ["429", "m0", "m1", "m2"]
+    assert retried >= 1
@@ -0,0 +1,124 @@
+"""Tests for app.services.telegram_parser (fast-path update parsing)."""
+import asyncio
+import json
+
+import pytest
+
+from app.schemas import TelegramUpdate
+from app.services import telegram_updates
+from app.services.bot_registry import BotEntry
+from app.services.telegram import normalize_telegram_message
+from app.services.telegram_parser import MAX_MESSAGE_LENGTH, parse_update
+
+PAYLOADS = [
+    {"update_id": 1, "message": {"message_id": 10, "date": 1700000000, "chat": {"id": 42, "type": "private"},
+                                 "from": {"id": 7, "is_bot": False}, "text": "  hello  "}},
+    {"update_id": 2, "channel_post": {"message_id": 11, "date": 1700000000, "chat": {"id": -100, "type": "channel"},
+                                      "text": "news"}},
+    {"update_id": 3, "message": {"message_id": 12, "date": 1700000000, "chat": {"id": 42, "type": "private"},
+                                 "from": {"id": 7}, "text": "re", "reply_to_message": {"message_id": 10},
+                                 "forward_from": {"id": 99}}},
+    {"update_id": 4, "message": {"message_id": 13, "date": 1700000000, "chat": {"id": 42, "type": "private"},
+                                 "from": {"id": 7}, "text": "x" * (MAX_MESSAGE_LENGTH + 5)}},
+]
+
+
+def _body(payload):
+    return json.dumps(payload).encode("utf-8")
+
+
+@pytest.mark.parametrize("payload", PAYLOADS, ids=lambda payload: str(payload["update_id"]))
+def test_fast_path_matches_pydantic_normalization(payload):
+    expected = normalize_telegram_message(TelegramUpdate(**payload))
+
+    parsed = parse_update(_body(payload))
+
+    assert parsed.update_id == payload["update_id"]
+    message = parsed.message
+    assert (message.channel, message.user_id, message.message_text) == (
+        expected.channel, expected.user_id, expected.message_text
+    )
+    assert message.timestamp == expected.timestamp
+    for key, value in expected.metadata.items():
+        assert message.metadata.get(key) == value
+
+
+def test_non_text_messages_keep_their_chat():
+    parsed = parse_update(_body({"update_id": 5, "message": {"chat": {"id": 42}, "photo": [{}]}}))
+
+    assert (parsed.update_id, parsed.chat_id, parsed.message, parsed.kind) == (5, 42, None, "message")
+
+
+@pytest.mark.parametrize("body", [b"not json", b"[]", b'{"message": {}}', b'{"update_id": "1"}'])
+def test_invalid_bodies_are_rejected(body):
+    assert parse_update(body) is None
+
+
+def test_redelivered_body_is_processed_once(monkeypatch):
+    processed = []
+
+    async def fake_process_message(message, business_id=None):
+        processed.append(message.message_text)
+        return "reply"
+
+    monkeypatch.setattr(telegram_updates, "process_message", fake_process_message)
+    monkeypatch.setattr(telegram_updates, "_enqueue_reply", lambda *args: True)
+    bot = BotEntry(integration_id=9001, business_id=1, bot_token="1:a", bot_username=None,
+                   channel_name=None, secret_token="s")
+    body = _body(dict(PAYLOADS[0], update_id=424242))
+
+    async def run():
+        for _ in range(2):
+            await telegram_updates.handle_update(parse_update(body), bot)
+
+    asyncio.run(run())
+
+    assert processed == ["hello"]
+
+
+def test_update_cancelled_mid_processing_is_processed_on_retry(monkeypatch):
+    processed = []
+
+    async def cancelled_once(message, business_id=None):
+        processed.append(message.message_text)
+        if len(processed) == 1:
+            raise asyncio.CancelledError
+        return "reply"
+
+    monkeypatch.setattr(telegram_updates, "process_message", cancelled_once)
+    monkeypatch.setattr(telegram_updates, "_enqueue_reply", lambda *args: True)
+    bot = BotEntry(integration_id=9002, business_id=1, bot_token="1:a", bot_username=None,
+                   channel_name=None, secret_token="s")
+    body = _body(dict(PAYLOADS[0], update_id=434343))
+
+    async def run():
+        with pytest.raises(asyncio.CancelledError):
+            await telegram_updates.handle_update(parse_update(body), bot)
+        await telegram_updates.handle_update(parse_update(body), bot)
+
+    asyncio.run(run())
+
+    assert processed == ["hello", "hello"]
+
+
+def test_legacy_webhook_updates_are_not_deduplicated(monkeypatch):
+    processed = []
+
+    async def fake_process_message(message, business_id=None):
+        processed.append(message.message_text)
+        return "reply"
+
+    async def fake_send_reply(chat_id, text, bot):
+        return None
+
+    monkeypatch.setattr(telegram_updates, "process_message", fake_process_message)
+    monkeypatch.setattr(telegram_updates, "_send_reply", fake_send_reply)
+    body = _body(dict(PAYLOADS[0], update_id=454545))
+
+    async def run():
+        for _ in range(2):
+            await telegram_updates.handle_update(parse_update(body), None)  # Bot unknown: ids may collide
+
+    asyncio.run(run())
+
+    assert processed == ["hello", "hello"]
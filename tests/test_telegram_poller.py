@@ -0,0 +1,94 @@
+"""Tests for app.services.telegram_poller (getUpdates ingestion)."""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.services import telegram, telegram_poller
+from app.services.bot_registry import BotEntry
+from app.services.telegram_poller import TelegramPoller
+
+BOT = BotEntry(
+    integration_id=7,
+    business_id=10,
+    bot_token="123:abc",
+    bot_username="shop_bot",
+    channel_name=None,
+    secret_token="secret",
+)
+
+
+def _raw(update_id, chat_id, text="hi"):
+    return {
+        "update_id": update_id,
+        "message": {"message_id": update_id, "date": 0, "chat": {"id": chat_id, "type": "private"}, "text": text},
+    }
+
+
+@pytest.fixture
+def handled(monkeypatch):
+    handled = []
+
+    async def fake_handle_update(update, bot, **kwargs):
+        await asyncio.sleep(0.01 if update.update_id % 2 else 0)  # Finish out of arrival order
+        handled.append((update.chat_id, update.update_id))
+        return {"ok": True}
+
+    monkeypatch.setattr(telegram_poller, "handle_update", fake_handle_update)
+    return handled
+
+
+def test_batch_keeps_per_chat_order_and_commits_the_offset(handled):
+    poller = TelegramPoller(poll_timeout=1, limit=100, concurrency=4)
+    batch = [_raw(11, 1), _raw(12, 2), _raw(13, 1), _raw(14, 2), _raw(15, 1)]
+
+    asyncio.run(poller._process_batch(BOT, batch))
+
+    assert [update_id for chat_id, update_id in handled if chat_id == 1] == [11, 13, 15]
+    assert [update_id for chat_id, update_id in handled if chat_id == 2] == [12, 14]
+    assert poller._offsets[BOT.integration_id] == 16
+
+
+def test_invalid_updates_are_skipped(handled):
+    poller = TelegramPoller(poll_timeout=1, limit=100, concurrency=4)
+
+    asyncio.run(poller._process_batch(BOT, [_raw(20, 1), {"update_id": "21"}, "not an update"]))
+
+    assert handled == [(1, 20)]
+    assert poller._offsets[BOT.integration_id] == 21
+
+
+def test_fetch_long_polls_from_the_committed_offset(monkeypatch):
+    payloads = []
+
+    def handler(request):
+        payloads.append((request.url.path, json.loads(request.content)))
+        return httpx.Response(200, json={"ok": True, "result": [_raw(30, 1)]})
+
+    monkeypatch.setattr(telegram, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    poller = TelegramPoller(poll_timeout=25, limit=50, concurrency=4)
+    poller._offsets[BOT.integration_id] = 30
+
+    updates = asyncio.run(poller._fetch(BOT))
+
+    assert updates == [_raw(30, 1)]
+    path, payload = payloads[0]
+    assert path == "/bot123:abc/getUpdates"
+    assert payload["offset"] == 30 and payload["timeout"] == 25 and payload["limit"] == 50
+
+
+def test_conflict_removes_the_webhook(monkeypatch):
+    paths = []
+
+    def handler(request):
+        paths.append(request.url.path.rsplit("/", 1)[-1])
+        if paths[-1] == "getUpdates":
+            return httpx.Response(409, json={"ok": False, "description": "Conflict: can't use getUpdates while webhook is active"})
+        return httpx.Response(200, json={"ok": True, "result": True})
+
+    monkeypatch.setattr(telegram, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(TelegramPoller(poll_timeout=1, limit=1, concurrency=1)._fetch(BOT))
+    assert paths == ["getUpdates", "deleteWebhook"]
@@ -0,0 +1,104 @@
+"""Tests for app.services.tenant_knowledge (per-business indexes, version invalidation)."""
+import asyncio
+
+import pytest
+from sqlalchemy import delete, update
+
+from app.models import Business, KnowledgeEntry
+from app.services import knowledge_service
+from app.services import tenant_knowledge as tenant_knowledge_module
+from app.services.tenant_knowledge import tenant_knowledge
+
+BUSINESS = 1
+OTHER = 2
+
+
+@pytest.fixture
+def db(db_context, monkeypatch):
+    monkeypatch.setattr(tenant_knowledge_module, "get_db_context", db_context)
+    monkeypatch.setattr(tenant_knowledge, "recheck_seconds", 0)
+    tenant_knowledge._tenants.clear()
+    with db_context() as session:
+        session.add_all([Business(id=BUSINESS, name="shop", owner_id=1), Business(id=OTHER, name="cafe", owner_id=1)])
+        session.add(KnowledgeEntry(business_id=BUSINESS, question="Do you deliver to Nairobi?", answer="Yes, same day."))
+        session.add(KnowledgeEntry(business_id=OTHER, question="Do you have vegan options?", answer="Yes, three."))
+    yield db_context
+    tenant_knowledge._tenants.clear()
+
+
+def _version(db, business_id=BUSINESS):
+    with db() as session:
+        return session.get(Business, business_id).knowledge_version
+
+
+def _answer(text, business_id=BUSINESS):
+    asyncio.run(tenant_knowledge.prepare(business_id))
+    return knowledge_service.find_answer(text, business_id)
+
+
+def test_orm_edit_bumps_the_version_and_invalidates_the_index(db):
+    assert _answer("do you deliver to nairobi") == "Yes, same day."
+    version = _version(db)
+
+    with db() as session:
+        entry = session.query(KnowledgeEntry).filter_by(business_id=BUSINESS).one()
+        entry.answer = "Yes, within two hours."
+
+    assert _version(db) == version + 1
+    assert tenant_knowledge.get(BUSINESS) is None
+    assert _answer("do you deliver to nairobi") == "Yes, within two hours."
+
+
+def test_new_entry_is_answered_after_commit(db):
+    assert _answer("do you deliver to nairobi") == "Yes, same day."
+
+    with db() as session:
+        session.add(KnowledgeEntry(business_id=BUSINESS, question="When are you open?", answer="9am to 6pm."))
+
+    assert _answer("when are you open") == "9am to 6pm."
+
+
+def test_rolled_back_write_keeps_the_version(db):
+    version = _version(db)
+
+    with pytest.raises(RuntimeError):
+        with db() as session:
+            session.add(KnowledgeEntry(business_id=BUSINESS, question="x", answer="y"))
+            session.flush()
+            raise RuntimeError
+
+    assert _version(db) == version
+
+
+def test_bulk_update_bumps_only_matching_businesses(db):
+    _answer("do you deliver to nairobi")
+    versions = _version(db), _version(db, OTHER)
+
+    with db() as session:
+        session.execute(update(KnowledgeEntry).where(KnowledgeEntry.business_id == BUSINESS).values(answer="No."))
+
+    assert _version(db) == versions[0] + 1
+    assert _version(db, OTHER) == versions[1]
+    assert _answer("do you deliver to nairobi") == "No."
+
+
+def test_legacy_query_delete_bumps_the_version(db):
+    _answer("do you deliver to nairobi")
+    version = _version(db)
+
+    with db() as session:
+        session.query(KnowledgeEntry).filter(KnowledgeEntry.business_id == BUSINESS).delete()
+
+    assert _version(db) == version + 1
+    assert tenant_knowledge.get(BUSINESS) is None
+    asyncio.run(tenant_knowledge.prepare(BUSINESS))
+    assert len(tenant_knowledge.get(BUSINESS)) == 0
+
+
+def test_bulk_delete_without_matches_bumps_nothing(db):
+    version = _version(db)
+
+    with db() as session:
+        session.execute(delete(KnowledgeEntry).where(KnowledgeEntry.business_id == 99))
+
+    assert _version(db) == version
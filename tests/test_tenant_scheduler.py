@@ -0,0 +1,93 @@
+"""Tests for app.services.tenant_scheduler (deficit round robin dispatch)."""
+import asyncio
+from typing import List
+
+from app.services.tenant_scheduler import TenantScheduler
+
+
+async def _grant_order(scheduler: TenantScheduler, keys: List[str], grants: int) -> List[str]:
+    """Queue one waiter per key behind a busy slot, then release slots one by one."""
+    await scheduler.acquire("busy")
+    order: List[str] = []
+
+    async def wait_for_slot(key: str) -> None:
+        await scheduler.acquire(key)
+        order.append(key)
+
+    tasks = [asyncio.create_task(wait_for_slot(key)) for key in keys]
+    await asyncio.sleep(0)
+    scheduler.release("busy")
+    for _ in range(grants):
+        await asyncio.sleep(0)
+        scheduler.release(order[-1])
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return order[:grants]
+
+
+def test_slots_are_split_in_proportion_to_shares():
+    scheduler = TenantScheduler(max_concurrency=1, default_share=1.0, default_cap=0, overrides={"a": {"share": 3}})
+
+    order = asyncio.run(_grant_order(scheduler, ["a"] * 20 + ["b"] * 20, grants=16))
+
+    assert order.count("a") == 12
+    assert order.count("b") == 4
+
+
+def test_equal_shares_alternate():
+    scheduler = TenantScheduler(max_concurrency=1, default_share=1.0, default_cap=0)
+
+    order = asyncio.run(_grant_order(scheduler, ["a"] * 5 + ["b"] * 5, grants=6))
+
+    assert order == ["a", "b", "a", "b", "a", "b"]
+
+
+def test_business_cap_leaves_slots_to_others():
+    async def scenario():
+        scheduler = TenantScheduler(
+            max_concurrency=4, default_share=1.0, default_cap=0, overrides={"a": {"max_concurrency": 1}}
+        )
+        await scheduler.acquire("a")
+        waiters = [asyncio.create_task(scheduler.acquire(key)) for key in ["a", "a", "b", "b"]]
+        await asyncio.sleep(0)
+        snapshot = scheduler.snapshot()
+        for task in waiters:
+            task.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        return snapshot
+
+    snapshot = asyncio.run(scenario())
+
+    assert snapshot["a"]["running"] == 1
+    assert snapshot["a"]["waiting"] == 2
+    assert snapshot["b"]["running"] == 2
+
+
+def test_cancelled_waiters_are_skipped():
+    async def scenario():
+        scheduler = TenantScheduler(max_concurrency=1, default_share=1.0, default_cap=0)
+        await scheduler.acquire("busy")
+        cancelled = asyncio.create_task(scheduler.acquire("a"))
+        waiting = asyncio.create_task(scheduler.acquire("b"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        scheduler.release("busy")
+        await asyncio.wait_for(waiting, timeout=1)
+        return scheduler.snapshot()
+
+    snapshot = asyncio.run(scenario())
+
+    assert snapshot["a"]["running"] == 0
+    assert snapshot["b"]["running"] == 1
+
+
+def test_disabled_scheduler_does_not_limit():
+    async def scenario():
+        scheduler = TenantScheduler(max_concurrency=0, default_share=1.0, default_cap=0)
+        async with scheduler.slot("a"):
+            async with scheduler.slot("a"):
+                return scheduler.waiting()
+
+    assert asyncio.run(scenario()) == 0
@@ -0,0 +1,82 @@
+"""Tests for app.services.update_dedup."""
+import asyncio
+from datetime import datetime
+
+from app.models import ProcessedUpdate
+from app.services import update_dedup
+from app.services.update_dedup import UpdateDeduplicator
+
+
+def test_second_delivery_is_a_duplicate():
+    dedup = UpdateDeduplicator(max_entries=10, ttl_seconds=60)
+
+    assert asyncio.run(dedup.is_duplicate(1, 100)) is False
+    assert asyncio.run(dedup.is_duplicate(1, 100)) is True
+
+
+def test_update_ids_are_per_bot():
+    dedup = UpdateDeduplicator(max_entries=10, ttl_seconds=60)
+
+    assert asyncio.run(dedup.is_duplicate(1, 100)) is False
+    assert asyncio.run(dedup.is_duplicate(2, 100)) is False
+
+
+def test_non_integer_update_id_is_never_a_duplicate():
+    dedup = UpdateDeduplicator(max_entries=10, ttl_seconds=60)
+
+    assert asyncio.run(dedup.is_duplicate(1, None)) is False
+    assert asyncio.run(dedup.is_duplicate(1, None)) is False
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(update_dedup.time, "monotonic", lambda: now[0])
+    dedup = UpdateDeduplicator(max_entries=10, ttl_seconds=60)
+
+    assert dedup.seen_locally(1, 100) is False
+    now[0] += 61
+    assert dedup.seen_locally(1, 100) is False
+
+
+def test_least_recently_seen_entries_are_evicted():
+    dedup = UpdateDeduplicator(max_entries=2, ttl_seconds=60)
+
+    dedup.seen_locally(1, 1)
+    dedup.seen_locally(1, 2)
+    dedup.seen_locally(1, 1)  # Refreshes 1, so 2 is the oldest
+    dedup.seen_locally(1, 3)
+
+    assert dedup.seen_locally(1, 1) is True
+    assert dedup.seen_locally(1, 2) is False
+
+
+def test_forget_lets_a_retry_through():
+    dedup = UpdateDeduplicator(max_entries=10, ttl_seconds=60)
+
+    assert asyncio.run(dedup.is_duplicate(1, 100)) is False
+    asyncio.run(dedup.forget(1, 100))
+    assert asyncio.run(dedup.is_duplicate(1, 100)) is False
+
+
+def test_shared_check_fails_open(monkeypatch):
+    def unavailable():
+        raise ConnectionError("database down")
+
+    monkeypatch.setattr(update_dedup, "get_db_context", unavailable)
+    dedup = UpdateDeduplicator(max_entries=10, ttl_seconds=60, shared=True)
+
+    assert asyncio.run(dedup.is_duplicate(1, 100)) is False
+    assert asyncio.run(dedup.is_duplicate(1, 100)) is True  # Still caught locally
+
+
+def test_forget_releases_the_shared_claim(db_context, monkeypatch):
+    monkeypatch.setattr(update_dedup, "get_db_context", db_context)
+    with db_context() as db:
+        db.add(ProcessedUpdate(bot_key="1", update_id=100, created_at=datetime.utcnow()))
+        db.add(ProcessedUpdate(bot_key="2", update_id=100, created_at=datetime.utcnow()))
+    dedup = UpdateDeduplicator(max_entries=10, ttl_seconds=60, shared=True)
+
+    asyncio.run(dedup.forget(1, 100))
+
+    with db_context() as db:
+        assert [row.bot_key for row in db.query(ProcessedUpdate)] == ["2"]
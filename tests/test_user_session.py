@@ -0,0 +1,124 @@
+"""Tests for app.services.user_session."""
+import struct
+
+import pytest
+
+from app.services import edge_case_handler, memory, user_session
+from app.services.state_store import BoundedStateStore
+from app.services.user_session import TIMESTAMP_RING_SIZE, UserSession, intent_code
+
+
+@pytest.fixture(autouse=True)
+def sessions(monkeypatch):
+    store = BoundedStateStore("test_session", max_entries=100, idle_ttl_seconds=3600)
+    monkeypatch.setattr(user_session, "_sessions", store)
+    return store
+
+
+def _session() -> UserSession:
+    session = UserSession()
+    session.record_intent("pricing")
+    session.record_intent("greeting")
+    session.track_intent("unknown")
+    session.track_intent("unknown")
+    for stamp in range(TIMESTAMP_RING_SIZE + 2):
+        session.add_message_time(100.0 + stamp)
+    return session
+
+
+def test_to_bytes_round_trip():
+    session = _session()
+
+    restored = UserSession.from_bytes(session.to_bytes())
+
+    assert restored.last_intent == "greeting"
+    assert restored.message_count == 2
+    assert restored.unknown_streak == 2
+    assert restored.stamp_head == session.stamp_head
+    assert list(restored.stamps) == list(session.stamps)
+    assert restored.recent_messages(110.0, 10) == session.recent_messages(110.0, 10)
+
+
+def test_round_trip_without_an_intent():
+    restored = UserSession.from_bytes(UserSession().to_bytes())
+
+    assert restored.last_intent is None
+    assert restored.message_count == 0
+
+
+def test_from_bytes_rejects_a_truncated_record():
+    with pytest.raises(struct.error):
+        UserSession.from_bytes(_session().to_bytes()[:8])
+
+
+def test_ring_keeps_the_most_recent_times():
+    session = _session()
+
+    count, last = session.recent_messages(now=107.0, window=10)
+
+    assert count == TIMESTAMP_RING_SIZE
+    assert last == 100.0 + TIMESTAMP_RING_SIZE + 1
+
+
+def test_memory_view_round_trip():
+    memory = _session().as_memory()
+
+    assert memory == {"last_intent": "greeting", "message_count": 2, "unknown_intent_count": 2}
+    assert UserSession.from_memory(memory).as_memory() == memory
+    assert UserSession().as_memory() == {"last_intent": None, "message_count": 0, "unknown_intent_count": 0}
+
+
+def test_intent_codes_are_interned():
+    assert intent_code("greeting") == intent_code("greeting")
+    assert intent_code("greeting") != intent_code("pricing")
+
+
+def test_known_intent_resets_the_unknown_streak():
+    session = UserSession()
+
+    assert [session.track_intent(intent) for intent in ("unknown", "unknown", "pricing", "unknown")] == [1, 2, 0, 1]
+
+
+def test_trackers_share_one_session_per_user(sessions):
+    memory.update_memory("42", "pricing")
+    edge_case_handler.track_unknown_intent("42", "unknown")
+    assert edge_case_handler.is_spam("42") == (False, None)
+
+    assert len(sessions) == 1
+    session = user_session.peek_session("42")
+    assert (session.last_intent, session.message_count, session.unknown_streak) == ("pricing", 1, 1)
+    assert memory.get_memory("42")["unknown_intent_count"] == 1
+
+
+def test_clearing_memory_drops_the_session(sessions):
+    memory.update_memory("42", "pricing")
+
+    memory.clear_memory("42")
+
+    assert user_session.peek_session("42") is None
+    assert memory.get_memory("42")["message_count"] == 0
+
+
+def test_spam_limit_is_checked_against_the_session_ring(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(edge_case_handler.time, "time", lambda: now[0])
+    session = user_session.get_session("42")
+    for index in range(edge_case_handler.SPAM_MESSAGE_LIMIT):
+        session.add_message_time(now[0] - 9 + index * 0.5)  # All in the window, the last 7s ago
+
+    is_spam, reason = edge_case_handler.is_spam("42")
+
+    assert is_spam is True
+    assert reason.startswith(f"Too many messages ({edge_case_handler.SPAM_MESSAGE_LIMIT})")
+
+
+def test_each_business_tracks_its_own_session(sessions):
+    edge_case_handler.track_unknown_intent("42", "unknown", 1, "telegram")
+    edge_case_handler.track_unknown_intent("42", "unknown", 1, "telegram")
+    edge_case_handler.track_unknown_intent("42", "unknown", 2, "telegram")
+
+    assert user_session.session_key("42") == "42"
+    assert user_session.session_key("42", 1, "telegram") != user_session.session_key("42", 2, "telegram")
+    assert edge_case_handler.get_unknown_intent_count("42", 1, "telegram") == 2
+    assert edge_case_handler.get_unknown_intent_count("42", 2, "telegram") == 1
+    assert edge_case_handler.get_unknown_intent_count("42") == 0